@@ -1,97 +1,324 @@
 from __future__ import annotations
 
-import shutil
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import date, timedelta
-from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 
+import numpy as np
 from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 
-from app.schemas.training import Activity, MetricsDaily, WorkoutExecuted, Sample
-from app.services.metrics import compute_metrics_daily
-from app.services.file_parser import parse_fit_file, FileParseError
+from app.schemas.training import (
+    Activity, MetricsDaily, WorkoutExecuted, Sample, IngestionJob, IntervalDetected, ThresholdSuggestion,
+    TeamPmcRequest,
+)
+from app.services.cp_model import DEFAULT_WINDOW_DAYS, refit_athletes
+from app.services.metrics import LoadConstants, daily_loads
+from app.services.file_parser import validate_file_type
+from app.services.ingestion import JobScheduler, JobQueueFullError, JobNotFoundError, WorkoutNotFoundError
+from app.services.parse_pool import ParsePool, ParsePoolSaturatedError
+from app.services.pmc import PmcCache, team_loads
+from app.services.power_curve import PowerCurveIndex
+from app.services.storage import IntervalCache, ParseResultCache, RawUploadStore, data_dir_from_env
+from app.services.workout_store import WorkoutStore
 from app.clients.trainingpeaks import TrainingPeaksClient, TrainingPeaksAPIError
 
-app = FastAPI(title="AutoCoach API", version="0.1.0")
+# Largest accepted upload (compressed size as sent by the client)
+MAX_UPLOAD_BYTES = 32 * 1024 * 1024
+_UPLOAD_CHUNK_BYTES = 1024 * 1024
 
 # Global client instance (in production, this should be managed per user)
 tp_client: Optional[TrainingPeaksClient] = None
 
+# Worker pool for CPU-bound file parsing and the ingestion job queue on top of it
+# (both created on first upload)
+parse_pool: Optional[ParsePool] = None
+job_scheduler: Optional[JobScheduler] = None
+
+# FTP-independent products of every ingested workout (persisted under the
+# data dir once the app starts; see lifespan)
+workout_store = WorkoutStore()
+
+# Per-athlete ATL/CTL series, updated forward from each changed workout date
+# (persisted next to the workout store once the app starts)
+pmc_cache = PmcCache(workout_store)
+
+# Per-athlete best mean-max power curves (persisted under the data dir once
+# the app starts)
+power_curve_index = PowerCurveIndex()
+
+# Latest CP/W′ suggestion per athlete from the CP model refit
+threshold_suggestions: Dict[int, ThresholdSuggestion] = {}
+
+
+def get_parse_pool() -> ParsePool:
+    """Return the shared parse pool, creating it from the environment if needed."""
+    global parse_pool
+    if parse_pool is None:
+        parse_pool = ParsePool.from_env()
+    return parse_pool
+
+
+def get_job_scheduler() -> JobScheduler:
+    """Return the shared ingestion job scheduler."""
+    global job_scheduler
+    if job_scheduler is None:
+        data_dir = data_dir_from_env()
+        job_scheduler = JobScheduler(
+            get_parse_pool(),
+            raw_store=RawUploadStore(data_dir / "raw"),
+            result_cache=ParseResultCache(data_dir / "parsed"),
+            workout_store=workout_store,
+            interval_cache=IntervalCache(data_dir / "intervals"),
+            power_curve_index=power_curve_index,
+        )
+    return job_scheduler
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    data_dir = data_dir_from_env()
+    await asyncio.to_thread(workout_store.open, data_dir / "workouts")
+    pmc_cache.open(data_dir / "pmc")
+    await asyncio.to_thread(power_curve_index.open, data_dir / "power_curves")
+    yield
+    if job_scheduler is not None:
+        await job_scheduler.stop()
+    if parse_pool is not None:
+        parse_pool.shutdown()
+
+
+app = FastAPI(title="AutoCoach API", version="0.1.0", lifespan=lifespan)
+
+
+async def _read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """Read an upload without blocking the event loop, enforcing a size limit."""
+    chunks: List[bytes] = []
+    total = 0
+    while True:
+        chunk = await file.read(_UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large (limit {max_bytes // (1024 * 1024)} MB)",
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
 
 @app.get("/")
 async def health() -> dict:
     return {"status": "ok"}
 
 
-@app.post("/workouts/upload")
+@app.post("/workouts/upload", status_code=202)
 async def upload_workout(
-    file: UploadFile = File(..., description="FIT/TCX/GPX file (.fit, .fit.gz, .tcx, .gpx)"),
+    file: UploadFile = File(..., description="FIT/TCX/GPX file (.fit, .fit.gz, .fit.zst, .tcx, .gpx)"),
     athlete_id: int = Form(..., description="Athlete ID"),
     ftp: Optional[int] = Form(None, description="Functional Threshold Power (for TSS calculation)"),
 ):
     """
-    Upload and parse a workout file (FIT, TCX, or GPX).
+    Upload a workout file (FIT, TCX, or GPX) for asynchronous ingestion.
     
-    Supports compressed files (.fit.gz).
-    Returns workout summary and sample count.
+    Supports compressed files (.fit.gz, .fit.zst, .tcx.gz, .gpx.gz), decompressed in memory.
+    Returns a job ID immediately; parse, clean, summarize and interval
+    detection run in a bounded process pool. Poll ``GET /jobs/{job_id}``
+    for per-stage status and the parsed workout. When the ingestion queue
+    is full the request is rejected with 503.
     """
     # Validate file type
-    allowed_extensions = {'.fit', '.gz', '.tcx', '.gpx'}
-    file_ext = Path(file.filename).suffix.lower()
-    
-    if file_ext not in allowed_extensions:
-        # Check if it's .fit.gz
-        if not file.filename.lower().endswith('.fit.gz'):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported file type. Allowed: .fit, .fit.gz, .tcx, .gpx"
-            )
+    if not validate_file_type(file.filename):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: .fit, .fit.gz, .fit.zst, .tcx, .gpx"
+        )
     
-    # Create uploads directory if it doesn't exist
-    uploads_dir = Path("uploads")
-    uploads_dir.mkdir(exist_ok=True)
+    data = await _read_upload(file)
+    try:
+        job = get_job_scheduler().submit(data, file.filename, athlete_id=athlete_id, ftp=ftp)
+    except JobQueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion queue full, retry shortly",
+            headers={"Retry-After": "5"},
+        )
     
-    # Save uploaded file temporarily
-    temp_file_path = uploads_dir / file.filename
+    return {
+        "message": "Workout accepted for processing",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+    }
+
+
+@app.get("/jobs/{job_id}", response_model=IngestionJob)
+async def get_job(job_id: str) -> IngestionJob:
+    """Get the status, per-stage timings and result of an ingestion job."""
     try:
-        with temp_file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Parse the file (currently only FIT supported)
-        if file.filename.lower().endswith(('.fit', '.fit.gz')):
-            try:
-                workout, samples = parse_fit_file(
-                    str(temp_file_path),
-                    athlete_id=athlete_id,
-                    ftp=ftp
-                )
-                
-                return {
-                    "message": "Workout uploaded and parsed successfully",
-                    "workout": workout.model_dump(),
-                    "sample_count": len(samples),
-                    "file_path": str(temp_file_path),
-                }
-            except FileParseError as e:
-                raise HTTPException(status_code=400, detail=f"Failed to parse FIT file: {str(e)}")
-        else:
-            # TCX/GPX support coming soon
-            raise HTTPException(
-                status_code=501,
-                detail="TCX/GPX parsing not yet implemented. Use FIT files for now."
-            )
+        return get_job_scheduler().get(job_id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/workouts/{content_hash}/intervals", response_model=List[IntervalDetected])
+async def get_workout_intervals(
+    content_hash: str,
+    ftp: Optional[int] = Query(None, gt=0, description="Athlete's current FTP (labels and zones)"),
+) -> List[IntervalDetected]:
+    """
+    Get the detected intervals of an ingested workout.
+
+    Results are cached per workout, detection parameters and threshold, so
+    re-opening a workout is a cache hit; a new FTP re-segments once. When
+    the parse pool is saturated the request is rejected with 503.
+    """
+    try:
+        return await get_job_scheduler().workout_intervals(content_hash, ftp=ftp)
+    except WorkoutNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ParsePoolSaturatedError:
+        raise HTTPException(
+            status_code=503,
+            detail="Parse pool busy, retry shortly",
+            headers={"Retry-After": "5"},
+        )
+
+
+@app.post("/athletes/{athlete_id}/rethreshold")
+async def rethreshold_athlete(
+    athlete_id: int,
+    ftp: int = Query(..., gt=0, description="New Functional Threshold Power (watts)"),
+    since: Optional[date] = Query(None, description="Only re-threshold workouts on/after this date"),
+):
+    """
+    Recompute IF/TSS for an athlete's stored workouts after an FTP change.
     
-    except Exception as e:
-        # Clean up temp file on error
-        if temp_file_path.exists():
-            temp_file_path.unlink()
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    Uses the stored NP and duration of each workout (no file re-decoding)
+    and reports the earliest day whose daily TSS changed.
+    """
+    result = workout_store.rethreshold(athlete_id, ftp, since=since)
+    return {
+        "athlete_id": result.athlete_id,
+        "ftp": result.ftp,
+        "workouts_updated": result.workouts_updated,
+        "earliest_affected_date": result.earliest_affected_date,
+    }
+
+
+@app.get("/athletes/{athlete_id}/pmc", response_model=List[MetricsDaily])
+async def get_athlete_pmc(
+    athlete_id: int,
+    start: Optional[date] = Query(None, description="First day returned (default: first workout)"),
+    end: Optional[date] = Query(None, description="Last day returned; later than the last workout decays loads"),
+) -> List[MetricsDaily]:
+    """
+    Get an athlete's daily TSS, ATL, CTL and TSB from their stored workouts.
+    
+    Loads are kept per athlete and only recomputed from the earliest
+    workout date that changed since the last request.
+    """
+    metrics = pmc_cache.metrics_daily(athlete_id, start=start, end=end)
+    if not metrics and pmc_cache.state(athlete_id) is None:
+        raise HTTPException(status_code=404, detail=f"No workouts for athlete {athlete_id}")
+    return metrics
+
+
+@app.post("/team/pmc")
+async def get_team_pmc(request: TeamPmcRequest):
+    """
+    Get daily TSS, ATL, CTL and TSB for a team from their stored workouts.
+    
+    All athletes are computed together in one vectorized pass over an
+    athletes x days TSS matrix; time constants can differ per athlete.
+    """
+    constants = {
+        athlete_id: LoadConstants(c.atl_tau_days, c.ctl_tau_days)
+        for athlete_id, c in request.load_constants.items()
+    }
+    loads = team_loads(
+        workout_store, request.athlete_ids, constants, start=request.start_date, end=request.end_date
+    )
+    return {
+        "dates": loads.dates.astype(str).tolist(),
+        "athletes": [
+            {
+                "athlete_id": athlete_id,
+                "tss": np.round(loads.tss[row], 1).tolist(),
+                "atl": np.round(loads.atl[row], 2).tolist(),
+                "ctl": np.round(loads.ctl[row], 2).tolist(),
+                "tsb": np.round(loads.tsb[row], 2).tolist(),
+            }
+            for row, athlete_id in enumerate(loads.athlete_ids)
+        ],
+    }
+
+
+@app.get("/athletes/{athlete_id}/power-curve")
+async def get_power_curve(
+    athlete_id: int,
+    days: Optional[int] = Query(None, gt=0, description="Only the last N days up to `end` (overrides start)"),
+    start: Optional[date] = Query(None, description="First day included (default: all history)"),
+    end: Optional[date] = Query(None, description="Last day included (default: all history)"),
+    duration_s: Optional[int] = Query(None, gt=0, description="Also report the best power for this duration"),
+):
+    """
+    Get an athlete's best mean-max power curve over a date range.
+    
+    Served from the incrementally maintained best-curve index, so long
+    ranges cost the same as short ones and no workout is re-read.
+    """
+    if days is not None:
+        start = (end or date.today()) - timedelta(days=days - 1)
+    curve = power_curve_index.best_curve(athlete_id, start=start, end=end)
+    if curve is None:
+        raise HTTPException(status_code=404, detail=f"No power data for athlete {athlete_id} in range")
+    known = ~np.isnan(curve)
+    response = {
+        "athlete_id": athlete_id,
+        "start": start,
+        "end": end,
+        "durations_s": power_curve_index.durations_s[known].tolist(),
+        "power_w": np.round(curve[known], 1).tolist(),
+    }
+    if duration_s is not None:
+        response["best_power_w"] = power_curve_index.best_power(athlete_id, duration_s, start=start, end=end)
+    return response
+
+
+@app.post("/athletes/cp-refit")
+async def refit_critical_power(
+    window_days: int = Query(DEFAULT_WINDOW_DAYS, gt=0, description="Rolling mean-max window (days)"),
+    model: str = Query("3p", pattern="^(2p|3p)$", description="CP model: 2p or 3p"),
+):
+    """
+    Refit CP/W′ for every athlete from their recent mean-max power.
+    
+    Intended for a nightly job: all athletes are fitted in one vectorized
+    pass and the suggestions replace the previous ones.
+    """
+    suggestions = await asyncio.to_thread(refit_athletes, power_curve_index, window_days, None, model)
+    threshold_suggestions.update(suggestions)
+    return {"athletes_fitted": len(suggestions), "model": model, "window_days": window_days}
+
+
+@app.get("/athletes/{athlete_id}/threshold-suggestion", response_model=ThresholdSuggestion)
+async def get_threshold_suggestion(athlete_id: int) -> ThresholdSuggestion:
+    """Get the latest suggested CP/W′ for an athlete."""
+    suggestion = threshold_suggestions.get(athlete_id)
+    if suggestion is None:
+        raise HTTPException(status_code=404, detail=f"No threshold suggestion for athlete {athlete_id}")
+    return suggestion
 
 
 @app.post("/metrics/daily", response_model=List[MetricsDaily])
-async def metrics_daily(activities: List[Activity]) -> List[MetricsDaily]:
-    return compute_metrics_daily(activities)
+async def metrics_daily(activities: List[Activity]) -> Response:
+    # Rows are computed from validated input: serialize the columns directly
+    # rather than re-validating a model per day
+    return Response(daily_loads(activities).to_json(), media_type="application/json")
 
 
 @app.get("/auth/trainingpeaks")
@@ -182,7 +409,6 @@ async def compute_tp_metrics(
     
     try:
         activities = tp_client.fetch_activities(start_date, end_date, athlete_id)
-        metrics = compute_metrics_daily(activities)
-        return metrics
+        return Response(daily_loads(activities).to_json(), media_type="application/json")
     except TrainingPeaksAPIError as e:
         raise HTTPException(status_code=400, detail=str(e))
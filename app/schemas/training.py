@@ -25,6 +25,7 @@ class Athlete(BaseModel):
     sport: str = Field(..., description="Primary sport: cycling, running, swimming, triathlon")
     ftp: Optional[int] = Field(None, ge=0, le=600, description="Cycling Functional Threshold Power (watts)")
     cp: Optional[float] = Field(None, ge=0, description="Running Critical Pace (min/km) or Critical Power")
+    w_prime: Optional[float] = Field(None, ge=0, description="W′: work capacity above Critical Power (joules)")
     lthr: Optional[int] = Field(None, ge=0, le=220, description="Lactate Threshold Heart Rate (bpm)")
     max_hr: Optional[int] = Field(None, ge=0, le=220, description="Maximum Heart Rate (bpm)")
     resting_hr: Optional[int] = Field(None, ge=30, le=100, description="Resting Heart Rate (bpm)")
@@ -168,6 +169,65 @@ class MetricsDaily(BaseModel):
     created_at: Optional[datetime] = Field(None, description="Record creation timestamp")
 
 
+class JobStage(BaseModel):
+    """Status and timing of one stage of an ingestion job."""
+    name: str = Field(..., description="Stage name: parse, clean, summarize, intervals, power_curve")
+    status: str = Field("pending", description="Stage status: pending, running, done, cached, failed, skipped")
+    started_at: Optional[datetime] = Field(None, description="Stage start time")
+    finished_at: Optional[datetime] = Field(None, description="Stage end time")
+    duration_ms: Optional[float] = Field(None, ge=0, description="Wall-clock stage duration in milliseconds")
+    error: Optional[str] = Field(None, description="Error message if the stage failed")
+
+
+class IngestionJob(BaseModel):
+    """Asynchronous workout-file ingestion job with per-stage progress."""
+    id: str = Field(..., description="Job ID")
+    athlete_id: int = Field(..., ge=1, description="Foreign key to athlete")
+    filename: str = Field(..., description="Uploaded file name")
+    content_hash: Optional[str] = Field(None, description="SHA-256 of the uploaded bytes (content address)")
+    cache_hit: bool = Field(False, description="True if the parse result came from the dedup cache")
+    status: str = Field("queued", description="Job status: queued, running, done, failed")
+    created_at: datetime = Field(..., description="Submission timestamp")
+    finished_at: Optional[datetime] = Field(None, description="Completion timestamp")
+    stages: List[JobStage] = Field(default_factory=list, description="Pipeline stages in execution order")
+    workout: Optional[WorkoutExecuted] = Field(None, description="Parsed workout (when done); the first leg of a multisport file")
+    workouts: List[WorkoutExecuted] = Field(default_factory=list, description="One workout per session (multisport legs)")
+    sample_count: Optional[int] = Field(None, ge=0, description="Number of samples parsed")
+    intervals: List[IntervalDetected] = Field(default_factory=list, description="Detected intervals")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+
+
+class ThresholdSuggestion(BaseModel):
+    """Critical Power model fitted to an athlete's recent mean-max power."""
+    athlete_id: int = Field(..., ge=1, description="Foreign key to athlete")
+    model: str = Field(..., description="CP model: 2p (CP + W′/t) or 3p (CP + W′/(t + k))")
+    cp: float = Field(..., gt=0, description="Suggested Critical Power (watts)")
+    w_prime: float = Field(..., gt=0, description="Suggested W′ (joules)")
+    p_max: Optional[float] = Field(None, gt=0, description="Modelled maximal instantaneous power (3p only)")
+    rmse_w: float = Field(..., ge=0, description="Root-mean-square fit error (watts)")
+    points: int = Field(..., ge=0, description="Mean-max points used in the fit")
+    window_start: date = Field(..., description="First day of the mean-max window")
+    window_end: date = Field(..., description="Last day of the mean-max window")
+    fitted_at: datetime = Field(..., description="Fit timestamp")
+
+
+class LoadTimeConstants(BaseModel):
+    """ATL/CTL time constants for one athlete."""
+    atl_tau_days: float = Field(7.0, ge=1, description="Acute Training Load time constant (days)")
+    ctl_tau_days: float = Field(42.0, ge=1, description="Chronic Training Load time constant (days)")
+
+
+class TeamPmcRequest(BaseModel):
+    """Request model for a team's daily ATL/CTL/TSB."""
+    athlete_ids: List[int] = Field(..., min_length=1, description="Team members")
+    start_date: Optional[date] = Field(None, description="First day returned (default: earliest workout)")
+    end_date: Optional[date] = Field(None, description="Last day returned (default: latest workout)")
+    load_constants: Dict[int, LoadTimeConstants] = Field(
+        default_factory=dict,
+        description="Per-athlete time constants by athlete ID (default 7/42 days)",
+    )
+
+
 class WeekPlanRequest(BaseModel):
     """Request model for generating a weekly training plan."""
     start_date: date = Field(..., description="Week start date")
@@ -0,0 +1,272 @@
+"""
+Compliance scoring of executed workouts against a planned ``WorkoutSpec``.
+
+The spec is compiled once (``workout_compiler``) into per-second arrays
+(step index, target, band low/high and the channel each step is targeted
+on). Executed samples are scattered onto the same one-second grid, and
+every per-step statistic (time in band, mean, variability) is a
+``np.bincount`` over the step index, so scoring is O(duration) with no
+Python loop over seconds.
+
+Rules (``NEXT_STEPS.md`` / ``AutocoachOverview.md``):
+    - Step pass: >= 80% of the step in the target band and mean within
+      +-3% (up to threshold) or +-5% (above threshold) of target
+    - Rest pass: <= 60% of FTP for >= 80% of the rest
+    - Session pass: >= 70% of scored steps pass
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from app.schemas.training import WorkoutSpec, WorkoutStep
+from app.services.sample_frame import SampleFrame
+from app.services.workout_compiler import NO_TARGET, TARGET_CHANNELS, compile_spec
+
+STEP_PASS_IN_BAND_PCT = 80.0
+STEP_MARGINAL_IN_BAND_PCT = 60.0
+SESSION_PASS_RATE = 0.70
+SESSION_MARGINAL_RATE = 0.50
+# Mean-vs-target tolerance: threshold/tempo work vs efforts above threshold
+MEAN_TOLERANCE_PCT = 3.0
+MEAN_TOLERANCE_ABOVE_THRESHOLD_PCT = 5.0
+# Rest steps pass when held under this fraction of FTP
+REST_CAP_FTP_FRACTION = 0.60
+
+_REST_KINDS = ('rest', 'recovery')
+
+
+@dataclass
+class SpecTimeline:
+    """
+    A WorkoutSpec expanded to one entry per planned second.
+
+    Attributes:
+        steps: Leaf steps in execution order (interval blocks unrolled)
+        step_index: Leaf step index for each second
+        channel: Per-step index into ``TARGET_CHANNELS`` (-1 = no target)
+        target, low, high: Per-step target and band (NaN without target)
+        mean_tolerance_pct: Per-step allowed mean deviation from target
+        rest: Per-step flag for rest steps (scored on the cap only)
+    """
+    steps: List[WorkoutStep]
+    step_index: np.ndarray
+    channel: np.ndarray
+    target: np.ndarray
+    low: np.ndarray
+    high: np.ndarray
+    mean_tolerance_pct: np.ndarray
+    rest: np.ndarray
+
+    @property
+    def duration_s(self) -> int:
+        return len(self.step_index)
+
+
+@dataclass
+class StepCompliance:
+    """Execution of one planned (leaf) step."""
+    step_index: int
+    kind: str
+    channel: Optional[str]
+    duration_s: int
+    target: Optional[float]
+    time_in_band_pct: Optional[float]
+    mean: Optional[float]
+    mean_vs_target_pct: Optional[float]
+    variability: Optional[float]
+    status: str  # pass, marginal, fail, unscored
+
+
+@dataclass
+class ComplianceReport:
+    """Per-step results and the session verdict."""
+    steps: List[StepCompliance] = field(default_factory=list)
+    steps_scored: int = 0
+    steps_passed: int = 0
+    pass_rate: Optional[float] = None
+    status: str = 'unscored'  # pass, marginal, fail, unscored
+
+
+def expand_spec(
+    spec: WorkoutSpec,
+    ftp: Optional[int] = None,
+    lthr: Optional[int] = None,
+    max_hr: Optional[int] = None,
+) -> SpecTimeline:
+    """
+    Expand a WorkoutSpec into per-second target arrays.
+
+    Power targets in % of FTP need ``ftp``; HR targets in % use ``lthr``
+    (or ``max_hr``). Steps whose target can't be resolved are kept on the
+    timeline but left unscored.
+
+    Args:
+        spec: Planned workout
+        ftp: Functional Threshold Power (watts)
+        lthr: Lactate Threshold Heart Rate (bpm)
+        max_hr: Maximum heart rate (bpm), used when lthr is unknown
+
+    Returns:
+        SpecTimeline covering the planned duration
+
+    Raises:
+        ValueError: If a step has no duration_s (distance-based steps can't
+            be placed on a time grid)
+    """
+    compiled = compile_spec(spec, ftp=ftp, lthr=lthr, max_hr=max_hr)
+    count = len(compiled.steps)
+    # The compiled arrays are shared through the compile cache; copy the
+    # band before adjusting it for rest steps
+    low = compiled.low.copy()
+    high = compiled.high.copy()
+    tolerance = np.where(compiled.intensity > 1.05, MEAN_TOLERANCE_ABOVE_THRESHOLD_PCT, MEAN_TOLERANCE_PCT)
+    rest = np.zeros(count, dtype=bool)
+
+    for i, step in enumerate(compiled.steps):
+        if compiled.channel[i] == NO_TARGET or step.kind not in _REST_KINDS:
+            continue
+        rest[i] = True
+        low[i] = 0.0
+        if compiled.channel[i] == 0 and ftp:
+            high[i] = max(high[i], REST_CAP_FTP_FRACTION * ftp)
+
+    return SpecTimeline(
+        steps=list(compiled.steps),
+        step_index=compiled.step_index,
+        channel=compiled.channel,
+        target=compiled.target,
+        low=low,
+        high=high,
+        mean_tolerance_pct=tolerance,
+        rest=rest,
+    )
+
+
+def _actual_on_grid(samples: SampleFrame, duration_s: int, offset_s: int) -> np.ndarray:
+    """Stack the target channels onto the planned 1 s grid (NaN = no data)."""
+    grid = np.full((len(TARGET_CHANNELS), duration_s), np.nan)
+    t = samples.t_s.astype(np.int64) - samples.t_s[0] - offset_s if len(samples) else samples.t_s
+    inside = (t >= 0) & (t < duration_s)
+    for row, name in enumerate(TARGET_CHANNELS):
+        keep = inside & samples.valid[name]
+        grid[row, t[keep]] = getattr(samples, name)[keep]
+    return grid
+
+
+def score_compliance(
+    timeline: SpecTimeline,
+    samples: SampleFrame,
+    offset_s: int = 0,
+) -> ComplianceReport:
+    """
+    Score executed samples against an expanded spec.
+
+    The plan is aligned with the first sample (plus ``offset_s``); seconds
+    with no data count as out of band.
+
+    Args:
+        timeline: Output of ``expand_spec``
+        samples: Cleaned samples of the executed workout
+        offset_s: Seconds of executed data to skip before the plan starts
+
+    Returns:
+        ComplianceReport with per-step results and the session status
+    """
+    count = len(timeline.steps)
+    step_index = timeline.step_index
+    grid = _actual_on_grid(samples, timeline.duration_s, offset_s)
+
+    # Each second is compared on its step's channel
+    step_channel = timeline.channel[step_index].astype(np.int64)
+    scored = step_channel != NO_TARGET
+    actual = np.full(timeline.duration_s, np.nan)
+    actual[scored] = grid[step_channel[scored], np.flatnonzero(scored)]
+    has_data = ~np.isnan(actual)
+    value = np.where(has_data, actual, 0.0)
+    in_band = has_data & (value >= timeline.low[step_index]) & (value <= timeline.high[step_index])
+
+    seconds = np.bincount(step_index, minlength=count)
+    n = np.bincount(step_index, weights=has_data, minlength=count)
+    hits = np.bincount(step_index, weights=in_band, minlength=count)
+    total = np.bincount(step_index, weights=value, minlength=count)
+    squares = np.bincount(step_index, weights=value * value, minlength=count)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        in_band_pct = 100 * hits / seconds
+        mean = total / n
+        std = np.sqrt(np.maximum(squares / n - mean * mean, 0.0))
+        deviation_pct = 100 * (mean - timeline.target) / timeline.target
+        variability = std / timeline.target
+
+    mean_ok = np.abs(deviation_pct) <= timeline.mean_tolerance_pct
+    mean_close = np.abs(deviation_pct) <= 2 * timeline.mean_tolerance_pct
+    # Rest steps are judged on time under the cap only
+    mean_ok |= timeline.rest
+    mean_close |= timeline.rest
+    passed = (in_band_pct >= STEP_PASS_IN_BAND_PCT) & mean_ok
+    marginal = ~passed & (in_band_pct >= STEP_MARGINAL_IN_BAND_PCT) & mean_close
+    has_target = timeline.channel != NO_TARGET
+
+    report = ComplianceReport()
+    for i, step in enumerate(timeline.steps):
+        if not has_target[i]:
+            status = 'unscored'
+        else:
+            status = 'pass' if passed[i] else 'marginal' if marginal[i] else 'fail'
+        measured = has_target[i] and n[i] > 0
+        report.steps.append(StepCompliance(
+            step_index=i,
+            kind=step.kind,
+            channel=TARGET_CHANNELS[timeline.channel[i]] if has_target[i] else None,
+            duration_s=int(seconds[i]),
+            target=float(timeline.target[i]) if has_target[i] else None,
+            time_in_band_pct=float(in_band_pct[i]) if has_target[i] and seconds[i] else None,
+            mean=float(mean[i]) if measured else None,
+            mean_vs_target_pct=float(deviation_pct[i]) if measured else None,
+            variability=float(variability[i]) if measured else None,
+            status=status,
+        ))
+
+    report.steps_scored = int(has_target.sum())
+    report.steps_passed = int((passed & has_target).sum())
+    if report.steps_scored:
+        report.pass_rate = report.steps_passed / report.steps_scored
+        if report.pass_rate >= SESSION_PASS_RATE:
+            report.status = 'pass'
+        elif report.pass_rate >= SESSION_MARGINAL_RATE:
+            report.status = 'marginal'
+        else:
+            report.status = 'fail'
+    return report
+
+
+def score_workout(
+    spec: WorkoutSpec,
+    samples: SampleFrame,
+    ftp: Optional[int] = None,
+    lthr: Optional[int] = None,
+    max_hr: Optional[int] = None,
+    offset_s: int = 0,
+) -> ComplianceReport:
+    """
+    Expand a spec and score one executed workout against it.
+
+    Args:
+        spec: Planned workout
+        samples: Cleaned samples of the executed workout
+        ftp: Functional Threshold Power (watts)
+        lthr: Lactate Threshold Heart Rate (bpm)
+        max_hr: Maximum heart rate (bpm)
+        offset_s: Seconds of executed data to skip before the plan starts
+
+    Returns:
+        ComplianceReport
+
+    Example:
+        >>> report = score_workout(spec, samples, ftp=280)
+        >>> report.status, [step.status for step in report.steps]
+    """
+    return score_compliance(expand_spec(spec, ftp=ftp, lthr=lthr, max_hr=max_hr), samples, offset_s)
@@ -0,0 +1,209 @@
+"""
+Critical Power / W′ model fitting from stored mean-max power curves.
+
+Both models are hyperbolas in duration:
+
+    2p:  P(t) = CP + W′ / t
+    3p:  P(t) = CP + W′ / (t + k),   k = W′ / (Pmax - CP)   (Morton 1996)
+
+For a fixed ``k`` either model is linear in (CP, W′), so least squares has
+a closed form from a handful of weighted sums. Those sums are matrix
+products of the athletes x durations power matrix (NaN = no effort that
+long) with 1 / (t + k) for every ``k`` on a grid, so one pass fits every
+athlete and every candidate ``k`` at once; the 3p fit keeps the ``k`` with
+the smallest squared error. ``refit_athletes`` runs the nightly refit: it
+reads each athlete's best curve over a rolling window from the
+``PowerCurveIndex`` and returns one ``ThresholdSuggestion`` per athlete
+with a usable fit.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.schemas.training import Athlete, ThresholdSuggestion
+from app.services.metrics import MMP_DURATIONS_S
+from app.services.power_curve import PowerCurveIndex
+
+# Mean-max durations each model is fitted on (all on MMP_DURATIONS_S): the
+# 2p model only holds for efforts of ~3-20 min; k lets 3p reach down to 30 s
+CP2_DURATIONS_S = np.array([180, 240, 300, 360, 420, 480, 600, 720, 900, 1200])
+CP3_DURATIONS_S = np.array([30, 45, 60, 90, 120, 180, 240, 300, 360, 420, 480, 600, 720, 900, 1200])
+
+# Candidate 3p time offsets k = W′ / (Pmax - CP) in seconds
+CP3_K_GRID_S = np.concatenate([[0.0], np.geomspace(0.5, 120.0, 96)])
+
+# Fewest mean-max points for a fit, and the longest effort it must include
+MIN_FIT_POINTS = 4
+MIN_LONGEST_EFFORT_S = 600
+
+DEFAULT_WINDOW_DAYS = 90
+
+# Athletes per block of the batched fit (bounds the athletes x k temporaries)
+_FIT_BLOCK_ATHLETES = 4096
+
+
+@dataclass
+class CriticalPowerFits:
+    """
+    Batched CP model fits, one entry per input curve (NaN where unusable).
+
+    Attributes:
+        model: ``'2p'`` or ``'3p'``
+        cp_w: Critical Power in watts
+        w_prime_j: W′ in joules
+        k_s: 3p time offset in seconds (0 for 2p)
+        p_max_w: Modelled maximal power, CP + W′ / k (NaN for 2p or k = 0)
+        rmse_w: Root-mean-square residual in watts
+        points: Mean-max points used
+    """
+    model: str
+    cp_w: np.ndarray
+    w_prime_j: np.ndarray
+    k_s: np.ndarray
+    p_max_w: np.ndarray
+    rmse_w: np.ndarray
+    points: np.ndarray
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Mask of curves with a usable fit."""
+        return ~np.isnan(self.cp_w)
+
+
+def _fit_block(power: np.ndarray, durations_s: np.ndarray, k_grid: np.ndarray):
+    """Closed-form least squares of P = CP + W′ x, x = 1 / (t + k), for every k."""
+    weight = (~np.isnan(power)).astype(np.float64)
+    y = np.nan_to_num(power.astype(np.float64))
+    x = 1.0 / (durations_s[None, :] + k_grid[:, None])          # (k, durations)
+
+    n = weight.sum(axis=1, keepdims=True)                        # (athletes, 1)
+    sum_y = y.sum(axis=1, keepdims=True)
+    sum_yy = (y * y).sum(axis=1, keepdims=True)
+    sum_x = weight @ x.T                                         # (athletes, k)
+    sum_xx = weight @ (x * x).T
+    sum_xy = y @ x.T
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w_prime = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
+        cp = (sum_y - w_prime * sum_x) / n
+        sse = (
+            sum_yy - 2 * cp * sum_y - 2 * w_prime * sum_xy
+            + cp * cp * n + 2 * cp * w_prime * sum_x + w_prime * w_prime * sum_xx
+        )
+    # Only physiological fits compete for the best k
+    sse = np.where((cp > 0) & (w_prime > 0), sse, np.inf)
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(len(power))
+    return cp[rows, best], w_prime[rows, best], k_grid[best], sse[rows, best], n[:, 0]
+
+
+def fit_critical_power(
+    curves: np.ndarray,
+    model: str = '2p',
+    durations_s: np.ndarray = MMP_DURATIONS_S,
+) -> CriticalPowerFits:
+    """
+    Fit a CP model to many mean-max power curves at once.
+
+    Args:
+        curves: Athletes x durations matrix of best power (NaN = no effort)
+        model: ``'2p'`` (CP + W′/t) or ``'3p'`` (CP + W′/(t + k))
+        durations_s: Durations of the curve columns (default ``MMP_DURATIONS_S``)
+
+    Returns:
+        CriticalPowerFits; curves with fewer than ``MIN_FIT_POINTS`` points,
+        no effort of ``MIN_LONGEST_EFFORT_S`` or a non-physiological fit
+        (CP or W′ <= 0) get NaN
+
+    Raises:
+        ValueError: If the model is unknown or the curves miss a fit duration
+
+    Example:
+        >>> ids, curves = index.best_curves(start=date.today() - timedelta(days=89))
+        >>> fits = fit_critical_power(curves, model='3p')
+        >>> fits.cp_w[fits.valid]
+    """
+    if model == '2p':
+        fit_durations, k_grid = CP2_DURATIONS_S, np.zeros(1)
+    elif model == '3p':
+        fit_durations, k_grid = CP3_DURATIONS_S, CP3_K_GRID_S
+    else:
+        raise ValueError(f"Unknown CP model '{model}' (expected '2p' or '3p')")
+    if not np.isin(fit_durations, durations_s).all():
+        raise ValueError("Curves must include every fit duration")
+    columns = np.searchsorted(durations_s, fit_durations)
+
+    power = np.asarray(curves)[:, columns]
+    count = len(power)
+    cp, w_prime, k, sse, points = (np.full(count, np.nan) for _ in range(5))
+    for start in range(0, count, _FIT_BLOCK_ATHLETES):
+        block = slice(start, start + _FIT_BLOCK_ATHLETES)
+        cp[block], w_prime[block], k[block], sse[block], points[block] = _fit_block(
+            power[block], fit_durations.astype(np.float64), k_grid
+        )
+
+    has_power = ~np.isnan(power)
+    longest = np.where(has_power, fit_durations, 0).max(axis=1, initial=0)
+    usable = (points >= MIN_FIT_POINTS) & (longest >= MIN_LONGEST_EFFORT_S) & np.isfinite(sse)
+    cp[~usable] = w_prime[~usable] = k[~usable] = np.nan
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_max = np.where(k > 0, cp + w_prime / k, np.nan)
+        rmse = np.where(usable, np.sqrt(np.maximum(sse, 0) / points), np.nan)
+    return CriticalPowerFits(
+        model=model,
+        cp_w=cp,
+        w_prime_j=w_prime,
+        k_s=k,
+        p_max_w=p_max,
+        rmse_w=rmse,
+        points=points.astype(np.int64),
+    )
+
+
+def refit_athletes(
+    index: PowerCurveIndex,
+    window_days: int = DEFAULT_WINDOW_DAYS,
+    today: Optional[date] = None,
+    model: str = '3p',
+) -> Dict[int, ThresholdSuggestion]:
+    """
+    Refit CP/W′ for every athlete from their mean-max curve over a window.
+
+    Args:
+        index: Per-athlete best mean-max curves
+        window_days: Rolling window length ending at ``today``
+        today: Last day of the window (default: today)
+        model: ``'2p'`` or ``'3p'``
+
+    Returns:
+        Mapping of athlete ID to its suggestion, for athletes with a usable fit
+    """
+    end = today or date.today()
+    start = end - timedelta(days=window_days - 1)
+    athlete_ids, curves = index.best_curves(start, end)
+    fits = fit_critical_power(curves, model=model, durations_s=index.durations_s)
+    fitted_at = datetime.now()
+    return {
+        int(athlete_ids[i]): ThresholdSuggestion(
+            athlete_id=int(athlete_ids[i]),
+            model=model,
+            cp=round(float(fits.cp_w[i]), 1),
+            w_prime=round(float(fits.w_prime_j[i])),
+            p_max=round(float(fits.p_max_w[i]), 1) if not np.isnan(fits.p_max_w[i]) else None,
+            rmse_w=round(float(fits.rmse_w[i]), 2),
+            points=int(fits.points[i]),
+            window_start=start,
+            window_end=end,
+            fitted_at=fitted_at,
+        )
+        for i in np.flatnonzero(fits.valid)
+    }
+
+
+def apply_threshold_suggestion(athlete: Athlete, suggestion: ThresholdSuggestion) -> Athlete:
+    """Return a copy of the athlete with the suggested CP and W′."""
+    return athlete.model_copy(update={'cp': suggestion.cp, 'w_prime': suggestion.w_prime})
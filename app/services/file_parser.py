@@ -2,23 +2,47 @@
 FIT/TCX/GPX file parsing service for workout data extraction.
 
 This module handles parsing of workout files from various sources:
-- FIT files (Garmin, Wahoo, most modern devices) - supports .fit and .fit.gz
+- FIT files (Garmin, Wahoo, most modern devices) - supports .fit, .fit.gz and .fit.zst
 - TCX files (TrainingPeaks, older Garmin)
 - GPX files (basic GPS tracking)
 """
 from __future__ import annotations
 
 import gzip
-import shutil
-import tempfile
-from datetime import datetime
+import io
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import BinaryIO, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple, Union
 
-from fitparse import FitFile
+import numpy as np
+import fitparse
+from fitparse import FitFile, FitParseError
+from fitparse.profile import FIELD_TYPE_TIMESTAMP, MESSAGE_TYPES
 
-from app.schemas.training import WorkoutExecuted, Sample
+# Non-caching reader of newer fitparse releases; None on fitparse <= 1.2
+UncachedFitFile = getattr(fitparse, 'UncachedFitFile', None)
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency for .fit.zst
+    zstandard = None
+
+from app.schemas.training import WorkoutExecuted
+from app.services.geo import track_distance_and_speed
+from app.services.sample_frame import (
+    CHANNELS,
+    ChannelSelection,
+    SampleFrame,
+    SampleFrameBuilder,
+    resolve_channels,
+)
 from app.services.metrics import (
+    RunningStats,
+    StreamingNormalizedPower,
     calculate_normalized_power,
     calculate_intensity_factor,
     calculate_variability_index,
@@ -31,77 +55,581 @@ class FileParseError(Exception):
     pass
 
 
+# Upper bound on the decompressed size of a .fit.gz/.fit.zst payload. Real
+# activity files are a few MB; anything larger is treated as a decompression bomb.
+MAX_DECOMPRESSED_BYTES = 64 * 1024 * 1024
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_READ_CHUNK_BYTES = 1024 * 1024
+
+FitSource = Union[str, Path, bytes, BinaryIO]
+
+
+def _read_capped(stream: BinaryIO, max_bytes: int) -> bytes:
+    """Read a decompressing stream fully, refusing to exceed ``max_bytes``."""
+    buffer = io.BytesIO()
+    while True:
+        chunk = stream.read(_READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer.write(chunk)
+        if buffer.tell() > max_bytes:
+            raise FileParseError(
+                f"Decompressed file exceeds the {max_bytes // (1024 * 1024)} MB limit"
+            )
+    return buffer.getvalue()
+
+
+def _decompressor_opener(magic: bytes) -> Optional[Callable[[BinaryIO], BinaryIO]]:
+    """Factory for a decompressing reader over a gzip/zstd stream, or None if uncompressed."""
+    if magic.startswith(_GZIP_MAGIC):
+        return lambda stream: gzip.GzipFile(fileobj=stream, mode='rb')
+    if magic.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise FileParseError("zstandard is not installed; cannot read .zst files")
+        return lambda stream: zstandard.ZstdDecompressor().stream_reader(stream, closefd=False)
+    return None
+
+
+def _decompression_error(e: Exception) -> FileParseError:
+    if isinstance(e, (gzip.BadGzipFile, EOFError, zlib.error)):
+        return FileParseError("File appears to be corrupted or not a valid gzip file")
+    return FileParseError(f"Failed to decompress file: {str(e)}")
+
+
+def _decompress_stream(
+    stream: BinaryIO,
+    magic: bytes,
+    max_bytes: int,
+) -> Optional[bytes]:
+    """Decompress a gzip/zstd stream in memory, or return None if uncompressed."""
+    opener = _decompressor_opener(magic)
+    if opener is None:
+        return None
+    try:
+        with opener(stream) as reader:
+            return _read_capped(reader, max_bytes)
+    except FileParseError:
+        raise
+    except Exception as e:
+        raise _decompression_error(e)
+
+
+class _StreamingDecompressor(io.RawIOBase):
+    """
+    Seekable, read-only view of a gzip/zstd stream decompressed on the fly.
+    
+    Only the decompressor's state is held, never the whole payload. Seeking
+    backwards restarts decompression from the start of the compressed
+    stream, and ``SEEK_END`` decompresses to the end once to learn the
+    size; fitparse does both exactly once when it opens a file, so a
+    streamed file is decompressed twice in total. The decompressed size is
+    capped at ``max_bytes`` as for in-memory decompression.
+    """
+    
+    def __init__(
+        self,
+        compressed: BinaryIO,
+        opener: Callable[[BinaryIO], BinaryIO],
+        max_bytes: int,
+    ) -> None:
+        super().__init__()
+        self._compressed = compressed
+        self._origin = compressed.tell()
+        self._opener = opener
+        self._max_bytes = max_bytes
+        self._reader = opener(compressed)
+        self._position = 0
+        self._size: Optional[int] = None
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def readinto(self, buffer) -> int:
+        try:
+            count = self._reader.readinto(buffer)
+        except Exception as e:
+            raise _decompression_error(e)
+        self._position += count
+        if self._position > self._max_bytes:
+            raise FileParseError(
+                f"Decompressed file exceeds the {self._max_bytes // (1024 * 1024)} MB limit"
+            )
+        if count == 0:
+            self._size = self._position
+        return count
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            if self._size is None:
+                self._skip(None)
+            offset += self._size
+        if offset < self._position:
+            self._reader.close()
+            self._compressed.seek(self._origin)
+            self._reader = self._opener(self._compressed)
+            self._position = 0
+        self._skip(offset - self._position)
+        return self._position
+    
+    def _skip(self, count: Optional[int]) -> None:
+        """Decompress and discard ``count`` bytes (None: to the end)."""
+        scratch = memoryview(bytearray(_READ_CHUNK_BYTES))
+        while count is None or count > 0:
+            size = len(scratch) if count is None else min(count, len(scratch))
+            read = self.readinto(scratch[:size])
+            if not read:
+                break
+            if count is not None:
+                count -= read
+    
+    def close(self) -> None:
+        if not self.closed:
+            self._reader.close()
+            self._compressed.close()
+        super().close()
+
+
+def open_payload_stream(
+    source: FitSource,
+    max_decompressed_bytes: int = MAX_DECOMPRESSED_BYTES,
+    streaming: bool = False,
+) -> BinaryIO:
+    """
+    Open an uploaded payload as a seekable binary stream of its plain bytes.
+    
+    Compression is detected from the leading magic bytes, so plain, gzip and
+    zstd payloads are all accepted from a path, a bytes buffer or a binary
+    stream (e.g. ``UploadFile.file``). Compressed data is decompressed in
+    memory, capped at ``max_decompressed_bytes``; with ``streaming`` it is
+    decompressed on the fly instead (see ``_StreamingDecompressor``), for
+    readers that never need the whole payload at once. A non-seekable
+    source is first read into memory in its compressed form.
+    
+    Args:
+        source: File path, raw bytes, or readable binary stream
+        max_decompressed_bytes: Decompression size limit in bytes
+        streaming: Decompress while reading instead of up front
+        
+    Returns:
+        Binary stream positioned at the start of the uncompressed payload
+        
+    Raises:
+        FileParseError: If the payload cannot be decompressed
+        FileNotFoundError: If a path is given and doesn't exist
+    """
+    if isinstance(source, (str, Path)):
+        path = Path(source)
+        if not path.exists():
+            raise FileNotFoundError(f"File not found: {source}")
+        stream: BinaryIO = path.open('rb')
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        stream = io.BytesIO(source)
+    else:
+        stream = source
+        if not stream.seekable():
+            stream = io.BytesIO(_read_capped(stream, max_decompressed_bytes))
+    
+    magic = stream.read(len(_ZSTD_MAGIC))
+    stream.seek(-len(magic), io.SEEK_CUR)
+    if streaming:
+        opener = _decompressor_opener(magic)
+        if opener is None:
+            return stream
+        return io.BufferedReader(_StreamingDecompressor(stream, opener, max_decompressed_bytes))
+    payload = _decompress_stream(stream, magic, max_decompressed_bytes)
+    if payload is not None:
+        stream.close()
+        stream = io.BytesIO(payload)
+    return stream
+
+
+def open_fit_source(
+    source: FitSource,
+    max_decompressed_bytes: int = MAX_DECOMPRESSED_BYTES,
+    streaming: bool = False,
+) -> FitFile:
+    """
+    Open a FIT payload for decoding without touching the filesystem.
+    
+    ``.fit``, ``.fit.gz`` and ``.fit.zst`` are all accepted from a path, a
+    bytes buffer or a binary stream; see ``open_payload_stream``.
+    
+    Args:
+        source: File path, raw bytes, or readable binary stream
+        max_decompressed_bytes: Decompression size limit in bytes
+        streaming: Decompress while decoding instead of up front
+        
+    Returns:
+        fitparse FitFile ready for ``decode_fit_messages``
+        
+    Raises:
+        FileParseError: If the payload cannot be decompressed or opened
+        FileNotFoundError: If a path is given and doesn't exist
+    """
+    stream = open_payload_stream(source, max_decompressed_bytes, streaming=streaming)
+    try:
+        return FitFile(stream)
+    except FileParseError:
+        raise
+    except Exception as e:
+        raise FileParseError(f"Failed to open FIT file: {str(e)}")
+
+
 def parse_fit_file(
-    file_path: str,
+    source: FitSource,
     athlete_id: int,
-    ftp: Optional[int] = None
-) -> Tuple[WorkoutExecuted, List[Sample]]:
+    ftp: Optional[int] = None,
+    filename: Optional[str] = None,
+    fast: Optional[bool] = None,
+    channels: ChannelSelection = None,
+) -> Tuple[WorkoutExecuted, SampleFrame]:
     """
-    Parse a FIT file and extract workout data and per-second samples.
+    Parse a single-session FIT file and extract workout data and per-second samples.
+    
+    Handles .fit, .fit.gz and .fit.zst payloads from a path, bytes or a
+    binary stream; compressed data is decompressed in memory (no temp
+    files). Samples are returned as a columnar ``SampleFrame``; call
+    ``samples.to_samples()`` if per-record ``Sample`` objects are needed.
     
-    Automatically handles both .fit and .fit.gz (gzipped) files.
+    Multisport files (triathlon, brick) have one workout per session and
+    are rejected here; use ``parse_fit_sessions``, which returns one
+    (WorkoutExecuted, SampleFrame) per leg with its own sport and TSS (the
+    ingestion pipeline does the same through ``summarize_sessions``).
     
     Args:
-        file_path: Path to the .fit or .fit.gz file
+        source: Path, bytes or binary stream of a .fit/.fit.gz/.fit.zst file
         athlete_id: ID of the athlete who performed the workout
         ftp: Functional Threshold Power (optional, for TSS calculation)
+        filename: Original file name recorded as ``file_ref`` when the
+            source is not a path
+        fast: Use the bulk NumPy record decoder (``decode_fit_fast``);
+            None reads the AUTOCOACH_FIT_FAST_DECODE environment variable
+        channels: Sample channels to decode: a profile name ("load" for
+            power/HR only, "full"), channel names, or None for all.
+            Skipped channels are left all-invalid.
         
     Returns:
-        Tuple of (WorkoutExecuted, List[Sample])
+        Tuple of (WorkoutExecuted, SampleFrame)
         
     Raises:
-        FileParseError: If file cannot be parsed
+        FileParseError: If file cannot be parsed or holds several recorded
+            sessions
         FileNotFoundError: If file doesn't exist
         
     Example:
         >>> # Works with both compressed and uncompressed files
         >>> workout, samples = parse_fit_file("ride.fit", athlete_id=1, ftp=300)
         >>> workout2, samples2 = parse_fit_file("ride.fit.gz", athlete_id=1, ftp=300)
+        >>> with open("ride.fit.zst", "rb") as f:
+        ...     workout3, samples3 = parse_fit_file(f, athlete_id=1, filename="ride.fit.zst")
+        >>> # TSS backfill: decode power and HR only
+        >>> workout4, samples4 = parse_fit_file("ride.fit", athlete_id=1, ftp=300, channels="load")
     """
-    file_path_obj = Path(file_path)
-    if not file_path_obj.exists():
-        raise FileNotFoundError(f"File not found: {file_path}")
+    if filename is None and isinstance(source, (str, Path)):
+        filename = str(source)
     
-    # Handle gzipped files by decompressing to temp file
-    temp_file = None
-    try:
-        if file_path_obj.suffix == '.gz':
-            # Create temporary file for decompressed data
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.fit')
-            with gzip.open(str(file_path_obj), 'rb') as f_in:
-                with open(temp_file.name, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-            fit_file_path = temp_file.name
-        else:
-            fit_file_path = str(file_path_obj)
+    # Single pass: session/lap/event/device_info summaries and per-record samples
+    decoded = clean_samples(_decode_source(source, fast, channels))
+    sessions = _recorded_sessions(decoded)
+    if len(sessions) > 1:
+        raise FileParseError(
+            f"File has {len(sessions)} sessions (multisport); use parse_fit_sessions"
+        )
+    workout = summarize_workout(sessions[0], athlete_id, ftp=ftp, filename=filename)
+    return workout, sessions[0].samples
+
+
+def parse_fit_sessions(
+    source: FitSource,
+    athlete_id: int,
+    ftp: Optional[int] = None,
+    filename: Optional[str] = None,
+    fast: Optional[bool] = None,
+    channels: ChannelSelection = None,
+) -> List[Tuple[WorkoutExecuted, SampleFrame]]:
+    """
+    Parse a FIT file into one workout per session (multisport aware).
+    
+    Decodes once like ``parse_fit_file``, then splits triathlon/brick files
+    by session (see ``split_sessions``); each leg's samples are views into
+    the shared arrays.
+    
+    Args:
+        source: Path, bytes or binary stream of a .fit/.fit.gz/.fit.zst file
+        athlete_id: ID of the athlete who performed the workout
+        ftp: Functional Threshold Power (optional, for TSS calculation)
+        filename: Original file name recorded as ``file_ref`` when the
+            source is not a path
+        fast: Use the bulk NumPy record decoder (see ``parse_fit_file``)
+        channels: Sample channels to decode (see ``parse_fit_file``)
         
-        # Parse the FIT file
-        fitfile = FitFile(fit_file_path)
-    except gzip.BadGzipFile:
-        raise FileParseError("File appears to be corrupted or not a valid gzip file")
-    except Exception as e:
-        raise FileParseError(f"Failed to open FIT file: {str(e)}")
-    finally:
-        # Clean up temp file if created
-        if temp_file:
-            try:
-                Path(temp_file.name).unlink()
-            except Exception:
-                pass  # Ignore cleanup errors
+    Returns:
+        List of (WorkoutExecuted, SampleFrame) tuples in session order
+        
+    Raises:
+        FileParseError: If file cannot be parsed
+        FileNotFoundError: If file doesn't exist
+        
+    Example:
+        >>> for leg, samples in parse_fit_sessions("race.fit", athlete_id=1, ftp=280):
+        ...     print(leg.sport, leg.duration_s, leg.summary_json.get("tss"))
+    """
+    if filename is None and isinstance(source, (str, Path)):
+        filename = str(source)
     
-    # Extract session-level data (summary)
-    session_data = _extract_session_data(fitfile)
+    decoded = clean_samples(_decode_source(source, fast, channels))
+    return [
+        (summarize_workout(part, athlete_id, ftp=ftp, filename=filename), part.samples)
+        for part in _recorded_sessions(decoded)
+    ]
+
+
+def _decode_source(source: FitSource, fast: Optional[bool], channels: ChannelSelection) -> FitDecodeResult:
+    if _use_fast_decoder(fast):
+        stream = open_payload_stream(source)
+        try:
+            return decode_fit_fast(stream.read(), channels=channels)
+        finally:
+            if stream is not source:
+                stream.close()
+    return decode_fit_messages(open_fit_source(source), channels=channels)
+
+
+def _use_fast_decoder(fast: Optional[bool]) -> bool:
+    if fast is None:
+        return os.getenv(FAST_DECODE_ENV, '0') == '1'
+    return fast
+
+
+def decode_fit_bytes(
+    data: bytes,
+    fast: Optional[bool] = None,
+    channels: ChannelSelection = None,
+) -> FitDecodeResult:
+    """
+    Decode a (possibly compressed) FIT payload without cleaning it.
     
-    # Extract per-record samples (power, HR, cadence, GPS, etc.)
-    samples = _extract_samples(fitfile)
+    This is the "parse" stage of the ingestion pipeline; follow it with
+    ``clean_samples`` and ``summarize_workout``.
+    
+    Args:
+        data: Raw .fit/.fit.gz/.fit.zst bytes
+        fast: Use the bulk NumPy record decoder (``decode_fit_fast``);
+            None reads the AUTOCOACH_FIT_FAST_DECODE environment variable
+        channels: Sample channels to decode (see ``parse_fit_file``)
+        
+    Returns:
+        FitDecodeResult with unvalidated samples
+        
+    Raises:
+        FileParseError: If the payload cannot be decoded
+    """
+    if _use_fast_decoder(fast):
+        return decode_fit_fast(open_payload_stream(data).read(), channels=channels)
+    return decode_fit_messages(open_fit_source(data), channels=channels)
+
+
+def _derive_distance_and_speed(samples: SampleFrame) -> float:
+    """
+    Fill distance (and missing speed) from positions, vectorized.
+
+    Only valid, time-ordered positions are used, so this must run after
+    ordering and range validation.
+
+    Returns:
+        Total track distance in meters
+    """
+    positioned = np.flatnonzero(samples.valid['lat'] & samples.valid['lon'])
+    if len(positioned) == 0:
+        return 0.0
+    t_s = samples.t_s[positioned]
+    distance, speed = track_distance_and_speed(
+        t_s, samples.lat[positioned], samples.lon[positioned]
+    )
+    samples.distance_m[positioned] = distance
+    samples.valid['distance_m'][positioned] = True
+
+    derive = ~samples.valid['pace_mps'][positioned] & ~np.isnan(speed)
+    samples.pace_mps[positioned[derive]] = speed[derive]
+    samples.valid['pace_mps'][positioned[derive]] = True
+    return float(distance[-1])
+
+
+def clean_samples(decoded: FitDecodeResult) -> FitDecodeResult:
+    """
+    Validate and order decoded samples in place.
     
-    if not samples:
-        raise FileParseError("No workout data found in FIT file")
+    Applies the vectorized channel range checks and restores time order if
+    the device wrote records out of sequence. Rejected value counts are kept
+    in ``decoded.rejected_values``. Files with positions but no distance
+    channel (GPX) get distance and speed derived from the cleaned track;
+    a single session without a recorded total distance gets the track
+    length.
+    
+    Args:
+        decoded: Output of the decode stage
+        
+    Returns:
+        The same FitDecodeResult, cleaned
+    """
+    samples = decoded.samples
+    if len(samples) > 1 and (samples.t_s[1:] < samples.t_s[:-1]).any():
+        samples = samples.select(np.argsort(samples.t_s, kind='stable'))
+    decoded.rejected_values = samples.validate()
+    decoded.samples = samples
+    if samples.has_channel('lat') and not samples.has_channel('distance_m'):
+        total_distance_m = _derive_distance_and_speed(samples)
+        if len(decoded.sessions) == 1:
+            decoded.sessions[0].setdefault('total_distance_m', total_distance_m)
+    return decoded
+
+
+def summarize_workout(
+    decoded: FitDecodeResult,
+    athlete_id: int,
+    ftp: Optional[int] = None,
+    filename: Optional[str] = None,
+) -> WorkoutExecuted:
+    """
+    Build the WorkoutExecuted summary for cleaned, decoded samples.
+    
+    Args:
+        decoded: Cleaned output of ``decode_fit_messages``
+        athlete_id: ID of the athlete who performed the workout
+        ftp: Functional Threshold Power (optional, for TSS calculation)
+        filename: Original file name recorded as ``file_ref``
+        
+    Returns:
+        WorkoutExecuted with summary metrics
+        
+    Raises:
+        FileParseError: If there are no samples
+    """
+    session_data = decoded.session_data
+    samples = decoded.samples
+    
+    if len(samples) == 0:
+        raise FileParseError("No workout data found in file")
     
     # Calculate summary metrics
-    duration_s = samples[-1].t_s if samples else 0
+    duration_s = samples.duration_s
     summary_json = _calculate_summary_metrics(samples, session_data, ftp)
+    return _workout_from_summary(session_data, athlete_id, duration_s, summary_json, filename)
+
+
+def split_sessions(decoded: FitDecodeResult) -> List[FitDecodeResult]:
+    """
+    Split a cleaned multisport/multi-session decode into one result per session.
+    
+    Each session covers the records from its ``start_time`` up to the next
+    session's start (the last one runs to the end of the file), located
+    with ``np.searchsorted`` on the time-ordered ``t_s``. Sample frames are
+    ``SampleFrame.slice`` views into the shared arrays, so splitting copies
+    no channel data; only ``t_s`` is re-based so that each part's offsets
+    are relative to its own ``start_time`` (the session start), as lap and
+    event timestamps are. Laps and events are assigned to the session they
+    start in; device info is shared.
+    
+    Args:
+        decoded: Output of the clean stage
+        
+    Returns:
+        One FitDecodeResult per session in time order, or ``[decoded]``
+        unchanged when there are fewer than two timed sessions
+    """
+    sessions = [s for s in decoded.sessions if s.get('start_time') is not None]
+    if len(sessions) < 2 or len(sessions) != len(decoded.sessions) or decoded.start_time is None:
+        return [decoded]
+    sessions.sort(key=lambda s: s['start_time'])
+    
+    samples = decoded.samples
+    offsets = np.array(
+        [(s['start_time'] - decoded.start_time).total_seconds() for s in sessions]
+    )
+    bounds = np.searchsorted(samples.t_s, offsets, side='left')
+    bounds[0] = 0
+    bounds = np.append(bounds, len(samples))
+    
+    def in_session(timestamp: Optional[datetime], i: int) -> bool:
+        if timestamp is None:
+            return i == 0
+        after_start = i == 0 or timestamp >= sessions[i]['start_time']
+        before_next = i == len(sessions) - 1 or timestamp < sessions[i + 1]['start_time']
+        return after_start and before_next
+    
+    parts: List[FitDecodeResult] = []
+    for i, session in enumerate(sessions):
+        part_samples = samples.slice(bounds[i], bounds[i + 1])
+        shift = int(round(offsets[i]))
+        if shift:
+            part_samples.t_s = part_samples.t_s - np.int32(shift)
+        parts.append(FitDecodeResult(
+            sessions=[session],
+            laps=[lap for lap in decoded.laps if in_session(lap.get('start_time'), i)],
+            events=[event for event in decoded.events if in_session(event.get('timestamp'), i)],
+            device_info=decoded.device_info,
+            samples=part_samples,
+            start_time=session['start_time'],
+            rejected_values=decoded.rejected_values if i == 0 else {},
+        ))
+    return parts
+
+
+def summarize_sessions(
+    decoded: FitDecodeResult,
+    athlete_id: int,
+    ftp: Optional[int] = None,
+    filename: Optional[str] = None,
+) -> List[WorkoutExecuted]:
+    """
+    Build one WorkoutExecuted per session of a cleaned decode.
+    
+    Single-session files give the same one workout as ``summarize_workout``;
+    triathlon and brick files give one workout per leg (swim, transition,
+    bike, ...) with that leg's sport, duration and power metrics. Sessions
+    without records (e.g. an unrecorded transition) are dropped.
     
+    Args:
+        decoded: Cleaned output of the decode stage
+        athlete_id: ID of the athlete who performed the workout
+        ftp: Functional Threshold Power (optional, for TSS calculation)
+        filename: Original file name recorded as ``file_ref``
+        
+    Returns:
+        List of WorkoutExecuted in session order
+        
+    Raises:
+        FileParseError: If there are no samples
+    """
+    return [
+        summarize_workout(part, athlete_id, ftp=ftp, filename=filename)
+        for part in _recorded_sessions(decoded)
+    ]
+
+
+def _recorded_sessions(decoded: FitDecodeResult) -> List[FitDecodeResult]:
+    """Sessions holding at least one record; ``[decoded]`` if none do."""
+    return [part for part in split_sessions(decoded) if len(part.samples)] or [decoded]
+
+
+def _workout_from_summary(
+    session_data: Dict,
+    athlete_id: int,
+    duration_s: int,
+    summary_json: Dict,
+    filename: Optional[str],
+) -> WorkoutExecuted:
+    """Wrap computed metrics in a WorkoutExecuted (shared by batch and streaming)."""
     # Determine sport type
     sport = session_data.get('sport', 'unknown').lower()
     if sport == 'bike' or sport == 'cycling':
@@ -112,139 +640,815 @@ def parse_fit_file(
         sport = 'swimming'
     
     # Create WorkoutExecuted object
-    workout = WorkoutExecuted(
+    return WorkoutExecuted(
         athlete_id=athlete_id,
         source='file',
         start_time=session_data.get('start_time', datetime.now()),
         duration_s=duration_s,
         sport=sport,
-        file_ref=str(file_path_obj),
+        file_ref=filename,
         summary_json=summary_json,
     )
+
+
+# FIT field name -> session_data key
+_SESSION_FIELDS: Dict[str, str] = {
+    'start_time': 'start_time',
+    'total_elapsed_time': 'total_elapsed_time',
+    'sport': 'sport',
+    'total_distance': 'total_distance_m',
+    'total_ascent': 'total_ascent_m',
+    'avg_heart_rate': 'avg_hr',
+    'max_heart_rate': 'max_hr',
+    'avg_power': 'avg_power',
+    'max_power': 'max_power',
+    'avg_cadence': 'avg_cadence',
+    'normalized_power': 'normalized_power',
+    'training_stress_score': 'tss',
+}
+
+# FIT field name -> lap dict key
+_LAP_FIELDS: Dict[str, str] = {
+    'start_time': 'start_time',
+    'timestamp': 'end_time',
+    'total_elapsed_time': 'total_elapsed_time',
+    'total_timer_time': 'total_timer_time',
+    'total_distance': 'total_distance_m',
+    'avg_power': 'avg_power',
+    'max_power': 'max_power',
+    'avg_heart_rate': 'avg_hr',
+    'max_heart_rate': 'max_hr',
+    'avg_cadence': 'avg_cadence',
+    'intensity': 'intensity',
+    'lap_trigger': 'lap_trigger',
+    'wkt_step_index': 'wkt_step_index',
+}
+
+_EVENT_FIELDS: Dict[str, str] = {
+    'timestamp': 'timestamp',
+    'event': 'event',
+    'event_type': 'event_type',
+    'timer_trigger': 'timer_trigger',
+}
+
+_DEVICE_INFO_FIELDS: Dict[str, str] = {
+    'device_index': 'device_index',
+    'manufacturer': 'manufacturer',
+    'product': 'product',
+    'serial_number': 'serial_number',
+    'software_version': 'software_version',
+}
+
+# Semicircles to degrees
+_SEMICIRCLE_DEG = 180 / 2**31
+
+# FIT record field name -> (sample channel, scale). The enhanced_* fields are
+# the 32-bit variants newer devices write instead of speed/altitude.
+_RECORD_FIELDS: Dict[str, Tuple[str, float]] = {
+    'power': ('power_w', 1.0),
+    'heart_rate': ('hr_bpm', 1.0),
+    'cadence': ('cadence', 1.0),
+    'speed': ('pace_mps', 1.0),
+    'enhanced_speed': ('pace_mps', 1.0),
+    'altitude': ('altitude_m', 1.0),
+    'enhanced_altitude': ('altitude_m', 1.0),
+    'position_lat': ('lat', _SEMICIRCLE_DEG),
+    'position_long': ('lon', _SEMICIRCLE_DEG),
+    'temperature': ('temperature_c', 1.0),
+    'distance': ('distance_m', 1.0),
+}
+
+
+@dataclass
+class FitDecodeResult:
+    """
+    Messages of interest collected in one pass over a workout file.
     
-    return workout, samples
-
-
-def _extract_session_data(fitfile: FitFile) -> Dict:
-    """Extract session-level summary data from FIT file."""
-    session_data = {}
-    
-    for record in fitfile.get_messages('session'):
-        for field in record:
-            if field.name == 'start_time':
-                session_data['start_time'] = field.value
-            elif field.name == 'total_elapsed_time':
-                session_data['total_elapsed_time'] = field.value
-            elif field.name == 'sport':
-                session_data['sport'] = field.value
-            elif field.name == 'total_distance':
-                session_data['total_distance_m'] = field.value
-            elif field.name == 'total_ascent':
-                session_data['total_ascent_m'] = field.value
-            elif field.name == 'avg_heart_rate':
-                session_data['avg_hr'] = field.value
-            elif field.name == 'max_heart_rate':
-                session_data['max_hr'] = field.value
-            elif field.name == 'avg_power':
-                session_data['avg_power'] = field.value
-            elif field.name == 'max_power':
-                session_data['max_power'] = field.value
-            elif field.name == 'avg_cadence':
-                session_data['avg_cadence'] = field.value
-            elif field.name == 'normalized_power':
-                session_data['normalized_power'] = field.value
-            elif field.name == 'training_stress_score':
-                session_data['tss'] = field.value
-    
-    return session_data
-
-
-def _extract_samples(fitfile: FitFile) -> List[Sample]:
-    """Extract per-second samples from FIT file."""
-    samples = []
-    start_time = None
-    
-    for record in fitfile.get_messages('record'):
-        # Build sample from record fields
-        sample_data = {'t_s': 0}
-        timestamp = None
+    FIT decoding fills every field; the TCX parser fills the same structure
+    (laps and a synthesized session) so both share the clean/summarize stages.
+    """
+    sessions: List[Dict] = field(default_factory=list)
+    laps: List[Dict] = field(default_factory=list)
+    events: List[Dict] = field(default_factory=list)
+    device_info: List[Dict] = field(default_factory=list)
+    samples: SampleFrame = field(default_factory=SampleFrame.empty)
+    start_time: Optional[datetime] = None
+    rejected_values: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def session_data(self) -> Dict:
+        """All session fields merged, later sessions taking precedence."""
+        merged: Dict = {}
+        for session in self.sessions:
+            merged.update(session)
+        return merged
+
+
+class _FitDecodeState:
+    """Mutable state threaded through the message handlers."""
+
+    def __init__(self, record_fields: Dict[str, Tuple[str, float]]) -> None:
+        self.result = FitDecodeResult()
+        self.builder = SampleFrameBuilder()
+        self.start_time: Optional[datetime] = None
+        # Projection of _RECORD_FIELDS onto the requested channels
+        self.record_fields = record_fields
+
+
+def _pick_fields(message, field_map: Dict[str, str]) -> Dict:
+    """Copy the mapped fields of a message into a dict (None values kept)."""
+    picked = {}
+    for fit_field in message.fields:
+        key = field_map.get(fit_field.name)
+        if key is not None:
+            picked[key] = fit_field.value
+    return picked
+
+
+def _handle_session(state: _FitDecodeState, message) -> None:
+    state.result.sessions.append(_pick_fields(message, _SESSION_FIELDS))
+
+
+def _handle_lap(state: _FitDecodeState, message) -> None:
+    state.result.laps.append(_pick_fields(message, _LAP_FIELDS))
+
+
+def _handle_event(state: _FitDecodeState, message) -> None:
+    state.result.events.append(_pick_fields(message, _EVENT_FIELDS))
+
+
+def _handle_device_info(state: _FitDecodeState, message) -> None:
+    state.result.device_info.append(_pick_fields(message, _DEVICE_INFO_FIELDS))
+
+
+def _handle_record(state: _FitDecodeState, message) -> None:
+    row: Dict[str, float] = {}
+    timestamp = None
+    
+    for fit_field in message.fields:
+        name = fit_field.name
+        if name == 'timestamp':
+            timestamp = fit_field.value
+            continue
+        mapping = state.record_fields.get(name)
+        if mapping is None or fit_field.value is None:
+            continue
+        channel, scale = mapping
+        row[channel] = float(fit_field.value) * scale
+    
+    # Only add sample if we have a timestamp
+    if timestamp is None:
+        return
+    if state.start_time is None:
+        state.start_time = timestamp
+    state.builder.append(int((timestamp - state.start_time).total_seconds()), row)
+
+
+# Message name -> handler; all other message types are skipped
+_MESSAGE_HANDLERS: Dict[str, Callable[[_FitDecodeState, object], None]] = {
+    'session': _handle_session,
+    'lap': _handle_lap,
+    'record': _handle_record,
+    'event': _handle_event,
+    'device_info': _handle_device_info,
+}
+
+
+def decode_fit_messages(fitfile: FitFile, channels: ChannelSelection = None) -> FitDecodeResult:
+    """
+    Decode a FIT file in a single pass over its message stream.
+    
+    Each message is dispatched by name to a handler that pulls only the
+    fields listed in its field table; record fields outside ``channels``
+    are skipped without conversion.
+    
+    Args:
+        fitfile: Opened fitparse FitFile
+        channels: Sample channels to decode (see ``parse_fit_file``)
+        
+    Returns:
+        FitDecodeResult with sessions, laps, events, device info and samples
+        
+    Raises:
+        FileParseError: If the message stream is corrupt
+    """
+    selected = resolve_channels(channels)
+    state = _FitDecodeState({
+        name: mapping for name, mapping in _RECORD_FIELDS.items() if mapping[0] in selected
+    })
+    try:
+        for message in fitfile.get_messages():
+            handler = _MESSAGE_HANDLERS.get(message.name)
+            if handler is not None:
+                handler(state, message)
+    except FitParseError as e:
+        raise FileParseError(f"Failed to decode FIT file: {str(e)}")
+    
+    # Range validation is left to clean_samples (the "clean" stage)
+    state.result.samples = state.builder.build(validate=False)
+    state.result.start_time = state.start_time
+    return state.result
+
+
+# Records per chunk yielded by FitChunkReader (one hour at 1 Hz)
+DEFAULT_CHUNK_RECORDS = 3600
+
+
+def _open_streaming_fit(source: FitSource) -> FitFile:
+    """Open a FIT payload with fitparse's non-caching reader when available."""
+    if UncachedFitFile is None:
+        return open_fit_source(source, streaming=True)
+    try:
+        return UncachedFitFile(open_payload_stream(source, streaming=True))
+    except FileParseError:
+        raise
+    except Exception as e:
+        raise FileParseError(f"Failed to open FIT file: {str(e)}")
+
+
+def release_parsed_messages(fitfile: FitFile) -> int:
+    """
+    Drop the messages a fitparse ``FitFile`` has cached while iterating.
+    
+    fitparse 1.2 keeps every parsed message in the private ``_messages``
+    list and has no public way to turn that off, so a long file grows the
+    decoder's memory with every record. This is the only place that touches
+    that list, guarded so that an ``UncachedFitFile`` (newer fitparse, used
+    by ``FitChunkReader`` when installed) or a layout change is left alone:
+    decoding stays correct and only the memory bound is lost.
+    ``TestChunkedStreaming`` pins the behaviour for the installed version.
+    
+    Args:
+        fitfile: Reader being iterated
+        
+    Returns:
+        Number of messages released
+    """
+    if UncachedFitFile is not None and isinstance(fitfile, UncachedFitFile):
+        return 0
+    messages = getattr(fitfile, '_messages', None)
+    if not isinstance(messages, list):
+        return 0
+    released = len(messages)
+    messages.clear()
+    return released
+
+
+class FitChunkReader:
+    """
+    Decode a FIT file as a stream of fixed-size sample chunks.
+    
+    Iterating yields cleaned ``SampleFrame`` chunks of at most
+    ``chunk_size`` records, so a recording of any length is processed with
+    memory bounded by one chunk. Compressed (.gz/.zst) input is
+    decompressed while decoding rather than into a buffer first, at the
+    cost of decompressing it twice (fitparse seeks to the end for the
+    size). Time offsets are relative to the first
+    record of the file, not of the chunk. Session, lap, event and
+    device_info messages accumulate in ``result`` (whose ``samples`` stay
+    empty) and are complete once iteration finishes.
+    
+    Records are time-ordered within each chunk; devices write records in
+    order, so this matches the batch decoder on real files.
+    
+    Args:
+        source: Path, bytes or binary stream of a .fit/.fit.gz/.fit.zst file
+        chunk_size: Maximum number of records per chunk
+        channels: Sample channels to decode (see ``parse_fit_file``)
+        
+    Raises:
+        FileParseError: If the file cannot be opened or decoded (raised
+            while iterating for a corrupt message stream)
+        ValueError: If chunk_size is not positive or a channel is unknown
+        
+    Example:
+        >>> reader = FitChunkReader("ultra.fit", chunk_size=3600)
+        >>> for chunk in reader:
+        ...     store_chunk(chunk)
+        >>> laps = reader.result.laps
+    """
+    
+    def __init__(
+        self,
+        source: FitSource,
+        chunk_size: int = DEFAULT_CHUNK_RECORDS,
+        channels: ChannelSelection = None,
+    ) -> None:
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        selected = resolve_channels(channels)
+        self.chunk_size = chunk_size
+        self._fitfile = _open_streaming_fit(source)
+        self._state = _FitDecodeState({
+            name: mapping for name, mapping in _RECORD_FIELDS.items() if mapping[0] in selected
+        })
+    
+    @property
+    def result(self) -> FitDecodeResult:
+        """Non-sample messages decoded so far (samples are yielded instead)."""
+        self._state.result.start_time = self._state.start_time
+        return self._state.result
+    
+    def _flush(self) -> SampleFrame:
+        state = self._state
+        chunk = state.builder.build(validate=False)
+        state.builder = SampleFrameBuilder()
+        if len(chunk) > 1 and (chunk.t_s[1:] < chunk.t_s[:-1]).any():
+            chunk = chunk.select(np.argsort(chunk.t_s, kind='stable'))
+        for name, count in chunk.validate().items():
+            state.result.rejected_values[name] = state.result.rejected_values.get(name, 0) + count
+        return chunk
+    
+    def __iter__(self) -> Iterator[SampleFrame]:
+        state = self._state
+        fitfile = self._fitfile
+        try:
+            for message in fitfile.get_messages():
+                handler = _MESSAGE_HANDLERS.get(message.name)
+                if handler is not None:
+                    handler(state, message)
+                if len(state.builder) >= self.chunk_size:
+                    release_parsed_messages(fitfile)
+                    yield self._flush()
+        except FitParseError as e:
+            raise FileParseError(f"Failed to decode FIT file: {str(e)}")
+        release_parsed_messages(fitfile)
+        if len(state.builder):
+            yield self._flush()
+
+
+def summarize_fit_stream(
+    source: FitSource,
+    athlete_id: int,
+    ftp: Optional[int] = None,
+    filename: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_RECORDS,
+    channels: ChannelSelection = None,
+    on_chunk: Optional[Callable[[SampleFrame], None]] = None,
+) -> WorkoutExecuted:
+    """
+    Summarize a FIT file of any length in constant memory.
+    
+    Chunks from ``FitChunkReader`` are folded into streaming accumulators
+    (avg/max power and HR, rolling-30s NP, elapsed time, distance) and then
+    discarded; pass ``on_chunk`` to persist each chunk as it arrives. The
+    summary matches ``parse_fit_file`` for time-ordered files.
+    
+    Args:
+        source: Path, bytes or binary stream of a .fit/.fit.gz/.fit.zst file
+        athlete_id: ID of the athlete who performed the workout
+        ftp: Functional Threshold Power (optional, for TSS calculation)
+        filename: Original file name recorded as ``file_ref`` when the
+            source is not a path
+        chunk_size: Maximum number of records per chunk
+        channels: Sample channels to decode (see ``parse_fit_file``)
+        on_chunk: Optional callback receiving each cleaned chunk
+        
+    Returns:
+        WorkoutExecuted with summary metrics
+        
+    Raises:
+        FileParseError: If file cannot be parsed or holds no records
+        FileNotFoundError: If file doesn't exist
+        
+    Example:
+        >>> workout = summarize_fit_stream("ultra.fit", athlete_id=1, ftp=300,
+        ...                                on_chunk=chunk_store.append)
+    """
+    if filename is None and isinstance(source, (str, Path)):
+        filename = str(source)
+    
+    reader = FitChunkReader(source, chunk_size=chunk_size, channels=channels)
+    power = RunningStats()
+    hr = RunningStats()
+    distance = RunningStats()
+    normalized_power = StreamingNormalizedPower()
+    first_t: Optional[int] = None
+    last_t: Optional[int] = None
+    for chunk in reader:
+        if len(chunk) == 0:
+            continue
+        chunk_first, chunk_last = int(chunk.t_s[0]), int(chunk.t_s[-1])
+        first_t = chunk_first if first_t is None else min(first_t, chunk_first)
+        last_t = chunk_last if last_t is None else max(last_t, chunk_last)
+        chunk_power = chunk.values('power_w')
+        power.update(chunk_power)
+        normalized_power.update(chunk_power)
+        hr.update(chunk.values('hr_bpm'))
+        distance.update(chunk.values('distance_m'))
+        if on_chunk is not None:
+            on_chunk(chunk)
+    
+    if first_t is None:
+        raise FileParseError("No workout data found in file")
+    
+    decoded = reader.result
+    session_data = dict(decoded.session_data)
+    if 'total_distance_m' not in session_data and distance.maximum is not None:
+        session_data['total_distance_m'] = distance.maximum
+    duration_s = last_t - first_t
+    summary_json = _summary_from_stats(
+        power, normalized_power.value, hr, duration_s, session_data, ftp
+    )
+    return _workout_from_summary(
+        session_data, athlete_id, duration_s, summary_json, filename
+    )
+
+
+# --- Fast FIT decoder -------------------------------------------------------
+#
+# fitparse builds a FieldData object (plus subfield/component/processor
+# passes) for every field of every message; on a 1 Hz ride with ~50 fields
+# per record that is the bulk of ingestion time. The fast path scans the
+# message stream once to find message boundaries, then decodes all record
+# messages sharing a definition with one NumPy gather + structured dtype.
+# The few session/lap/event/device_info messages are re-packed into a small
+# FIT stream and decoded by fitparse itself, so their field semantics
+# (enums, subfields, components) are fitparse's exactly.
+
+# Set to "1" to make decode_fit_bytes/parse_fit_file use the fast decoder
+FAST_DECODE_ENV = 'AUTOCOACH_FIT_FAST_DECODE'
+
+_FIT_HEADER = struct.Struct('<2BHI4s')
+_FIT_EPOCH = datetime(1989, 12, 31)
+# date_time values below this are relative (seconds since device power-on)
+_FIT_MIN_ABSOLUTE_TIME = 0x10000000
+_RECORD_MESG_NUM = 20
+
+
+def _build_crc_table() -> Tuple[int, ...]:
+    # Byte-wise table for the FIT CRC-16 (reflected polynomial 0xA001)
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+_CRC_TABLE = _build_crc_table()
+
+
+def _fit_crc(data: bytes) -> int:
+    crc = 0
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+# FIT base type -> (NumPy dtype code, invalid sentinel; None = NaN for floats)
+_BASE_TYPES: Dict[int, Tuple[str, Optional[int]]] = {
+    0x00: ('u1', 0xFF),                  # enum
+    0x01: ('i1', 0x7F),                  # sint8
+    0x02: ('u1', 0xFF),                  # uint8
+    0x83: ('i2', 0x7FFF),                # sint16
+    0x84: ('u2', 0xFFFF),                # uint16
+    0x85: ('i4', 0x7FFFFFFF),            # sint32
+    0x86: ('u4', 0xFFFFFFFF),            # uint32
+    0x88: ('f4', None),                  # float32
+    0x89: ('f8', None),                  # float64
+    0x0A: ('u1', 0),                     # uint8z
+    0x8B: ('u2', 0),                     # uint16z
+    0x8C: ('u4', 0),                     # uint32z
+    0x8E: ('i8', 0x7FFFFFFFFFFFFFFF),    # sint64
+    0x8F: ('u8', 0xFFFFFFFFFFFFFFFF),    # uint64
+    0x90: ('u8', 0),                     # uint64z
+}
+
+_RECORD_PROFILE = MESSAGE_TYPES[_RECORD_MESG_NUM].fields
+_TIMESTAMP_FIELD_NUM = FIELD_TYPE_TIMESTAMP.def_num
+
+
+def _record_field_nums() -> Dict[int, Tuple[str, Optional[float], Optional[float], float]]:
+    # Record field number -> (channel, profile scale, profile offset, extra scale)
+    nums = {}
+    for num, profile_field in _RECORD_PROFILE.items():
+        if profile_field.name in _RECORD_FIELDS:
+            channel, scale = _RECORD_FIELDS[profile_field.name]
+            nums[num] = (channel, profile_field.scale, profile_field.offset, scale)
+    return nums
+
+
+_RECORD_FIELD_NUMS = _record_field_nums()
+
+# Record fields whose components only copy their own value into another
+# picked channel (altitude -> enhanced_altitude, speed -> enhanced_speed)
+_DUPLICATING_COMPONENT_FIELDS = {
+    num for num, profile_field in _RECORD_PROFILE.items()
+    if profile_field.name in ('altitude', 'speed')
+}
+
+# Record fields whose components write picked channels in other ways
+# (compressed_speed_distance -> speed, distance) and the channels they
+# write; supported only while every value is invalid
+_COMPONENT_SOURCE_FIELDS: Dict[int, FrozenSet[str]] = {
+    num: frozenset(
+        _RECORD_FIELD_NUMS[component.def_num][0]
+        for component in profile_field.components
+        if component.def_num in _RECORD_FIELD_NUMS
+    )
+    for num, profile_field in _RECORD_PROFILE.items()
+    if num not in _DUPLICATING_COMPONENT_FIELDS and any(
+        component.def_num in _RECORD_FIELD_NUMS for component in profile_field.components or ()
+    )
+}
+
+_BYTE_BASE_TYPE = 0x0D
+
+_HANDLED_MESG_NUMS = {
+    num for num, mesg_type in MESSAGE_TYPES.items()
+    if mesg_type.name in _MESSAGE_HANDLERS and num != _RECORD_MESG_NUM
+}
+
+
+class _FastDecodeUnsupported(Exception):
+    """Raised when the fast decoder meets a FIT feature it doesn't handle."""
+    pass
+
+
+@dataclass
+class _RecordLayout:
+    """Byte layout of one record message definition."""
+    dtype: np.dtype
+    # (field number, byte offset in message, field size, base type) of the
+    # decoded fields, and of component fields that must be all-invalid
+    fields: List[Tuple[int, int, int, int]]
+    component_fields: List[Tuple[int, int, int, int]]
+    offsets: List[int] = field(default_factory=list)
+    rows: List[int] = field(default_factory=list)
+
+
+def _record_layout(
+    field_defs: List[Tuple[int, int, int]],
+    big_endian: bool,
+    selected: FrozenSet[str],
+) -> _RecordLayout:
+    endian = '>' if big_endian else '<'
+    names, formats, positions = [], [], []
+    fields, component_fields = [], []
+    position = 0
+    for number, size, base_type in field_defs:
+        spec = (number, position, size, base_type)
+        position += size
+        if selected & _COMPONENT_SOURCE_FIELDS.get(number, frozenset()):
+            component_fields.append(spec)
+        if number == _TIMESTAMP_FIELD_NUM:
+            pass
+        elif number not in _RECORD_FIELD_NUMS or _RECORD_FIELD_NUMS[number][0] not in selected:
+            # Unrequested fields are never touched
+            continue
+        if base_type not in _BASE_TYPES:
+            raise _FastDecodeUnsupported(f"record field {number} has base type {base_type:#x}")
+        code = _BASE_TYPES[base_type][0]
+        if np.dtype(code).itemsize != size:
+            # Arrays of values (or malformed sizes) are left to fitparse
+            raise _FastDecodeUnsupported(f"record field {number} has size {size}")
+        if f'f{number}' in names:
+            raise _FastDecodeUnsupported(f"record field {number} defined twice")
+        names.append(f'f{number}')
+        formats.append(endian + code)
+        positions.append(spec[1])
+        fields.append(spec)
+    dtype = np.dtype({'names': names, 'formats': formats, 'offsets': positions, 'itemsize': position})
+    return _RecordLayout(dtype=dtype, fields=fields, component_fields=component_fields)
+
+
+def _scan_fit_messages(
+    data: bytes,
+    check_crc: bool,
+    selected: FrozenSet[str],
+) -> Tuple[List[_RecordLayout], bytes, int]:
+    """
+    Walk the message stream once.
+
+    Returns:
+        Tuple of (record layouts with their message offsets, FIT stream of
+        the definitions and handled non-record messages, record count)
+    """
+    if len(data) < 12:
+        raise _FastDecodeUnsupported("file too short")
+    header_size, protocol, profile, data_size, signature = _FIT_HEADER.unpack_from(data)
+    if signature != b'.FIT' or header_size < 12:
+        raise _FastDecodeUnsupported("invalid header")
+    end = header_size + data_size
+    if len(data) != end + 2:
+        # Truncated or chained FIT files
+        raise _FastDecodeUnsupported("unexpected file length")
+    if check_crc:
+        if header_size >= 14:
+            header_crc = int.from_bytes(data[12:14], 'little')
+            if header_crc and header_crc != _fit_crc(data[:12]):
+                raise _FastDecodeUnsupported("header CRC mismatch")
+        if _fit_crc(data[:end]) != int.from_bytes(data[end:end + 2], 'little'):
+            raise _FastDecodeUnsupported("CRC mismatch")
+
+    layouts: Dict[bytes, _RecordLayout] = {}
+    # local message type -> (global message number, message size, record layout)
+    local_defs: Dict[int, Tuple[int, int, Optional[_RecordLayout]]] = {}
+    others = bytearray()
+    record_count = 0
+    pos = header_size
+    while pos < end:
+        header = data[pos]
+        if header & 0x80:
+            raise _FastDecodeUnsupported("compressed timestamp header")
+        local = header & 0x0F
+        if header & 0x40:
+            if header & 0x20:
+                raise _FastDecodeUnsupported("developer data fields")
+            big_endian = data[pos + 2] == 1
+            mesg_num = int.from_bytes(data[pos + 3:pos + 5], 'big' if big_endian else 'little')
+            num_fields = data[pos + 5]
+            definition_end = pos + 6 + 3 * num_fields
+            field_bytes = data[pos + 6:definition_end]
+            field_defs = [tuple(field_bytes[i:i + 3]) for i in range(0, len(field_bytes), 3)]
+            size = sum(field_def[1] for field_def in field_defs)
+            layout = None
+            if mesg_num == _RECORD_MESG_NUM:
+                # Devices often repeat the same definition (e.g. every lap)
+                key = bytes([big_endian]) + field_bytes
+                layout = layouts.get(key)
+                if layout is None:
+                    layout = layouts[key] = _record_layout(field_defs, big_endian, selected)
+            else:
+                others += data[pos:definition_end]
+            local_defs[local] = (mesg_num, size, layout)
+            pos = definition_end
+            continue
+
+        definition = local_defs.get(local)
+        if definition is None:
+            raise _FastDecodeUnsupported(f"data message for undefined local type {local}")
+        mesg_num, size, layout = definition
+        if layout is not None:
+            layout.offsets.append(pos + 1)
+            layout.rows.append(record_count)
+            record_count += 1
+        elif mesg_num in _HANDLED_MESG_NUMS:
+            others += data[pos:pos + 1 + size]
+        pos += 1 + size
+
+    if pos != end:
+        raise _FastDecodeUnsupported("message overruns data size")
+    stream = _FIT_HEADER.pack(12, protocol, profile, len(others), b'.FIT') + others + b'\x00\x00'
+    return list(layouts.values()), stream, record_count
+
+
+def _decode_record_layout(
+    buffer: np.ndarray,
+    layout: _RecordLayout,
+    timestamps: np.ndarray,
+    columns: Dict[str, np.ndarray],
+) -> None:
+    """Decode every record message of one layout and scatter into columns."""
+    offsets = np.asarray(layout.offsets, dtype=np.intp)
+    rows = np.asarray(layout.rows, dtype=np.intp)
+    block = buffer[offsets[:, None] + np.arange(layout.dtype.itemsize)]
+    messages = block.view(layout.dtype).reshape(len(offsets))
+
+    for number, position, size, base_type in layout.component_fields:
+        if base_type != _BYTE_BASE_TYPE or not (block[:, position:position + size] == 0xFF).all():
+            raise _FastDecodeUnsupported(f"record field {number} carries component values")
+
+    for number, position, size, base_type in layout.fields:
+        raw = messages[f'f{number}']
+        sentinel = _BASE_TYPES[base_type][1]
+        valid = ~np.isnan(raw) if sentinel is None else raw != sentinel
+        if number == _TIMESTAMP_FIELD_NUM:
+            if (raw[valid] < _FIT_MIN_ABSOLUTE_TIME).any():
+                raise _FastDecodeUnsupported("relative record timestamps")
+            timestamps[rows[valid]] = raw[valid]
+            continue
+
+        channel, profile_scale, profile_offset, scale = _RECORD_FIELD_NUMS[number]
+        values = raw.astype(np.float64)
+        if profile_scale:
+            values = values / profile_scale
+        if profile_offset:
+            values = values - profile_offset
+        # Same precedence as the fitparse path: the last valid field wins
+        columns[channel][rows[valid]] = values[valid] * scale
+
+
+def decode_fit_fast(
+    data: bytes,
+    check_crc: bool = True,
+    channels: ChannelSelection = None,
+) -> FitDecodeResult:
+    """
+    Decode an uncompressed FIT payload with the bulk NumPy record decoder.
+    
+    Definition messages are read once and turned into a structured dtype
+    per distinct record layout; all record messages with that layout are
+    decoded together. Session, lap, event and device_info messages go
+    through fitparse. Files using compressed timestamp headers, developer
+    fields, chained FIT segments or record component encodings the fast
+    path doesn't model fall back to ``decode_fit_messages`` transparently.
+    
+    Args:
+        data: Uncompressed .fit bytes
+        check_crc: Verify the file CRC (as fitparse does)
+        channels: Sample channels to decode (see ``parse_fit_file``);
+            unrequested record fields are left out of the dtype entirely
         
-        for field in record:
-            if field.name == 'timestamp':
-                timestamp = field.value
-                if start_time is None:
-                    start_time = timestamp
-                sample_data['t_s'] = int((timestamp - start_time).total_seconds())
-            elif field.name == 'power' and field.value is not None:
-                sample_data['power_w'] = int(field.value)
-            elif field.name == 'heart_rate' and field.value is not None:
-                sample_data['hr_bpm'] = int(field.value)
-            elif field.name == 'cadence' and field.value is not None:
-                sample_data['cadence'] = int(field.value)
-            elif field.name == 'speed' and field.value is not None:
-                sample_data['pace_mps'] = float(field.value)
-            elif field.name == 'altitude' and field.value is not None:
-                sample_data['altitude_m'] = float(field.value)
-            elif field.name == 'position_lat' and field.value is not None:
-                # Convert from semicircles to degrees
-                sample_data['lat'] = float(field.value) * (180 / 2**31)
-            elif field.name == 'position_long' and field.value is not None:
-                # Convert from semicircles to degrees
-                sample_data['lon'] = float(field.value) * (180 / 2**31)
-            elif field.name == 'temperature' and field.value is not None:
-                sample_data['temperature_c'] = float(field.value)
-            elif field.name == 'distance' and field.value is not None:
-                sample_data['distance_m'] = float(field.value)
+    Returns:
+        FitDecodeResult identical to ``decode_fit_messages`` output
         
-        # Only add sample if we have a timestamp
-        if timestamp is not None:
-            # workout_id will be set when saving to database (use 1 as placeholder for validation)
-            sample_data['workout_id'] = 1  # Placeholder - will be updated on DB insert
-            samples.append(Sample(**sample_data))
+    Raises:
+        FileParseError: If the file cannot be decoded
+    """
+    selected = resolve_channels(channels)
+    try:
+        layouts, other_messages, record_count = _scan_fit_messages(data, check_crc, selected)
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        timestamps = np.zeros(record_count, dtype=np.int64)
+        columns = {name: np.full(record_count, np.nan) for name in CHANNELS if name in selected}
+        for layout in layouts:
+            _decode_record_layout(buffer, layout, timestamps, columns)
+    except (_FastDecodeUnsupported, IndexError, ValueError):
+        return decode_fit_messages(open_fit_source(data), channels=channels)
+
+    try:
+        # The re-packed stream has no valid CRC; the original was checked above
+        other_fitfile = FitFile(io.BytesIO(other_messages), check_crc=False)
+    except Exception as e:
+        raise FileParseError(f"Failed to open FIT file: {str(e)}")
+    result = decode_fit_messages(other_fitfile)
     
-    return samples
+    # Only records with a timestamp become samples
+    has_time = timestamps != 0
+    if has_time.any():
+        first = int(timestamps[has_time][0])
+        result.start_time = _FIT_EPOCH + timedelta(seconds=first)
+        result.samples = SampleFrame.from_columns(
+            timestamps[has_time] - first,
+            {name: column[has_time] for name, column in columns.items()},
+            validate=False,
+        )
+    return result
 
 
 def _calculate_summary_metrics(
-    samples: List[Sample],
+    samples: SampleFrame,
     session_data: Dict,
     ftp: Optional[int] = None
 ) -> Dict:
     """Calculate summary metrics from samples and session data."""
-    summary = {}
+    # Extract valid power/HR values straight from the channel arrays
+    power_samples = samples.values('power_w')
+    power = RunningStats()
+    power.update(power_samples)
+    hr = RunningStats()
+    hr.update(samples.values('hr_bpm'))
     
-    # Extract power samples
-    power_samples = [s.power_w for s in samples if s.power_w is not None]
-    hr_samples = [s.hr_bpm for s in samples if s.hr_bpm is not None]
+    np_value = None
+    power_error = None
+    if len(power_samples):
+        try:
+            np_value = calculate_normalized_power(power_samples)
+        except Exception as e:
+            # Log error but don't fail the parse
+            power_error = str(e)
+    summary = _summary_from_stats(power, np_value, hr, samples.duration_s, session_data, ftp)
+    if power_error is not None:
+        summary['power_calc_error'] = power_error
+    return summary
+
+
+def _summary_from_stats(
+    power: RunningStats,
+    np_value: Optional[float],
+    hr: RunningStats,
+    duration_s: int,
+    session_data: Dict,
+    ftp: Optional[int] = None,
+) -> Dict:
+    """Assemble summary_json from accumulated power/HR statistics."""
+    summary = {}
     
     # Basic metrics
-    if power_samples:
-        summary['avg_power'] = sum(power_samples) / len(power_samples)
-        summary['max_power'] = max(power_samples)
-        
-        # Calculate NP, IF, VI
+    if power.count:
+        summary['avg_power'] = power.mean
+        summary['max_power'] = int(power.maximum)
+    
+    # Calculate NP, VI (IF/TSS are added last, see _add_threshold_metrics)
+    if power.count and np_value is not None:
         try:
-            np = calculate_normalized_power(power_samples)
+            np = np_value
             summary['np'] = np
             
             avg_power = summary['avg_power']
             vi = calculate_variability_index(np, avg_power)
             summary['vi'] = vi
-            
-            if ftp and ftp > 0:
-                if_value = calculate_intensity_factor(np, ftp)
-                summary['if'] = if_value
-                
-                duration_s = samples[-1].t_s
-                tss = calculate_tss_from_power(duration_s, np, ftp)
-                summary['tss'] = tss
         except Exception as e:
             # Log error but don't fail the parse
             summary['power_calc_error'] = str(e)
     
-    if hr_samples:
-        summary['avg_hr'] = sum(hr_samples) / len(hr_samples)
-        summary['max_hr'] = max(hr_samples)
+    if hr.count:
+        summary['avg_hr'] = hr.mean
+        summary['max_hr'] = int(hr.maximum)
     
     # Add session-level data if available
     if 'total_distance_m' in session_data:
@@ -260,9 +1464,46 @@ def _calculate_summary_metrics(
     if 'tss' not in summary and 'tss' in session_data:
         summary['tss'] = session_data['tss']
     
+    _add_threshold_metrics(summary, duration_s, ftp)
     return summary
 
 
+def _add_threshold_metrics(summary: Dict, duration_s: int, ftp: Optional[int]) -> None:
+    """
+    Add FTP-dependent IF and TSS to a summary, in place.
+    
+    Only NP computed from the samples counts (``vi`` marks it); a
+    device-reported NP keeps the device TSS. Our TSS replaces the device's.
+    """
+    if not ftp or ftp <= 0 or 'vi' not in summary:
+        return
+    try:
+        summary['if'] = calculate_intensity_factor(summary['np'], ftp)
+        summary['tss'] = calculate_tss_from_power(duration_s, summary['np'], ftp)
+    except ValueError as e:
+        summary['power_calc_error'] = str(e)
+
+
+def apply_ftp(workout: WorkoutExecuted, ftp: Optional[int]) -> WorkoutExecuted:
+    """
+    Add IF and TSS for an FTP to a workout summarized without one.
+    
+    Everything else in the summary is FTP-independent, so a stored
+    ``summarize_sessions(..., ftp=None)`` result can be re-used for any
+    athlete threshold in O(1), without the samples.
+    
+    Args:
+        workout: Workout summarized with ``ftp=None``
+        ftp: Functional Threshold Power (None leaves the summary as is)
+        
+    Returns:
+        A copy of the workout with ``if``/``tss`` in ``summary_json``
+    """
+    summary = dict(workout.summary_json)
+    _add_threshold_metrics(summary, workout.duration_s, ftp)
+    return workout.model_copy(update={'summary_json': summary})
+
+
 def get_file_type(filename: str) -> str:
     """
     Determine file type from filename extension.
@@ -273,7 +1514,11 @@ def get_file_type(filename: str) -> str:
     Returns:
         File type: 'fit', 'tcx', 'gpx', or 'unknown'
     """
-    extension = Path(filename).suffix.lower()
+    path = Path(filename)
+    extension = path.suffix.lower()
+    if extension in ('.gz', '.zst'):
+        # Compressed upload: the file type is the inner extension (ride.fit.gz)
+        extension = Path(path.stem).suffix.lower()
     
     if extension == '.fit':
         return 'fit'
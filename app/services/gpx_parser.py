@@ -0,0 +1,221 @@
+"""
+Streaming GPX parser.
+
+GPX carries positions, elevation and time per ``trkpt``; heart rate,
+cadence, temperature and (on some exporters) power live in the Garmin
+``TrackPointExtension`` or a bare ``<power>`` extension. Like the TCX
+parser, documents are walked with ``ElementTree.iterparse`` and every
+``trkpt`` is detached once read, so large backfill exports never build a
+DOM.
+
+GPX has no distance or speed fields; ``clean_samples`` derives both in one
+vectorized haversine pass over the position arrays (``app.services.geo``)
+once points are time-ordered and out-of-range positions are rejected.
+Device-recorded speed (``gpxtpx:speed``) is kept where present.
+"""
+from __future__ import annotations
+
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+from app.schemas.training import WorkoutExecuted
+from app.services.file_parser import (
+    FileParseError,
+    FitDecodeResult,
+    FitSource,
+    MAX_DECOMPRESSED_BYTES,
+    clean_samples,
+    open_payload_stream,
+    summarize_workout,
+)
+from app.services.sample_frame import SampleFrame, SampleFrameBuilder
+from app.services.xml_utils import local_name, parse_time
+
+# trkpt descendant (local name) -> sample channel. hr/cad/atemp/speed are
+# TrackPointExtension v1/v2 fields; power/PowerInWatts cover the common
+# power extensions.
+_TRKPT_CHANNELS: Dict[str, str] = {
+    'ele': 'altitude_m',
+    'hr': 'hr_bpm',
+    'cad': 'cadence',
+    'atemp': 'temperature_c',
+    'speed': 'pace_mps',
+    'power': 'power_w',
+    'PowerInWatts': 'power_w',
+}
+
+# GPX <type> values seen in exports (Strava writes numeric codes)
+_SPORTS = {
+    'cycling': 'cycling',
+    'biking': 'cycling',
+    'ride': 'cycling',
+    '1': 'cycling',
+    'running': 'running',
+    'run': 'running',
+    '9': 'running',
+}
+
+
+class _GpxDecodeState:
+    """Mutable state threaded through the iterparse loop."""
+
+    def __init__(self) -> None:
+        self.builder = SampleFrameBuilder()
+        self.start_time: Optional[datetime] = None
+        self.metadata_time: Optional[datetime] = None
+        self.sport: Optional[str] = None
+        self.names: Dict[str, str] = {}
+
+    def name(self, tag: str) -> str:
+        local = self.names.get(tag)
+        if local is None:
+            local = self.names[tag] = local_name(tag)
+        return local
+
+
+def _handle_trkpt(state: _GpxDecodeState, element: ET.Element) -> None:
+    timestamp = None
+    row: Dict[str, float] = {}
+    lat = element.get('lat')
+    lon = element.get('lon')
+    if lat is not None and lon is not None:
+        row['lat'] = float(lat)
+        row['lon'] = float(lon)
+    for child in element.iter():
+        name = state.name(child.tag)
+        if name == 'time':
+            timestamp = parse_time(child.text)
+            continue
+        channel = _TRKPT_CHANNELS.get(name)
+        if channel is not None and child.text:
+            row[channel] = float(child.text)
+
+    # Only add sample if we have a timestamp
+    if timestamp is None:
+        return
+    if state.start_time is None:
+        state.start_time = timestamp
+    state.builder.append(int((timestamp - state.start_time).total_seconds()), row)
+
+
+def decode_gpx_stream(stream) -> FitDecodeResult:
+    """
+    Decode a GPX document incrementally.
+
+    All ``trkseg`` segments of all ``trk`` tracks are concatenated into one
+    sample stream, time offsets measured from the first timed point.
+
+    Args:
+        stream: Readable binary stream of uncompressed GPX XML
+
+    Returns:
+        FitDecodeResult with one synthesized session and samples; GPX has
+        no laps, and distance and speed are derived by ``clean_samples``
+
+    Raises:
+        FileParseError: If the XML is malformed, not GPX, or a value is not numeric
+    """
+    state = _GpxDecodeState()
+    parents: List[ET.Element] = []
+    try:
+        for event, element in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                if not parents and state.name(element.tag) != 'gpx':
+                    raise FileParseError("Not a GPX document")
+                parents.append(element)
+                continue
+
+            parents.pop()
+            name = state.name(element.tag)
+            if name == 'trkpt':
+                _handle_trkpt(state, element)
+                # Detach the finished point so the segment never grows
+                parents[-1].remove(element)
+            elif name == 'trkseg':
+                element.clear()
+            elif name == 'type' and parents and state.name(parents[-1].tag) == 'trk':
+                if state.sport is None and element.text:
+                    state.sport = element.text.strip()
+            elif name == 'time' and parents and state.name(parents[-1].tag) == 'metadata':
+                state.metadata_time = parse_time(element.text)
+    except ET.ParseError as e:
+        raise FileParseError(f"Failed to parse GPX file: {str(e)}")
+    except ValueError as e:
+        raise FileParseError(f"Invalid value in GPX file: {str(e)}")
+
+    result = FitDecodeResult()
+    # Range validation is left to clean_samples (the "clean" stage)
+    result.samples = state.builder.build(validate=False)
+    result.start_time = state.start_time
+
+    session: Dict = {
+        'sport': _SPORTS.get((state.sport or '').lower(), (state.sport or 'unknown').lower()),
+        'total_elapsed_time': float(result.samples.duration_s),
+    }
+    start_time = state.start_time or state.metadata_time
+    if start_time is not None:
+        session['start_time'] = start_time
+    result.sessions.append(session)
+    return result
+
+
+def decode_gpx_bytes(data: bytes) -> FitDecodeResult:
+    """
+    Decode a (possibly compressed) GPX payload without cleaning it.
+
+    This is the GPX "parse" stage of the ingestion pipeline.
+
+    Args:
+        data: Raw .gpx/.gpx.gz/.gpx.zst bytes
+
+    Returns:
+        FitDecodeResult with unvalidated samples
+
+    Raises:
+        FileParseError: If the payload cannot be decoded
+    """
+    return decode_gpx_stream(open_payload_stream(data))
+
+
+def parse_gpx_file(
+    source: FitSource,
+    athlete_id: int,
+    ftp: Optional[int] = None,
+    filename: Optional[str] = None,
+    max_decompressed_bytes: int = MAX_DECOMPRESSED_BYTES,
+) -> Tuple[WorkoutExecuted, SampleFrame]:
+    """
+    Parse a GPX file and extract workout data and per-second samples.
+
+    Args:
+        source: Path, bytes or binary stream of a .gpx (optionally .gz/.zst) file
+        athlete_id: ID of the athlete who performed the workout
+        ftp: Functional Threshold Power (optional, for TSS calculation)
+        filename: Original file name recorded as ``file_ref`` when the
+            source is not a path
+        max_decompressed_bytes: Decompression size limit in bytes
+
+    Returns:
+        Tuple of (WorkoutExecuted, SampleFrame)
+
+    Raises:
+        FileParseError: If file cannot be parsed
+        FileNotFoundError: If file doesn't exist
+
+    Example:
+        >>> workout, samples = parse_gpx_file("ride.gpx", athlete_id=1, ftp=300)
+    """
+    stream = open_payload_stream(source, max_decompressed_bytes)
+    if filename is None and isinstance(source, (str, Path)):
+        filename = str(source)
+    try:
+        decoded = decode_gpx_stream(stream)
+    finally:
+        if stream is not source:
+            stream.close()
+    clean_samples(decoded)
+    workout = summarize_workout(decoded, athlete_id, ftp=ftp, filename=filename)
+    return workout, decoded.samples
@@ -0,0 +1,667 @@
+"""
+Asynchronous ingestion jobs for uploaded workout files.
+
+An upload is turned into an ``IngestionJob`` and queued; the HTTP request
+returns the job ID immediately. Scheduler workers (asyncio tasks, one per
+pool worker) run each job through the pipeline stages
+
+    parse -> clean -> summarize -> intervals -> power_curve
+
+and record per-stage status and wall-clock timings on the job, so
+``GET /jobs/{id}`` shows progress and which stage is slow. A new upload
+runs every stage in a single ``ParsePool`` worker call (``process_upload``):
+the raw bytes are pickled to the worker once and only the small products
+(workouts, intervals, power curves, timings) come back, instead of
+shipping the decoded samples across the process boundary per stage. No
+external broker is involved: jobs live in memory for the lifetime of the
+process.
+
+When storage is configured, raw bytes are kept in a content-addressed
+``RawUploadStore`` and cleaned decode results in a ``ParseResultCache``
+(written by the worker), together with each session's summary computed
+without an FTP. A duplicate upload skips parse and clean (marked "cached")
+and is summarized in O(1): the stored summaries only need IF/TSS for the
+job's FTP (``apply_ftp``), so the samples are not loaded at all. They are
+read only when something is actually missing: change-point detection for
+a new threshold runs in a worker, which reads the cached result by
+content hash (``detect_stored_intervals``), and power curves not yet in
+the index are computed here.
+
+Multisport files (triathlon, brick) summarize to one workout per session;
+``job.workouts`` lists every leg and each leg is stored separately.
+
+With a ``PowerCurveIndex`` configured, the power_curve stage computes each
+leg's mean-max power curve and folds it into the athlete's best-curve index.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.schemas.training import IngestionJob, IntervalDetected, JobStage, WorkoutExecuted
+from app.services.file_parser import (
+    FileParseError,
+    FitDecodeResult,
+    apply_ftp,
+    clean_samples,
+    decode_fit_bytes,
+    get_file_type,
+    summarize_sessions,
+)
+from app.services.gpx_parser import decode_gpx_bytes
+from app.services.interval_detection import DEFAULT_PARAMS, SegmentationParams, detect_intervals
+from app.services.parse_pool import ParsePool
+from app.services.power_curve import PowerCurveIndex, session_power_curves
+from app.services.storage import (
+    IntervalCache,
+    ParseResultCache,
+    RawUploadStore,
+    content_hash,
+    threshold_version,
+)
+from app.services.tcx_parser import decode_tcx_bytes
+from app.services.workout_store import WorkoutStore
+
+PIPELINE_STAGES: Tuple[str, ...] = ("parse", "clean", "summarize", "intervals", "power_curve")
+
+# File type -> "parse" stage function (bytes -> FitDecodeResult)
+DECODERS: Dict[str, Callable[[bytes], FitDecodeResult]] = {
+    "fit": decode_fit_bytes,
+    "tcx": decode_tcx_bytes,
+    "gpx": decode_gpx_bytes,
+}
+
+# Finished jobs kept for status polling before the oldest are dropped
+DEFAULT_MAX_RETAINED_JOBS = 1000
+
+
+class JobQueueFullError(Exception):
+    """Raised when the ingestion queue has no free slot."""
+    pass
+
+
+class JobNotFoundError(Exception):
+    """Raised when a job ID is unknown (or has been evicted)."""
+    pass
+
+
+class WorkoutNotFoundError(Exception):
+    """Raised when no parse result is stored for a content hash."""
+    pass
+
+
+# Stage name -> (started_at, finished_at, duration_ms)
+StageTimings = Dict[str, Tuple[datetime, datetime, float]]
+
+
+class PipelineStageError(Exception):
+    """
+    Raised from ``process_upload`` when a stage fails in the worker.
+
+    Carries the failing stage and the timings of every stage that ran, so
+    the job can report them after the exception crosses the process pool.
+    """
+
+    def __init__(self, stage: str, message: str, timings: StageTimings) -> None:
+        super().__init__(stage, message, timings)
+        self.stage = stage
+        self.message = message
+        self.timings = timings
+
+    def __str__(self) -> str:
+        return self.message
+
+
+@dataclass
+class ProcessedUpload:
+    """Products of a new upload, computed in one worker call."""
+    workouts: List[WorkoutExecuted]
+    sample_count: int
+    intervals: Optional[List[IntervalDetected]] = None
+    power_curves: Optional[List[Optional[np.ndarray]]] = None
+    timings: StageTimings = field(default_factory=dict)
+
+
+def detect_stored_intervals(
+    result_cache: ParseResultCache,
+    digest: str,
+    ftp: Optional[int] = None,
+    power_zones: Optional[Dict[str, Tuple[int, int]]] = None,
+    params: SegmentationParams = DEFAULT_PARAMS,
+) -> List[IntervalDetected]:
+    """
+    Detect intervals of a cached parse result (a ``ParsePool`` entry point).
+
+    The worker reads the cleaned decode from the cache itself, so only the
+    content hash is pickled to it.
+
+    Args:
+        result_cache: Parse-result cache holding the workout
+        digest: Content hash of the uploaded file
+        ftp: Functional Threshold Power for labels and time-in-zone
+        power_zones: Athlete power zones overriding the FTP-derived zones
+        params: Change-point detection parameters
+
+    Returns:
+        Detected intervals in time order
+
+    Raises:
+        WorkoutNotFoundError: If no parse result is stored for the digest
+    """
+    decoded = result_cache.get(digest)
+    if decoded is None:
+        raise WorkoutNotFoundError(f"No stored workout {digest}")
+    return detect_intervals(decoded, ftp=ftp, power_zones=power_zones, params=params)
+
+
+def load_cached_summaries(
+    result_cache: ParseResultCache,
+    digest: str,
+    athlete_id: int,
+    filename: Optional[str] = None,
+) -> Optional[Tuple[List[WorkoutExecuted], int]]:
+    """
+    FTP-independent workouts of a cached upload, for this athlete and file.
+
+    Results cached before summaries were stored with them are summarized
+    once from their samples and the summaries backfilled.
+
+    Args:
+        result_cache: Parse-result cache holding the workout
+        digest: Content hash of the uploaded file
+        athlete_id: ID of the athlete who uploaded it
+        filename: Recorded as each workout's ``file_ref``
+
+    Returns:
+        Tuple of (workouts without IF/TSS, sample count), or None if the
+        cache holds no usable entry for the digest
+    """
+    cached = result_cache.get_summaries(digest)
+    if cached is None:
+        decoded = result_cache.get(digest)
+        if decoded is None:
+            return None
+        try:
+            cached = (summarize_sessions(decoded, athlete_id), len(decoded.samples))
+        except FileParseError:
+            return None
+        result_cache.put_summaries(digest, *cached)
+    workouts, sample_count = cached
+    return [
+        workout.model_copy(update={"athlete_id": athlete_id, "file_ref": filename})
+        for workout in workouts
+    ], sample_count
+
+
+def stored_power_curves(result_cache: ParseResultCache, digest: str) -> List[Optional[np.ndarray]]:
+    """
+    Power curve per session of a cached parse result.
+
+    Raises:
+        WorkoutNotFoundError: If no parse result is stored for the digest
+    """
+    decoded = result_cache.get(digest)
+    if decoded is None:
+        raise WorkoutNotFoundError(f"No stored workout {digest}")
+    return session_power_curves(decoded)
+
+
+def process_upload(
+    decoder: Callable[[bytes], FitDecodeResult],
+    data: bytes,
+    athlete_id: int,
+    ftp: Optional[int] = None,
+    filename: Optional[str] = None,
+    digest: Optional[str] = None,
+    result_cache: Optional[ParseResultCache] = None,
+    params: SegmentationParams = DEFAULT_PARAMS,
+    detect: bool = True,
+    power_curves: bool = True,
+) -> ProcessedUpload:
+    """
+    Run the whole pipeline for a new upload (the ``ParsePool`` entry point).
+
+    Args:
+        decoder: "parse" stage function for the file type (see ``DECODERS``)
+        data: Raw file bytes
+        athlete_id: ID of the athlete who performed the workout
+        ftp: Functional Threshold Power (optional, for TSS and labels)
+        filename: Recorded as each workout's ``file_ref``
+        digest: Content hash under which to cache the cleaned decode
+        result_cache: Parse-result cache to write (optional)
+        params: Change-point detection parameters
+        detect: Run the intervals stage (False when cached intervals exist)
+        power_curves: Run the power_curve stage
+
+    Returns:
+        ProcessedUpload with one workout per session and stage timings
+
+    Raises:
+        PipelineStageError: If a stage fails
+    """
+    timings: StageTimings = {}
+
+    def stage(name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            raise PipelineStageError(name, str(e), timings) from None
+        finally:
+            timings[name] = (started_at, datetime.now(), (time.perf_counter() - start) * 1000)
+
+    def summarize(decoded: FitDecodeResult) -> List[WorkoutExecuted]:
+        # Multisport files summarize to one workout per session (leg); the
+        # FTP-independent summaries are cached for duplicate uploads
+        summaries = summarize_sessions(decoded, athlete_id, filename=filename)
+        if result_cache is not None and digest is not None:
+            result_cache.put_summaries(digest, summaries, len(decoded.samples))
+        return [apply_ftp(summary, ftp) for summary in summaries]
+
+    decoded = stage("parse", decoder, data)
+    decoded = stage("clean", clean_samples, decoded)
+    if result_cache is not None and digest is not None:
+        result_cache.put(digest, decoded)
+    workouts = stage("summarize", summarize, decoded)
+    processed = ProcessedUpload(workouts=workouts, sample_count=len(decoded.samples), timings=timings)
+    if detect:
+        processed.intervals = stage("intervals", detect_intervals, decoded, ftp=ftp, params=params)
+    if power_curves:
+        processed.power_curves = stage("power_curve", session_power_curves, decoded)
+    return processed
+
+
+class JobScheduler:
+    """
+    In-process ingestion job queue backed by a ``ParsePool``.
+
+    At most ``pool.max_workers`` jobs run at once and at most
+    ``pool.queue_depth`` wait; ``submit`` raises ``JobQueueFullError`` beyond
+    that so the API can answer 503.
+
+    Args:
+        pool: Process pool that executes the pipeline stages
+        raw_store: Content-addressed store for uploaded bytes (optional)
+        result_cache: Parse-result cache keyed by content hash (optional)
+        workout_store: Receives each summarized workout's FTP-independent
+            products (optional)
+        interval_cache: Detected-interval cache keyed by content hash,
+            segmentation parameters and threshold version (optional)
+        power_curve_index: Receives each workout's mean-max power curve
+            (optional; the power_curve stage is skipped without it)
+        segmentation_params: Change-point detection parameters
+        max_retained_jobs: Number of jobs kept for status lookups
+    """
+
+    def __init__(
+        self,
+        pool: ParsePool,
+        raw_store: Optional[RawUploadStore] = None,
+        result_cache: Optional[ParseResultCache] = None,
+        workout_store: Optional[WorkoutStore] = None,
+        interval_cache: Optional[IntervalCache] = None,
+        power_curve_index: Optional[PowerCurveIndex] = None,
+        segmentation_params: SegmentationParams = DEFAULT_PARAMS,
+        max_retained_jobs: int = DEFAULT_MAX_RETAINED_JOBS,
+    ) -> None:
+        self.pool = pool
+        self.raw_store = raw_store
+        self.result_cache = result_cache
+        self.workout_store = workout_store
+        self.interval_cache = interval_cache
+        self.power_curve_index = power_curve_index
+        self.segmentation_params = segmentation_params
+        self.max_retained_jobs = max_retained_jobs
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._active = 0
+
+    @property
+    def active_jobs(self) -> int:
+        """Number of jobs queued or running."""
+        return self._active
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._active = 0
+        self._workers = [
+            loop.create_task(self._worker()) for _ in range(self.pool.max_workers)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks; queued jobs are left unprocessed."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._loop = None
+
+    def submit(
+        self,
+        data: bytes,
+        filename: str,
+        athlete_id: int,
+        ftp: Optional[int] = None,
+    ) -> IngestionJob:
+        """
+        Queue an uploaded file for ingestion.
+
+        Args:
+            data: Raw file bytes
+            filename: Original file name
+            athlete_id: ID of the athlete who performed the workout
+            ftp: Functional Threshold Power (optional, for TSS calculation)
+
+        Returns:
+            The queued IngestionJob
+
+        Raises:
+            JobQueueFullError: If ``pool.capacity`` jobs are already queued or running
+        """
+        self.start()
+        if self._active >= self.pool.capacity:
+            raise JobQueueFullError(f"Ingestion queue full ({self._active} jobs in flight)")
+
+        job = IngestionJob(
+            id=uuid.uuid4().hex,
+            athlete_id=athlete_id,
+            filename=filename,
+            created_at=datetime.now(),
+            stages=[JobStage(name=name) for name in PIPELINE_STAGES],
+        )
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_retained_jobs:
+            self._jobs.popitem(last=False)
+
+        self._active += 1
+        self._queue.put_nowait((job, {"data": data, "ftp": ftp}))
+        return job
+
+    def get(self, job_id: str) -> IngestionJob:
+        """
+        Look up a job by ID.
+
+        Raises:
+            JobNotFoundError: If the job is unknown
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFoundError(f"Job {job_id} not found")
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job, payload = await self._queue.get()
+            try:
+                await self._run(job, payload)
+            finally:
+                self._active -= 1
+                self._queue.task_done()
+
+    async def _run(self, job: IngestionJob, payload: Dict[str, Any]) -> None:
+        job.status = "running"
+        try:
+            data = payload["data"]
+            file_ref = job.filename
+            if self.raw_store is not None:
+                job.content_hash = await asyncio.to_thread(self.raw_store.put, data)
+                file_ref = str(self.raw_store.path(job.content_hash))
+            else:
+                job.content_hash = content_hash(data)
+
+            # Device laps segment structured workouts for free; change-point
+            # detection covers files without laps
+            version = threshold_version(payload["ftp"])
+            cached_intervals = await self._cached_intervals(job.content_hash, version)
+
+            cached = None
+            if self.result_cache is not None:
+                cached = await asyncio.to_thread(
+                    load_cached_summaries, self.result_cache, job.content_hash, job.athlete_id, file_ref
+                )
+            if cached is not None:
+                job.cache_hit = True
+                self._stage(job, "parse").status = "cached"
+                self._stage(job, "clean").status = "cached"
+                workouts, intervals = await self._process_cached(
+                    job, *cached, payload["ftp"], cached_intervals
+                )
+                curves = None
+            else:
+                processed = await self._process_upload(job, data, payload["ftp"], file_ref, cached_intervals)
+                workouts, intervals, curves = processed.workouts, processed.intervals, processed.power_curves
+                job.sample_count = processed.sample_count
+
+            job.workout = workouts[0]
+            job.workouts = workouts
+            keys = [
+                job.content_hash if len(workouts) == 1 else f"{job.content_hash}:{leg}"
+                for leg in range(len(workouts))
+            ]
+            if self.workout_store is not None:
+                for key, workout in zip(keys, workouts):
+                    self.workout_store.add(key, workout)
+
+            if cached_intervals is not None:
+                self._stage(job, "intervals").status = "cached"
+                intervals = cached_intervals
+            else:
+                await self._store_intervals(job.content_hash, version, intervals)
+            job.intervals = intervals
+
+            if curves is not None:
+                self._add_power_curves(job, workouts, keys, curves)
+            elif job.cache_hit:
+                await self._index_power_curves(job, workouts, keys)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            for stage in job.stages:
+                if stage.status == "pending":
+                    stage.status = "skipped"
+        finally:
+            job.finished_at = datetime.now()
+
+    async def _process_cached(
+        self,
+        job: IngestionJob,
+        summaries: List[WorkoutExecuted],
+        sample_count: int,
+        ftp: Optional[int],
+        cached_intervals: Optional[List[IntervalDetected]],
+    ) -> Tuple[List[WorkoutExecuted], Optional[List[IntervalDetected]]]:
+        """Apply the FTP to cached summaries in O(1); segment in the pool if needed."""
+        job.sample_count = sample_count
+        workouts = await self._timed(job, "summarize", self._apply_ftp(summaries, ftp))
+        intervals = None
+        if cached_intervals is None:
+            intervals = await self._run_stage(
+                job, "intervals", detect_stored_intervals, self.result_cache, job.content_hash,
+                ftp=ftp, params=self.segmentation_params,
+            )
+        return workouts, intervals
+
+    async def workout_intervals(
+        self,
+        digest: str,
+        ftp: Optional[int] = None,
+        power_zones: Optional[Dict[str, Tuple[int, int]]] = None,
+    ) -> List[IntervalDetected]:
+        """
+        Intervals of a stored workout for the athlete's current thresholds.
+
+        Served from the interval cache when possible; otherwise the cached
+        parse result is segmented in the pool and the result cached.
+
+        Args:
+            digest: Content hash of the uploaded file
+            ftp: Athlete's current FTP
+            power_zones: Athlete's current power zones
+
+        Returns:
+            Detected intervals in time order
+
+        Raises:
+            WorkoutNotFoundError: If no parse result is stored for the digest
+        """
+        version = threshold_version(ftp, power_zones)
+        intervals = await self._cached_intervals(digest, version)
+        if intervals is not None:
+            return intervals
+        if self.result_cache is None or digest not in self.result_cache:
+            raise WorkoutNotFoundError(f"No stored workout {digest}")
+        intervals = await self.pool.run(
+            detect_stored_intervals, self.result_cache, digest,
+            ftp=ftp, power_zones=power_zones, params=self.segmentation_params,
+        )
+        await self._store_intervals(digest, version, intervals)
+        return intervals
+
+    async def _process_upload(
+        self,
+        job: IngestionJob,
+        data: bytes,
+        ftp: Optional[int],
+        file_ref: str,
+        cached_intervals: Optional[List[IntervalDetected]],
+    ) -> ProcessedUpload:
+        """Run every stage of a new upload in one worker call and record the timings."""
+        decoder = DECODERS.get(get_file_type(job.filename))
+        if decoder is None:
+            raise FileParseError(f"No parser for {job.filename}")
+        run_curves = self.power_curve_index is not None
+        stages = ["parse", "clean", "summarize"]
+        stages += ["intervals"] if cached_intervals is None else []
+        stages += ["power_curve"] if run_curves else []
+        for name in stages:
+            self._stage(job, name).status = "running"
+        try:
+            processed = await self.pool.run(
+                process_upload, decoder, data, job.athlete_id,
+                ftp=ftp, filename=file_ref, digest=job.content_hash,
+                result_cache=self.result_cache, params=self.segmentation_params,
+                detect=cached_intervals is None, power_curves=run_curves,
+            )
+        except PipelineStageError as e:
+            self._record_timings(job, e.timings)
+            failed = self._stage(job, e.stage)
+            failed.status = "failed"
+            failed.error = e.message
+            for name in stages:
+                if self._stage(job, name).status == "running":
+                    self._stage(job, name).status = "pending"
+            raise
+        except Exception as e:
+            # The pool itself failed (e.g. saturated or a worker died)
+            for name in stages:
+                self._stage(job, name).status = "pending"
+            self._stage(job, "parse").status = "failed"
+            self._stage(job, "parse").error = str(e)
+            raise
+        self._record_timings(job, processed.timings)
+        if not run_curves:
+            self._stage(job, "power_curve").status = "skipped"
+        return processed
+
+    def _record_timings(self, job: IngestionJob, timings: StageTimings) -> None:
+        for name, (started_at, finished_at, duration_ms) in timings.items():
+            stage = self._stage(job, name)
+            stage.status = "done"
+            stage.started_at = started_at
+            stage.finished_at = finished_at
+            stage.duration_ms = duration_ms
+
+    def _add_power_curves(
+        self,
+        job: IngestionJob,
+        workouts: List[WorkoutExecuted],
+        keys: List[str],
+        curves: List[Optional[np.ndarray]],
+    ) -> None:
+        for key, workout, curve in zip(keys, workouts, curves):
+            if curve is not None:
+                self.power_curve_index.add(job.athlete_id, key, workout.start_time.date(), curve)
+
+    @staticmethod
+    async def _apply_ftp(summaries: List[WorkoutExecuted], ftp: Optional[int]) -> List[WorkoutExecuted]:
+        return [apply_ftp(summary, ftp) for summary in summaries]
+
+    async def _index_power_curves(
+        self,
+        job: IngestionJob,
+        workouts: List[WorkoutExecuted],
+        keys: List[str],
+    ) -> None:
+        """Index a cached upload's curves, loading its samples only if some are missing."""
+        index = self.power_curve_index
+        if index is None:
+            self._stage(job, "power_curve").status = "skipped"
+            return
+        if all((job.athlete_id, key) in index for key in keys):
+            self._stage(job, "power_curve").status = "cached"
+            return
+        curves = await self._timed(job, "power_curve", asyncio.to_thread(
+            stored_power_curves, self.result_cache, job.content_hash,
+        ))
+        self._add_power_curves(job, workouts, keys, curves)
+
+    async def _cached_intervals(self, digest: str, version: str) -> Optional[List[IntervalDetected]]:
+        if self.interval_cache is None:
+            return None
+        return await asyncio.to_thread(
+            self.interval_cache.get, digest, self.segmentation_params, version
+        )
+
+    async def _store_intervals(self, digest: str, version: str, intervals: List[IntervalDetected]) -> None:
+        if self.interval_cache is not None:
+            await asyncio.to_thread(
+                self.interval_cache.put, digest, self.segmentation_params, version, intervals
+            )
+
+    async def _run_stage(
+        self,
+        job: IngestionJob,
+        name: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
+        """Run one stage in the pool, recording its status and timing."""
+        return await self._timed(job, name, self.pool.run(fn, *args, **kwargs))
+
+    async def _timed(self, job: IngestionJob, name: str, work: Awaitable[Any]) -> Any:
+        stage = self._stage(job, name)
+        stage.status = "running"
+        stage.started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            result = await work
+        except Exception as e:
+            stage.status = "failed"
+            stage.error = str(e)
+            raise
+        finally:
+            stage.finished_at = datetime.now()
+            stage.duration_ms = (time.perf_counter() - start) * 1000
+        stage.status = "done"
+        return result
+
+    @staticmethod
+    def _stage(job: IngestionJob, name: str) -> JobStage:
+        return next(stage for stage in job.stages if stage.name == name)
@@ -0,0 +1,312 @@
+"""
+Change-point interval detection for workouts without device laps.
+
+Follows the approach in ``AutocoachOverview.md``: smooth power (or pace),
+segment it with PELT (Killick et al., 2012) under a Gaussian mean/variance
+cost, enforce a minimum duration, merge near-duplicate neighbours and label
+segments against the athlete's threshold.
+
+The segment cost ``n * log(variance)`` is evaluated in O(1) from prefix
+sums of ``x`` and ``x**2``, and PELT's pruning keeps the candidate set
+small, so the search is close to linear in the series length. Smoothing is
+done by averaging fixed blocks (5 s by default), which also shrinks the
+series PELT walks; each change point is then refined back to 1 s
+resolution on the unsmoothed series. No ``ruptures`` dependency.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.schemas.training import IntervalDetected
+from app.services.file_parser import FitDecodeResult
+from app.services.intervals import device_intervals, segment_metrics
+from app.services.sample_frame import SampleFrame
+
+
+@dataclass(frozen=True)
+class SegmentationParams:
+    """
+    Tuning knobs for change-point segmentation.
+
+    Attributes:
+        smoothing_s: Block length in samples averaged before segmenting
+        min_duration_s: Minimum segment length in samples
+        penalty: Cost added per change point; None uses ``penalty_scale *
+            log(n)`` on the smoothed series (a BIC-style penalty)
+        penalty_scale: Multiplier for the default penalty
+        merge_ratio: Adjacent segments whose means differ by less than this
+            fraction of the larger mean are merged
+        min_variance: Variance floor (units²) so flat segments don't drive
+            ``log(variance)`` to -inf
+    """
+    smoothing_s: int = 5
+    min_duration_s: int = 30
+    penalty: Optional[float] = None
+    penalty_scale: float = 3.0
+    merge_ratio: float = 0.1
+    min_variance: float = 1.0
+
+
+DEFAULT_PARAMS = SegmentationParams()
+
+# Labels relative to FTP: work at/above tempo (Z3), rest in recovery (Z1)
+_WORK_FTP_FRACTION = 0.76
+_REST_FTP_FRACTION = 0.56
+
+
+def _prefix_sums(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    s1 = np.zeros(len(values) + 1)
+    s2 = np.zeros(len(values) + 1)
+    np.cumsum(values, out=s1[1:])
+    np.cumsum(values * values, out=s2[1:])
+    return s1, s2
+
+
+def pelt(
+    values: np.ndarray,
+    penalty: float,
+    min_size: int = 2,
+    min_variance: float = 1.0,
+) -> np.ndarray:
+    """
+    Optimal partition of a 1-D series under a Gaussian mean/variance cost.
+
+    Minimizes ``sum(n_i * log(var_i)) + penalty * n_changes`` over all
+    segmentations with segments of at least ``min_size`` points, using
+    PELT's pruning of candidates that can no longer be optimal.
+
+    Args:
+        values: Series to segment
+        penalty: Cost per change point
+        min_size: Minimum segment length in points (>= 2)
+        min_variance: Variance floor for the segment cost
+
+    Returns:
+        Segment end indices (exclusive), ending with ``len(values)``; empty
+        for an empty series
+
+    Raises:
+        ValueError: If min_size < 2
+    """
+    if min_size < 2:
+        raise ValueError("min_size must be at least 2")
+    n = len(values)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if n < 2 * min_size:
+        return np.array([n])
+
+    s1, s2 = _prefix_sums(np.asarray(values, dtype=np.float64))
+    best = np.full(n + 1, np.inf)
+    best[0] = -penalty
+    previous = np.zeros(n + 1, dtype=np.int64)
+    candidates = np.array([0], dtype=np.int64)
+
+    for t in range(min_size, n + 1):
+        if t >= 2 * min_size:
+            candidates = np.append(candidates, t - min_size)
+        length = t - candidates
+        mean = (s1[t] - s1[candidates]) / length
+        variance = np.maximum((s2[t] - s2[candidates]) / length - mean * mean, min_variance)
+        fitted = best[candidates] + length * np.log(variance)
+        i = int(np.argmin(fitted))
+        best[t] = fitted[i] + penalty
+        previous[t] = candidates[i]
+        # Prune candidates that cannot start the last segment of any later optimum
+        candidates = candidates[fitted <= best[t]]
+
+    ends = []
+    t = n
+    while t > 0:
+        ends.append(t)
+        t = previous[t]
+    return np.array(ends[::-1], dtype=np.int64)
+
+
+def _fill_gaps(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Forward-fill invalid entries so dropouts don't look like rest."""
+    if valid.all() or not valid.any():
+        return values.astype(np.float64)
+    index = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(index, out=index)
+    index[:np.argmax(valid)] = np.argmax(valid)
+    return values[index].astype(np.float64)
+
+
+def _refine(series: np.ndarray, bounds: np.ndarray, radius: int) -> np.ndarray:
+    """Move each interior boundary within +-radius to the best 1 Hz mean split."""
+    s1, s2 = _prefix_sums(series)
+    bounds = bounds.copy()
+    for j in range(1, len(bounds) - 1):
+        left, right = bounds[j - 1], bounds[j + 1]
+        split = np.arange(max(bounds[j] - radius, left + 1), min(bounds[j] + radius, right - 1) + 1)
+        if len(split) == 0:
+            continue
+        n_left, n_right = split - left, right - split
+        cost = (
+            (s2[split] - s2[left]) - (s1[split] - s1[left]) ** 2 / n_left
+            + (s2[right] - s2[split]) - (s1[right] - s1[split]) ** 2 / n_right
+        )
+        bounds[j] = split[int(np.argmin(cost))]
+    return bounds
+
+
+def _merge_similar(series: np.ndarray, bounds: np.ndarray, merge_ratio: float) -> np.ndarray:
+    """Repeatedly merge the closest adjacent pair whose means are within merge_ratio."""
+    s1, _ = _prefix_sums(series)
+    bounds = list(bounds)
+    while len(bounds) > 2:
+        edges = np.array(bounds)
+        means = (s1[edges[1:]] - s1[edges[:-1]]) / np.diff(edges)
+        gap = np.abs(np.diff(means))
+        scale = np.maximum(np.maximum(np.abs(means[:-1]), np.abs(means[1:])), 1e-9)
+        relative = gap / scale
+        j = int(np.argmin(relative))
+        if relative[j] >= merge_ratio:
+            break
+        del bounds[j + 1]
+    return np.array(bounds, dtype=np.int64)
+
+
+def segment_series(
+    values: np.ndarray,
+    params: SegmentationParams = DEFAULT_PARAMS,
+) -> np.ndarray:
+    """
+    Segment a 1 Hz series into steady efforts.
+
+    Args:
+        values: Gap-free series (e.g. power in watts), one value per sample
+        params: Segmentation parameters
+
+    Returns:
+        Boundary indices ``[0, b1, ..., n]``; segment i is
+        ``values[bounds[i]:bounds[i + 1]]``
+    """
+    n = len(values)
+    if n == 0:
+        return np.zeros(1, dtype=np.int64)
+    block = max(int(params.smoothing_s), 1)
+    starts = np.arange(0, n, block)
+    smoothed = np.add.reduceat(values, starts) / np.diff(np.append(starts, n))
+
+    min_blocks = max(int(np.ceil(params.min_duration_s / block)), 2)
+    penalty = params.penalty
+    if penalty is None:
+        penalty = params.penalty_scale * np.log(max(len(smoothed), 2))
+    ends = pelt(smoothed, penalty, min_size=min_blocks, min_variance=params.min_variance)
+
+    bounds = np.concatenate([[0], np.minimum(ends * block, n)])
+    if block > 1:
+        bounds = _refine(values, bounds, radius=block)
+    return _merge_similar(values, bounds, params.merge_ratio)
+
+
+def _label(means: np.ndarray, ftp: Optional[int]) -> List[str]:
+    if ftp and ftp > 0:
+        work, rest = _WORK_FTP_FRACTION * ftp, _REST_FTP_FRACTION * ftp
+    else:
+        # Without a threshold, label relative to the ride's typical effort
+        reference = float(np.median(means))
+        work, rest = 1.1 * reference, 0.9 * reference
+    kinds = ['work' if m >= work else 'rest' if m < rest else 'other' for m in means]
+    if len(kinds) > 1 and kinds[0] != 'work':
+        kinds[0] = 'warmup'
+    if len(kinds) > 2 and kinds[-1] != 'work':
+        kinds[-1] = 'cooldown'
+    return kinds
+
+
+def change_point_intervals(
+    samples: SampleFrame,
+    workout_id: int = 1,
+    ftp: Optional[int] = None,
+    power_zones: Optional[Dict[str, Tuple[int, int]]] = None,
+    params: SegmentationParams = DEFAULT_PARAMS,
+    sample_rate_hz: float = 1,
+) -> List[IntervalDetected]:
+    """
+    Detect intervals from the power (or, without power, pace) channel.
+
+    Args:
+        samples: Cleaned, time-ordered samples
+        workout_id: Workout the intervals belong to (placeholder until the
+            workout is persisted)
+        ftp: Functional Threshold Power for work/rest labels and zones;
+            pace-only rides are labelled relative to their median
+        power_zones: Athlete power zones overriding the FTP-derived zones
+        params: Segmentation parameters
+        sample_rate_hz: Recording rate for the per-segment NP window
+
+    Returns:
+        IntervalDetected segments covering the ride in time order; [] if
+        there is neither a power nor a pace channel
+    """
+    channel = 'power_w' if samples.has_channel('power_w') else 'pace_mps'
+    if not samples.has_channel(channel):
+        return []
+    series = _fill_gaps(getattr(samples, channel), samples.valid[channel])
+    bounds = segment_series(series, params)
+
+    s1, _ = _prefix_sums(series)
+    means = (s1[bounds[1:]] - s1[bounds[:-1]]) / np.diff(bounds)
+    kinds = _label(means, ftp if channel == 'power_w' else None)
+
+    t_s = samples.t_s
+    t_start = t_s[bounds[:-1]].astype(np.int64)
+    t_end = np.append(t_s[bounds[1:-1]], t_s[-1] + 1).astype(np.int64)
+    metrics = segment_metrics(
+        samples, t_start, t_end, ftp=ftp, power_zones=power_zones, sample_rate_hz=sample_rate_hz
+    )
+    return [
+        IntervalDetected(
+            workout_id=workout_id,
+            t_start=int(start),
+            t_end=int(end),
+            kind=kind,
+            metrics_json=segment,
+        )
+        for start, end, kind, segment in zip(t_start, t_end, kinds, metrics)
+        if end > start
+    ]
+
+
+def detect_intervals(
+    decoded: FitDecodeResult,
+    workout_id: int = 1,
+    ftp: Optional[int] = None,
+    power_zones: Optional[Dict[str, Tuple[int, int]]] = None,
+    params: SegmentationParams = DEFAULT_PARAMS,
+    sample_rate_hz: float = 1,
+) -> List[IntervalDetected]:
+    """
+    Segment a workout, preferring the device's own laps.
+
+    Structured workouts are segmented from lap/timer messages
+    (``device_intervals``); change-point detection only runs when the
+    file carries no usable laps.
+
+    Args:
+        decoded: Cleaned output of the decode stage
+        workout_id: Workout the intervals belong to
+        ftp: Functional Threshold Power for labels and time-in-zone
+        power_zones: Athlete power zones overriding the FTP-derived zones
+        params: Change-point segmentation parameters
+        sample_rate_hz: Recording rate for the per-segment NP window
+
+    Returns:
+        IntervalDetected segments in time order
+    """
+    intervals = device_intervals(
+        decoded, workout_id=workout_id, ftp=ftp, power_zones=power_zones,
+        sample_rate_hz=sample_rate_hz,
+    )
+    if intervals or len(decoded.samples) == 0:
+        return intervals
+    return change_point_intervals(
+        decoded.samples, workout_id=workout_id, ftp=ftp, power_zones=power_zones, params=params,
+        sample_rate_hz=sample_rate_hz,
+    )
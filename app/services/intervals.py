@@ -0,0 +1,259 @@
+"""
+Interval segmentation of executed workouts.
+
+Structured workouts already carry their segmentation: head units write a
+``lap`` message per workout step (and timer start/stop ``event`` messages
+around pauses), and both are collected by the same decode pass that builds
+the samples. ``device_intervals`` turns them straight into
+``IntervalDetected`` segments, so change-point detection only has to run
+for files without laps.
+
+Per-segment metrics come from prefix sums over the channel arrays: after
+one O(n) ``np.cumsum`` per quantity, every segment's sum is a difference of
+two entries, so any number of laps costs O(samples + laps).
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.schemas.training import IntervalDetected
+from app.services.file_parser import FitDecodeResult
+from app.services.metrics import _np_window
+from app.services.sample_frame import SampleFrame
+
+# Upper edges of Coggan power zones Z1..Z6 as fractions of FTP (Z7 is open)
+POWER_ZONE_FTP_FRACTIONS: Tuple[float, ...] = (0.55, 0.75, 0.90, 1.05, 1.20, 1.50)
+POWER_ZONE_NAMES: Tuple[str, ...] = ('Z1', 'Z2', 'Z3', 'Z4', 'Z5', 'Z6', 'Z7')
+
+# FIT lap intensity -> IntervalDetected.kind
+_LAP_KINDS: Dict[str, str] = {
+    'active': 'work',
+    'interval': 'work',
+    'rest': 'rest',
+    'recovery': 'rest',
+    'warmup': 'warmup',
+    'cooldown': 'cooldown',
+}
+
+_TIMER_STOP_TYPES = ('stop', 'stop_all', 'stop_disable', 'stop_disable_all')
+
+
+def _prefix_sum(values: np.ndarray) -> np.ndarray:
+    """Cumulative sum with a leading zero row: sum(values[a:b]) = p[b] - p[a]."""
+    prefix = np.zeros((len(values) + 1,) + values.shape[1:], dtype=values.dtype)
+    np.cumsum(values, axis=0, out=prefix[1:])
+    return prefix
+
+
+def _zone_edges(
+    ftp: Optional[int],
+    power_zones: Optional[Dict[str, Tuple[int, int]]],
+) -> Optional[Tuple[List[str], np.ndarray]]:
+    """Zone names and upper edges (all but the last zone), or None if unknown."""
+    if power_zones:
+        ordered = sorted(power_zones.items(), key=lambda item: item[1][0])
+        names = [name for name, _ in ordered]
+        return names, np.array([high for _, (_, high) in ordered[:-1]], dtype=np.float64)
+    if ftp and ftp > 0:
+        return list(POWER_ZONE_NAMES), np.array(POWER_ZONE_FTP_FRACTIONS) * ftp
+    return None
+
+
+def segment_metrics(
+    samples: SampleFrame,
+    t_start: Sequence[float],
+    t_end: Sequence[float],
+    ftp: Optional[int] = None,
+    power_zones: Optional[Dict[str, Tuple[int, int]]] = None,
+    sample_rate_hz: float = 1,
+) -> List[Dict]:
+    """
+    Compute avg/NP power, avg HR and time-in-zone for many segments at once.
+
+    Segments are half-open ``[t_start, t_end)`` windows on the samples'
+    ``t_s`` axis, located with ``np.searchsorted`` (``t_s`` must be sorted,
+    as after the clean stage). NP uses the ride's 30 s rolling average, so
+    the first windows of a lap include the preceding lap's power as they do
+    on a head unit; a single segment spanning the ride gives exactly
+    ``calculate_normalized_power`` at the same ``sample_rate_hz``. Segments
+    shorter than the NP window report average power as NP, like
+    ``calculate_normalized_power``.
+
+    Args:
+        samples: Cleaned, time-ordered samples
+        t_start: Segment start offsets in seconds
+        t_end: Segment end offsets in seconds (exclusive)
+        ftp: Functional Threshold Power; zones default to Coggan's 7 zones
+        power_zones: Athlete power zones (name -> (min, max) watts),
+            overriding the FTP-derived zones
+        sample_rate_hz: Recording rate, which sets the NP window length
+            in samples (see ``calculate_normalized_power``)
+
+    Returns:
+        One metrics dict per segment with duration_s and, where the data
+        exists, avg_power, np, avg_hr and time_in_zone (zone -> seconds)
+    """
+    t_start = np.asarray(t_start, dtype=np.float64)
+    t_end = np.asarray(t_end, dtype=np.float64)
+    lo = np.searchsorted(samples.t_s, t_start, side='left')
+    hi = np.searchsorted(samples.t_s, t_end, side='left')
+
+    power_valid = samples.valid['power_w']
+    power = np.where(power_valid, samples.power_w, 0).astype(np.float64)
+    power_count = _prefix_sum(power_valid.astype(np.int64))
+    power_sum = _prefix_sum(power)
+    hr_valid = samples.valid['hr_bpm']
+    hr_count = _prefix_sum(hr_valid.astype(np.int64))
+    hr_sum = _prefix_sum(np.where(hr_valid, samples.hr_bpm, 0).astype(np.float64))
+
+    n_power = power_count[hi] - power_count[lo]
+    n_hr = hr_count[hi] - hr_count[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_power = (power_sum[hi] - power_sum[lo]) / n_power
+        avg_hr = (hr_sum[hi] - hr_sum[lo]) / n_hr
+
+    # NP over the compacted valid power (as calculate_normalized_power sees
+    # it): trailing 30 s mean with partial windows at the start
+    window = _np_window(sample_rate_hz)
+    compact = power[power_valid]
+    compact_prefix = _prefix_sum(compact)
+    end = np.arange(1, len(compact) + 1)
+    begin = np.maximum(end - window, 0)
+    rolling = (compact_prefix[end] - compact_prefix[begin]) / (end - begin)
+    fourth = _prefix_sum(rolling ** 4)
+    c_lo, c_hi = power_count[lo], power_count[hi]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        np_power = np.where(
+            n_power >= window,
+            ((fourth[c_hi] - fourth[c_lo]) / n_power) ** 0.25,
+            avg_power,
+        )
+
+    zones = _zone_edges(ftp, power_zones)
+    zone_seconds = None
+    if zones is not None:
+        names, edges = zones
+        zone_index = np.digitize(samples.power_w, edges, right=True)
+        one_hot = (zone_index[:, None] == np.arange(len(names))) & power_valid[:, None]
+        zone_prefix = _prefix_sum(one_hot.astype(np.int32))
+        zone_seconds = zone_prefix[hi] - zone_prefix[lo]
+
+    metrics: List[Dict] = []
+    for i in range(len(t_start)):
+        segment: Dict = {'duration_s': float(t_end[i] - t_start[i])}
+        if n_power[i]:
+            segment['avg_power'] = float(avg_power[i])
+            segment['np'] = float(np_power[i])
+        if n_hr[i]:
+            segment['avg_hr'] = float(avg_hr[i])
+        if zone_seconds is not None and n_power[i]:
+            segment['time_in_zone'] = dict(zip(zones[0], zone_seconds[i].tolist()))
+        metrics.append(segment)
+    return metrics
+
+
+def _offset_s(timestamp: datetime, origin: datetime) -> float:
+    return (timestamp - origin).total_seconds()
+
+
+def _lap_segments(decoded: FitDecodeResult) -> List[Tuple[float, float, str, Optional[int]]]:
+    segments = []
+    for lap in decoded.laps:
+        start = lap.get('start_time')
+        if start is None:
+            continue
+        t_start = _offset_s(start, decoded.start_time)
+        if lap.get('end_time') is not None:
+            t_end = _offset_s(lap['end_time'], decoded.start_time)
+        else:
+            elapsed = lap.get('total_elapsed_time') or lap.get('total_timer_time')
+            if elapsed is None:
+                continue
+            t_end = t_start + elapsed
+        kind = _LAP_KINDS.get(lap.get('intensity') or '', 'other')
+        segments.append((t_start, t_end, kind, lap.get('wkt_step_index')))
+    return segments
+
+
+def _timer_segments(decoded: FitDecodeResult) -> List[Tuple[float, float, str, Optional[int]]]:
+    """Periods between timer start and stop events (the recording's pauses)."""
+    segments = []
+    running_since: Optional[datetime] = None
+    for event in sorted(
+        (e for e in decoded.events if e.get('event') == 'timer' and e.get('timestamp') is not None),
+        key=lambda e: e['timestamp'],
+    ):
+        if event.get('event_type') == 'start' and running_since is None:
+            running_since = event['timestamp']
+        elif event.get('event_type') in _TIMER_STOP_TYPES and running_since is not None:
+            segments.append((
+                _offset_s(running_since, decoded.start_time),
+                _offset_s(event['timestamp'], decoded.start_time),
+                'other',
+                None,
+            ))
+            running_since = None
+    return segments
+
+
+def device_intervals(
+    decoded: FitDecodeResult,
+    workout_id: int = 1,
+    ftp: Optional[int] = None,
+    power_zones: Optional[Dict[str, Tuple[int, int]]] = None,
+    sample_rate_hz: float = 1,
+) -> List[IntervalDetected]:
+    """
+    Build intervals from the device's own lap (or timer event) messages.
+
+    Laps map to segments directly, with ``kind`` from the lap intensity and
+    ``planned_step_index`` from ``wkt_step_index``. Without laps, timer
+    start/stop pairs split the ride at its pauses. A file with a single
+    lap or timer period carries no segmentation, so an empty list is
+    returned and the caller should fall back to change-point detection.
+
+    Args:
+        decoded: Cleaned output of the decode stage
+        workout_id: Workout the intervals belong to (placeholder until the
+            workout is persisted)
+        ftp: Functional Threshold Power for time-in-zone
+        power_zones: Athlete power zones overriding the FTP-derived zones
+        sample_rate_hz: Recording rate for the lap NP window
+
+    Returns:
+        IntervalDetected segments in time order, or [] if the device
+        recorded no usable segmentation
+    """
+    if decoded.start_time is None or len(decoded.samples) == 0:
+        return []
+    segments = _lap_segments(decoded)
+    if len(segments) < 2:
+        segments = _timer_segments(decoded)
+    segments = sorted((
+        (max(round(start), 0), round(end), kind, step)
+        for start, end, kind, step in segments
+        if round(end) > max(round(start), 0)
+    ), key=lambda segment: segment[:2])
+    if len(segments) < 2:
+        return []
+
+    t_start = [segment[0] for segment in segments]
+    t_end = [segment[1] for segment in segments]
+    metrics = segment_metrics(
+        decoded.samples, t_start, t_end, ftp=ftp, power_zones=power_zones,
+        sample_rate_hz=sample_rate_hz,
+    )
+    return [
+        IntervalDetected(
+            workout_id=workout_id,
+            t_start=start,
+            t_end=end,
+            kind=kind,
+            planned_step_index=step,
+            metrics_json=segment,
+        )
+        for (start, end, kind, step), segment in zip(segments, metrics)
+    ]
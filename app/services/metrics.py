@@ -2,12 +2,16 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import date
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
-from app.schemas.training import Activity, MetricsDaily
+from app.schemas.training import Activity, Athlete, MetricsDaily
+
+
+# Samples per block in calculate_normalized_power_batch (~1 MB per temporary)
+_NP_BLOCK_SAMPLES = 1 << 17
 
 
 @dataclass
@@ -16,7 +20,17 @@ class LoadConstants:
     ctl_tau_days: float = 42.0
 
 
-def calculate_normalized_power(power_samples: List[float], sample_rate_hz: int = 1) -> float:
+def _np_window(sample_rate_hz: float) -> int:
+    """Samples in the 30 s NP rolling window at a given sample rate."""
+    if sample_rate_hz <= 0:
+        raise ValueError("sample_rate_hz must be positive")
+    return max(1, int(round(30 * sample_rate_hz)))
+
+
+def calculate_normalized_power(
+    power_samples: Union[List[float], np.ndarray],
+    sample_rate_hz: float = 1,
+) -> float:
     """
     Calculate Normalized Power (NP) for cycling power data.
     
@@ -30,8 +44,10 @@ def calculate_normalized_power(power_samples: List[float], sample_rate_hz: int =
         4. Take the 4th root of the mean
     
     Args:
-        power_samples: List of power values in watts (time-ordered)
-        sample_rate_hz: Sample rate in Hz (default 1 = 1 sample/second)
+        power_samples: List or array of power values in watts (time-ordered)
+        sample_rate_hz: Sample rate in Hz (default 1 = 1 sample/second);
+            the rolling window spans round(30 * sample_rate_hz) samples, so
+            sub-1 Hz recordings (e.g. 0.5 for one sample every 2 s) work too
         
     Returns:
         Normalized power in watts
@@ -53,30 +69,98 @@ def calculate_normalized_power(power_samples: List[float], sample_rate_hz: int =
         >>> np = calculate_normalized_power(variable_power)
         >>> assert np > 250  # Higher than average of 250W
     """
-    if not power_samples:
+    if len(power_samples) == 0:
         raise ValueError("power_samples cannot be empty")
-    if sample_rate_hz <= 0:
-        raise ValueError("sample_rate_hz must be positive")
+    power = np.asarray(power_samples, dtype=np.float64)
+    offsets = np.array([0, len(power)])
+    return float(calculate_normalized_power_batch(power, offsets, sample_rate_hz)[0])
+
+
+def _normalized_power_kernel(power: np.ndarray, offsets: np.ndarray, window: int) -> np.ndarray:
+    """NP of the ragged workouts ``power[offsets[i]:offsets[i + 1]]``."""
+    lengths = np.diff(offsets)
+    first, last = offsets[:-1], offsets[1:]
+    cumulative = np.zeros(len(power) + 1)
+    np.cumsum(power, out=cumulative[1:])
     
-    # Convert to pandas Series for efficient rolling calculations
-    power_series = pd.Series(power_samples, dtype=float)
+    # Trailing 30 s mean ending at each sample: full windows by slicing ...
+    rolling = np.empty(len(power))
+    if len(power) >= window:
+        np.subtract(cumulative[window:], cumulative[:-window], out=rolling[window - 1:])
+        rolling[window - 1:] /= window
+    # ... then the first window - 1 samples of each workout, whose windows
+    # are clipped at the workout's start (min_periods=1)
+    heads = np.minimum(lengths, window - 1)
+    head_first = np.repeat(first, heads)
+    head = head_first + np.arange(heads.sum()) - np.repeat(np.cumsum(heads) - heads, heads)
+    rolling[head] = (cumulative[head + 1] - cumulative[head_first]) / (head + 1 - head_first)
     
-    # Handle edge case: very short workout
-    if len(power_samples) < 30 * sample_rate_hz:
-        # For workouts < 30 seconds, just use average power
-        return float(power_series.mean())
+    np.square(rolling, out=rolling)
+    np.square(rolling, out=rolling)
+    fourth = np.zeros(len(power) + 1)
+    np.cumsum(rolling, out=fourth[1:])
     
-    # Calculate 30-second rolling average
-    window_size = 30 * sample_rate_hz
-    rolling_avg = power_series.rolling(window=window_size, min_periods=1).mean()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        average = (cumulative[last] - cumulative[first]) / lengths
+        normalized = ((fourth[last] - fourth[first]) / lengths) ** 0.25
+    return np.where(lengths >= window, normalized, average)
+
+
+def calculate_normalized_power_batch(
+    power: np.ndarray,
+    offsets: np.ndarray,
+    sample_rate_hz: float = 1,
+) -> np.ndarray:
+    """
+    Normalized Power of many workouts in one vectorized pass.
     
-    # Raise to 4th power
-    powered = rolling_avg ** 4
+    The workouts are a ragged collection: workout ``i`` is
+    ``power[offsets[i]:offsets[i + 1]]``. Rolling 30 s means come from a
+    cumulative sum over many workouts at once, with the windows of each
+    workout's first 30 s clipped at its own start (the partial windows of
+    ``calculate_normalized_power``), and the per-workout 4th-power means
+    from a second cumulative sum. Workouts shorter than one window get their
+    average power; empty workouts get NaN.
     
-    # Take mean and 4th root
-    np_value = powered.mean() ** 0.25
+    Args:
+        power: Concatenated power values in watts (each workout time-ordered)
+        offsets: Workout boundaries into ``power`` (length workouts + 1,
+            starting at 0, non-decreasing, ending at ``len(power)``)
+        sample_rate_hz: Sample rate in Hz shared by all workouts
+        
+    Returns:
+        Normalized Power per workout in watts
+        
+    Raises:
+        ValueError: If sample_rate_hz <= 0 or offsets don't partition power
+        
+    Example:
+        >>> steady = np.full(3600, 250.0)
+        >>> intervals = np.tile(np.repeat([150.0, 350.0], 300), 6)  # 5 min on/off
+        >>> offsets = np.array([0, 3600, 7200])
+        >>> calculate_normalized_power_batch(np.concatenate([steady, intervals]), offsets).round(1)
+        array([250. , 293.9])
+    """
+    window = _np_window(sample_rate_hz)
+    power = np.asarray(power, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if (
+        offsets.ndim != 1 or len(offsets) == 0 or offsets[0] != 0
+        or offsets[-1] != len(power) or (np.diff(offsets) < 0).any()
+    ):
+        raise ValueError("offsets must run from 0 to len(power) without decreasing")
     
-    return float(np_value)
+    # Whole workouts in blocks of ~_NP_BLOCK_SAMPLES keep the temporaries
+    # cache-sized instead of several arrays the size of the whole library
+    result = np.empty(len(offsets) - 1)
+    i = 0
+    while i < len(result):
+        j = int(np.searchsorted(offsets, offsets[i] + _NP_BLOCK_SAMPLES, side='right')) - 1
+        j = min(max(j, i + 1), len(result))
+        block = power[offsets[i]:offsets[j]]
+        result[i:j] = _normalized_power_kernel(block, offsets[i:j + 1] - offsets[i], window)
+        i = j
+    return result
 
 
 def calculate_intensity_factor(np: float, ftp: int) -> float:
@@ -197,33 +281,619 @@ def calculate_tss_from_power(duration_s: int, np: float, ftp: int) -> float:
     return float(tss)
 
 
-def activities_to_dataframe(activities: List[Activity]) -> pd.DataFrame:
-    if not activities:
-        return pd.DataFrame(columns=["date", "tss"]).astype({"date": "datetime64[ns]", "tss": "float64"})
+def calculate_tss_from_power_batch(
+    duration_s: np.ndarray,
+    np_w: np.ndarray,
+    ftp: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized IF and TSS for many workouts at one FTP.
+    
+    Same formula as ``calculate_tss_from_power`` applied element-wise, used
+    to re-threshold stored workouts after an FTP change without re-parsing.
+    NaN NP values (workouts without power) propagate to NaN IF/TSS.
+    
+    Args:
+        duration_s: Workout durations in seconds
+        np_w: Normalized Power per workout in watts
+        ftp: Functional Threshold Power in watts
+        
+    Returns:
+        Tuple of (intensity_factor, tss) arrays
+        
+    Raises:
+        ValueError: If ftp <= 0 or any duration is negative
+    """
+    if ftp <= 0:
+        raise ValueError("FTP must be positive")
+    duration_s = np.asarray(duration_s, dtype=float)
+    if (duration_s < 0).any():
+        raise ValueError("duration_s cannot be negative")
+    
+    intensity_factor = np.asarray(np_w, dtype=float) / ftp
+    tss = duration_s * intensity_factor ** 2 / 36.0
+    return intensity_factor, tss
 
-    frame = pd.DataFrame([a.model_dump() for a in activities])
-    frame["date"] = pd.to_datetime(frame["activity_date"])  # normalize
 
-    if "tss" not in frame.columns:
-        frame["tss"] = pd.NA
+class RunningStats:
+    """
+    Streaming count/mean/max over chunks of values.
+    
+    Example:
+        >>> stats = RunningStats()
+        >>> stats.update(np.array([100, 200]))
+        >>> stats.update(np.array([300]))
+        >>> stats.mean, stats.maximum
+        (200.0, 300.0)
+    """
+    
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.maximum: Optional[float] = None
+    
+    def update(self, values: np.ndarray) -> None:
+        """Fold a chunk of values into the running totals."""
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.total += float(values.sum(dtype=np.float64))
+        chunk_max = float(values.max())
+        self.maximum = chunk_max if self.maximum is None else max(self.maximum, chunk_max)
+    
+    @property
+    def mean(self) -> Optional[float]:
+        """Mean of all values seen, or None if there were none."""
+        return self.total / self.count if self.count else None
 
-    # Fill missing TSS conservatively using simple proxies if duration and intensity are available
-    # This is a placeholder; later we can add sport-specific load models
-    frame["tss"] = frame["tss"].astype("float64")
-    if "duration_min" in frame.columns:
-        duration_factor = frame["duration_min"].fillna(0.0) / 60.0
-        if "intensity_factor" in frame.columns:
-            intensity_factor = frame["intensity_factor"].astype("float64").fillna(0.7)
-        else:
-            intensity_factor = pd.Series([0.7] * len(frame), dtype="float64")
-        frame["tss"] = frame["tss"].fillna(100.0 * duration_factor * intensity_factor)
 
-    # Consolidate to daily TSS in case of multiple workouts per day
-    daily = (
-        frame.groupby(frame["date"].dt.date)["tss"].sum().rename_axis("date").reset_index()
+class StreamingNormalizedPower:
+    """
+    Normalized Power computed chunk by chunk in constant memory.
+    
+    Reproduces ``calculate_normalized_power`` (30 s rolling mean with
+    ``min_periods=1``, so the first window is a partial mean; plain average
+    for rides shorter than one window). Only the last ``window - 1`` power
+    values are carried between chunks.
+    
+    Args:
+        sample_rate_hz: Sample rate in Hz (default 1 = 1 sample/second)
+        
+    Example:
+        >>> stream_np = StreamingNormalizedPower()
+        >>> for chunk in np.array_split(np.full(3600, 250.0), 7):
+        ...     stream_np.update(chunk)
+        >>> round(stream_np.value, 6)
+        250.0
+    """
+    
+    def __init__(self, sample_rate_hz: float = 1) -> None:
+        self.window = _np_window(sample_rate_hz)
+        self.count = 0
+        self._total = 0.0
+        self._fourth_power_total = 0.0
+        self._tail = np.zeros(0)
+    
+    def update(self, power: np.ndarray) -> None:
+        """Fold the next time-ordered chunk of valid power values in."""
+        if len(power) == 0:
+            return
+        power = np.asarray(power, dtype=np.float64)
+        carried = len(self._tail)
+        values = np.concatenate([self._tail, power])
+        cumulative = np.concatenate([[0.0], np.cumsum(values)])
+        
+        # Rolling window ending at each new value; windows near the start of
+        # the ride are shorter (min_periods=1)
+        end = np.arange(carried, len(values)) + 1
+        first_global = self.count - carried
+        start = np.maximum(end - self.window, -first_global)
+        start = np.maximum(start, 0)
+        rolling = (cumulative[end] - cumulative[start]) / (end - start)
+        
+        self._fourth_power_total += float((rolling ** 4).sum())
+        self._total += float(power.sum())
+        self.count += len(power)
+        self._tail = values[-(self.window - 1):] if self.window > 1 else np.zeros(0)
+    
+    @property
+    def value(self) -> Optional[float]:
+        """Normalized Power so far, or None before any power was seen."""
+        if self.count == 0:
+            return None
+        if self.count < self.window:
+            return self._total / self.count
+        return (self._fourth_power_total / self.count) ** 0.25
+
+
+# Mean-maximal power is stored on one shared duration grid (float32 watts)
+MMP_MAX_DURATION_S = 5 * 3600
+
+
+def _mmp_durations() -> np.ndarray:
+    """Every second to 2 min, then ~3% steps plus the usual test durations, to 5 h."""
+    geometric = np.round(120 * 1.03 ** np.arange(200)).astype(np.int64)
+    standard = [180, 240, 300, 360, 420, 480, 600, 720, 900, 1200, 1800,
+                2400, 3600, 5400, 7200, 10800, 14400, 18000]
+    durations = np.unique(np.concatenate([np.arange(1, 121), geometric, standard]))
+    return durations[durations <= MMP_MAX_DURATION_S]
+
+
+MMP_DURATIONS_S = _mmp_durations()
+
+
+def mean_max_power(
+    power: Union[List[float], np.ndarray],
+    durations_s: Optional[np.ndarray] = None,
+    sample_rate_hz: float = 1,
+) -> np.ndarray:
+    """
+    Mean-maximal power: the best average power sustained for each duration.
+    
+    One cumulative sum of the ride gives every window's average as a
+    difference of two prefix sums, so each duration is a single vectorized
+    max over the ride: O(n) per duration and O(n x durations) overall, with
+    the ~300-point ``MMP_DURATIONS_S`` grid standing in for every second
+    from 1 s to 5 h (see ``interpolate_power_curve``).
+    
+    Args:
+        power: Power in watts on an even time grid (gaps filled with 0)
+        durations_s: Durations in seconds (default ``MMP_DURATIONS_S``)
+        sample_rate_hz: Sample rate in Hz (default 1)
+        
+    Returns:
+        float32 array of best average power per duration; NaN for durations
+        longer than the ride
+        
+    Raises:
+        ValueError: If sample_rate_hz <= 0
+        
+    Example:
+        >>> ride = np.concatenate([np.full(600, 200.0), np.full(300, 400.0)])
+        >>> mean_max_power(ride, np.array([60, 300, 900, 3600]))
+        array([400., 400., 266.66666, nan], dtype=float32)
+    """
+    if sample_rate_hz <= 0:
+        raise ValueError("sample_rate_hz must be positive")
+    if durations_s is None:
+        durations_s = MMP_DURATIONS_S
+    power = np.asarray(power, dtype=np.float64)
+    windows = np.maximum(np.round(np.asarray(durations_s) * sample_rate_hz).astype(np.int64), 1)
+    cumulative = np.zeros(len(power) + 1)
+    np.cumsum(power, out=cumulative[1:])
+    
+    curve = np.full(len(windows), np.nan, dtype=np.float32)
+    for i, window in enumerate(windows.tolist()):
+        if window > len(power):
+            continue
+        curve[i] = np.max(cumulative[window:] - cumulative[:-window]) / window
+    return curve
+
+
+def interpolate_power_curve(
+    curve: np.ndarray,
+    duration_s: Union[float, np.ndarray],
+    durations_s: Optional[np.ndarray] = None,
+) -> Union[float, np.ndarray]:
+    """
+    Read a mean-max curve at any duration between grid points.
+    
+    Total work (duration x power) is interpolated linearly between the
+    neighbouring grid durations. Durations outside the grid or past the
+    curve's end give NaN.
+    
+    Args:
+        curve: Output of ``mean_max_power`` on ``durations_s``
+        duration_s: Duration(s) in seconds
+        durations_s: Grid the curve was computed on (default ``MMP_DURATIONS_S``)
+        
+    Returns:
+        Best average power in watts (scalar for a scalar duration)
+    """
+    if durations_s is None:
+        durations_s = MMP_DURATIONS_S
+    work = durations_s * np.asarray(curve, dtype=np.float64)
+    known = ~np.isnan(work)
+    query = np.asarray(duration_s, dtype=np.float64)
+    if not known.any():
+        result = np.full(query.shape, np.nan)
+    else:
+        grid = durations_s[known]
+        result = np.interp(query, grid, work[known], left=np.nan, right=np.nan) / query
+    return float(result) if result.ndim == 0 else result
+
+
+# Samples per block when solving the W′bal recurrence in closed form
+_RECURRENCE_BLOCK = 1024
+
+# W′bal fractions reported as time below (e.g. 0.25 = under 25% of W′)
+W_PRIME_BAL_FRACTIONS: Tuple[float, ...] = (0.75, 0.5, 0.25)
+
+
+@dataclass
+class WPrimeBalance:
+    """
+    W′ balance over a workout.
+    
+    Attributes:
+        trace_j: W′bal after each sample in joules
+        w_prime_j: W′ the trace starts from
+        cp_w: Critical Power used
+        tau_s: Recovery time constant (integral model; None for differential)
+        min_j: Lowest W′bal reached
+        min_at_s: Time of the lowest W′bal from workout start in seconds
+        time_below_s: Seconds spent below each fraction of W′
+    """
+    trace_j: np.ndarray
+    w_prime_j: float
+    cp_w: float
+    tau_s: Optional[float]
+    min_j: float
+    min_at_s: float
+    time_below_s: Dict[float, float]
+
+
+def _linear_recurrence(a: np.ndarray, b: np.ndarray, y0: float) -> np.ndarray:
+    """
+    Solve y[t] = a[t] * y[t - 1] + b[t] (0 < a <= 1) without a Python loop per sample.
+    
+    Within a block, y[t] = A[t] * (y0 + sum(b[u] / A[u])) with A the running
+    product of ``a``; blocks of ``_RECURRENCE_BLOCK`` keep 1 / A from
+    overflowing, and each block starts from the last value of the previous.
+    """
+    y = np.empty(len(b))
+    for start in range(0, len(b), _RECURRENCE_BLOCK):
+        stop = min(start + _RECURRENCE_BLOCK, len(b))
+        decay = np.cumprod(a[start:stop])
+        y[start:stop] = decay * (y0 + np.cumsum(b[start:stop] / decay))
+        y0 = y[stop - 1]
+    return y
+
+
+def calculate_w_prime_balance(
+    power_samples: Union[List[float], np.ndarray],
+    cp: float,
+    w_prime: float,
+    sample_rate_hz: float = 1,
+    model: str = 'differential',
+) -> WPrimeBalance:
+    """
+    Calculate the W′ balance (W′bal) trace of a workout in linear time.
+    
+    Models:
+        differential (default): Skiba et al. (2015). Above CP, W′bal falls
+            by (P - CP) * dt; below CP it recovers by
+            (W′ - W′bal) * (CP - P) / W′ * dt, a recurrence over the power
+            array that needs no workout-wide constant.
+        integral: Skiba et al. (2012). W′bal(t) = W′ - sum over u <= t of
+            W′exp(u) * exp(-(t - u) / tau), with W′exp the work above CP and
+            tau = 546 * exp(-0.01 * D_CP) + 316, D_CP = CP - mean power of
+            the samples below CP. With tau fixed for the workout the sum
+            obeys S(t) = exp(-dt / tau) * S(t - 1) + W′exp(t), so the
+            textbook O(n^2) integral is evaluated exactly in O(n).
+    
+    Args:
+        power_samples: Power in watts on an even time grid (gaps as 0)
+        cp: Critical Power in watts
+        w_prime: W′ in joules
+        sample_rate_hz: Sample rate in Hz (default 1)
+        model: ``'differential'`` (default) or ``'integral'``
+        
+    Returns:
+        WPrimeBalance with the full trace, its minimum and time below
+        ``W_PRIME_BAL_FRACTIONS`` of W′
+        
+    Raises:
+        ValueError: If power_samples is empty, cp/w_prime/sample_rate_hz
+            are not positive, or the model is unknown
+        
+    Reference:
+        Skiba, P. F., et al. (2015). Intramuscular determinants of the
+        ability to recover work capacity above critical power. EJAP 115(4).
+        Skiba, P. F., et al. (2012). Modeling the expenditure and
+        reconstitution of work capacity above critical power. MSSE 44(8).
+        
+    Example:
+        >>> # 3 min at 400 W on CP 300 W / W′ 20 kJ: 18 kJ above CP
+        >>> power = np.concatenate([np.full(300, 150.0), np.full(180, 400.0), np.full(600, 150.0)])
+        >>> balance = calculate_w_prime_balance(power, cp=300, w_prime=20000)
+        >>> round(balance.min_j), balance.min_at_s
+        (2000, 479.0)
+        >>> # The integral model reconstitutes part of it while still riding
+        >>> round(calculate_w_prime_balance(power, 300, 20000, model='integral').min_j)
+        5224
+    """
+    if len(power_samples) == 0:
+        raise ValueError("power_samples cannot be empty")
+    if cp <= 0 or w_prime <= 0:
+        raise ValueError("cp and w_prime must be positive")
+    if sample_rate_hz <= 0:
+        raise ValueError("sample_rate_hz must be positive")
+    power = np.asarray(power_samples, dtype=np.float64)
+    dt = 1.0 / sample_rate_hz
+    above = np.maximum(power - cp, 0.0) * dt
+    
+    tau = None
+    if model == 'integral':
+        below = power < cp
+        d_cp = cp - power[below].mean() if below.any() else 0.0
+        tau = 546.0 * np.exp(-0.01 * d_cp) + 316.0
+        decay = np.full(len(power), np.exp(-dt / tau))
+        trace = w_prime - _linear_recurrence(decay, above, 0.0)
+    elif model == 'differential':
+        # Below CP: W′bal <- W′bal * (1 - k) + W′ * k with k = (CP - P) dt / W′
+        recovery = np.maximum(cp - power, 0.0) * dt / w_prime
+        trace = _linear_recurrence(1.0 - np.minimum(recovery, 1.0), w_prime * recovery - above, w_prime)
+    else:
+        raise ValueError(f"Unknown W′bal model '{model}' (expected 'integral' or 'differential')")
+    
+    lowest = int(np.argmin(trace))
+    return WPrimeBalance(
+        trace_j=trace,
+        w_prime_j=float(w_prime),
+        cp_w=float(cp),
+        tau_s=float(tau) if tau is not None else None,
+        min_j=float(trace[lowest]),
+        min_at_s=lowest * dt,
+        time_below_s={
+            fraction: float(np.count_nonzero(trace < fraction * w_prime) * dt)
+            for fraction in W_PRIME_BAL_FRACTIONS
+        },
+    )
+
+
+def calculate_w_prime_balance_for_athlete(
+    power_samples: Union[List[float], np.ndarray],
+    athlete: Athlete,
+    sample_rate_hz: float = 1,
+    model: str = 'differential',
+) -> WPrimeBalance:
+    """
+    W′bal with CP and W′ taken from an athlete's thresholds.
+    
+    CP is ``athlete.cp`` (FTP if CP is unset); for running athletes ``cp``
+    is a pace, so only FTP is used.
+    
+    Raises:
+        ValueError: If the athlete has no CP/FTP or no W′
+    """
+    cp = athlete.cp if athlete.sport != 'running' and athlete.cp else athlete.ftp
+    if not cp or not athlete.w_prime:
+        raise ValueError("W′bal needs the athlete's CP (or FTP) and W′")
+    return calculate_w_prime_balance(power_samples, cp, athlete.w_prime, sample_rate_hz, model)
+
+
+# Athletes x days cells per block in banister_loads_batch (~2 MB per temporary)
+_LOAD_BLOCK_CELLS = 1 << 18
+
+# Shorter single-athlete series (e.g. an incremental update) run as a plain
+# loop, which beats the vectorized pass's setup cost
+_LOAD_LOOP_DAYS = 32
+
+
+def _ewm_recurrence(
+    values: np.ndarray,
+    tau: np.ndarray,
+    y0: np.ndarray,
+    first_day: np.ndarray,
+) -> np.ndarray:
+    """
+    Row-wise y[t] = y[t - 1] + (x[t] - y[t - 1]) / tau, from y0 on the day before each row's first day.
+    
+    ``values`` must be 0 before a row's first day, where the result is 0.
+    The previous load enters as an extra input on the first day, so every
+    row solves y[t] = keep * y[t - 1] + b[t] from 0 with a constant
+    ``keep``; the blocked closed form of ``_linear_recurrence`` then needs
+    only one table of decay powers, shared by all blocks.
+    """
+    athletes, days = values.shape
+    alpha = 1.0 / tau
+    keep = 1.0 - alpha
+    b = alpha[:, None] * values
+    rows = np.flatnonzero(first_day < days)
+    b[rows, first_day[rows]] += keep[rows] * y0[rows]
+
+    # tau = 1 day: the load is just that day's TSS (and 1 / keep would divide by 0)
+    instant = keep == 0
+    if instant.all():
+        return b
+    decay = np.where(instant, 1.0, keep)
+    # Shorter blocks for fast decay, so keep ** block can't underflow
+    block = max(1, min(_RECURRENCE_BLOCK, days, int(600 / -np.log(decay.min()))))
+    powers = decay[:, None] ** np.arange(1, block + 1)
+    inverse = 1.0 / powers
+
+    y = np.empty(values.shape)
+    carry = np.zeros((athletes, 1))
+    for start in range(0, days, block):
+        stop = min(start + block, days)
+        width = stop - start
+        y[:, start:stop] = powers[:, :width] * (carry + np.cumsum(b[:, start:stop] * inverse[:, :width], axis=1))
+        carry = y[:, stop - 1:stop]
+    y[instant] = b[instant]
+    return y
+
+
+def _load_taus(constants: Union[LoadConstants, Sequence[LoadConstants], None], athletes: int):
+    """ATL and CTL time constants per athlete."""
+    if constants is None:
+        constants = LoadConstants()
+    if isinstance(constants, LoadConstants):
+        constants = [constants] * athletes
+    elif len(constants) != athletes:
+        raise ValueError(f"Got {len(constants)} load constants for {athletes} athletes")
+    atl_tau = np.array([c.atl_tau_days for c in constants], dtype=np.float64)
+    ctl_tau = np.array([c.ctl_tau_days for c in constants], dtype=np.float64)
+    if (atl_tau < 1).any() or (ctl_tau < 1).any():
+        raise ValueError("Load time constants must be at least 1 day")
+    return atl_tau, ctl_tau
+
+
+def banister_loads(
+    daily_tss: Union[List[float], np.ndarray],
+    constants: Optional[LoadConstants] = None,
+    atl0: Optional[float] = None,
+    ctl0: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ATL and CTL over consecutive days with the Banister recurrence.
+    
+    load[t] = load[t - 1] + (tss[t] - load[t - 1]) / tau, the same as
+    pandas ``ewm(alpha=1/tau, adjust=False)``. Passing the loads of the day
+    before ``daily_tss[0]`` continues an existing series, so appending days
+    costs O(new days) rather than a rerun over the whole history.
+    
+    Args:
+        daily_tss: TSS per day, one entry per consecutive day (rest days 0)
+        constants: Time constants (default 7/42 days)
+        atl0: ATL on the day before the first entry (default: start from
+            the first day's TSS, as ``compute_chronic_and_acute_loads``)
+        ctl0: CTL on the day before the first entry (same default)
+    
+    Returns:
+        Tuple of (atl, ctl) arrays, one value per day
+    
+    Raises:
+        ValueError: If a time constant is shorter than one day
+    
+    Example:
+        >>> atl, ctl = banister_loads([100, 0, 50])
+        >>> atl, ctl = banister_loads(new_days, atl0=atl[-1], ctl0=ctl[-1])
+    """
+    tss = np.asarray(daily_tss, dtype=np.float64)
+    if len(tss) == 0:
+        return np.zeros(0), np.zeros(0)
+    if len(tss) < _LOAD_LOOP_DAYS:
+        (atl_tau,), (ctl_tau,) = _load_taus(constants, 1)
+        atl, ctl = np.empty(len(tss)), np.empty(len(tss))
+        atl_day = tss[0] if atl0 is None else float(atl0)
+        ctl_day = tss[0] if ctl0 is None else float(ctl0)
+        for day, value in enumerate(tss.tolist()):
+            atl_day += (value - atl_day) / atl_tau
+            ctl_day += (value - ctl_day) / ctl_tau
+            atl[day], ctl[day] = atl_day, ctl_day
+        return atl, ctl
+    atl, ctl = banister_loads_batch(
+        tss[None, :],
+        constants,
+        atl0=[tss[0] if atl0 is None else atl0],
+        ctl0=[tss[0] if ctl0 is None else ctl0],
+    )
+    return atl[0], ctl[0]
+
+
+def banister_loads_batch(
+    daily_tss: np.ndarray,
+    constants: Union[LoadConstants, Sequence[LoadConstants], None] = None,
+    atl0: Optional[Union[Sequence[float], np.ndarray]] = None,
+    ctl0: Optional[Union[Sequence[float], np.ndarray]] = None,
+    first_day: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ATL and CTL for many athletes at once from an athletes x days TSS matrix.
+    
+    Every athlete's recurrence runs in the same vectorized pass (blocked
+    closed form, see ``_ewm_recurrence``), so a team costs a few array
+    operations per block of days rather than one pandas pipeline each.
+    
+    Args:
+        daily_tss: Athletes x consecutive days matrix of daily TSS
+        constants: One ``LoadConstants`` for everyone or one per athlete
+            (default 7/42 days)
+        atl0: Per-athlete ATL on the day before the first column, to
+            continue existing series (default: seed as ``first_day``)
+        ctl0: Per-athlete CTL on the day before the first column
+        first_day: Column of each athlete's first training day; loads start
+            from that day's TSS and are 0 before it, where TSS is ignored
+            (default: first column with TSS, or column 0 when
+            ``atl0``/``ctl0`` are given)
+    
+    Returns:
+        Tuple of (atl, ctl) matrices shaped like ``daily_tss``
+    
+    Raises:
+        ValueError: If the constants don't match the athletes or a time
+            constant is shorter than one day
+    
+    Example:
+        >>> tss = np.zeros((300, 365)); tss[:, ::2] = 80
+        >>> atl, ctl = banister_loads_batch(tss)
+        >>> tsb_today = ctl[:, -1] - atl[:, -1]
+    """
+    tss = np.atleast_2d(np.asarray(daily_tss, dtype=np.float64))
+    athletes, days = tss.shape
+    atl_tau, ctl_tau = _load_taus(constants, athletes)
+    if days == 0:
+        return np.zeros(tss.shape), np.zeros(tss.shape)
+
+    if first_day is not None:
+        first_day = np.asarray(first_day, dtype=np.int64)
+        if (tss[np.arange(days) < first_day[:, None]] != 0).any():
+            tss = np.where(np.arange(days) >= first_day[:, None], tss, 0.0)
+    elif atl0 is None and ctl0 is None:
+        trained = tss > 0
+        first_day = np.where(trained.any(axis=1), trained.argmax(axis=1), days)
+    else:
+        first_day = np.zeros(athletes, dtype=np.int64)
+    seed = tss[np.arange(athletes), np.minimum(first_day, days - 1)]
+    atl0 = seed if atl0 is None else np.broadcast_to(np.asarray(atl0, dtype=np.float64), (athletes,))
+    ctl0 = seed if ctl0 is None else np.broadcast_to(np.asarray(ctl0, dtype=np.float64), (athletes,))
+
+    # Blocks of whole athletes keep the temporaries small and reused
+    atl = np.empty(tss.shape)
+    ctl = np.empty(tss.shape)
+    step = max(1, _LOAD_BLOCK_CELLS // days)
+    for start in range(0, athletes, step):
+        rows = slice(start, start + step)
+        atl[rows] = _ewm_recurrence(tss[rows], atl_tau[rows], atl0[rows], first_day[rows])
+        ctl[rows] = _ewm_recurrence(tss[rows], ctl_tau[rows], ctl0[rows], first_day[rows])
+    return atl, ctl
+
+
+# Activity TSS estimate when none is recorded: 100 * hours * IF, with this
+# IF when the activity has none (placeholder for sport-specific load models)
+DEFAULT_INTENSITY_FACTOR = 0.7
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def activities_to_arrays(activities: List[Activity]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Day and TSS of each activity as typed arrays, in one pass over the models.
+
+    Missing TSS is estimated conservatively from duration and intensity
+    factor (``DEFAULT_INTENSITY_FACTOR`` when that is missing too).
+
+    Args:
+        activities: Activities in any order
+
+    Returns:
+        Tuple of (days since 1970-01-01 as int64, TSS as float64)
+    """
+    if not activities:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    # None becomes NaN in the float64 table
+    table = np.array(
+        [(a.activity_date.toordinal(), a.duration_min, a.tss, a.intensity_factor) for a in activities],
+        dtype=np.float64,
     )
-    daily["date"] = pd.to_datetime(daily["date"])  # ensure datetime index compatibility
-    return daily
+    days = table[:, 0].astype(np.int64) - _EPOCH_ORDINAL
+    intensity_factor = np.where(np.isnan(table[:, 3]), DEFAULT_INTENSITY_FACTOR, table[:, 3])
+    tss = np.where(np.isnan(table[:, 2]), 100.0 * table[:, 1] / 60.0 * intensity_factor, table[:, 2])
+    return days, tss
+
+
+def activities_to_dataframe(activities: List[Activity]) -> pd.DataFrame:
+    if not activities:
+        return pd.DataFrame(columns=["date", "tss"]).astype({"date": "datetime64[ns]", "tss": "float64"})
+
+    # Consolidate to daily TSS in case of multiple workouts per day
+    days, tss = activities_to_arrays(activities)
+    active_days, day_index = np.unique(days, return_inverse=True)
+    return pd.DataFrame({
+        "date": active_days.astype("datetime64[D]").astype("datetime64[ns]"),
+        "tss": np.bincount(day_index, weights=tss),
+    })
 
 
 def compute_chronic_and_acute_loads(
@@ -257,18 +927,77 @@ def compute_chronic_and_acute_loads(
     return df[["date", "tss", "atl", "ctl", "tsb"]]
 
 
-def compute_metrics_daily(activities: List[Activity]) -> List[MetricsDaily]:
-    daily = activities_to_dataframe(activities)
-    metrics_df = compute_chronic_and_acute_loads(daily)
-    results: List[MetricsDaily] = []
-    for row in metrics_df.itertuples(index=False):
-        results.append(
-            MetricsDaily(
-                metric_date=row.date.date() if isinstance(row.date, pd.Timestamp) else row.date,
-                tss=float(row.tss),
-                atl=float(row.atl),
-                ctl=float(row.ctl),
-                tsb=float(row.tsb),
+def _metrics_daily_row_template() -> str:
+    """JSON object for one ``MetricsDaily`` row, in field order, with unset fields null."""
+    values = {"metric_date": '"%s"', "tss": "%r", "atl": "%r", "ctl": "%r", "tsb": "%r"}
+    return "{" + ",".join(f'"{name}":{values.get(name, "null")}' for name in MetricsDaily.model_fields) + "}"
+
+
+_METRICS_DAILY_ROW = _metrics_daily_row_template()
+
+
+@dataclass
+class DailyLoads:
+    """
+    Daily PMC values as columns, one entry per consecutive day.
+
+    Attributes:
+        dates: Days (datetime64[D])
+        tss: Daily TSS (0 on rest days)
+        atl: Acute Training Load
+        ctl: Chronic Training Load
+    """
+    dates: np.ndarray
+    tss: np.ndarray
+    atl: np.ndarray
+    ctl: np.ndarray
+
+    @property
+    def tsb(self) -> np.ndarray:
+        return self.ctl - self.atl
+
+    def to_metrics(self) -> List[MetricsDaily]:
+        """``MetricsDaily`` rows, built without re-validating computed values."""
+        return [
+            MetricsDaily.model_construct(metric_date=day, tss=tss, atl=atl, ctl=ctl, tsb=tsb)
+            for day, tss, atl, ctl, tsb in zip(
+                self.dates.tolist(), self.tss.tolist(), self.atl.tolist(), self.ctl.tolist(), self.tsb.tolist()
             )
+        ]
+
+    def to_json(self) -> bytes:
+        """JSON array of ``MetricsDaily`` objects, formatted straight from the columns."""
+        rows = zip(
+            self.dates.astype(str).tolist(), self.tss.tolist(), self.atl.tolist(), self.ctl.tolist(), self.tsb.tolist()
         )
-    return results
+        return ("[" + ",".join(_METRICS_DAILY_ROW % row for row in rows) + "]").encode()
+
+
+def daily_loads(activities: List[Activity], constants: Optional[LoadConstants] = None) -> DailyLoads:
+    """
+    Daily TSS, ATL and CTL from activities without building a DataFrame.
+
+    Same values as ``compute_chronic_and_acute_loads(activities_to_dataframe(...))``:
+    TSS is binned per day with ``np.bincount`` from the first to the last
+    activity day and the loads come from ``banister_loads``.
+
+    Args:
+        activities: Activities in any order
+        constants: Time constants (default 7/42 days)
+
+    Returns:
+        DailyLoads (empty without activities)
+    """
+    days, tss = activities_to_arrays(activities)
+    if len(days) == 0:
+        empty = np.zeros(0)
+        return DailyLoads(np.zeros(0, dtype="datetime64[D]"), empty, empty, empty)
+    first = days.min()
+    daily_tss = np.bincount(days - first, weights=tss)
+    atl, ctl = banister_loads(daily_tss, constants)
+    dates = np.arange(first, first + len(daily_tss)).astype("datetime64[D]")
+    return DailyLoads(dates, daily_tss, atl, ctl)
+
+
+def compute_metrics_daily(activities: List[Activity]) -> List[MetricsDaily]:
+    return daily_loads(activities).to_metrics()
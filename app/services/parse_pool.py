@@ -0,0 +1,120 @@
+"""
+Bounded worker pool for CPU-heavy workout file parsing.
+
+FIT decoding is pure Python and holds the GIL, so running it on the event
+loop (or in a thread) stalls every other request. ``ParsePool`` runs parse
+jobs in a process pool and caps the number of jobs in flight: at most
+``max_workers`` run at once and at most ``queue_depth`` more wait. Beyond
+that, ``ParsePoolSaturatedError`` is raised so the API can shed load with a
+503 instead of letting latency grow without limit.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_QUEUE_DEPTH = 8
+
+
+class ParsePoolSaturatedError(Exception):
+    """Raised when the parse pool has no free worker or queue slot."""
+    pass
+
+
+def _default_executor(max_workers: int) -> Executor:
+    # spawn: forking a process that runs an event loop and worker threads can
+    # inherit held locks
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+class ParsePool:
+    """
+    Process pool with a fixed concurrency limit and queue depth.
+
+    The in-flight counter is only touched from the event loop thread, so it
+    needs no lock.
+
+    Args:
+        max_workers: Number of worker processes (parse concurrency limit)
+        queue_depth: Number of jobs allowed to wait for a free worker
+        executor_factory: Builds the executor from ``max_workers``
+            (defaults to a spawn-based ProcessPoolExecutor)
+
+    Example:
+        >>> pool = ParsePool(max_workers=2, queue_depth=4)
+        >>> workout, samples = await pool.run(parse_fit_file, data, 1)
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        queue_depth: int = DEFAULT_QUEUE_DEPTH,
+        executor_factory: Optional[Callable[[int], Executor]] = None,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if queue_depth < 0:
+            raise ValueError("queue_depth cannot be negative")
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self._executor_factory = executor_factory or _default_executor
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+
+    @classmethod
+    def from_env(cls) -> "ParsePool":
+        """Create a pool sized by AUTOCOACH_PARSE_WORKERS / AUTOCOACH_PARSE_QUEUE_DEPTH."""
+        max_workers = int(os.getenv("AUTOCOACH_PARSE_WORKERS", DEFAULT_MAX_WORKERS))
+        queue_depth = int(os.getenv("AUTOCOACH_PARSE_QUEUE_DEPTH", DEFAULT_QUEUE_DEPTH))
+        return cls(max_workers=max_workers, queue_depth=queue_depth)
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of jobs running or waiting at once."""
+        return self.max_workers + self.queue_depth
+
+    @property
+    def in_flight(self) -> int:
+        """Number of jobs currently running or waiting."""
+        return self._in_flight
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run ``fn(*args, **kwargs)`` in a worker and await its result.
+
+        ``fn`` and its arguments must be picklable for process workers.
+
+        Raises:
+            ParsePoolSaturatedError: If ``capacity`` jobs are already in flight
+        """
+        if self._in_flight >= self.capacity:
+            raise ParsePoolSaturatedError(
+                f"Parse pool saturated ({self._in_flight} jobs in flight)"
+            )
+        if self._executor is None:
+            self._executor = self._executor_factory(self.max_workers)
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self._in_flight -= 1
+
+    def shutdown(self) -> None:
+        """Stop the worker processes (pending jobs are cancelled)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
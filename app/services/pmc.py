@@ -0,0 +1,353 @@
+"""
+Incrementally maintained Performance Management Chart (ATL/CTL/TSB) per athlete.
+
+``compute_chronic_and_acute_loads`` reruns the EWMs over an athlete's whole
+history. ``PmcCache`` instead keeps each athlete's daily TSS, ATL and CTL
+series and listens to the ``WorkoutStore``: a new, edited or re-thresholded
+workout only marks the series stale from its date. The next read restarts
+the Banister recurrence from the loads of the day before and recomputes
+forward, so adding today's ride to ten years of history costs one day, not
+3,650. Several edits before a read are coalesced into one recompute from
+the earliest of them.
+
+With a storage root, each athlete's series is also kept on disk in
+``<root>/<athlete_id>.pmc``: a header (first day and time constants)
+followed by one (tss, atl, ctl) float64 row per day. An invalidation
+truncates the file at the stale day and a refresh appends the recomputed
+rows, so disk writes are as incremental as the recompute and a restart
+resumes from the stored loads instead of replaying every athlete's history.
+
+``team_loads`` covers the dashboard case: every athlete of a team on one
+athletes x days TSS matrix, solved in a single vectorized pass with
+per-athlete time constants.
+"""
+from __future__ import annotations
+
+import struct
+from array import array
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.schemas.training import MetricsDaily
+from app.services.metrics import LoadConstants, banister_loads, banister_loads_batch
+from app.services.storage import atomic_write
+from app.services.workout_store import WorkoutStore
+
+_EPOCH = date(1970, 1, 1)
+
+# Persisted series: magic, first day, ATL/CTL time constants, then rows
+_FILE_HEADER = struct.Struct("<8sqdd")
+_FILE_MAGIC = b"PMCLOAD1"
+_ROW_BYTES = 3 * 8
+
+
+class _AthleteLoads:
+    """Daily TSS/ATL/CTL of one athlete from its first workout day (``array`` buffers)."""
+
+    def __init__(self, first_day: int) -> None:
+        self.first_day = first_day
+        self.tss = array("d")
+        self.atl = array("d")
+        self.ctl = array("d")
+        self.stale_from: Optional[int] = first_day
+
+    def __len__(self) -> int:
+        return len(self.tss)
+
+    def truncate(self, length: int) -> None:
+        for buffer in (self.tss, self.atl, self.ctl):
+            del buffer[length:]
+
+    def extend(self, tss: np.ndarray, atl: np.ndarray, ctl: np.ndarray) -> None:
+        for buffer, values in ((self.tss, tss), (self.atl, atl), (self.ctl, ctl)):
+            buffer.frombytes(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+
+
+@dataclass
+class PmcState:
+    """Loads on an athlete's last day with training."""
+    athlete_id: int
+    last_date: date
+    atl: float
+    ctl: float
+
+    @property
+    def tsb(self) -> float:
+        return self.ctl - self.atl
+
+
+@dataclass
+class TeamLoads:
+    """
+    Daily loads of several athletes on a shared calendar.
+
+    Attributes:
+        athlete_ids: Athlete of each row
+        dates: Days of the columns (datetime64[D])
+        tss: Athletes x days daily TSS
+        atl: Acute Training Load (0 before an athlete's first workout)
+        ctl: Chronic Training Load (0 before an athlete's first workout)
+    """
+    athlete_ids: List[int]
+    dates: np.ndarray
+    tss: np.ndarray
+    atl: np.ndarray
+    ctl: np.ndarray
+
+    @property
+    def tsb(self) -> np.ndarray:
+        return self.ctl - self.atl
+
+
+def team_loads(
+    workout_store: WorkoutStore,
+    athlete_ids: Sequence[int],
+    constants: Optional[Mapping[int, LoadConstants]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> TeamLoads:
+    """
+    ATL/CTL/TSB of a team from stored workouts in one vectorized pass.
+
+    Each athlete's loads start at their first stored workout (as
+    ``PmcCache``), so rows match the per-athlete series.
+
+    Args:
+        workout_store: Source of daily TSS
+        athlete_ids: Team members
+        constants: Time constants per athlete ID (default 7/42 days)
+        start: First day returned (default: earliest first workout)
+        end: Last day returned (default: last workout of any athlete)
+
+    Returns:
+        TeamLoads with one row per athlete in ``athlete_ids`` order
+    """
+    dates, tss, first_day = workout_store.daily_tss_matrix(athlete_ids, end=end)
+    constants = constants or {}
+    per_athlete = [constants.get(athlete_id, LoadConstants()) for athlete_id in athlete_ids]
+    atl, ctl = banister_loads_batch(tss, per_athlete, first_day=first_day)
+    first = 0
+    if start is not None and len(dates):
+        first = max(0, (start - dates[0].astype(date)).days)
+    return TeamLoads(
+        athlete_ids=list(athlete_ids),
+        dates=dates[first:],
+        tss=tss[:, first:],
+        atl=atl[:, first:],
+        ctl=ctl[:, first:],
+    )
+
+
+class PmcCache:
+    """
+    Per-athlete PMC series kept up to date from a ``WorkoutStore``.
+
+    Args:
+        workout_store: Source of daily TSS; the cache subscribes to it
+        constants: ATL/CTL time constants (default 7/42 days)
+        root: Directory to persist the series in (see ``open``), or None
+            for memory only
+
+    Example:
+        >>> cache = PmcCache(workout_store)
+        >>> workout_store.add(key, todays_ride)     # marks day N stale
+        >>> cache.metrics_daily(athlete_id)         # recomputes day N only
+    """
+
+    def __init__(
+        self,
+        workout_store: WorkoutStore,
+        constants: Optional[LoadConstants] = None,
+        root: Optional[Union[str, Path]] = None,
+    ) -> None:
+        self.workout_store = workout_store
+        self.constants = constants or LoadConstants()
+        self._athletes: Dict[int, _AthleteLoads] = {}
+        self.root: Optional[Path] = None
+        # Days recomputed by refreshes (for tests and benchmarks)
+        self.days_recomputed = 0
+        workout_store.subscribe(self.invalidate)
+        if root is not None:
+            self.open(root)
+
+    def open(self, root: Union[str, Path]) -> None:
+        """
+        Persist series under ``root`` and resume from what is stored there.
+
+        Athletes are loaded lazily on first use. Stored series are trusted
+        up to their last row; days the store holds beyond it are computed
+        on the next read. Files written with other time constants are
+        ignored and rebuilt.
+
+        Args:
+            root: Directory holding one ``<athlete_id>.pmc`` per athlete
+        """
+        self.root = Path(root)
+        self._athletes.clear()
+
+    def invalidate(self, athlete_id: int, changed_from: date) -> None:
+        """
+        Mark an athlete's loads stale from a date (``TssChangeListener``).
+
+        Args:
+            athlete_id: Athlete ID
+            changed_from: Earliest date whose daily TSS changed
+        """
+        day = (changed_from - _EPOCH).days
+        loads = self._loads(athlete_id)
+        if loads is None:
+            # Nothing cached yet: the next read starts from the whole history,
+            # which may already reach back before this change
+            return
+        if day < loads.first_day:
+            # History now starts earlier: the seed day moved
+            loads = self._athletes[athlete_id] = _AthleteLoads(day)
+            self._write(athlete_id, loads, 0)
+        elif loads.stale_from is None or day < loads.stale_from:
+            loads.stale_from = day
+            self._write(athlete_id, loads, min(day - loads.first_day, len(loads)), rows=False)
+
+    def state(self, athlete_id: int) -> Optional[PmcState]:
+        """Current loads on the athlete's last day with training (None if unknown)."""
+        loads = self._refresh(athlete_id)
+        if loads is None:
+            return None
+        return PmcState(
+            athlete_id=athlete_id,
+            last_date=_EPOCH + timedelta(days=loads.first_day + len(loads) - 1),
+            atl=loads.atl[-1],
+            ctl=loads.ctl[-1],
+        )
+
+    def series(
+        self,
+        athlete_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Daily TSS, ATL and CTL over a date range.
+
+        Days after the last workout (up to ``end``) continue the recurrence
+        with zero TSS; they are computed per read and not stored.
+
+        Args:
+            athlete_id: Athlete ID
+            start: First day returned (default: first workout day)
+            end: Last day returned (default: last workout day)
+
+        Returns:
+            Tuple of (dates as datetime64[D], tss, atl, ctl); empty if the
+            athlete has no workouts
+        """
+        loads = self._refresh(athlete_id)
+        if loads is None:
+            empty = np.zeros(0)
+            return np.zeros(0, dtype="datetime64[D]"), empty, empty, empty
+
+        tss = np.frombuffer(loads.tss)
+        atl = np.frombuffer(loads.atl)
+        ctl = np.frombuffer(loads.ctl)
+        last_day = loads.first_day + len(loads) - 1
+        end_day = last_day if end is None else (end - _EPOCH).days
+        if end_day > last_day:
+            rest = np.zeros(end_day - last_day)
+            rest_atl, rest_ctl = banister_loads(rest, self.constants, atl0=atl[-1], ctl0=ctl[-1])
+            tss, atl, ctl = (np.concatenate(pair) for pair in ((tss, rest), (atl, rest_atl), (ctl, rest_ctl)))
+
+        first = 0 if start is None else max(0, (start - _EPOCH).days - loads.first_day)
+        stop = max(first, end_day - loads.first_day + 1)
+        dates = np.arange(loads.first_day + first, loads.first_day + stop).astype("datetime64[D]")
+        return dates, tss[first:stop], atl[first:stop], ctl[first:stop]
+
+    def metrics_daily(
+        self,
+        athlete_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> List[MetricsDaily]:
+        """Daily PMC rows for an athlete (see ``series``)."""
+        dates, tss, atl, ctl = self.series(athlete_id, start, end)
+        return [
+            MetricsDaily(
+                athlete_id=athlete_id,
+                metric_date=day,
+                tss=float(day_tss),
+                atl=float(day_atl),
+                ctl=float(day_ctl),
+                tsb=float(day_ctl - day_atl),
+            )
+            for day, day_tss, day_atl, day_ctl in zip(dates.tolist(), tss, atl, ctl)
+        ]
+
+    def _refresh(self, athlete_id: int) -> Optional[_AthleteLoads]:
+        """Recompute an athlete's stale days from the loads of the day before."""
+        loads = self._loads(athlete_id)
+        if loads is None:
+            # Stored before this cache subscribed: start from the whole history
+            dates, tss = self.workout_store.daily_tss(athlete_id)
+            if len(tss) == 0:
+                return None
+            loads = self._athletes[athlete_id] = _AthleteLoads(int(dates[0].astype(np.int64)))
+            keep = 0
+        elif loads.stale_from is None:
+            return loads
+        else:
+            # Keep the days before the edit; an edit past the end recomputes
+            # the rest days in between (daily_tss bins them as 0)
+            keep = min(loads.stale_from - loads.first_day, len(loads))
+            _, tss = self.workout_store.daily_tss(athlete_id, start=_EPOCH + timedelta(days=loads.first_day + keep))
+
+        atl0 = loads.atl[keep - 1] if keep else None
+        ctl0 = loads.ctl[keep - 1] if keep else None
+        atl, ctl = banister_loads(tss, self.constants, atl0=atl0, ctl0=ctl0)
+        loads.truncate(keep)
+        loads.extend(tss, atl, ctl)
+        loads.stale_from = None
+        self.days_recomputed += len(tss)
+        self._write(athlete_id, loads, keep)
+        return loads
+
+    def _path(self, athlete_id: int) -> Path:
+        return self.root / f"{athlete_id}.pmc"
+
+    def _loads(self, athlete_id: int) -> Optional[_AthleteLoads]:
+        """In-memory loads, else the persisted series (None if neither)."""
+        loads = self._athletes.get(athlete_id)
+        if loads is not None or self.root is None:
+            return loads
+        try:
+            data = self._path(athlete_id).read_bytes()
+            magic, first_day, atl_tau, ctl_tau = _FILE_HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        if magic != _FILE_MAGIC or (atl_tau, ctl_tau) != (self.constants.atl_tau_days, self.constants.ctl_tau_days):
+            return None
+        rows = (len(data) - _FILE_HEADER.size) // _ROW_BYTES   # drops a torn last row
+        table = np.frombuffer(data, dtype="<f8", count=rows * 3, offset=_FILE_HEADER.size).reshape(rows, 3)
+        loads = self._athletes[athlete_id] = _AthleteLoads(first_day)
+        loads.extend(table[:, 0], table[:, 1], table[:, 2])
+        loads.stale_from = first_day + rows
+        return loads
+
+    def _write(self, athlete_id: int, loads: _AthleteLoads, keep: int, rows: bool = True) -> None:
+        """Truncate the persisted series to ``keep`` days, then append the rest."""
+        if self.root is None:
+            return
+        path = self._path(athlete_id)
+        if keep == 0 or not path.exists():
+            header = _FILE_HEADER.pack(
+                _FILE_MAGIC, loads.first_day, self.constants.atl_tau_days, self.constants.ctl_tau_days
+            )
+            atomic_write(path, header)
+            keep = 0
+        with path.open("r+b") as f:
+            f.truncate(_FILE_HEADER.size + keep * _ROW_BYTES)
+            if rows and len(loads) > keep:
+                f.seek(0, 2)
+                table = np.column_stack([np.frombuffer(buffer)[keep:] for buffer in (loads.tss, loads.atl, loads.ctl)])
+                f.write(table.astype("<f8").tobytes())
@@ -0,0 +1,363 @@
+"""
+Mean-maximal power curves per workout and a per-athlete best-curve index.
+
+Each workout's curve is computed once at ingestion (``session_power_curves``,
+a pipeline stage) on the shared ``MMP_DURATIONS_S`` grid and stored as a
+float32 row. ``PowerCurveIndex`` keeps, per athlete, the element-wise best
+curve of every day and of every ``BLOCK_DAYS``-day block, both maintained
+incrementally as workouts arrive. A query such as "best 20-minute power in
+the last 90 days" combines the block bests fully inside the range with the
+day bests at its edges, so it never rescans workouts: a 10-year season
+best touches ~115 block rows and at most ``2 * BLOCK_DAYS`` day rows.
+
+With a storage root (``PowerCurveIndex.open``), each athlete's curves are
+also appended to ``<root>/<athlete_id>.mmp``: a header with the duration
+grid, then one record per added (or removed) workout holding its key, day
+and float32 curve. A restart replays the records, which rebuilds the day
+and block bests without re-decoding a single upload.
+"""
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from app.services.file_parser import FitDecodeResult, split_sessions
+from app.services.metrics import MMP_DURATIONS_S, interpolate_power_curve, mean_max_power
+from app.services.sample_frame import SampleFrame
+from app.services.storage import atomic_write
+
+_EPOCH = date(1970, 1, 1)
+
+# Days per block of the best-curve index
+BLOCK_DAYS = 32
+
+# Recording gaps up to this long hold the last power value (smart
+# recording); longer gaps are stops and count as 0 W
+MAX_HOLD_S = 5
+
+# Persisted curves: magic and grid size, the float64 grid, then records of
+# (key length, day) + key bytes + float32 curve
+_FILE_HEADER = struct.Struct("<8sI")
+_FILE_MAGIC = b"MMPCURV1"
+_RECORD_HEADER = struct.Struct("<Hq")
+# Record day marking a removed workout
+_REMOVED = -(1 << 63)
+
+
+def power_on_grid(samples: SampleFrame) -> np.ndarray:
+    """
+    Resample a workout's valid power onto an even 1 s grid.
+
+    Args:
+        samples: Cleaned, time-ordered samples
+
+    Returns:
+        Power per second from the first to the last valid power sample
+        (empty if the workout has no power)
+    """
+    keep = samples.valid['power_w']
+    if not keep.any():
+        return np.zeros(0)
+    t = samples.t_s[keep].astype(np.int64)
+    power = samples.power_w[keep].astype(np.float64)
+    seconds = np.arange(t[0], t[-1] + 1)
+    last = np.searchsorted(t, seconds, side='right') - 1
+    return np.where(seconds - t[last] <= MAX_HOLD_S, power[last], 0.0)
+
+
+def workout_power_curve(samples: SampleFrame) -> Optional[np.ndarray]:
+    """Mean-max power curve of one workout on ``MMP_DURATIONS_S`` (None without power)."""
+    power = power_on_grid(samples)
+    return mean_max_power(power) if len(power) else None
+
+
+def session_power_curves(decoded: FitDecodeResult) -> List[Optional[np.ndarray]]:
+    """
+    Power curve per recorded session, aligned with ``summarize_sessions``.
+
+    Args:
+        decoded: Cleaned output of the decode stage
+
+    Returns:
+        One curve (or None for legs without power) per summarized workout
+    """
+    parts = [part for part in split_sessions(decoded) if len(part.samples)] or [decoded]
+    return [workout_power_curve(part.samples) for part in parts]
+
+
+@dataclass
+class _AthleteCurves:
+    """Curves of one athlete: per workout, best per day and per block."""
+    workouts: Dict[str, Tuple[int, np.ndarray]] = field(default_factory=dict)
+    day_keys: Dict[int, Set[str]] = field(default_factory=dict)
+    day_best: Dict[int, np.ndarray] = field(default_factory=dict)
+    block_best: Dict[int, np.ndarray] = field(default_factory=dict)
+
+
+def _best(curves: List[np.ndarray]) -> Optional[np.ndarray]:
+    """Element-wise max of curves, ignoring NaN (durations a ride didn't reach)."""
+    if not curves:
+        return None
+    return np.fmax.reduce(np.stack(curves), axis=0)
+
+
+class PowerCurveIndex:
+    """
+    Incrementally maintained best mean-max power per athlete.
+
+    Workouts are keyed like the ``WorkoutStore`` (upload content hash, with
+    ``:<leg>`` for multisport legs); adding a known key replaces its curve.
+
+    Args:
+        durations_s: Duration grid of the curves
+        root: Directory to persist the curves in (see ``open``), or None
+            for memory only
+
+    Example:
+        >>> index = PowerCurveIndex()
+        >>> index.add(1, "abc", date(2025, 6, 1), curve)
+        >>> index.best_power(1, 1200, start=date(2025, 3, 3))
+    """
+
+    def __init__(
+        self,
+        durations_s: np.ndarray = MMP_DURATIONS_S,
+        root: Optional[Union[str, Path]] = None,
+    ) -> None:
+        self.durations_s = durations_s
+        self._athletes: Dict[int, _AthleteCurves] = {}
+        self.root: Optional[Path] = None
+        if root is not None:
+            self.open(root)
+
+    def open(self, root: Union[str, Path]) -> None:
+        """
+        Load the curves persisted under ``root`` and persist changes there.
+
+        Later records for the same workout key replace earlier ones; a torn
+        final record (crash mid-append) is ignored, and files written for
+        another duration grid are skipped.
+
+        Args:
+            root: Directory holding one ``<athlete_id>.mmp`` per athlete
+        """
+        self.root = Path(root)
+        curve_bytes = self.durations_s.size * 4
+        for path in sorted(self.root.glob("*.mmp")):
+            if not path.stem.isdigit():
+                continue
+            data = path.read_bytes()
+            try:
+                magic, size = _FILE_HEADER.unpack_from(data)
+            except struct.error:
+                continue
+            offset = _FILE_HEADER.size + size * 8
+            if magic != _FILE_MAGIC or size != self.durations_s.size or not np.array_equal(
+                np.frombuffer(data, dtype="<f8", count=size, offset=_FILE_HEADER.size), self.durations_s
+            ):
+                continue
+            athlete_id = int(path.stem)
+            while offset + _RECORD_HEADER.size <= len(data):
+                key_size, day_number = _RECORD_HEADER.unpack_from(data, offset)
+                key_end = offset + _RECORD_HEADER.size + key_size
+                if key_end + curve_bytes > len(data):
+                    break
+                workout_key = data[key_end - key_size:key_end].decode()
+                if day_number == _REMOVED:
+                    curves = self._athletes.get(athlete_id)
+                    if curves is not None and workout_key in curves.workouts:
+                        self._remove(curves, workout_key)
+                else:
+                    curve = np.frombuffer(data, dtype="<f4", count=self.durations_s.size, offset=key_end)
+                    self._insert(athlete_id, workout_key, day_number, curve.astype(np.float32))
+                offset = key_end + curve_bytes
+
+    def __len__(self) -> int:
+        return sum(len(curves.workouts) for curves in self._athletes.values())
+
+    def __contains__(self, athlete_and_key: Tuple[int, str]) -> bool:
+        athlete_id, workout_key = athlete_and_key
+        curves = self._athletes.get(athlete_id)
+        return curves is not None and workout_key in curves.workouts
+
+    def add(self, athlete_id: int, workout_key: str, day: date, curve: np.ndarray) -> None:
+        """
+        Record (or replace) a workout's power curve.
+
+        Args:
+            athlete_id: Athlete ID
+            workout_key: Stable workout identity (upload content hash)
+            day: Workout date
+            curve: Mean-max power on ``durations_s`` (NaN past the ride's end)
+
+        Raises:
+            ValueError: If the curve doesn't match the index's duration grid
+        """
+        curve = np.asarray(curve, dtype=np.float32)
+        if curve.shape != self.durations_s.shape:
+            raise ValueError(f"Curve has {curve.size} points, expected {self.durations_s.size}")
+        day_number = (day - _EPOCH).days
+        self._insert(athlete_id, workout_key, day_number, curve)
+        self._append(athlete_id, workout_key, day_number, curve)
+
+    def remove(self, athlete_id: int, workout_key: str) -> bool:
+        """
+        Drop a workout's curve (e.g. a deleted workout).
+
+        Returns:
+            True if the workout was indexed
+        """
+        curves = self._athletes.get(athlete_id)
+        if curves is None or workout_key not in curves.workouts:
+            return False
+        self._remove(curves, workout_key)
+        self._append(athlete_id, workout_key, _REMOVED, np.zeros(self.durations_s.size, dtype=np.float32))
+        return True
+
+    def _insert(self, athlete_id: int, workout_key: str, day_number: int, curve: np.ndarray) -> None:
+        """Index a curve in memory, replacing any earlier curve for the key."""
+        curves = self._athletes.setdefault(athlete_id, _AthleteCurves())
+        if workout_key in curves.workouts:
+            self._remove(curves, workout_key)
+
+        curves.workouts[workout_key] = (day_number, curve)
+        curves.day_keys.setdefault(day_number, set()).add(workout_key)
+        # A new curve can only raise the bests: fold it in without rescanning
+        for table, slot in ((curves.day_best, day_number), (curves.block_best, day_number // BLOCK_DAYS)):
+            best = table.get(slot)
+            table[slot] = curve.copy() if best is None else np.fmax(best, curve)
+
+    def _append(self, athlete_id: int, workout_key: str, day_number: int, curve: np.ndarray) -> None:
+        """Append one record to the athlete's curve file (no-op without a root)."""
+        if self.root is None:
+            return
+        path = self.root / f"{athlete_id}.mmp"
+        if not path.exists():
+            header = _FILE_HEADER.pack(_FILE_MAGIC, self.durations_s.size)
+            atomic_write(path, header + np.asarray(self.durations_s, dtype="<f8").tobytes())
+        key = workout_key.encode()
+        with path.open("ab") as f:
+            f.write(_RECORD_HEADER.pack(len(key), day_number) + key + curve.astype("<f4").tobytes())
+
+    def best_curve(
+        self,
+        athlete_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Best mean-max power per duration over a date range.
+
+        Args:
+            athlete_id: Athlete ID
+            start: First day included (default: all history)
+            end: Last day included (default: all history)
+
+        Returns:
+            float32 curve on ``durations_s``, or None without workouts in range
+        """
+        curves = self._athletes.get(athlete_id)
+        if curves is None or not curves.day_best:
+            return None
+        first = (start - _EPOCH).days if start is not None else min(curves.day_best)
+        last = (end - _EPOCH).days if end is not None else max(curves.day_best)
+        if first > last:
+            return None
+
+        # Whole blocks inside [first, last] from the block index, the partial
+        # blocks at either edge from the day index
+        first_block = -(-first // BLOCK_DAYS)
+        last_block = (last + 1) // BLOCK_DAYS - 1
+        rows = [
+            best for block, best in curves.block_best.items()
+            if first_block <= block <= last_block
+        ]
+        if first_block > last_block:
+            edge_days = range(first, last + 1)
+        else:
+            edge_days = [
+                *range(first, first_block * BLOCK_DAYS),
+                *range((last_block + 1) * BLOCK_DAYS, last + 1),
+            ]
+        rows.extend(curves.day_best[day] for day in edge_days if day in curves.day_best)
+        return _best(rows)
+
+    def best_curves(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best curve of every athlete with workouts in a date range.
+
+        Args:
+            start: First day included (default: all history)
+            end: Last day included (default: all history)
+
+        Returns:
+            Tuple of (athlete IDs, float32 matrix with one curve per row)
+        """
+        athlete_ids: List[int] = []
+        rows: List[np.ndarray] = []
+        for athlete_id in self._athletes:
+            curve = self.best_curve(athlete_id, start, end)
+            if curve is not None:
+                athlete_ids.append(athlete_id)
+                rows.append(curve)
+        matrix = np.stack(rows) if rows else np.zeros((0, len(self.durations_s)), dtype=np.float32)
+        return np.array(athlete_ids, dtype=np.int64), matrix
+
+    def best_power(
+        self,
+        athlete_id: int,
+        duration_s: float,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Optional[float]:
+        """
+        Best average power for one duration over a date range.
+
+        Durations between grid points are interpolated (see
+        ``interpolate_power_curve``).
+
+        Args:
+            athlete_id: Athlete ID
+            duration_s: Effort duration in seconds
+            start: First day included (default: all history)
+            end: Last day included (default: all history)
+
+        Returns:
+            Watts, or None if no workout in range lasted that long with power
+        """
+        curve = self.best_curve(athlete_id, start, end)
+        if curve is None:
+            return None
+        watts = interpolate_power_curve(curve, duration_s, self.durations_s)
+        return None if np.isnan(watts) else watts
+
+    def _remove(self, curves: _AthleteCurves, workout_key: str) -> None:
+        """Drop a workout and rebuild the (possibly lowered) bests of its day and block."""
+        day_number, _ = curves.workouts.pop(workout_key)
+        keys = curves.day_keys[day_number]
+        keys.discard(workout_key)
+        if keys:
+            curves.day_best[day_number] = _best([curves.workouts[key][1] for key in keys])
+        else:
+            del curves.day_keys[day_number]
+            del curves.day_best[day_number]
+
+        block = day_number // BLOCK_DAYS
+        block_rows = [
+            curves.day_best[day]
+            for day in range(block * BLOCK_DAYS, (block + 1) * BLOCK_DAYS)
+            if day in curves.day_best
+        ]
+        if block_rows:
+            curves.block_best[block] = _best(block_rows)
+        else:
+            del curves.block_best[block]
@@ -0,0 +1,317 @@
+"""
+Columnar, NumPy-backed container for per-record workout samples.
+
+A ``SampleFrame`` holds one typed array per channel plus a boolean validity
+mask per channel, instead of one validated ``Sample`` Pydantic object per
+record. Range validation mirrors the bounds declared on ``Sample`` but runs
+vectorized over whole channels; ``Sample`` objects are only built on demand
+via ``SampleFrame.to_samples()``.
+"""
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.schemas.training import Sample
+
+
+# Storage dtype for each sample channel (t_s is always int32 seconds)
+CHANNEL_DTYPES: Dict[str, type] = {
+    "power_w": np.int32,
+    "hr_bpm": np.int16,
+    "cadence": np.int16,
+    "pace_mps": np.float64,
+    "altitude_m": np.float64,
+    "lat": np.float64,
+    "lon": np.float64,
+    "temperature_c": np.float64,
+    "distance_m": np.float64,
+}
+
+CHANNELS: Tuple[str, ...] = tuple(CHANNEL_DTYPES)
+
+# Named channel selections for decode-time projection (``channels=``):
+# "load" is enough for TSS/PMC backfills, "full" is for map and chart views
+CHANNEL_PROFILES: Dict[str, Tuple[str, ...]] = {
+    "load": ("power_w", "hr_bpm"),
+    "full": CHANNELS,
+}
+
+ChannelSelection = Union[str, Iterable[str], None]
+
+# Inclusive (min, max) bounds per channel, matching the ``Sample`` schema
+CHANNEL_RANGES: Dict[str, Tuple[Optional[float], Optional[float]]] = {
+    "power_w": (0, 2000),
+    "hr_bpm": (0, 220),
+    "cadence": (0, 300),
+    "pace_mps": (0, None),
+    "altitude_m": (None, None),
+    "lat": (-90, 90),
+    "lon": (-180, 180),
+    "temperature_c": (None, None),
+    "distance_m": (0, None),
+}
+
+
+def resolve_channels(channels: ChannelSelection = None) -> FrozenSet[str]:
+    """
+    Turn a ``channels=`` argument into a set of channel names.
+
+    Args:
+        channels: None (all channels), a profile name from
+            ``CHANNEL_PROFILES``, or an iterable of channel names
+
+    Returns:
+        Frozen set of channel names to decode
+
+    Raises:
+        ValueError: If the profile or a channel name is unknown
+    """
+    if channels is None:
+        return frozenset(CHANNELS)
+    if isinstance(channels, str):
+        if channels not in CHANNEL_PROFILES:
+            raise ValueError(
+                f"Unknown channel profile '{channels}'. Use one of: {', '.join(CHANNEL_PROFILES)}"
+            )
+        return frozenset(CHANNEL_PROFILES[channels])
+    selected = frozenset(channels)
+    unknown = selected - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"Unknown sample channels: {', '.join(sorted(unknown))}")
+    return selected
+
+
+@dataclass
+class SampleFrame:
+    """
+    Per-record workout samples stored as one typed array per channel.
+
+    Every channel array has the same length as ``t_s``. Entries whose mask in
+    ``valid`` is False carry no data (the stored value is 0 and meaningless).
+
+    Attributes:
+        t_s: Time offset from workout start in seconds (int32)
+        power_w, hr_bpm, cadence, pace_mps, altitude_m, lat, lon,
+        temperature_c, distance_m: Channel values (see ``CHANNEL_DTYPES``)
+        valid: Mapping of channel name to boolean validity mask
+    """
+    t_s: np.ndarray
+    power_w: np.ndarray
+    hr_bpm: np.ndarray
+    cadence: np.ndarray
+    pace_mps: np.ndarray
+    altitude_m: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    temperature_c: np.ndarray
+    distance_m: np.ndarray
+    valid: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @classmethod
+    def from_columns(
+        cls,
+        t_s: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        validate: bool = True,
+    ) -> "SampleFrame":
+        """
+        Build a frame from float columns where NaN marks a missing value.
+
+        Channels absent from ``columns`` are stored as all-invalid.
+
+        Args:
+            t_s: Time offsets in seconds
+            columns: Mapping of channel name to float array (NaN = missing)
+            validate: Apply vectorized range validation (default True)
+
+        Returns:
+            SampleFrame with typed channel arrays and validity masks
+
+        Raises:
+            ValueError: If a column name is unknown or lengths differ
+        """
+        t_s = np.asarray(t_s, dtype=np.int32)
+        n = len(t_s)
+        unknown = set(columns) - set(CHANNELS)
+        if unknown:
+            raise ValueError(f"Unknown sample channels: {', '.join(sorted(unknown))}")
+
+        arrays: Dict[str, np.ndarray] = {}
+        valid: Dict[str, np.ndarray] = {}
+        for name, dtype in CHANNEL_DTYPES.items():
+            raw = columns.get(name)
+            if raw is None:
+                arrays[name] = np.zeros(n, dtype=dtype)
+                valid[name] = np.zeros(n, dtype=bool)
+                continue
+            raw = np.asarray(raw, dtype=np.float64)
+            if len(raw) != n:
+                raise ValueError(f"Channel '{name}' has {len(raw)} values, expected {n}")
+            mask = ~np.isnan(raw)
+            if np.issubdtype(dtype, np.integer):
+                # Match the previous int() conversion (truncation toward zero)
+                arrays[name] = np.where(mask, np.trunc(raw), 0).astype(dtype)
+            else:
+                arrays[name] = np.where(mask, raw, 0).astype(dtype)
+            valid[name] = mask
+
+        frame = cls(t_s=t_s, valid=valid, **arrays)
+        if validate:
+            frame.validate()
+        return frame
+
+    @classmethod
+    def empty(cls) -> "SampleFrame":
+        """Create a frame with no samples."""
+        return cls.from_columns(np.zeros(0, dtype=np.int32), {})
+
+    def __len__(self) -> int:
+        return len(self.t_s)
+
+    @property
+    def duration_s(self) -> int:
+        """Elapsed time covered by the frame in seconds."""
+        if len(self.t_s) == 0:
+            return 0
+        return int(self.t_s[-1] - self.t_s[0])
+
+    def has_channel(self, name: str) -> bool:
+        """Return True if the channel has at least one valid value."""
+        return bool(self.valid[name].any())
+
+    def values(self, name: str) -> np.ndarray:
+        """
+        Return only the valid values of a channel, in time order.
+
+        Args:
+            name: Channel name (see ``CHANNELS``)
+
+        Returns:
+            1-D array of the channel's valid values
+        """
+        return getattr(self, name)[self.valid[name]]
+
+    def select(self, index: np.ndarray) -> "SampleFrame":
+        """
+        Return a new frame with the records picked by an index or boolean mask.
+
+        Args:
+            index: Integer index array or boolean mask over records
+
+        Returns:
+            SampleFrame holding copies of the selected records
+        """
+        arrays = {name: getattr(self, name)[index] for name in CHANNELS}
+        valid = {name: mask[index] for name, mask in self.valid.items()}
+        return SampleFrame(t_s=self.t_s[index], valid=valid, **arrays)
+
+    def slice(self, start: int, stop: int) -> "SampleFrame":
+        """
+        Return records ``start:stop`` as a frame of views (no copying).
+
+        Writes through the returned frame's arrays modify this frame.
+
+        Args:
+            start: First record index
+            stop: One past the last record index
+
+        Returns:
+            SampleFrame whose arrays are views into this frame's arrays
+        """
+        arrays = {name: getattr(self, name)[start:stop] for name in CHANNELS}
+        valid = {name: mask[start:stop] for name, mask in self.valid.items()}
+        return SampleFrame(t_s=self.t_s[start:stop], valid=valid, **arrays)
+
+    def validate(self) -> Dict[str, int]:
+        """
+        Apply ``Sample`` range bounds to every channel, vectorized.
+
+        Out-of-range values are marked invalid rather than raising, so one
+        corrupt record (e.g. a power spike of 65000 W) no longer fails the
+        whole file.
+
+        Returns:
+            Mapping of channel name to number of values rejected
+        """
+        rejected: Dict[str, int] = {}
+        for name, (low, high) in CHANNEL_RANGES.items():
+            if low is None and high is None:
+                continue
+            values = getattr(self, name)
+            in_range = np.ones(len(values), dtype=bool)
+            if low is not None:
+                in_range &= values >= low
+            if high is not None:
+                in_range &= values <= high
+            bad = self.valid[name] & ~in_range
+            count = int(bad.sum())
+            if count:
+                self.valid[name] = self.valid[name] & in_range
+                rejected[name] = count
+        return rejected
+
+    def to_samples(self, workout_id: int = 1) -> List[Sample]:
+        """
+        Materialize ``Sample`` models for callers that need per-record objects.
+
+        This is the expensive path; prefer the channel arrays for any math.
+
+        Args:
+            workout_id: Workout ID to stamp on each sample (placeholder until
+                the workout is persisted)
+
+        Returns:
+            List of Sample objects, one per record
+        """
+        columns = {}
+        for name in CHANNELS:
+            values = getattr(self, name).tolist()
+            mask = self.valid[name].tolist()
+            columns[name] = [v if ok else None for v, ok in zip(values, mask)]
+        t_values = self.t_s.tolist()
+        samples: List[Sample] = []
+        for i, t in enumerate(t_values):
+            row = {name: columns[name][i] for name in CHANNELS if columns[name][i] is not None}
+            samples.append(Sample(workout_id=workout_id, t_s=t, **row))
+        return samples
+
+
+class SampleFrameBuilder:
+    """
+    Incrementally collect records into compact per-channel buffers.
+
+    Values are appended to ``array('d')`` buffers (8 bytes per value, no
+    per-record Python objects) and converted to a ``SampleFrame`` once.
+    """
+
+    def __init__(self) -> None:
+        self._t_s = array("q")
+        self._columns: Dict[str, array] = {name: array("d") for name in CHANNELS}
+
+    def __len__(self) -> int:
+        return len(self._t_s)
+
+    def append(self, t_s: int, row: Dict[str, float]) -> None:
+        """
+        Append one record.
+
+        Args:
+            t_s: Time offset from workout start in seconds
+            row: Mapping of channel name to value; missing channels are NaN
+        """
+        self._t_s.append(t_s)
+        for name, column in self._columns.items():
+            column.append(row.get(name, np.nan))
+
+    def build(self, validate: bool = True) -> SampleFrame:
+        """Convert the collected buffers into a ``SampleFrame``."""
+        columns = {
+            name: np.frombuffer(column, dtype=np.float64) if len(column) else np.zeros(0)
+            for name, column in self._columns.items()
+        }
+        t_s = np.frombuffer(self._t_s, dtype=np.int64) if len(self._t_s) else np.zeros(0)
+        return SampleFrame.from_columns(t_s, columns, validate=validate)
@@ -0,0 +1,350 @@
+"""
+Content-addressed storage for uploaded workout files and parse results.
+
+Raw uploads are stored under their SHA-256 digest, so two athletes uploading
+``ride.fit`` at the same moment can never overwrite each other and identical
+files are stored once. Decoded, cleaned FIT results are cached on disk under
+the same digest, so a re-upload (device sync retries, users re-sending a
+file) is a lookup instead of a re-parse.
+
+Layout (two-level fan-out keeps directories small):
+    <root>/raw/ab/abcdef...            raw upload bytes
+    <root>/parsed/ab/abcdef....npz     SampleFrame channel arrays and masks
+    <root>/parsed/ab/abcdef....json    sessions, laps, events, device info
+    <root>/parsed/ab/abcdef....summary.json   FTP-independent workout summaries
+    <root>/intervals/ab/abcdef.../<params>.json   detected intervals
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import astuple
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.schemas.training import IntervalDetected, WorkoutExecuted
+from app.services.file_parser import FitDecodeResult
+from app.services.interval_detection import SegmentationParams
+from app.services.sample_frame import CHANNELS, SampleFrame
+
+DEFAULT_DATA_DIR = "data"
+
+
+def content_hash(data: bytes) -> str:
+    """Return the hex SHA-256 digest used as the content address."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def data_dir_from_env() -> Path:
+    """Root directory for stored files (``AUTOCOACH_DATA_DIR``, default ``data``)."""
+    return Path(os.getenv("AUTOCOACH_DATA_DIR", DEFAULT_DATA_DIR))
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """Write via a temp file + rename so readers never see partial files."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _fanout(root: Path, digest: str, suffix: str = "") -> Path:
+    return root / digest[:2] / f"{digest}{suffix}"
+
+
+class RawUploadStore:
+    """
+    Raw upload bytes stored by content hash.
+
+    Args:
+        root: Directory for raw files
+    """
+
+    def __init__(self, root: Union[str, Path]) -> None:
+        self.root = Path(root)
+
+    def path(self, digest: str) -> Path:
+        """Storage path for a digest."""
+        return _fanout(self.root, digest)
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def put(self, data: bytes) -> str:
+        """
+        Store bytes unless already present.
+
+        Args:
+            data: Raw file bytes
+
+        Returns:
+            Hex SHA-256 digest of the data
+        """
+        digest = content_hash(data)
+        path = self.path(digest)
+        if not path.exists():
+            atomic_write(path, data)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """
+        Read stored bytes.
+
+        Raises:
+            FileNotFoundError: If nothing is stored under the digest
+        """
+        return self.path(digest).read_bytes()
+
+
+def _encode_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode_json(obj: Dict[str, Any]) -> Any:
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class ParseResultCache:
+    """
+    Persistent cache of cleaned ``FitDecodeResult`` objects keyed by content hash.
+
+    Only FTP-independent decode products are cached; the per-athlete summary
+    is rebuilt from them with ``summarize_workout``.
+
+    Args:
+        root: Directory for cache entries
+    """
+
+    def __init__(self, root: Union[str, Path]) -> None:
+        self.root = Path(root)
+
+    def __contains__(self, digest: str) -> bool:
+        return _fanout(self.root, digest, ".json").exists()
+
+    def get(self, digest: str) -> Optional[FitDecodeResult]:
+        """
+        Load a cached result.
+
+        Args:
+            digest: Content hash of the raw upload
+
+        Returns:
+            FitDecodeResult, or None if not cached (or the entry is unreadable)
+        """
+        meta_path = _fanout(self.root, digest, ".json")
+        arrays_path = _fanout(self.root, digest, ".npz")
+        try:
+            meta = json.loads(meta_path.read_text(), object_hook=_decode_json)
+            with np.load(arrays_path, allow_pickle=False) as arrays:
+                samples = SampleFrame(
+                    t_s=arrays["t_s"],
+                    valid={name: arrays[f"valid_{name}"] for name in CHANNELS},
+                    **{name: arrays[name] for name in CHANNELS},
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+        return FitDecodeResult(samples=samples, **meta)
+
+    def put(self, digest: str, decoded: FitDecodeResult) -> None:
+        """
+        Store a cleaned result.
+
+        The metadata file is written last, so its presence marks a complete
+        entry.
+        """
+        samples = decoded.samples
+        arrays = {"t_s": samples.t_s}
+        for name in CHANNELS:
+            arrays[name] = getattr(samples, name)
+            arrays[f"valid_{name}"] = samples.valid[name]
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        atomic_write(_fanout(self.root, digest, ".npz"), buffer.getvalue())
+
+        meta = {
+            "sessions": decoded.sessions,
+            "laps": decoded.laps,
+            "events": decoded.events,
+            "device_info": decoded.device_info,
+            "start_time": decoded.start_time,
+            "rejected_values": decoded.rejected_values,
+        }
+        atomic_write(
+            _fanout(self.root, digest, ".json"),
+            json.dumps(meta, default=_encode_json).encode(),
+        )
+
+    def get_summaries(self, digest: str) -> Optional[Tuple[List[WorkoutExecuted], int]]:
+        """
+        Load the stored FTP-independent summaries of a cached result.
+
+        Args:
+            digest: Content hash of the raw upload
+
+        Returns:
+            Tuple of (one workout per session, sample count), or None if
+            no summaries are stored (or the entry is unreadable)
+        """
+        try:
+            stored = json.loads(_fanout(self.root, digest, ".summary.json").read_text())
+            workouts = [WorkoutExecuted.model_validate(item) for item in stored["workouts"]]
+            return workouts, int(stored["sample_count"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put_summaries(self, digest: str, workouts: List[WorkoutExecuted], sample_count: int) -> None:
+        """
+        Store workouts summarized with ``ftp=None`` next to the cached result.
+
+        A duplicate upload then only needs ``apply_ftp`` for the job's FTP
+        instead of loading and re-summarizing the samples.
+        """
+        stored = {
+            "sample_count": sample_count,
+            "workouts": [workout.model_dump(mode="json") for workout in workouts],
+        }
+        atomic_write(_fanout(self.root, digest, ".summary.json"), json.dumps(stored).encode())
+
+
+
+# In-memory interval cache size (entries are a few KB each)
+DEFAULT_INTERVAL_CACHE_ENTRIES = 1024
+
+
+def threshold_version(
+    ftp: Optional[int],
+    power_zones: Optional[Dict[str, Tuple[int, int]]] = None,
+) -> str:
+    """
+    Fingerprint of the athlete thresholds that interval labels depend on.
+
+    Pass ``Athlete.ftp`` and ``Athlete.power_zones``; any change to either
+    gives a new version, which is how cached intervals are invalidated.
+    """
+    zones = sorted((name, list(bounds)) for name, bounds in (power_zones or {}).items())
+    payload = json.dumps({"ftp": ftp, "power_zones": zones})
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _params_key(params: SegmentationParams) -> str:
+    return hashlib.sha256(repr(astuple(params)).encode()).hexdigest()[:16]
+
+
+class IntervalCache:
+    """
+    Two-tier cache of detected intervals per workout and segmentation parameters.
+
+    Entries are keyed by (content hash, segmentation parameters) and
+    stamped with the athlete's ``threshold_version``; a lookup with a
+    different version (FTP or zones changed) is a miss and the next
+    ``put`` replaces the stale entry, so invalidation needs no explicit
+    call. The memory tier is an LRU of ``max_entries``; the disk tier
+    (optional) survives restarts.
+
+    Args:
+        root: Directory for persisted entries, or None for memory only
+        max_entries: Number of entries kept in memory
+    """
+
+    def __init__(
+        self,
+        root: Optional[Union[str, Path]] = None,
+        max_entries: int = DEFAULT_INTERVAL_CACHE_ENTRIES,
+    ) -> None:
+        self.root = Path(root) if root is not None else None
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[str, List[IntervalDetected]]]" = OrderedDict()
+        # Lookups run in worker threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str, key: str) -> Path:
+        return _fanout(self.root, digest) / f"{key}.json"
+
+    def _remember(self, entry_key: Tuple[str, str], version: str, intervals: List[IntervalDetected]) -> None:
+        with self._lock:
+            self._memory[entry_key] = (version, intervals)
+            self._memory.move_to_end(entry_key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(
+        self,
+        digest: str,
+        params: SegmentationParams,
+        version: str,
+    ) -> Optional[List[IntervalDetected]]:
+        """
+        Look up intervals detected with these parameters and thresholds.
+
+        Args:
+            digest: Content hash of the raw upload
+            params: Segmentation parameters used for detection
+            version: ``threshold_version`` of the athlete's current thresholds
+
+        Returns:
+            Cached intervals, or None on a miss or a stale threshold version
+        """
+        entry_key = (digest, _params_key(params))
+        with self._lock:
+            entry = self._memory.get(entry_key)
+            if entry is not None:
+                self._memory.move_to_end(entry_key)
+        if entry is None and self.root is not None:
+            try:
+                stored = json.loads(self._path(*entry_key).read_text())
+                entry = (
+                    stored["threshold_version"],
+                    [IntervalDetected.model_validate(item) for item in stored["intervals"]],
+                )
+            except (OSError, ValueError, KeyError):
+                return None
+            self._remember(entry_key, *entry)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def put(
+        self,
+        digest: str,
+        params: SegmentationParams,
+        version: str,
+        intervals: List[IntervalDetected],
+    ) -> None:
+        """Store intervals, replacing any entry for an older threshold version."""
+        entry_key = (digest, _params_key(params))
+        self._remember(entry_key, version, intervals)
+        if self.root is not None:
+            stored = {
+                "threshold_version": version,
+                "intervals": [interval.model_dump(mode="json") for interval in intervals],
+            }
+            atomic_write(self._path(*entry_key), json.dumps(stored).encode())
+
+    def invalidate(self, digest: str) -> None:
+        """Drop every cached entry for a workout (e.g. after re-parsing it)."""
+        with self._lock:
+            for entry_key in [k for k in self._memory if k[0] == digest]:
+                del self._memory[entry_key]
+        if self.root is not None:
+            for path in _fanout(self.root, digest).glob("*.json"):
+                path.unlink(missing_ok=True)
@@ -0,0 +1,263 @@
+"""
+Streaming TCX (Training Center XML) parser.
+
+TCX files are verbose XML: a 10-hour ride with power and speed extensions
+is tens of megabytes and would be hundreds of megabytes as an ElementTree
+DOM. This parser walks the document with ``ElementTree.iterparse`` and
+drops every ``Trackpoint`` as soon as its values are copied into a
+``SampleFrameBuilder``, so memory is bounded by the sample arrays rather
+than the document.
+
+The result is the same ``FitDecodeResult`` the FIT decoder produces (laps,
+a session synthesized from the ``Activity`` element, columnar samples), so
+TCX uploads share the clean and summarize stages with FIT.
+"""
+from __future__ import annotations
+
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.schemas.training import WorkoutExecuted
+from app.services.file_parser import (
+    FileParseError,
+    FitDecodeResult,
+    FitSource,
+    MAX_DECOMPRESSED_BYTES,
+    clean_samples,
+    open_payload_stream,
+    summarize_workout,
+)
+from app.services.sample_frame import SampleFrame, SampleFrameBuilder
+from app.services.xml_utils import local_name, parse_time
+
+# Trackpoint element (local name) -> sample channel. ``Value`` only occurs
+# under ``HeartRateBpm`` inside a trackpoint; Speed/Watts/RunCadence come
+# from the Garmin ActivityExtension ``TPX`` block.
+_TRACKPOINT_CHANNELS: Dict[str, str] = {
+    'LatitudeDegrees': 'lat',
+    'LongitudeDegrees': 'lon',
+    'AltitudeMeters': 'altitude_m',
+    'DistanceMeters': 'distance_m',
+    'Value': 'hr_bpm',
+    'Cadence': 'cadence',
+    'RunCadence': 'cadence',
+    'Speed': 'pace_mps',
+    'Watts': 'power_w',
+}
+
+# Lap child element (local name) -> (lap dict key, converter), matching the
+# keys the FIT decoder uses. AvgWatts/MaxWatts come from the LX extension.
+_LAP_FIELDS: Dict[str, Tuple[str, type]] = {
+    'TotalTimeSeconds': ('total_timer_time', float),
+    'DistanceMeters': ('total_distance_m', float),
+    'Cadence': ('avg_cadence', int),
+    'AvgWatts': ('avg_power', float),
+    'MaxWatts': ('max_power', int),
+}
+
+_INTENSITY = {'Active': 'active', 'Resting': 'rest'}
+
+_TRIGGER_METHODS = {
+    'Manual': 'manual',
+    'Distance': 'distance',
+    'Location': 'position_marked',
+    'Time': 'time',
+    'HeartRate': 'heart_rate',
+}
+
+_SPORTS = {'Biking': 'cycling', 'Running': 'running'}
+
+
+class _TcxDecodeState:
+    """Mutable state threaded through the iterparse loop."""
+
+    def __init__(self) -> None:
+        self.result = FitDecodeResult()
+        self.builder = SampleFrameBuilder()
+        self.start_time: Optional[datetime] = None
+        self.sport: Optional[str] = None
+        # Cache of namespaced tag -> local name (a handful of distinct tags)
+        self.names: Dict[str, str] = {}
+
+    def name(self, tag: str) -> str:
+        local = self.names.get(tag)
+        if local is None:
+            local = self.names[tag] = local_name(tag)
+        return local
+
+
+def _handle_trackpoint(state: _TcxDecodeState, element: ET.Element) -> None:
+    timestamp = None
+    row: Dict[str, float] = {}
+    for child in element.iter():
+        name = state.name(child.tag)
+        if name == 'Time':
+            timestamp = parse_time(child.text)
+            continue
+        channel = _TRACKPOINT_CHANNELS.get(name)
+        if channel is not None and child.text:
+            row[channel] = float(child.text)
+
+    # Only add sample if we have a timestamp
+    if timestamp is None:
+        return
+    if state.start_time is None:
+        state.start_time = timestamp
+    state.builder.append(int((timestamp - state.start_time).total_seconds()), row)
+
+
+def _handle_lap(state: _TcxDecodeState, element: ET.Element) -> None:
+    lap: Dict = {'start_time': parse_time(element.get('StartTime'))}
+    for child in element.iter():
+        name = state.name(child.tag)
+        mapping = _LAP_FIELDS.get(name)
+        if mapping is not None and child.text:
+            key, convert = mapping
+            lap[key] = convert(float(child.text))
+        elif name in ('AverageHeartRateBpm', 'MaximumHeartRateBpm'):
+            value = child.find('*')
+            if value is not None and value.text:
+                lap['avg_hr' if name.startswith('Average') else 'max_hr'] = int(value.text)
+        elif name == 'Intensity' and child.text:
+            lap['intensity'] = _INTENSITY.get(child.text, child.text.lower())
+        elif name == 'TriggerMethod' and child.text:
+            lap['lap_trigger'] = _TRIGGER_METHODS.get(child.text, child.text.lower())
+
+    if lap['start_time'] is not None and 'total_timer_time' in lap:
+        lap['end_time'] = lap['start_time'] + timedelta(seconds=lap['total_timer_time'])
+    state.result.laps.append(lap)
+
+
+def _session_from_laps(sport: Optional[str], laps: List[Dict]) -> Dict:
+    """Synthesize the session summary TCX doesn't carry explicitly."""
+    session: Dict = {'sport': _SPORTS.get(sport or '', (sport or 'unknown').lower())}
+    if laps and laps[0].get('start_time') is not None:
+        session['start_time'] = laps[0]['start_time']
+    durations = [lap['total_timer_time'] for lap in laps if 'total_timer_time' in lap]
+    if durations:
+        session['total_elapsed_time'] = sum(durations)
+    distances = [lap['total_distance_m'] for lap in laps if 'total_distance_m' in lap]
+    if distances:
+        session['total_distance_m'] = sum(distances)
+    return session
+
+
+def decode_tcx_stream(stream) -> FitDecodeResult:
+    """
+    Decode a TCX document incrementally.
+
+    Trackpoints are converted and detached from their parent ``Track`` as
+    soon as they are complete, so at most one trackpoint subtree is alive
+    at a time. Only the first ``Activity`` is read; TCX files hold one
+    activity in practice.
+
+    Args:
+        stream: Readable binary stream of uncompressed TCX XML
+
+    Returns:
+        FitDecodeResult with laps, one synthesized session and unvalidated samples
+
+    Raises:
+        FileParseError: If the XML is malformed or a value is not numeric
+    """
+    state = _TcxDecodeState()
+    parents: List[ET.Element] = []
+    found_activity = False
+    try:
+        for event, element in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                parents.append(element)
+                if state.name(element.tag) == 'Activity':
+                    found_activity = True
+                    state.sport = element.get('Sport')
+                continue
+
+            parents.pop()
+            name = state.name(element.tag)
+            if name == 'Trackpoint':
+                _handle_trackpoint(state, element)
+                # Detach the finished trackpoint so the Track never grows
+                parents[-1].remove(element)
+            elif name == 'Lap':
+                _handle_lap(state, element)
+                element.clear()
+            elif name == 'Creator' and state.name(parents[-1].tag) == 'Activity':
+                product = next((c for c in element if state.name(c.tag) == 'Name'), None)
+                if product is not None and product.text:
+                    state.result.device_info.append({'product': product.text.strip()})
+            elif name == 'Activity':
+                break
+    except ET.ParseError as e:
+        raise FileParseError(f"Failed to parse TCX file: {str(e)}")
+    except ValueError as e:
+        raise FileParseError(f"Invalid value in TCX file: {str(e)}")
+
+    if not found_activity:
+        raise FileParseError("No Activity found in TCX file")
+
+    state.result.sessions.append(_session_from_laps(state.sport, state.result.laps))
+    # Range validation is left to clean_samples (the "clean" stage)
+    state.result.samples = state.builder.build(validate=False)
+    state.result.start_time = state.start_time
+    return state.result
+
+
+def decode_tcx_bytes(data: bytes) -> FitDecodeResult:
+    """
+    Decode a (possibly compressed) TCX payload without cleaning it.
+
+    This is the TCX "parse" stage of the ingestion pipeline.
+
+    Args:
+        data: Raw .tcx/.tcx.gz/.tcx.zst bytes
+
+    Returns:
+        FitDecodeResult with unvalidated samples
+
+    Raises:
+        FileParseError: If the payload cannot be decoded
+    """
+    return decode_tcx_stream(open_payload_stream(data))
+
+
+def parse_tcx_file(
+    source: FitSource,
+    athlete_id: int,
+    ftp: Optional[int] = None,
+    filename: Optional[str] = None,
+    max_decompressed_bytes: int = MAX_DECOMPRESSED_BYTES,
+) -> Tuple[WorkoutExecuted, SampleFrame]:
+    """
+    Parse a TCX file and extract workout data and per-second samples.
+
+    Args:
+        source: Path, bytes or binary stream of a .tcx (optionally .gz/.zst) file
+        athlete_id: ID of the athlete who performed the workout
+        ftp: Functional Threshold Power (optional, for TSS calculation)
+        filename: Original file name recorded as ``file_ref`` when the
+            source is not a path
+        max_decompressed_bytes: Decompression size limit in bytes
+
+    Returns:
+        Tuple of (WorkoutExecuted, SampleFrame)
+
+    Raises:
+        FileParseError: If file cannot be parsed
+        FileNotFoundError: If file doesn't exist
+
+    Example:
+        >>> workout, samples = parse_tcx_file("ride.tcx", athlete_id=1, ftp=300)
+    """
+    stream = open_payload_stream(source, max_decompressed_bytes)
+    if filename is None and isinstance(source, (str, Path)):
+        filename = str(source)
+    try:
+        decoded = decode_tcx_stream(stream)
+    finally:
+        if stream is not source:
+            stream.close()
+    clean_samples(decoded)
+    workout = summarize_workout(decoded, athlete_id, ftp=ftp, filename=filename)
+    return workout, decoded.samples
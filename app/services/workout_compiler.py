@@ -0,0 +1,279 @@
+"""
+Compile a nested ``WorkoutSpec`` into a flat, array-backed timeline.
+
+``WorkoutStep`` nests through ``steps`` and ``repeats``; the compiler
+unrolls that tree once into per-step arrays (start/end offsets, channel,
+absolute target and band for the athlete's thresholds) plus a per-second
+step index, so compliance scoring, planning and interval matching never
+walk the tree themselves. Planned NP/IF/TSS are computed analytically from
+the step targets over the whole planned duration.
+
+Compiled workouts are memoized by (spec hash, thresholds) in a small LRU;
+their arrays are read-only so a cached timeline can be shared safely.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.schemas.training import Athlete, WorkoutSpec, WorkoutStep
+from app.services.metrics import calculate_tss_from_power
+
+# Channels a step can be targeted on (index into TARGET_CHANNELS)
+TARGET_CHANNELS: Tuple[str, ...] = ('power_w', 'hr_bpm', 'pace_mps')
+NO_TARGET = -1
+
+# Band used when a step leaves tolerance_pct unset
+DEFAULT_TOLERANCE_PCT = 5
+
+# Assumed power (fraction of FTP, Coggan Z1) for planned seconds without a
+# power target (untargeted warmups and rests, HR- or pace-targeted steps)
+UNTARGETED_POWER_FTP_FRACTION = 0.5
+
+# Compiled workouts kept in memory
+DEFAULT_COMPILE_CACHE_ENTRIES = 512
+
+Thresholds = Tuple[Optional[int], Optional[int], Optional[int]]
+
+
+@dataclass(frozen=True)
+class CompiledWorkout:
+    """
+    A WorkoutSpec unrolled into flat per-step arrays for given thresholds.
+
+    Attributes:
+        steps: Leaf steps in execution order (interval blocks unrolled)
+        start_s, end_s: Per-step offsets from workout start in seconds
+        channel: Per-step index into ``TARGET_CHANNELS`` (-1 = no target)
+        target, low, high: Per-step absolute target and band (watts, bpm
+            or m/s; NaN without a resolvable target)
+        intensity: Per-step target as a fraction of threshold (FTP or
+            LTHR; NaN if unknown)
+        step_index: Leaf step index for each planned second
+        ftp, lthr, max_hr: Thresholds the targets were resolved with
+        planned_np: Planned Normalized Power (plans with power targets;
+            other steps count at ``UNTARGETED_POWER_FTP_FRACTION`` of FTP)
+        planned_if: Planned Intensity Factor
+        planned_tss: Planned Training Stress Score
+    """
+    steps: Tuple[WorkoutStep, ...]
+    start_s: np.ndarray
+    end_s: np.ndarray
+    channel: np.ndarray
+    target: np.ndarray
+    low: np.ndarray
+    high: np.ndarray
+    intensity: np.ndarray
+    step_index: np.ndarray
+    ftp: Optional[int] = None
+    lthr: Optional[int] = None
+    max_hr: Optional[int] = None
+    planned_np: Optional[float] = None
+    planned_if: Optional[float] = None
+    planned_tss: Optional[float] = None
+
+    @property
+    def duration_s(self) -> int:
+        """Total planned duration in seconds."""
+        return len(self.step_index)
+
+
+def _leaf_steps(steps: Iterable[WorkoutStep]) -> List[WorkoutStep]:
+    """Unroll ``repeats`` recursively (of nested ``steps`` or of a single leaf step)."""
+    leaves: List[WorkoutStep] = []
+    for step in steps:
+        repeats = step.repeats or 1
+        if step.steps:
+            leaves.extend(_leaf_steps(step.steps) * repeats)
+        else:
+            leaves.extend([step] * repeats)
+    return leaves
+
+
+def _step_target(step: WorkoutStep, ftp: Optional[int], lthr: Optional[int], max_hr: Optional[int]):
+    """(channel index, absolute target, fraction of threshold) for a step."""
+    if step.target_power_w is not None:
+        return 0, float(step.target_power_w), step.target_power_w / ftp if ftp else np.nan
+    if step.target_power_pct is not None and ftp:
+        return 0, step.target_power_pct / 100 * ftp, step.target_power_pct / 100
+    if step.target_hr_bpm is not None:
+        return 1, float(step.target_hr_bpm), step.target_hr_bpm / lthr if lthr else np.nan
+    hr_reference = lthr or max_hr
+    if step.target_hr_pct is not None and hr_reference:
+        return 1, step.target_hr_pct / 100 * hr_reference, step.target_hr_pct / 100 if lthr else np.nan
+    if step.target_pace_min_per_km:
+        # min/km -> m/s, the unit of the pace_mps channel
+        return 2, 1000 / (step.target_pace_min_per_km * 60), np.nan
+    return NO_TARGET, np.nan, np.nan
+
+
+def _read_only(*arrays: np.ndarray) -> None:
+    for array in arrays:
+        array.flags.writeable = False
+
+
+def _compile(spec: WorkoutSpec, ftp: Optional[int], lthr: Optional[int], max_hr: Optional[int]) -> CompiledWorkout:
+    steps = _leaf_steps(spec.steps)
+    count = len(steps)
+    durations = np.zeros(count, dtype=np.int64)
+    channel = np.full(count, NO_TARGET, dtype=np.int8)
+    target = np.full(count, np.nan)
+    intensity = np.full(count, np.nan)
+    tolerance = np.zeros(count)
+
+    for i, step in enumerate(steps):
+        if step.duration_s is None:
+            raise ValueError(f"Step {i} ({step.kind}) has no duration_s; distance-based steps are not supported")
+        durations[i] = step.duration_s
+        channel[i], target[i], intensity[i] = _step_target(step, ftp, lthr, max_hr)
+        tolerance[i] = step.tolerance_pct if step.tolerance_pct is not None else DEFAULT_TOLERANCE_PCT
+
+    end_s = np.cumsum(durations)
+    start_s = end_s - durations
+    low = target * (1 - tolerance / 100)
+    high = target * (1 + tolerance / 100)
+    step_index = np.repeat(np.arange(count), durations)
+
+    # Analytic planned load over the whole plan: NP of a piecewise-constant
+    # plan is the duration-weighted 4th-power mean of the step powers
+    # (ignoring the 30 s smoothing at step changes); steps without a power
+    # target are assumed ridden easy
+    planned_np = planned_if = planned_tss = None
+    power = channel == 0
+    total_s = int(durations.sum())
+    if ftp and power.any() and total_s > 0:
+        step_power = np.where(power, target, UNTARGETED_POWER_FTP_FRACTION * ftp)
+        planned_np = float((np.sum(durations * step_power ** 4) / total_s) ** 0.25)
+        planned_if = planned_np / ftp
+        planned_tss = calculate_tss_from_power(total_s, planned_np, ftp)
+
+    _read_only(start_s, end_s, channel, target, low, high, intensity, step_index)
+    return CompiledWorkout(
+        steps=tuple(steps),
+        start_s=start_s,
+        end_s=end_s,
+        channel=channel,
+        target=target,
+        low=low,
+        high=high,
+        intensity=intensity,
+        step_index=step_index,
+        ftp=ftp,
+        lthr=lthr,
+        max_hr=max_hr,
+        planned_np=planned_np,
+        planned_if=planned_if,
+        planned_tss=planned_tss,
+    )
+
+
+def spec_hash(spec: WorkoutSpec) -> str:
+    """Stable digest of a spec's content (its canonical JSON)."""
+    return hashlib.sha256(spec.model_dump_json().encode()).hexdigest()
+
+
+class _CompileCache:
+    """Thread-safe LRU of compiled workouts keyed by (spec hash, thresholds)."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Thresholds], CompiledWorkout]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, Thresholds]) -> Optional[CompiledWorkout]:
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return compiled
+
+    def put(self, key: Tuple[str, Thresholds], compiled: CompiledWorkout) -> None:
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+_cache = _CompileCache(DEFAULT_COMPILE_CACHE_ENTRIES)
+
+
+def compile_spec(
+    spec: WorkoutSpec,
+    athlete: Optional[Athlete] = None,
+    ftp: Optional[int] = None,
+    lthr: Optional[int] = None,
+    max_hr: Optional[int] = None,
+) -> CompiledWorkout:
+    """
+    Compile a WorkoutSpec for an athlete's thresholds (memoized).
+
+    Thresholds come from ``athlete`` unless given explicitly. Power targets
+    in % of FTP need an FTP; HR targets in % use LTHR (or max HR). Steps
+    whose target can't be resolved stay on the timeline with no target.
+
+    Args:
+        spec: Planned workout
+        athlete: Athlete supplying ftp/lthr/max_hr
+        ftp: Functional Threshold Power (watts), overriding the athlete's
+        lthr: Lactate Threshold Heart Rate (bpm), overriding the athlete's
+        max_hr: Maximum heart rate (bpm), overriding the athlete's
+
+    Returns:
+        CompiledWorkout (shared, read-only arrays)
+
+    Raises:
+        ValueError: If a step has no duration_s (distance-based steps can't
+            be placed on a time grid)
+
+    Example:
+        >>> compiled = compile_spec(spec, athlete)
+        >>> compiled.duration_s, compiled.planned_tss
+    """
+    if athlete is not None:
+        ftp = ftp if ftp is not None else athlete.ftp
+        lthr = lthr if lthr is not None else athlete.lthr
+        max_hr = max_hr if max_hr is not None else athlete.max_hr
+    key = (spec_hash(spec), (ftp, lthr, max_hr))
+    compiled = _cache.get(key)
+    if compiled is None:
+        compiled = _compile(spec, ftp, lthr, max_hr)
+        _cache.put(key, compiled)
+    return compiled
+
+
+def with_planned_load(
+    spec: WorkoutSpec,
+    athlete: Optional[Athlete] = None,
+    ftp: Optional[int] = None,
+) -> WorkoutSpec:
+    """
+    Return a copy of the spec with ``total_duration_s`` and ``total_tss`` filled.
+
+    Args:
+        spec: Planned workout
+        athlete: Athlete supplying thresholds
+        ftp: Functional Threshold Power, overriding the athlete's
+
+    Returns:
+        New WorkoutSpec; ``total_tss`` stays None without power targets and FTP
+    """
+    compiled = compile_spec(spec, athlete, ftp=ftp)
+    return spec.model_copy(update={
+        'total_duration_s': compiled.duration_s,
+        'total_tss': compiled.planned_tss,
+    })
@@ -0,0 +1,310 @@
+"""
+Per-athlete store of FTP-independent workout products.
+
+Decoding a FIT file is expensive; IF and TSS are not. Each ingested workout
+keeps only what doesn't depend on the athlete's threshold: duration, average
+power and Normalized Power, plus the content hash under which its channel
+arrays live in the ``ParseResultCache``. After an FTP test,
+``WorkoutStore.rethreshold`` recomputes IF/TSS for every affected workout in
+one vectorized pass and reports the earliest date whose daily TSS changed,
+so only PMC values from that date forward need recomputing.
+
+With a storage root (``WorkoutStore.open``), each athlete's rows are also
+kept in ``<root>/<athlete_id>.jsonl``: ``add`` appends one line and
+``rethreshold`` rewrites the file from the columns, so a restart restores
+the tables without re-decoding a single upload.
+"""
+from __future__ import annotations
+
+import json
+from array import array
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.schemas.training import WorkoutExecuted
+from app.services.metrics import calculate_tss_from_power_batch
+from app.services.storage import atomic_write
+
+_EPOCH = date(1970, 1, 1)
+
+# Called with (athlete_id, earliest date whose daily TSS changed)
+TssChangeListener = Callable[[int, date], None]
+
+
+@dataclass
+class RethresholdResult:
+    """Outcome of re-thresholding one athlete's workouts."""
+    athlete_id: int
+    ftp: int
+    workouts_updated: int
+    earliest_affected_date: Optional[date]
+
+
+class _AthleteWorkouts:
+    """Columnar workout table for one athlete (compact ``array`` buffers)."""
+
+    def __init__(self) -> None:
+        self.index: Dict[str, int] = {}
+        self.day = array("q")          # days since 1970-01-01
+        self.duration_s = array("d")
+        self.avg_power = array("d")    # NaN if no power
+        self.np_w = array("d")         # NaN if no power
+        self.tss = array("d")          # NaN if unknown
+        self.intensity_factor = array("d")
+        self.cycling = array("b")      # 1 for cycling (FTP-based TSS applies)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def column(self, name: str) -> np.ndarray:
+        """Writable NumPy view of a column (valid until the table grows)."""
+        buffer = getattr(self, name)
+        dtype = {"q": np.int64, "b": np.int8}.get(buffer.typecode, np.float64)
+        return np.frombuffer(buffer, dtype=dtype) if len(buffer) else np.zeros(0, dtype=dtype)
+
+    def put(self, workout_key: str, values: Dict[str, float]) -> Optional[int]:
+        """Insert or replace a row; returns the replaced row's day (None if new)."""
+        row = self.index.get(workout_key)
+        if row is None:
+            self.index[workout_key] = len(self)
+            for name, value in values.items():
+                getattr(self, name).append(value)
+            return None
+        previous = self.day[row]
+        for name, value in values.items():
+            getattr(self, name)[row] = value
+        return previous
+
+    def rows(self) -> List[Dict]:
+        """Every row as a dict with its ``key`` (the persisted form)."""
+        return [
+            {"key": key, **{name: getattr(self, name)[row] for name in _COLUMNS}}
+            for key, row in self.index.items()
+        ]
+
+
+_COLUMNS = ("day", "duration_s", "avg_power", "np_w", "tss", "intensity_factor", "cycling")
+
+
+def _summary_value(summary: Dict, key: str) -> float:
+    value = summary.get(key)
+    return float(value) if value is not None else float("nan")
+
+
+class WorkoutStore:
+    """
+    Columnar store of FTP-independent workout products.
+
+    Workouts are keyed by (athlete_id, workout_key); the key is the upload's
+    content hash, so re-uploading the same file updates rather than
+    duplicates the entry.
+
+    Args:
+        root: Directory to persist the tables in (see ``open``), or None
+            for memory only
+    """
+
+    def __init__(self, root: Optional[Union[str, Path]] = None) -> None:
+        self._athletes: Dict[int, _AthleteWorkouts] = {}
+        self._listeners: List[TssChangeListener] = []
+        self.root: Optional[Path] = None
+        if root is not None:
+            self.open(root)
+
+    def open(self, root: Union[str, Path]) -> None:
+        """
+        Load the tables persisted under ``root`` and persist changes there.
+
+        Later lines for the same workout key replace earlier ones; a torn
+        final line (crash mid-append) is ignored. Loading does not notify
+        listeners.
+
+        Args:
+            root: Directory holding one ``<athlete_id>.jsonl`` per athlete
+        """
+        self.root = Path(root)
+        for path in sorted(self.root.glob("*.jsonl")):
+            if not path.stem.isdigit():
+                continue
+            table = self._athletes.setdefault(int(path.stem), _AthleteWorkouts())
+            for line in path.read_text().splitlines():
+                try:
+                    row = json.loads(line)
+                    table.put(row.pop("key"), {name: row[name] for name in _COLUMNS})
+                except (ValueError, KeyError):
+                    continue
+
+    def subscribe(self, listener: TssChangeListener) -> None:
+        """Register a callback for daily-TSS changes (e.g. a PMC cache)."""
+        self._listeners.append(listener)
+
+    def __len__(self) -> int:
+        return sum(len(table) for table in self._athletes.values())
+
+    def add(self, workout_key: str, workout: WorkoutExecuted) -> None:
+        """
+        Record (or replace) a workout's FTP-independent products.
+
+        Args:
+            workout_key: Stable workout identity (upload content hash)
+            workout: Summarized workout; ``summary_json`` supplies np,
+                avg_power and (if an FTP was known) tss/if
+        """
+        table = self._athletes.setdefault(workout.athlete_id, _AthleteWorkouts())
+        summary = workout.summary_json
+        day = (workout.start_time.date() - _EPOCH).days
+        values = {
+            "day": day,
+            "duration_s": float(workout.duration_s),
+            "avg_power": _summary_value(summary, "avg_power"),
+            "np_w": _summary_value(summary, "np"),
+            "tss": _summary_value(summary, "tss"),
+            "intensity_factor": _summary_value(summary, "if"),
+            "cycling": int(workout.sport == "cycling"),
+        }
+
+        previous = table.put(workout_key, values)
+        if self.root is not None:
+            with self._path(workout.athlete_id).open("a") as f:
+                f.write(json.dumps({"key": workout_key, **values}) + "\n")
+        self._notify(workout.athlete_id, day if previous is None else min(day, previous))
+
+    def daily_tss(
+        self,
+        athlete_id: int,
+        start: Optional[date] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Daily TSS totals for an athlete, binned with ``np.bincount``.
+
+        Args:
+            athlete_id: Athlete ID
+            start: First day to include (default: first workout day)
+
+        Returns:
+            Tuple of (dates as datetime64[D], tss per day); days without a
+            known TSS count as 0
+        """
+        table = self._athletes.get(athlete_id)
+        if table is None or len(table) == 0:
+            return np.zeros(0, dtype="datetime64[D]"), np.zeros(0)
+        days = table.column("day")
+        tss = np.nan_to_num(table.column("tss"), nan=0.0)
+        first = int(days.min()) if start is None else (start - _EPOCH).days
+        keep = days >= first
+        totals = np.bincount(days[keep] - first, weights=tss[keep])
+        dates = np.arange(first, first + len(totals)).astype("datetime64[D]")
+        return dates, totals
+
+    def daily_tss_matrix(
+        self,
+        athlete_ids: Sequence[int],
+        end: Optional[date] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Daily TSS of several athletes on one shared calendar.
+
+        Args:
+            athlete_ids: Athlete IDs, one matrix row each
+            end: Last day (default: last workout day of any athlete)
+
+        Returns:
+            Tuple of (dates as datetime64[D] from the earliest first workout
+            day, athletes x days TSS matrix, column of each athlete's first
+            workout day, ``len(dates)`` for athletes without workouts)
+        """
+        tables = [self._athletes.get(athlete_id) for athlete_id in athlete_ids]
+        days = [table.column("day") for table in tables if table is not None and len(table)]
+        if not days:
+            no_days = np.zeros(len(athlete_ids), dtype=np.int64)
+            return np.zeros(0, dtype="datetime64[D]"), np.zeros((len(athlete_ids), 0)), no_days
+        first = min(int(d.min()) for d in days)
+        last = max(int(d.max()) for d in days) if end is None else (end - _EPOCH).days
+        width = max(0, last - first + 1)
+
+        # One bincount over (row, day) cells for the whole team
+        rows, columns, weights, first_day = [], [], [], np.full(len(athlete_ids), width, dtype=np.int64)
+        for row, table in enumerate(tables):
+            if table is None or len(table) == 0:
+                continue
+            column = table.column("day") - first
+            first_day[row] = column.min()
+            keep = column < width
+            rows.append(np.full(int(keep.sum()), row))
+            columns.append(column[keep])
+            weights.append(np.nan_to_num(table.column("tss")[keep], nan=0.0))
+        cells = np.concatenate(rows) * width + np.concatenate(columns)
+        tss = np.bincount(cells, weights=np.concatenate(weights), minlength=len(athlete_ids) * width)
+        dates = np.arange(first, first + width).astype("datetime64[D]")
+        return dates, tss.reshape(len(athlete_ids), width), np.minimum(first_day, width)
+
+    def rethreshold(
+        self,
+        athlete_id: int,
+        ftp: int,
+        since: Optional[date] = None,
+    ) -> RethresholdResult:
+        """
+        Recompute IF/TSS for an athlete's cycling power workouts at a new FTP.
+
+        Runs one vectorized pass over the stored NP/duration columns; no
+        file is re-decoded. The FTP is a cycling threshold, so other sports
+        (e.g. running power) and workouts without power keep their
+        existing TSS.
+
+        Args:
+            athlete_id: Athlete ID
+            ftp: New Functional Threshold Power in watts
+            since: Only re-threshold workouts on or after this date
+                (e.g. the previous FTP test); default all
+
+        Returns:
+            RethresholdResult with the count of updated workouts and the
+            earliest date whose daily TSS changed
+
+        Raises:
+            ValueError: If ftp <= 0
+        """
+        if ftp <= 0:
+            raise ValueError("FTP must be positive")
+        table = self._athletes.get(athlete_id)
+        if table is None or len(table) == 0:
+            return RethresholdResult(athlete_id, ftp, 0, None)
+
+        days = table.column("day")
+        np_w = table.column("np_w")
+        affected = ~np.isnan(np_w) & (table.column("cycling") == 1)
+        if since is not None:
+            affected &= days >= (since - _EPOCH).days
+
+        intensity_factor, tss = calculate_tss_from_power_batch(
+            table.column("duration_s")[affected], np_w[affected], ftp
+        )
+        tss_column = table.column("tss")
+        changed = affected.copy()
+        changed[affected] = ~np.isclose(tss_column[affected], tss, equal_nan=False)
+        tss_column[affected] = tss
+        table.column("intensity_factor")[affected] = intensity_factor
+
+        if self.root is not None and affected.any():
+            rows = "".join(json.dumps(row) + "\n" for row in table.rows())
+            atomic_write(self._path(athlete_id), rows.encode())
+
+        earliest = None
+        if changed.any():
+            earliest = _EPOCH + timedelta(days=int(days[changed].min()))
+            self._notify(athlete_id, int(days[changed].min()))
+        return RethresholdResult(athlete_id, ftp, int(affected.sum()), earliest)
+
+    def _path(self, athlete_id: int) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        return self.root / f"{athlete_id}.jsonl"
+
+    def _notify(self, athlete_id: int, day: int) -> None:
+        changed_from = _EPOCH + timedelta(days=int(day))
+        for listener in self._listeners:
+            listener(athlete_id, changed_from)
@@ -0,0 +1,33 @@
+"""
+Small helpers shared by the streaming XML workout parsers (TCX, GPX).
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def local_name(tag: str) -> str:
+    """Element tag without its ``{namespace}`` prefix."""
+    return tag.rpartition('}')[2]
+
+
+def parse_time(text: Optional[str]) -> Optional[datetime]:
+    """
+    Parse an ISO 8601 timestamp to naive UTC (as fitparse reports times).
+
+    Args:
+        text: Timestamp text, e.g. ``2024-05-01T08:00:00Z``
+
+    Returns:
+        Naive UTC datetime, or None for empty text
+
+    Raises:
+        ValueError: If the text is not an ISO 8601 timestamp
+    """
+    if not text:
+        return None
+    value = datetime.fromisoformat(text.strip())
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
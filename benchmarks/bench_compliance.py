@@ -0,0 +1,70 @@
+"""
+Benchmark: compliance scoring for a team's week of structured workouts.
+
+Scores 30 athletes x 7 workouts (90 minutes each: warmup, 6 x (5 min
+threshold / 3 min recovery), endurance, cooldown) of synthetic 1 Hz power
+against their WorkoutSpec with ``score_workout`` and reports the total and
+per-workout time.
+
+Run from the repository root:
+    python -m benchmarks.bench_compliance
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from typing import List
+
+import numpy as np
+
+from app.schemas.training import WorkoutSpec, WorkoutStep
+from app.services.compliance import score_workout
+from app.services.sample_frame import SampleFrame
+
+ATHLETES = 30
+WORKOUTS_PER_ATHLETE = 7
+
+
+def make_spec() -> WorkoutSpec:
+    return WorkoutSpec(sport="cycling", steps=[
+        WorkoutStep(kind="warmup", duration_s=900, target_power_pct=60, tolerance_pct=10),
+        WorkoutStep(kind="interval_block", repeats=6, steps=[
+            WorkoutStep(kind="work", duration_s=300, target_power_pct=100),
+            WorkoutStep(kind="rest", duration_s=180, target_power_pct=50),
+        ]),
+        WorkoutStep(kind="work", duration_s=1080, target_power_pct=70, tolerance_pct=10),
+        WorkoutStep(kind="cooldown", duration_s=540, target_power_pct=50, tolerance_pct=10),
+    ])
+
+
+def make_samples(ftp: int, rng: np.random.Generator) -> SampleFrame:
+    levels = [(900, 0.6)] + [(300, 1.0), (180, 0.5)] * 6 + [(1080, 0.7), (540, 0.5)]
+    power = np.concatenate([np.full(n, f * ftp) for n, f in levels])
+    power = (power * rng.normal(1.0, 0.04) + rng.normal(0, 12, len(power))).clip(0)
+    return SampleFrame.from_columns(np.arange(len(power)), {"power_w": power})
+
+
+def main(repeats: int = 5) -> None:
+    rng = np.random.default_rng(0)
+    spec = make_spec()
+    team = [
+        (ftp, make_samples(ftp, rng))
+        for ftp in rng.integers(200, 350, ATHLETES * WORKOUTS_PER_ATHLETE).tolist()
+    ]
+
+    timings: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        reports = [score_workout(spec, samples, ftp=ftp) for ftp, samples in team]
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    passed = sum(report.status == "pass" for report in reports)
+    print(f"Team week: {len(team)} workouts x 90 min, {len(reports[0].steps)} steps each")
+    print(
+        f"  score_workout  median {median * 1000:7.1f} ms total  "
+        f"({median / len(team) * 1000:.2f} ms/workout)  {passed} sessions passed"
+    )
+
+
+if __name__ == "__main__":
+    main()
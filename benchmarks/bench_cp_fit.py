@@ -0,0 +1,78 @@
+"""
+Benchmark: nightly CP/W′ refit across thousands of athletes.
+
+Fills a ``PowerCurveIndex`` with synthetic athletes (three months of rides
+each, mean-max curves drawn from a 3-parameter CP model with noise), then
+times ``fit_critical_power`` on the batched curve matrix (2p and 3p) and
+the full ``refit_athletes`` run including the index reads, and reports the
+median CP error against the model each athlete was drawn from.
+
+Run from the repository root:
+    python -m benchmarks.bench_cp_fit
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from datetime import date, timedelta
+from typing import Callable
+
+import numpy as np
+
+from app.services.cp_model import fit_critical_power, refit_athletes
+from app.services.metrics import MMP_DURATIONS_S
+from app.services.power_curve import PowerCurveIndex
+
+TODAY = date(2025, 6, 30)
+RIDES_PER_ATHLETE = 24
+WINDOW_DAYS = 90
+
+
+def build_index(athletes: int, rng: np.random.Generator):
+    """Index with rides whose curves sit at or below each athlete's 3p model."""
+    cp = rng.uniform(180, 380, athletes)
+    w_prime = rng.uniform(12000, 30000, athletes)
+    k = rng.uniform(5, 60, athletes)
+    index = PowerCurveIndex()
+    for athlete in range(athletes):
+        model = cp[athlete] + w_prime[athlete] / (MMP_DURATIONS_S + k[athlete])
+        lengths = rng.integers(1800, 4 * 3600, RIDES_PER_ATHLETE)
+        efforts = rng.uniform(0.85, 1.0, (RIDES_PER_ATHLETE, len(MMP_DURATIONS_S)))
+        efforts[:2] = rng.normal(1.0, 0.01, (2, len(MMP_DURATIONS_S)))  # a few maximal rides
+        days = rng.integers(0, WINDOW_DAYS, RIDES_PER_ATHLETE)
+        for ride in range(RIDES_PER_ATHLETE):
+            curve = np.where(MMP_DURATIONS_S <= lengths[ride], model * efforts[ride], np.nan)
+            index.add(athlete + 1, f"ride-{ride}", TODAY - timedelta(days=int(days[ride])), curve)
+    return index, cp
+
+
+def time_it(fn: Callable[[], object], repeats: int = 3) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    print(f"{'athletes':>8}  {'fit 2p':>9}  {'fit 3p':>9}  {'refit 3p':>10}  {'CP err 2p':>9}  CP err 3p")
+    for athletes in (1000, 5000, 10000):
+        index, true_cp = build_index(athletes, rng)
+        _, curves = index.best_curves(TODAY - timedelta(days=WINDOW_DAYS - 1), TODAY)
+        fit_2p = time_it(lambda: fit_critical_power(curves, model="2p"))
+        fit_3p = time_it(lambda: fit_critical_power(curves, model="3p"))
+        refit = time_it(lambda: refit_athletes(index, WINDOW_DAYS, TODAY, model="3p"), repeats=1)
+        errors = [
+            np.nanmedian(np.abs(fit_critical_power(curves, model=model).cp_w / true_cp - 1)) * 100
+            for model in ("2p", "3p")
+        ]
+        print(
+            f"{athletes:8d}  {fit_2p * 1000:6.1f} ms  {fit_3p * 1000:6.1f} ms  {refit:8.2f} s  "
+            f"{errors[0]:8.2f}%  {errors[1]:7.2f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
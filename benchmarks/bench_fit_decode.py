@@ -0,0 +1,122 @@
+"""
+Benchmark: FIT decoding paths.
+
+- two-pass (before): the previous session + record passes
+- single-pass: ``decode_fit_messages`` over fitparse messages
+- fast: ``decode_fit_fast``, bulk NumPy decoding of record messages
+- "load" rows decode only power and HR (``channels="load"``)
+
+The two-pass baseline reproduces the original ``_extract_session_data`` /
+``_extract_samples`` pair: ``get_messages('session')`` then
+``get_messages('record')``, iterating every (sorted) field through an
+``if/elif`` chain and building one ``Sample`` model per record.
+
+Run from the repository root:
+    python -m benchmarks.bench_fit_decode
+"""
+from __future__ import annotations
+
+import gzip
+import io
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from fitparse import FitFile
+
+from app.schemas.training import Sample
+from app.services.file_parser import decode_fit_fast, decode_fit_messages
+
+SAMPLE_FILE = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+
+
+def two_pass_decode(fitfile: FitFile) -> int:
+    """Previous implementation: separate session and record passes."""
+    session_data: Dict = {}
+    for record in fitfile.get_messages('session'):
+        for field in record:
+            if field.name == 'start_time':
+                session_data['start_time'] = field.value
+            elif field.name == 'total_elapsed_time':
+                session_data['total_elapsed_time'] = field.value
+            elif field.name == 'sport':
+                session_data['sport'] = field.value
+            elif field.name == 'total_distance':
+                session_data['total_distance_m'] = field.value
+
+    samples: List[Sample] = []
+    start_time = None
+    for record in fitfile.get_messages('record'):
+        sample_data = {'t_s': 0}
+        timestamp = None
+        for field in record:
+            if field.name == 'timestamp':
+                timestamp = field.value
+                if start_time is None:
+                    start_time = timestamp
+                sample_data['t_s'] = int((timestamp - start_time).total_seconds())
+            elif field.name == 'power' and field.value is not None:
+                sample_data['power_w'] = int(field.value)
+            elif field.name == 'heart_rate' and field.value is not None:
+                sample_data['hr_bpm'] = int(field.value)
+            elif field.name == 'cadence' and field.value is not None:
+                sample_data['cadence'] = int(field.value)
+            elif field.name == 'speed' and field.value is not None:
+                sample_data['pace_mps'] = float(field.value)
+            elif field.name == 'altitude' and field.value is not None:
+                sample_data['altitude_m'] = float(field.value)
+            elif field.name == 'position_lat' and field.value is not None:
+                sample_data['lat'] = float(field.value) * (180 / 2**31)
+            elif field.name == 'position_long' and field.value is not None:
+                sample_data['lon'] = float(field.value) * (180 / 2**31)
+            elif field.name == 'temperature' and field.value is not None:
+                sample_data['temperature_c'] = float(field.value)
+            elif field.name == 'distance' and field.value is not None:
+                sample_data['distance_m'] = float(field.value)
+        if timestamp is not None:
+            sample_data['workout_id'] = 1
+            samples.append(Sample(**sample_data))
+    return len(samples)
+
+
+def single_pass_decode(fitfile: FitFile) -> int:
+    """Current implementation: one dispatching pass."""
+    return len(decode_fit_messages(fitfile).samples)
+
+
+def fast_decode(data: bytes, channels: Optional[str] = None) -> int:
+    """Bulk NumPy record decoder (works on bytes, not a FitFile)."""
+    return len(decode_fit_fast(data, channels=channels).samples)
+
+
+def _time(decoder: Callable[[FitFile], int], data: bytes, repeats: int) -> List[float]:
+    timings = []
+    for _ in range(repeats):
+        # Fresh FitFile each time: fitparse caches parsed messages
+        fitfile = FitFile(io.BytesIO(data))
+        start = time.perf_counter()
+        decoder(fitfile)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(repeats: int = 5) -> None:
+    data = gzip.decompress(SAMPLE_FILE.read_bytes())
+    records = single_pass_decode(FitFile(io.BytesIO(data)))
+    print(f"File: {SAMPLE_FILE.name} ({len(data) / 1024:.0f} KiB, {records} records)")
+
+    results = {
+        "two-pass (before)": _time(two_pass_decode, data, repeats),
+        "single-pass": _time(single_pass_decode, data, repeats),
+        "single-pass, load": _time(lambda f: len(decode_fit_messages(f, channels="load").samples), data, repeats),
+        "fast (NumPy)": _time(lambda _: fast_decode(data), data, repeats),
+        "fast (NumPy), load": _time(lambda _: fast_decode(data, "load"), data, repeats),
+    }
+    for label, timings in results.items():
+        median = statistics.median(timings)
+        print(f"  {label:<22} median {median * 1000:8.1f} ms  ({records / median:,.0f} records/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: GPX parsing throughput and vectorized distance/speed derivation.
+
+Generates a synthetic 10-hour, 1 Hz GPX export (36,000 points with
+TrackPointExtension HR/cadence/temperature and a power extension), then
+reports
+
+- end-to-end ``decode_gpx_stream`` throughput in records/s
+- distance + speed derivation: a per-point ``math`` haversine loop (the
+  straightforward implementation) vs ``track_distance_and_speed``
+
+Run from the repository root:
+    python -m benchmarks.bench_gpx_parse
+"""
+from __future__ import annotations
+
+import io
+import math
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+import numpy as np
+
+from app.services.geo import EARTH_RADIUS_M, track_distance_and_speed
+from app.services.gpx_parser import decode_gpx_stream
+
+GPX_NS = "http://www.topografix.com/GPX/1/1"
+TPX_NS = "http://www.garmin.com/xmlschemas/TrackPointExtension/v1"
+
+
+def make_gpx(hours: float = 10.0) -> bytes:
+    """Build a synthetic 1 Hz GPX export."""
+    start = datetime(2024, 6, 1, 6, 0, 0)
+    parts = [
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<gpx version="1.1" creator="bench" xmlns="{GPX_NS}" xmlns:gpxtpx="{TPX_NS}">'
+        f"<trk><type>cycling</type><trkseg>"
+    ]
+    for i in range(int(hours * 3600)):
+        t = start + timedelta(seconds=i)
+        parts.append(
+            f'<trkpt lat="{45 + i * 7e-5:.7f}" lon="{7 + math.sin(i / 300) * 0.01:.7f}">'
+            f"<ele>{200 + (i % 900) * 0.2:.1f}</ele><time>{t.isoformat()}Z</time>"
+            f"<extensions><power>{150 + i % 150}</power><gpxtpx:TrackPointExtension>"
+            f"<gpxtpx:atemp>18</gpxtpx:atemp><gpxtpx:hr>{120 + i % 40}</gpxtpx:hr>"
+            f"<gpxtpx:cad>{85 + i % 10}</gpxtpx:cad></gpxtpx:TrackPointExtension>"
+            f"</extensions></trkpt>"
+        )
+    parts.append("</trkseg></trk></gpx>")
+    return "".join(parts).encode()
+
+
+def loop_distance_and_speed(t_s: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> float:
+    """Baseline: point-by-point haversine in Python."""
+    t_values, lat_values, lon_values = t_s.tolist(), lat.tolist(), lon.tolist()
+    total = 0.0
+    speeds = [None]
+    for i in range(1, len(t_values)):
+        p1, p2 = math.radians(lat_values[i - 1]), math.radians(lat_values[i])
+        dp = p2 - p1
+        dl = math.radians(lon_values[i] - lon_values[i - 1])
+        a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+        segment = 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+        total += segment
+        dt = t_values[i] - t_values[i - 1]
+        speeds.append(segment / dt if dt > 0 else None)
+    return total
+
+
+def vectorized_distance_and_speed(t_s: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> float:
+    """Current implementation."""
+    distance, _ = track_distance_and_speed(t_s, lat, lon)
+    return float(distance[-1])
+
+
+def _median_ms(fn: Callable[[], object], repeats: int) -> float:
+    timings: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main(repeats: int = 3) -> None:
+    data = make_gpx()
+    decoded = decode_gpx_stream(io.BytesIO(data))
+    samples = decoded.samples
+    records = len(samples)
+    print(f"Synthetic 10 h GPX: {len(data) / 2**20:.1f} MiB, {records} points")
+
+    parse_ms = _median_ms(lambda: decode_gpx_stream(io.BytesIO(data)), repeats)
+    print(f"  full parse            median {parse_ms:8.1f} ms  ({records / parse_ms * 1000:,.0f} records/s)")
+
+    args = (samples.t_s, samples.lat, samples.lon)
+    for label, fn in (
+        ("distance/speed loop", loop_distance_and_speed),
+        ("distance/speed numpy", vectorized_distance_and_speed),
+    ):
+        print(f"  {label:<21} median {_median_ms(lambda: fn(*args), repeats):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: change-point interval detection across ride lengths.
+
+Builds synthetic 1 Hz rides of 1 to 10 hours by repeating a structured
+block (10 min endurance, then 4 x (3 min threshold / 2 min recovery) with
+20 W Gaussian noise) and times ``segment_series`` on each. Near-linear
+scaling shows up as a roughly constant time per hour of riding.
+
+Run from the repository root:
+    python -m benchmarks.bench_interval_detection
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from typing import List
+
+import numpy as np
+
+from app.services.interval_detection import segment_series
+
+BLOCK_LEVELS = [(600, 180)] + [(180, 320), (120, 140)] * 4
+
+
+def make_power(hours: float, seed: int = 0) -> np.ndarray:
+    """Synthetic structured ride of the given length."""
+    rng = np.random.default_rng(seed)
+    block = np.concatenate([np.full(n, float(watts)) for n, watts in BLOCK_LEVELS])
+    n = int(hours * 3600)
+    power = np.resize(block, n) + rng.normal(0, 20, n)
+    return power.clip(0)
+
+
+def _median_ms(power: np.ndarray, repeats: int) -> float:
+    timings: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        segment_series(power)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main(repeats: int = 5) -> None:
+    print("Change-point detection (PELT, 5 s smoothing, 30 s min duration)")
+    for hours in (1, 2, 5, 10):
+        power = make_power(hours)
+        median = _median_ms(power, repeats)
+        segments = len(segment_series(power)) - 1
+        print(
+            f"  {hours:>2} h ({len(power):>6} samples)  median {median:7.1f} ms  "
+            f"({median / hours:5.1f} ms/h)  {segments} segments"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: /metrics/daily work for multi-year ranges, DataFrame path vs columnar.
+
+Before: ``model_dump`` per activity into a DataFrame, ``groupby(dt.date)``,
+pandas EWMs, one validated ``MetricsDaily`` per day from ``itertuples``,
+then response-model serialization (what FastAPI did with the list).
+After: ``daily_loads`` (typed arrays, ``np.bincount`` daily binning,
+closed-form loads) and ``DailyLoads.to_json``.
+
+Request parsing into ``Activity`` models is the same for both and is not
+timed.
+
+Run from the repository root:
+    python -m benchmarks.bench_metrics_daily
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from datetime import date, timedelta
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter
+
+from app.schemas.training import Activity, MetricsDaily
+from app.services.metrics import compute_chronic_and_acute_loads, daily_loads
+
+ACTIVITIES_PER_DAY = 1.5
+_RESPONSE = TypeAdapter(List[MetricsDaily])
+
+
+def make_activities(years: int, rng: np.random.Generator) -> List[Activity]:
+    days = years * 365
+    start = date(2015, 1, 1)
+    return [
+        Activity(
+            activity_date=start + timedelta(days=int(day)),
+            sport="ride",
+            duration_min=float(rng.uniform(20, 240)),
+            tss=None if rng.random() < 0.2 else float(rng.uniform(20, 250)),
+            intensity_factor=float(rng.uniform(0.5, 1.0)),
+        )
+        for day in rng.integers(0, days, int(days * ACTIVITIES_PER_DAY))
+    ]
+
+
+def legacy_activities_to_dataframe(activities: List[Activity]) -> pd.DataFrame:
+    """The previous row-wise construction (baseline)."""
+    frame = pd.DataFrame([a.model_dump() for a in activities])
+    frame["date"] = pd.to_datetime(frame["activity_date"])
+    frame["tss"] = frame["tss"].astype("float64")
+    duration_factor = frame["duration_min"].fillna(0.0) / 60.0
+    intensity_factor = frame["intensity_factor"].astype("float64").fillna(0.7)
+    frame["tss"] = frame["tss"].fillna(100.0 * duration_factor * intensity_factor)
+    daily = frame.groupby(frame["date"].dt.date)["tss"].sum().rename_axis("date").reset_index()
+    daily["date"] = pd.to_datetime(daily["date"])
+    return daily
+
+
+def legacy_response(activities: List[Activity]) -> bytes:
+    metrics_df = compute_chronic_and_acute_loads(legacy_activities_to_dataframe(activities))
+    rows = [
+        MetricsDaily(
+            metric_date=row.date.date(),
+            tss=float(row.tss),
+            atl=float(row.atl),
+            ctl=float(row.ctl),
+            tsb=float(row.tsb),
+        )
+        for row in metrics_df.itertuples(index=False)
+    ]
+    return _RESPONSE.dump_json(_RESPONSE.validate_python(rows))
+
+
+def columnar_response(activities: List[Activity]) -> bytes:
+    return daily_loads(activities).to_json()
+
+
+def time_it(fn: Callable[[], object], repeats: int = 5) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    print(f"{'years':>5}  {'activities':>10}  {'before':>10}  {'after':>9}  speedup")
+    for years in (1, 3, 5, 10):
+        activities = make_activities(years, rng)
+        before = time_it(lambda: legacy_response(activities))
+        after = time_it(lambda: columnar_response(activities))
+        print(
+            f"{years:5d}  {len(activities):10d}  {before * 1000:7.1f} ms  {after * 1000:6.1f} ms  "
+            f"{before / after:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
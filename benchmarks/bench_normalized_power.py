@@ -0,0 +1,75 @@
+"""
+Benchmark: Normalized Power for a library of stored workouts.
+
+Builds 2,000 synthetic 1 Hz rides of 30 minutes to 4 hours (~8.5M samples)
+and reports the time to compute every NP with
+
+- the previous pandas implementation (a Series and ``rolling`` per call)
+- ``calculate_normalized_power`` (cumulative-sum kernel, one call per ride)
+- ``calculate_normalized_power_batch`` (all rides in one pass)
+
+Run from the repository root:
+    python -m benchmarks.bench_normalized_power
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from app.services.metrics import calculate_normalized_power, calculate_normalized_power_batch
+
+WORKOUTS = 2000
+
+
+def pandas_normalized_power(power: np.ndarray, sample_rate_hz: int = 1) -> float:
+    """Baseline: the pandas rolling-window NP this kernel replaced."""
+    power_series = pd.Series(power, dtype=float)
+    if len(power) < 30 * sample_rate_hz:
+        return float(power_series.mean())
+    rolling_avg = power_series.rolling(window=30 * sample_rate_hz, min_periods=1).mean()
+    return float((rolling_avg ** 4).mean() ** 0.25)
+
+
+def make_rides(rng: np.random.Generator) -> List[np.ndarray]:
+    durations = rng.integers(1800, 4 * 3600, WORKOUTS)
+    return [rng.gamma(4.0, 55.0, n) for n in durations]
+
+
+def time_it(fn: Callable[[], object], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(repeats: int = 3) -> None:
+    rides = make_rides(np.random.default_rng(0))
+    power = np.concatenate(rides)
+    offsets = np.cumsum([0] + [len(ride) for ride in rides])
+
+    batch = calculate_normalized_power_batch(power, offsets)
+    reference = np.array([pandas_normalized_power(ride) for ride in rides])
+    assert np.allclose(batch, reference, rtol=1e-9)
+
+    print(f"{WORKOUTS} rides, {len(power) / 1e6:.1f}M samples")
+    baseline = time_it(lambda: [pandas_normalized_power(ride) for ride in rides], repeats)
+    for label, fn in (
+        ("pandas rolling (per ride)", lambda: [pandas_normalized_power(ride) for ride in rides]),
+        ("calculate_normalized_power", lambda: [calculate_normalized_power(ride) for ride in rides]),
+        ("calculate_normalized_power_batch", lambda: calculate_normalized_power_batch(power, offsets)),
+    ):
+        elapsed = baseline if label.startswith("pandas") else time_it(fn, repeats)
+        print(
+            f"  {label:34s} median {elapsed * 1000:8.1f} ms  "
+            f"({elapsed / WORKOUTS * 1e6:7.1f} us/ride, {baseline / elapsed:5.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
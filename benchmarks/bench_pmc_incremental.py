@@ -0,0 +1,87 @@
+"""
+Benchmark: adding a workout to long histories, incremental PMC vs full recompute.
+
+For athletes with 1 to 10 years of stored workouts, times adding today's
+ride and reading the updated loads through ``PmcCache`` (recomputes from
+the changed day) against the previous path: daily TSS for the whole
+history through ``compute_chronic_and_acute_loads`` (pandas EWM over every
+day). Also times an edit one year back, which recomputes 365 days.
+
+Run from the repository root:
+    python -m benchmarks.bench_pmc_incremental
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from app.schemas.training import WorkoutExecuted
+from app.services.metrics import compute_chronic_and_acute_loads
+from app.services.pmc import PmcCache
+from app.services.workout_store import WorkoutStore
+
+START = date(2015, 1, 1)
+
+
+def workout(day: date, tss: float) -> WorkoutExecuted:
+    return WorkoutExecuted(
+        athlete_id=1,
+        source="file",
+        start_time=datetime.combine(day, datetime.min.time()),
+        duration_s=3600,
+        sport="cycling",
+        summary_json={"tss": tss},
+    )
+
+
+def full_recompute(store: WorkoutStore) -> pd.DataFrame:
+    dates, tss = store.daily_tss(1)
+    return compute_chronic_and_acute_loads(pd.DataFrame({"date": pd.to_datetime(dates), "tss": tss}))
+
+
+def time_it(fn: Callable[[], object], repeats: int = 20) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    print(f"{'years':>5}  {'full recompute':>14}  {'add today':>10}  {'edit 1 y ago':>12}  speedup")
+    for years in (1, 2, 5, 10):
+        days = years * 365
+        store = WorkoutStore()
+        cache = PmcCache(store)
+        for day in np.flatnonzero(rng.random(days) < 0.8):
+            store.add(f"w{day}", workout(START + timedelta(days=int(day)), float(rng.uniform(30, 200))))
+        cache.state(1)
+        today = START + timedelta(days=days)
+        year_ago = today - timedelta(days=365)
+
+        def add_today() -> None:
+            store.add("today", workout(today, float(rng.uniform(30, 200))))
+            cache.state(1)
+
+        def edit_year_ago() -> None:
+            store.add("edit", workout(year_ago, float(rng.uniform(30, 200))))
+            cache.state(1)
+
+        full = time_it(lambda: full_recompute(store))
+        incremental = time_it(add_today)
+        edit = time_it(edit_year_ago)
+        print(
+            f"{years:5d}  {full * 1000:11.2f} ms  {incremental * 1000:7.3f} ms  {edit * 1000:9.3f} ms  "
+            f"{full / incremental:6.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
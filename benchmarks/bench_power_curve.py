@@ -0,0 +1,85 @@
+"""
+Benchmark: mean-max power curves and season-best queries.
+
+Reports
+
+- ``mean_max_power`` on the ~300-point duration grid vs the naive every-
+  second curve (one rolling max per duration, 1 s to the ride length) for
+  1-10 hour rides (the naive curve is skipped for the 10 h ride)
+- season-best queries on a ``PowerCurveIndex`` holding 10 years of one
+  athlete's rides (best 20 min in the last 90 days / whole history) vs
+  scanning every workout's curve
+
+Run from the repository root:
+    python -m benchmarks.bench_power_curve
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from datetime import date, timedelta
+from typing import Callable
+
+import numpy as np
+
+from app.services.metrics import mean_max_power
+from app.services.power_curve import PowerCurveIndex
+
+NAIVE_MAX_HOURS = 5
+YEARS = 10
+RIDES_PER_WEEK = 5
+
+
+def naive_curve(power: np.ndarray) -> np.ndarray:
+    """Baseline: best rolling mean for every duration from 1 s to the ride length."""
+    cumulative = np.concatenate([[0.0], np.cumsum(power)])
+    return np.array([
+        np.max(cumulative[d:] - cumulative[:-d]) / d for d in range(1, len(power) + 1)
+    ])
+
+
+def time_it(fn: Callable[[], object], repeats: int = 3) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    print("Mean-max curve per ride")
+    for hours in (1, 2, 5, 10):
+        power = rng.gamma(4.0, 55.0, hours * 3600)
+        grid = time_it(lambda: mean_max_power(power))
+        line = f"  {hours:2d} h  grid {grid * 1000:7.1f} ms"
+        if hours <= NAIVE_MAX_HOURS:
+            naive = time_it(lambda: naive_curve(power), repeats=1)
+            line += f"   every second {naive * 1000:8.1f} ms  ({naive / grid:5.0f}x)"
+        print(line)
+
+    index = PowerCurveIndex()
+    curves = []
+    today = date(2025, 12, 31)
+    rides = YEARS * 52 * RIDES_PER_WEEK
+    for i, offset in enumerate(np.sort(rng.integers(0, YEARS * 365, rides)).tolist()):
+        curve = mean_max_power(rng.gamma(4.0, 55.0, int(rng.integers(1800, 4 * 3600))))
+        day = today - timedelta(days=YEARS * 365 - offset)
+        index.add(1, f"ride-{i}", day, curve)
+        curves.append((day, curve))
+
+    print(f"\nSeason-best queries over {rides} rides ({YEARS} years)")
+    for label, start in (("last 90 days", today - timedelta(days=89)), ("all history", None)):
+        indexed = time_it(lambda: index.best_power(1, 1200, start=start, end=today), repeats=20)
+        scan = time_it(lambda: np.fmax.reduce(np.stack(
+            [curve for day, curve in curves if start is None or day >= start]
+        ), axis=0), repeats=5)
+        print(
+            f"  {label:13s} index {indexed * 1e6:8.1f} us   "
+            f"scan all workouts {scan * 1e6:9.1f} us  ({scan / indexed:5.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
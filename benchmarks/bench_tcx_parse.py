@@ -0,0 +1,128 @@
+"""
+Benchmark: streaming TCX parsing vs a DOM-based baseline.
+
+Generates a synthetic 10-hour, 1 Hz ride (36,000 trackpoints with HR,
+cadence, position, and TPX speed/power extensions) and decodes it with
+
+- DOM: ``ElementTree.fromstring`` on the whole document, then a walk over
+  every ``Trackpoint`` (the straightforward implementation)
+- streaming: ``decode_tcx_stream`` (iterparse, trackpoints dropped as
+  they complete)
+
+reporting throughput in records/s and the peak Python heap allocation
+measured with ``tracemalloc`` (the input bytes themselves are excluded).
+
+Run from the repository root:
+    python -m benchmarks.bench_tcx_parse
+"""
+from __future__ import annotations
+
+import io
+import statistics
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+
+from app.services.sample_frame import SampleFrameBuilder
+from app.services.tcx_parser import _TRACKPOINT_CHANNELS, decode_tcx_stream
+from app.services.xml_utils import local_name, parse_time
+
+TCX_NS = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
+EXT_NS = "http://www.garmin.com/xmlschemas/ActivityExtension/v2"
+
+
+def make_tcx(hours: float = 10.0) -> bytes:
+    """Build a synthetic 1 Hz ride with one lap per hour."""
+    start = datetime(2024, 6, 1, 6, 0, 0)
+    seconds = int(hours * 3600)
+    parts = [
+        f'<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<TrainingCenterDatabase xmlns="{TCX_NS}" xmlns:ns3="{EXT_NS}">'
+        f'<Activities><Activity Sport="Biking"><Id>{start.isoformat()}Z</Id>'
+    ]
+    for i in range(seconds):
+        t = start + timedelta(seconds=i)
+        if i % 3600 == 0:
+            if i:
+                parts.append("</Track></Lap>")
+            parts.append(
+                f'<Lap StartTime="{t.isoformat()}Z"><TotalTimeSeconds>3600</TotalTimeSeconds>'
+                f'<DistanceMeters>30000</DistanceMeters><Intensity>Active</Intensity>'
+                f'<TriggerMethod>Time</TriggerMethod><Track>'
+            )
+        parts.append(
+            f"<Trackpoint><Time>{t.isoformat()}Z</Time>"
+            f"<Position><LatitudeDegrees>{45 + i * 1e-5:.7f}</LatitudeDegrees>"
+            f"<LongitudeDegrees>{-122 - i * 1e-5:.7f}</LongitudeDegrees></Position>"
+            f"<AltitudeMeters>{100 + (i % 600) * 0.1:.1f}</AltitudeMeters>"
+            f"<DistanceMeters>{i * 8.3:.1f}</DistanceMeters>"
+            f"<HeartRateBpm><Value>{120 + i % 40}</Value></HeartRateBpm>"
+            f"<Cadence>{85 + i % 10}</Cadence>"
+            f"<Extensions><ns3:TPX><ns3:Speed>8.3</ns3:Speed>"
+            f"<ns3:Watts>{150 + i % 150}</ns3:Watts></ns3:TPX></Extensions></Trackpoint>"
+        )
+    parts.append("</Track></Lap></Activity></Activities></TrainingCenterDatabase>")
+    return "".join(parts).encode()
+
+
+def dom_decode(data: bytes) -> int:
+    """Baseline: build the full DOM, then walk it."""
+    root = ET.fromstring(data)
+    builder = SampleFrameBuilder()
+    start_time = None
+    for trackpoint in root.iter(f"{{{TCX_NS}}}Trackpoint"):
+        timestamp = None
+        row = {}
+        for child in trackpoint.iter():
+            name = local_name(child.tag)
+            if name == "Time":
+                timestamp = parse_time(child.text)
+                continue
+            channel = _TRACKPOINT_CHANNELS.get(name)
+            if channel is not None and child.text:
+                row[channel] = float(child.text)
+        if timestamp is None:
+            continue
+        if start_time is None:
+            start_time = timestamp
+        builder.append(int((timestamp - start_time).total_seconds()), row)
+    return len(builder.build(validate=False))
+
+
+def streaming_decode(data: bytes) -> int:
+    """Current implementation: iterparse with element clearing."""
+    return len(decode_tcx_stream(io.BytesIO(data)).samples)
+
+
+def _measure(decoder: Callable[[bytes], int], data: bytes, repeats: int) -> Tuple[List[float], int]:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        decoder(data)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    decoder(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def main(repeats: int = 3) -> None:
+    data = make_tcx()
+    records = streaming_decode(data)
+    print(f"Synthetic 10 h TCX: {len(data) / 2**20:.1f} MiB, {records} trackpoints")
+
+    for label, decoder in (("DOM (before)", dom_decode), ("streaming", streaming_decode)):
+        timings, peak = _measure(decoder, data, repeats)
+        median = statistics.median(timings)
+        print(
+            f"  {label:<14} median {median * 1000:8.1f} ms  "
+            f"({records / median:,.0f} records/s)  peak {peak / 2**20:7.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: team PMC, one pandas pipeline per athlete vs one vectorized pass.
+
+Builds an athletes x days TSS matrix (10 years of daily training, staggered
+start dates, per-athlete time constants) and times:
+
+- per athlete: ``compute_chronic_and_acute_loads`` on each athlete's days
+  (what a dashboard did before, minus the ``Activity`` conversion)
+- ``banister_loads_batch`` on the whole matrix
+
+and reports the largest difference between the two.
+
+Run from the repository root:
+    python -m benchmarks.bench_team_pmc
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from app.services.metrics import LoadConstants, banister_loads_batch, compute_chronic_and_acute_loads
+
+DAYS = 3650
+
+
+def make_team(athletes: int, rng: np.random.Generator):
+    tss = rng.gamma(2.0, 40.0, (athletes, DAYS)) * (rng.random((athletes, DAYS)) < 0.75)
+    joined = rng.integers(0, DAYS // 2, athletes)
+    tss[np.arange(DAYS) < joined[:, None]] = 0
+    constants = [
+        LoadConstants(float(atl), float(ctl))
+        for atl, ctl in zip(rng.uniform(5, 9, athletes), rng.uniform(35, 50, athletes))
+    ]
+    return tss, constants
+
+
+def per_athlete(tss: np.ndarray, constants: List[LoadConstants]) -> np.ndarray:
+    dates = pd.date_range("2015-01-01", periods=DAYS)
+    ctl = np.zeros(tss.shape)
+    for row, athlete_constants in enumerate(constants):
+        first = int(np.argmax(tss[row] > 0))
+        daily = pd.DataFrame({"date": dates[first:], "tss": tss[row, first:]})
+        ctl[row, first:] = compute_chronic_and_acute_loads(daily, athlete_constants)["ctl"].to_numpy()
+    return ctl
+
+
+def time_it(fn: Callable[[], object], repeats: int = 3) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    print(f"{'athletes':>8}  {'per athlete':>12}  {'batch':>9}  {'speedup':>7}  max |ΔCTL|")
+    for athletes in (100, 300, 1000):
+        tss, constants = make_team(athletes, rng)
+        looped = time_it(lambda: per_athlete(tss, constants), repeats=1)
+        batch = time_it(lambda: banister_loads_batch(tss, constants))
+        error = np.abs(per_athlete(tss, constants) - banister_loads_batch(tss, constants)[1]).max()
+        print(f"{athletes:8d}  {looped * 1000:9.0f} ms  {batch * 1000:6.1f} ms  {looped / batch:6.0f}x  {error:.1e}")
+
+
+if __name__ == "__main__":
+    main()
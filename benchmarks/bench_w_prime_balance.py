@@ -0,0 +1,73 @@
+"""
+Benchmark: W′bal (Skiba) computation time vs ride length.
+
+Runs ``calculate_w_prime_balance`` (the default differential model and the
+integral model) on synthetic 1 Hz interval rides of 1 to 24 hours and
+reports time and differential time per hour of riding, which stays flat
+if the cost is linear. The textbook O(n^2) integral is timed for the
+short rides for comparison.
+
+Run from the repository root:
+    python -m benchmarks.bench_w_prime_balance
+"""
+from __future__ import annotations
+
+import statistics
+import time
+from typing import Callable
+
+import numpy as np
+
+from app.services.metrics import calculate_w_prime_balance
+
+CP = 280
+W_PRIME = 20000
+NAIVE_MAX_HOURS = 4
+
+
+def make_ride(hours: int, rng: np.random.Generator) -> np.ndarray:
+    """Endurance riding with a 3 min VO2 effort every 20 minutes."""
+    power = rng.normal(200, 25, hours * 3600).clip(0)
+    for start in range(600, len(power) - 180, 1200):
+        power[start:start + 180] += 180
+    return power
+
+
+def naive_integral(power: np.ndarray, tau: float) -> np.ndarray:
+    """Baseline: the Skiba integral summed over all earlier samples at each second."""
+    expended = np.maximum(power - CP, 0.0)
+    t = np.arange(len(power))
+    return np.array([
+        W_PRIME - np.sum(expended[:i + 1] * np.exp(-(i - t[:i + 1]) / tau)) for i in range(len(power))
+    ])
+
+
+def time_it(fn: Callable[[], object], repeats: int = 3) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    print(f"{'hours':>5}  {'differential':>14}  {'per hour':>9}  {'integral':>12}  naive integral")
+    for hours in (1, 2, 4, 8, 12, 24):
+        power = make_ride(hours, rng)
+        differential = time_it(lambda: calculate_w_prime_balance(power, CP, W_PRIME))
+        integral = time_it(lambda: calculate_w_prime_balance(power, CP, W_PRIME, model="integral"))
+        line = (
+            f"{hours:5d}  {differential * 1000:11.1f} ms  {differential / hours * 1000:6.2f} ms  "
+            f"{integral * 1000:9.1f} ms"
+        )
+        if hours <= NAIVE_MAX_HOURS:
+            tau = calculate_w_prime_balance(power, CP, W_PRIME, model="integral").tau_s
+            naive = time_it(lambda: naive_integral(power, tau), repeats=1)
+            line += f"  {naive * 1000:9.1f} ms ({naive / integral:.0f}x)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Load test: health-check latency while 20 FIT uploads run concurrently.
+
+Drives the ASGI app in-process with httpx. Each accepted upload's ingestion
+job is polled until it finishes. Health checks are scheduled every 20 ms
+while the uploads are in flight and their latency is measured from the
+scheduled send time, so event-loop stalls are included. With parsing in the
+process pool the health-check latency should stay flat, and uploads beyond
+the pool's capacity are shed with 503. ``--inline`` reproduces the old behaviour of
+parsing on the event loop for comparison.
+
+Run from the repository root:
+    python -m benchmarks.load_upload_health [--inline] [--workers 2] [--queue-depth 8]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, List
+
+import httpx
+
+from app import main
+from app.services.parse_pool import ParsePool
+
+SAMPLE_FILE = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+CONCURRENT_UPLOADS = 20
+
+
+class InlinePool(ParsePool):
+    """Runs the parse directly on the event loop (the pre-pool behaviour)."""
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return fn(*args, **kwargs)
+
+
+def _summary(label: str, latencies: List[float]) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    return (
+        f"  {label:<18} n={len(ordered):4d}  p50 {statistics.median(ordered) * 1000:7.1f} ms"
+        f"  p95 {p95 * 1000:7.1f} ms  max {ordered[-1] * 1000:7.1f} ms"
+    )
+
+
+async def _ping(client: httpx.AsyncClient, interval_s: float = 0.0) -> float:
+    """Send a health check after ``interval_s``; latency counts any event-loop stall."""
+    start = time.perf_counter()
+    if interval_s:
+        await asyncio.sleep(interval_s)
+    resp = await client.get("/")
+    resp.raise_for_status()
+    return time.perf_counter() - start - interval_s
+
+
+async def _upload(client: httpx.AsyncClient, data: bytes) -> str:
+    """Submit an upload and poll its ingestion job; returns the final outcome."""
+    resp = await client.post(
+        "/workouts/upload",
+        files={"file": ("ride.fit.gz", data, "application/gzip")},
+        data={"athlete_id": "1", "ftp": "250"},
+    )
+    if resp.status_code != 202:
+        return str(resp.status_code)
+    status_url = resp.json()["status_url"]
+    while True:
+        job = (await client.get(status_url)).json()
+        if job["status"] in ("done", "failed"):
+            return job["status"]
+        await asyncio.sleep(0.1)
+
+
+async def run(inline: bool, workers: int, queue_depth: int) -> None:
+    data = SAMPLE_FILE.read_bytes()
+    main.parse_pool = InlinePool(workers, queue_depth) if inline else ParsePool(workers, queue_depth)
+    main.job_scheduler = None
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        idle = [await _ping(client) for _ in range(50)]
+
+        # Warm the worker processes so spawn cost doesn't count as load
+        await _upload(client, data)
+
+        uploads = [asyncio.ensure_future(_upload(client, data)) for _ in range(CONCURRENT_UPLOADS)]
+        loaded: List[float] = []
+        start = time.perf_counter()
+        while not all(u.done() for u in uploads):
+            loaded.append(await _ping(client, interval_s=0.02))
+        statuses = Counter(await asyncio.gather(*uploads))
+        elapsed = time.perf_counter() - start
+
+    await main.job_scheduler.stop()
+    main.parse_pool.shutdown()
+    mode = "inline (event loop)" if inline else f"process pool ({workers} workers, queue {queue_depth})"
+    print(f"Parsing: {mode}")
+    print(_summary("health idle", idle))
+    print(_summary("health under load", loaded))
+    print(f"  uploads: {dict(statuses)} in {elapsed:.1f}s")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--inline", action="store_true", help="parse on the event loop")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-depth", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(run(args.inline, args.workers, args.queue_depth))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,6 +1,8 @@
 from datetime import date
+from pathlib import Path
 from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -83,3 +85,447 @@ def test_activities_endpoint_validation():
     # Valid date range but no auth
     resp = client.get("/trainingpeaks/activities?start_date=2024-01-01&end_date=2024-01-07")
     assert resp.status_code == 401
+
+
+def _wait_for_job(test_client: TestClient, job_id: str, timeout_s: float = 60.0) -> dict:
+    """Poll a job until it finishes."""
+    import time
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        job = test_client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_upload_fit_gz_runs_ingestion_job_without_saving_to_disk(tmp_path, monkeypatch):
+    """Test that an upload returns a job ID and the job reports per-stage progress."""
+    fit_file_path = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    if not fit_file_path.exists():
+        pytest.skip("Test FIT file not found")
+    
+    from app import main
+    
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    with TestClient(app) as test_client:
+        with fit_file_path.open("rb") as f:
+            resp = test_client.post(
+                "/workouts/upload",
+                files={"file": ("ride.fit.gz", f, "application/gzip")},
+                data={"athlete_id": "1", "ftp": "250"},
+            )
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+        assert resp.json()["status_url"] == f"/jobs/{job_id}"
+        
+        job = _wait_for_job(test_client, job_id)
+    
+    assert job["status"] == "done"
+    assert job["sample_count"] > 0
+    assert job["filename"] == "ride.fit.gz"
+    assert job["workout"]["file_ref"].endswith(job["content_hash"])
+    assert [stage["name"] for stage in job["stages"]] == ["parse", "clean", "summarize", "intervals", "power_curve"]
+    assert all(stage["duration_ms"] is not None for stage in job["stages"])
+    assert len(job["intervals"]) > 1
+    assert job["intervals"][0]["metrics_json"]["time_in_zone"]
+    assert not (tmp_path / "uploads").exists()
+
+
+def test_duplicate_upload_is_served_from_parse_cache(tmp_path, monkeypatch):
+    """Test that re-uploading identical bytes skips parse and clean."""
+    from app import main
+    fit_file_path = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    if not fit_file_path.exists():
+        pytest.skip("Test FIT file not found")
+    
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    data = fit_file_path.read_bytes()
+    jobs = []
+    with TestClient(app) as test_client:
+        for name in ("ride.fit.gz", "same-ride-again.fit.gz"):
+            resp = test_client.post(
+                "/workouts/upload",
+                files={"file": (name, data, "application/gzip")},
+                data={"athlete_id": "1", "ftp": "250"},
+            )
+            jobs.append(_wait_for_job(test_client, resp.json()["job_id"]))
+    
+    first, second = jobs
+    assert first["content_hash"] == second["content_hash"]
+    assert not first["cache_hit"] and second["cache_hit"]
+    assert [stage["status"] for stage in second["stages"][:2]] == ["cached", "cached"]
+    assert second["workout"]["summary_json"] == first["workout"]["summary_json"]
+    assert second["stages"][3]["status"] == "cached"
+    assert second["intervals"] == first["intervals"]
+    assert len(list((tmp_path / "raw").rglob("*"))) == 2  # one fan-out dir + one file
+
+
+def test_new_upload_runs_pipeline_in_one_worker_call(tmp_path, monkeypatch):
+    """Test that a new upload uses the parse pool once and a cache hit not at all."""
+    from app import main
+    from app.services.parse_pool import ParsePool
+    fit_file_path = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    if not fit_file_path.exists():
+        pytest.skip("Test FIT file not found")
+    
+    calls = []
+    run = ParsePool.run
+    
+    async def counting_run(self, fn, *args, **kwargs):
+        calls.append(fn.__name__)
+        return await run(self, fn, *args, **kwargs)
+    
+    monkeypatch.setattr(ParsePool, "run", counting_run)
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    jobs = []
+    with TestClient(app) as test_client:
+        for ftp in ("250", "300"):
+            resp = test_client.post(
+                "/workouts/upload",
+                files={"file": ("ride.fit.gz", fit_file_path.read_bytes(), "application/gzip")},
+                data={"athlete_id": "1", "ftp": ftp},
+            )
+            jobs.append(_wait_for_job(test_client, resp.json()["job_id"]))
+    
+    first, second = jobs
+    assert first["status"] == "done"
+    assert [stage["status"] for stage in first["stages"]] == ["done"] * 5
+    assert all(stage["duration_ms"] is not None for stage in first["stages"])
+    # The hit is summarized in-process; only new-FTP intervals use a worker
+    assert second["cache_hit"]
+    assert second["workout"]["summary_json"]["tss"] != first["workout"]["summary_json"]["tss"]
+    assert [stage["status"] for stage in second["stages"]] == ["cached", "cached", "done", "done", "cached"]
+    assert calls == ["process_upload", "detect_stored_intervals"]
+
+
+def test_duplicate_upload_does_not_load_cached_samples(tmp_path, monkeypatch):
+    """Test that a retried upload is summarized from stored summaries alone."""
+    from app import main
+    from app.services.storage import ParseResultCache
+    fit_file_path = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    if not fit_file_path.exists():
+        pytest.skip("Test FIT file not found")
+    
+    loads = []
+    get = ParseResultCache.get
+    
+    def counting_get(self, digest):
+        loads.append(digest)
+        return get(self, digest)
+    
+    monkeypatch.setattr(ParseResultCache, "get", counting_get)
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    monkeypatch.setattr(main, "power_curve_index", main.PowerCurveIndex())
+    jobs, loads_per_job = [], []
+    with TestClient(app) as test_client:
+        for ftp in ("250", "250", "300"):
+            del loads[:]
+            resp = test_client.post(
+                "/workouts/upload",
+                files={"file": ("ride.fit.gz", fit_file_path.read_bytes(), "application/gzip")},
+                data={"athlete_id": "1", "ftp": ftp},
+            )
+            jobs.append(_wait_for_job(test_client, resp.json()["job_id"]))
+            loads_per_job.append(len(loads))
+    
+    first, retry, new_ftp = jobs
+    assert loads_per_job[1] == 0
+    assert retry["cache_hit"] and retry["sample_count"] == first["sample_count"]
+    assert retry["workout"]["summary_json"] == first["workout"]["summary_json"]
+    assert new_ftp["workout"]["summary_json"]["tss"] < first["workout"]["summary_json"]["tss"]
+    # Only change-point detection for the new FTP reads the samples (in the pool)
+    assert [stage["status"] for stage in retry["stages"]] == ["cached", "cached", "done", "cached", "cached"]
+    assert [stage["status"] for stage in new_ftp["stages"]] == ["cached", "cached", "done", "done", "cached"]
+
+
+def test_workout_intervals_endpoint_caches_per_threshold(tmp_path, monkeypatch):
+    """Test that workout intervals are served from cache and re-derived for a new FTP."""
+    from app import main
+    fit_file_path = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    if not fit_file_path.exists():
+        pytest.skip("Test FIT file not found")
+    
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    with TestClient(app) as test_client:
+        resp = test_client.post(
+            "/workouts/upload",
+            files={"file": ("ride.fit.gz", fit_file_path.read_bytes(), "application/gzip")},
+            data={"athlete_id": "1", "ftp": "250"},
+        )
+        job = _wait_for_job(test_client, resp.json()["job_id"])
+        url = f"/workouts/{job['content_hash']}/intervals"
+        
+        cached = test_client.get(url, params={"ftp": 250})
+        new_ftp = test_client.get(url, params={"ftp": 300})
+        missing = test_client.get("/workouts/" + "0" * 64 + "/intervals")
+    
+    assert cached.status_code == 200
+    assert cached.json() == job["intervals"]
+    assert new_ftp.status_code == 200
+    assert new_ftp.json() != cached.json()
+    assert missing.status_code == 404
+
+
+def test_workout_intervals_endpoint_returns_503_when_pool_saturated(tmp_path, monkeypatch):
+    """Test that a re-segmentation the pool can't take is a retryable 503."""
+    from app import main
+    from app.services.parse_pool import ParsePool, ParsePoolSaturatedError
+    fit_file_path = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    if not fit_file_path.exists():
+        pytest.skip("Test FIT file not found")
+    
+    async def saturated_run(self, fn, *args, **kwargs):
+        raise ParsePoolSaturatedError("busy")
+    
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    with TestClient(app) as test_client:
+        resp = test_client.post(
+            "/workouts/upload",
+            files={"file": ("ride.fit.gz", fit_file_path.read_bytes(), "application/gzip")},
+            data={"athlete_id": "1", "ftp": "250"},
+        )
+        job = _wait_for_job(test_client, resp.json()["job_id"])
+        monkeypatch.setattr(ParsePool, "run", saturated_run)
+        resp = test_client.get(f"/workouts/{job['content_hash']}/intervals", params={"ftp": 300})
+    
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "5"
+
+
+def test_upload_of_corrupt_fit_marks_job_failed(tmp_path, monkeypatch):
+    """Test that a parse failure is reported on the job's parse stage."""
+    from app import main
+    
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    with TestClient(app) as test_client:
+        resp = test_client.post(
+            "/workouts/upload",
+            files={"file": ("ride.fit", b"not a fit file", "application/octet-stream")},
+            data={"athlete_id": "1"},
+        )
+        job = _wait_for_job(test_client, resp.json()["job_id"])
+    
+    assert job["status"] == "failed"
+    assert job["stages"][0]["status"] == "failed"
+    assert job["stages"][1]["status"] == "skipped"
+
+
+def test_upload_tcx_runs_ingestion_job(tmp_path, monkeypatch):
+    """Test that TCX uploads go through the same ingestion pipeline as FIT."""
+    from app import main
+    
+    points = "".join(
+        f"<Trackpoint><Time>2024-05-01T08:{i // 60:02d}:{i % 60:02d}Z</Time>"
+        f"<HeartRateBpm><Value>130</Value></HeartRateBpm>"
+        f"<Extensions><TPX xmlns=\"http://www.garmin.com/xmlschemas/ActivityExtension/v2\">"
+        f"<Watts>200</Watts></TPX></Extensions></Trackpoint>"
+        for i in range(120)
+    )
+    tcx = (
+        '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">'
+        '<Activities><Activity Sport="Biking"><Lap StartTime="2024-05-01T08:00:00Z">'
+        f'<TotalTimeSeconds>120</TotalTimeSeconds><Track>{points}</Track></Lap>'
+        '</Activity></Activities></TrainingCenterDatabase>'
+    ).encode()
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    with TestClient(app) as test_client:
+        resp = test_client.post(
+            "/workouts/upload",
+            files={"file": ("ride.tcx", tcx, "application/xml")},
+            data={"athlete_id": "1", "ftp": "250"},
+        )
+        assert resp.status_code == 202
+        job = _wait_for_job(test_client, resp.json()["job_id"])
+    
+    assert job["status"] == "done"
+    assert job["sample_count"] == 120
+    assert job["workout"]["sport"] == "cycling"
+    assert job["workout"]["summary_json"]["avg_power"] == 200
+    assert job["workouts"] == [job["workout"]]
+
+
+def test_power_curve_endpoint_serves_indexed_bests(tmp_path, monkeypatch):
+    """Test that an ingested ride's curve is indexed and queryable by date range."""
+    from app import main
+    from app.services.power_curve import PowerCurveIndex
+    
+    points = "".join(
+        f"<Trackpoint><Time>2024-05-01T08:{i // 60:02d}:{i % 60:02d}Z</Time>"
+        f"<Extensions><TPX xmlns=\"http://www.garmin.com/xmlschemas/ActivityExtension/v2\">"
+        f"<Watts>{400 if 60 <= i < 120 else 200}</Watts></TPX></Extensions></Trackpoint>"
+        for i in range(180)
+    )
+    tcx = (
+        '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">'
+        '<Activities><Activity Sport="Biking"><Lap StartTime="2024-05-01T08:00:00Z">'
+        f'<TotalTimeSeconds>180</TotalTimeSeconds><Track>{points}</Track></Lap>'
+        '</Activity></Activities></TrainingCenterDatabase>'
+    ).encode()
+    monkeypatch.setenv("AUTOCOACH_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "job_scheduler", None)
+    monkeypatch.setattr(main, "power_curve_index", PowerCurveIndex())
+    with TestClient(app) as test_client:
+        resp = test_client.post(
+            "/workouts/upload",
+            files={"file": ("ride.tcx", tcx, "application/xml")},
+            data={"athlete_id": "1"},
+        )
+        job = _wait_for_job(test_client, resp.json()["job_id"])
+        url = "/athletes/1/power-curve"
+        in_range = test_client.get(url, params={"days": 90, "end": "2024-06-01", "duration_s": 60})
+        later = test_client.get(url, params={"start": "2024-05-02"})
+    
+    assert job["stages"][-1]["status"] == "done"
+    assert in_range.status_code == 200
+    curve = in_range.json()
+    assert curve["durations_s"][-1] == 180
+    assert curve["power_w"][0] == 400
+    assert curve["best_power_w"] == pytest.approx(400)
+    assert later.status_code == 404
+
+
+def test_cp_refit_serves_threshold_suggestions(monkeypatch):
+    """Test that the refit fits indexed curves and suggestions are served per athlete."""
+    from app import main
+    from app.services.metrics import MMP_DURATIONS_S
+    from app.services.power_curve import PowerCurveIndex
+    
+    index = PowerCurveIndex()
+    index.add(7, "ride", date.today(), 260 + 16000 / MMP_DURATIONS_S)
+    monkeypatch.setattr(main, "power_curve_index", index)
+    monkeypatch.setattr(main, "threshold_suggestions", {})
+    
+    resp = client.post("/athletes/cp-refit", params={"model": "2p"})
+    assert resp.status_code == 200
+    assert resp.json()["athletes_fitted"] == 1
+    
+    suggestion = client.get("/athletes/7/threshold-suggestion")
+    assert suggestion.status_code == 200
+    assert suggestion.json()["cp"] == pytest.approx(260, abs=0.1)
+    assert suggestion.json()["w_prime"] == pytest.approx(16000, abs=5)
+    assert client.get("/athletes/8/threshold-suggestion").status_code == 404
+    assert client.post("/athletes/cp-refit", params={"model": "4p"}).status_code == 422
+
+
+def test_get_unknown_job_returns_404():
+    """Test that unknown job IDs return 404."""
+    resp = client.get("/jobs/does-not-exist")
+    assert resp.status_code == 404
+
+
+def test_upload_unsupported_extension_returns_400():
+    """Test that unsupported upload types are rejected."""
+    resp = client.post(
+        "/workouts/upload",
+        files={"file": ("notes.txt", b"hello", "text/plain")},
+        data={"athlete_id": "1"},
+    )
+    assert resp.status_code == 400
+
+
+def test_upload_returns_503_when_ingestion_queue_full(monkeypatch):
+    """Test that a full ingestion queue sheds load with 503 + Retry-After."""
+    from app import main
+    from app.services.ingestion import JobQueueFullError
+
+    class FullScheduler:
+        def submit(self, *args, **kwargs):
+            raise JobQueueFullError("full")
+
+    monkeypatch.setattr(main, "get_job_scheduler", lambda: FullScheduler())
+
+    resp = client.post(
+        "/workouts/upload",
+        files={"file": ("ride.fit", b"\x0e\x10", "application/octet-stream")},
+        data={"athlete_id": "1"},
+    )
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "5"
+
+
+def test_rethreshold_endpoint_updates_stored_workouts(monkeypatch):
+    """Test that rethresholding recomputes TSS from stored NP."""
+    from datetime import datetime
+    from app import main
+    from app.schemas.training import WorkoutExecuted
+    from app.services.workout_store import WorkoutStore
+
+    store = WorkoutStore()
+    store.add("abc", WorkoutExecuted(
+        athlete_id=3, source="file", start_time=datetime(2024, 5, 1, 8), duration_s=3600,
+        sport="cycling", summary_json={"np": 250.0, "avg_power": 240.0, "tss": 69.4},
+    ))
+    monkeypatch.setattr(main, "workout_store", store)
+
+    resp = client.post("/athletes/3/rethreshold?ftp=250")
+    assert resp.status_code == 200
+    assert resp.json()["workouts_updated"] == 1
+    assert resp.json()["earliest_affected_date"] == "2024-05-01"
+    assert store.daily_tss(3)[1][0] == pytest.approx(100.0)
+
+
+def test_athlete_pmc_endpoint_serves_incremental_loads(monkeypatch):
+    """Test that stored workouts are served as daily PMC rows, decaying to `end`."""
+    from datetime import datetime
+    from app import main
+    from app.schemas.training import WorkoutExecuted
+    from app.services.pmc import PmcCache
+    from app.services.workout_store import WorkoutStore
+
+    store = WorkoutStore()
+    monkeypatch.setattr(main, "workout_store", store)
+    monkeypatch.setattr(main, "pmc_cache", PmcCache(store))
+    for day, tss in ((1, 100.0), (3, 60.0)):
+        store.add(f"w{day}", WorkoutExecuted(
+            athlete_id=4, source="file", start_time=datetime(2024, 5, day, 8), duration_s=3600,
+            sport="cycling", summary_json={"tss": tss},
+        ))
+
+    resp = client.get("/athletes/4/pmc", params={"end": "2024-05-05"})
+    assert resp.status_code == 200
+    rows = resp.json()
+    assert [row["metric_date"] for row in rows] == [f"2024-05-0{i}" for i in range(1, 6)]
+    assert [row["tss"] for row in rows] == [100, 0, 60, 0, 0]
+    assert rows[0]["atl"] == rows[0]["ctl"] == 100
+    assert client.get("/athletes/5/pmc").status_code == 404
+
+
+def test_team_pmc_endpoint_computes_all_athletes(monkeypatch):
+    """Test that the team endpoint returns aligned per-athlete series with custom constants."""
+    from datetime import datetime
+    from app import main
+    from app.schemas.training import WorkoutExecuted
+    from app.services.workout_store import WorkoutStore
+
+    store = WorkoutStore()
+    monkeypatch.setattr(main, "workout_store", store)
+    for athlete_id, day, tss in ((1, 1, 100.0), (1, 2, 50.0), (2, 2, 70.0)):
+        store.add(f"w{athlete_id}{day}", WorkoutExecuted(
+            athlete_id=athlete_id, source="file", start_time=datetime(2024, 5, day, 8), duration_s=3600,
+            sport="cycling", summary_json={"tss": tss},
+        ))
+
+    resp = client.post("/team/pmc", json={
+        "athlete_ids": [1, 2],
+        "end_date": "2024-05-03",
+        "load_constants": {"2": {"atl_tau_days": 2, "ctl_tau_days": 10}},
+    })
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["dates"] == ["2024-05-01", "2024-05-02", "2024-05-03"]
+    first, second = body["athletes"]
+    assert first["tss"] == [100, 50, 0]
+    assert first["atl"][1] == pytest.approx(100 + (50 - 100) / 7, abs=0.01)
+    assert second["atl"] == [0, 70, 35]
+    assert second["tsb"][2] == pytest.approx(second["ctl"][2] - second["atl"][2], abs=0.01)
+    assert client.post("/team/pmc", json={"athlete_ids": []}).status_code == 422
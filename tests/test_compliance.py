@@ -0,0 +1,98 @@
+"""Unit tests for vectorized compliance scoring."""
+import numpy as np
+import pytest
+
+from app.schemas.training import WorkoutSpec, WorkoutStep
+from app.services.compliance import expand_spec, score_workout
+from app.services.sample_frame import SampleFrame
+
+FTP = 300
+
+
+def vo2_spec() -> WorkoutSpec:
+    """10 min warmup, 5 x (3 min @ 115% / 3 min rest), 10 min cooldown."""
+    return WorkoutSpec(sport="cycling", steps=[
+        WorkoutStep(kind="warmup", duration_s=600, target_power_pct=55, tolerance_pct=10),
+        WorkoutStep(kind="interval_block", repeats=5, steps=[
+            WorkoutStep(kind="work", duration_s=180, target_power_pct=115, tolerance_pct=5),
+            WorkoutStep(kind="rest", duration_s=180, target_power_pct=50),
+        ]),
+        WorkoutStep(kind="cooldown", duration_s=600, target_power_pct=50, tolerance_pct=10),
+    ])
+
+
+def ride(levels, noise_w: float = 3.0, seed: int = 0) -> SampleFrame:
+    rng = np.random.default_rng(seed)
+    power = np.concatenate([np.full(n, w) + rng.normal(0, noise_w, n) for n, w in levels])
+    return SampleFrame.from_columns(np.arange(len(power)), {"power_w": power.clip(0)})
+
+
+def executed_as_planned():
+    return [(600, 165)] + [(180, 345), (180, 140)] * 5 + [(600, 150)]
+
+
+class TestExpandSpec:
+    """Tests for spec expansion to per-second targets."""
+
+    def test_interval_blocks_are_unrolled(self):
+        """Test repeats expansion, per-second step index and FTP-relative targets."""
+        timeline = expand_spec(vo2_spec(), ftp=FTP)
+        assert len(timeline.steps) == 12
+        assert timeline.duration_s == 600 + 5 * 360 + 600
+        assert timeline.step_index[600] == 1 and timeline.step_index[780] == 2
+        assert timeline.target[1] == pytest.approx(345)
+        assert timeline.high[2] == pytest.approx(0.6 * FTP)
+
+    def test_distance_steps_are_rejected(self):
+        """Test that steps without a duration can't be placed on the time grid."""
+        spec = WorkoutSpec(sport="running", steps=[WorkoutStep(kind="work", duration_distance_m=1000)])
+        with pytest.raises(ValueError, match="distance-based"):
+            expand_spec(spec)
+
+
+class TestScoreWorkout:
+    """Tests for step and session verdicts."""
+
+    def test_workout_executed_as_planned_passes(self):
+        """Test that on-target execution passes every step and the session."""
+        report = score_workout(vo2_spec(), ride(executed_as_planned()), ftp=FTP)
+        assert [step.status for step in report.steps] == ["pass"] * 12
+        assert report.status == "pass"
+        assert report.steps[1].mean_vs_target_pct == pytest.approx(0, abs=1)
+        assert report.steps[1].variability == pytest.approx(3 / 345, rel=0.2)
+
+    def test_fading_intervals_fail_the_session(self):
+        """Test that undercooked work steps fail and drag the session below 70%."""
+        levels = [(600, 165)] + [(180, 300), (180, 140)] * 5 + [(600, 150)]
+        report = score_workout(vo2_spec(), ride(levels), ftp=FTP)
+        assert all(step.status == "fail" for step in report.steps[1:11:2])
+        assert report.pass_rate == pytest.approx(7 / 12)
+        assert report.status == "marginal"
+
+    def test_rest_over_cap_fails_and_missing_data_counts_out_of_band(self):
+        """Test the rest cap rule and that a dropout half-way through a step marks it down."""
+        levels = [(600, 165)] + [(180, 345), (180, 250)] * 5 + [(600, 150)]
+        report = score_workout(vo2_spec(), ride(levels), ftp=FTP)
+        assert all(step.status == "fail" for step in report.steps[2:12:2])
+
+        samples = ride(executed_as_planned())
+        samples = samples.select(np.flatnonzero((samples.t_s < 600) | (samples.t_s >= 690)))
+        report = score_workout(vo2_spec(), samples, ftp=FTP)
+        assert report.steps[1].time_in_band_pct == pytest.approx(50, abs=2)
+        assert report.steps[1].status == "fail"
+
+    def test_steps_without_resolvable_target_are_unscored(self):
+        """Test that %FTP targets without an FTP are left unscored."""
+        report = score_workout(vo2_spec(), ride(executed_as_planned()))
+        assert {step.status for step in report.steps} == {"unscored"}
+        assert report.status == "unscored" and report.pass_rate is None
+
+    def test_hr_targets_use_hr_channel(self):
+        """Test scoring on heart rate for HR-targeted steps."""
+        spec = WorkoutSpec(sport="running", steps=[
+            WorkoutStep(kind="work", duration_s=1200, target_hr_pct=85),
+        ])
+        samples = SampleFrame.from_columns(np.arange(1200), {"hr_bpm": np.full(1200, 145.0)})
+        report = score_workout(spec, samples, lthr=170)
+        assert report.steps[0].channel == "hr_bpm"
+        assert report.steps[0].status == "pass"
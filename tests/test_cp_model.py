@@ -0,0 +1,125 @@
+"""Unit tests for batched Critical Power / W′ model fitting."""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.schemas.training import Athlete
+from app.services.cp_model import (
+    CP3_DURATIONS_S,
+    CP3_K_GRID_S,
+    apply_threshold_suggestion,
+    fit_critical_power,
+    refit_athletes,
+)
+from app.services.metrics import MMP_DURATIONS_S
+from app.services.power_curve import PowerCurveIndex
+
+TODAY = date(2025, 6, 30)
+
+
+def _model_curve(cp: float, w_prime: float, k: float = 0.0) -> np.ndarray:
+    """Mean-max curve that follows a CP model exactly on every grid duration."""
+    return cp + w_prime / (MMP_DURATIONS_S + k)
+
+
+class TestFitCriticalPower:
+    """Tests for the closed-form batched CP fits."""
+
+    def test_two_parameter_fit_recovers_exact_model(self):
+        """Test that 2p fits recover CP and W′ from a curve on the hyperbola."""
+        curves = np.stack([_model_curve(250, 18000), _model_curve(320, 24000)])
+        fits = fit_critical_power(curves, model="2p")
+        np.testing.assert_allclose(fits.cp_w, [250, 320], rtol=1e-9)
+        np.testing.assert_allclose(fits.w_prime_j, [18000, 24000], rtol=1e-9)
+        assert fits.k_s.tolist() == [0, 0]
+        assert np.isnan(fits.p_max_w).all()
+        assert fits.rmse_w.max() < 1e-6
+
+    def test_three_parameter_fit_recovers_model_on_k_grid(self):
+        """Test that 3p fits recover CP, W′ and Pmax when k is a grid point."""
+        k = CP3_K_GRID_S[60]
+        fits = fit_critical_power(_model_curve(280, 20000, k)[None, :], model="3p")
+        assert fits.cp_w[0] == pytest.approx(280, rel=1e-9)
+        assert fits.w_prime_j[0] == pytest.approx(20000, rel=1e-9)
+        assert fits.k_s[0] == k
+        assert fits.p_max_w[0] == pytest.approx(280 + 20000 / k)
+
+    def test_three_parameter_fit_is_close_off_grid(self):
+        """Test that 3p stays accurate for k between grid points and noisy curves."""
+        rng = np.random.default_rng(3)
+        curve = _model_curve(300, 22000, 17.0) * rng.normal(1, 0.01, len(MMP_DURATIONS_S))
+        fits = fit_critical_power(curve[None, :], model="3p")
+        assert fits.cp_w[0] == pytest.approx(300, rel=0.03)
+        assert fits.w_prime_j[0] == pytest.approx(22000, rel=0.1)
+
+    def test_unusable_curves_get_nan(self):
+        """Test that short-effort-only, sparse and empty curves are not fitted."""
+        good = _model_curve(250, 18000)
+        short_only = np.where(MMP_DURATIONS_S <= 300, good, np.nan)
+        sparse = np.where(np.isin(MMP_DURATIONS_S, [600, 1200]), good, np.nan)
+        empty = np.full_like(good, np.nan)
+        fits = fit_critical_power(np.stack([good, short_only, sparse, empty]), model="3p")
+        assert fits.valid.tolist() == [True, False, False, False]
+        assert np.isnan(fits.rmse_w[1:]).all()
+
+    def test_results_do_not_depend_on_blocking(self, monkeypatch):
+        """Test that fitting in athlete blocks matches fitting in one pass."""
+        rng = np.random.default_rng(7)
+        curves = np.stack([
+            _model_curve(cp, w, k) * rng.normal(1, 0.02, len(MMP_DURATIONS_S))
+            for cp, w, k in zip(rng.uniform(180, 380, 25), rng.uniform(10000, 30000, 25), rng.uniform(0, 60, 25))
+        ])
+        whole = fit_critical_power(curves, model="3p")
+        monkeypatch.setattr("app.services.cp_model._FIT_BLOCK_ATHLETES", 4)
+        blocked = fit_critical_power(curves, model="3p")
+        np.testing.assert_allclose(whole.cp_w, blocked.cp_w, rtol=1e-9)
+        np.testing.assert_array_equal(whole.k_s, blocked.k_s)
+
+    def test_rejects_unknown_model_and_missing_durations(self):
+        """Test that bad models and grids without the fit durations raise."""
+        with pytest.raises(ValueError, match="Unknown CP model"):
+            fit_critical_power(np.zeros((1, len(MMP_DURATIONS_S))), model="4p")
+        with pytest.raises(ValueError, match="fit duration"):
+            fit_critical_power(np.zeros((1, 3)), model="3p", durations_s=np.array([60, 300, 1200]))
+
+    def test_accepts_grid_of_just_the_fit_durations(self):
+        """Test that curves on a custom grid holding the fit durations work."""
+        curve = 260 + 15000 / (CP3_DURATIONS_S + 0.0)
+        fits = fit_critical_power(curve[None, :], model="2p", durations_s=CP3_DURATIONS_S)
+        assert fits.cp_w[0] == pytest.approx(260)
+
+
+class TestRefitAthletes:
+    """Tests for the nightly refit from the best-curve index."""
+
+    def test_refits_every_athlete_over_the_window(self):
+        """Test that suggestions use only workouts inside the rolling window."""
+        index = PowerCurveIndex()
+        index.add(1, "recent", TODAY - timedelta(days=10), _model_curve(250, 18000))
+        index.add(1, "old", TODAY - timedelta(days=200), _model_curve(400, 30000))
+        index.add(2, "recent", TODAY, _model_curve(300, 21000))
+        index.add(3, "sprint", TODAY, np.where(MMP_DURATIONS_S <= 120, 900.0, np.nan))
+
+        suggestions = refit_athletes(index, window_days=90, today=TODAY, model="2p")
+        assert sorted(suggestions) == [1, 2]
+        assert suggestions[1].cp == pytest.approx(250, abs=0.1)
+        assert suggestions[1].w_prime == pytest.approx(18000, abs=5)
+        assert suggestions[1].window_start == TODAY - timedelta(days=89)
+        assert suggestions[1].window_end == TODAY
+        assert suggestions[2].p_max is None
+
+    def test_empty_index(self):
+        """Test that an index without curves yields no suggestions."""
+        assert refit_athletes(PowerCurveIndex(), today=TODAY) == {}
+
+    def test_apply_threshold_suggestion(self):
+        """Test that applying a suggestion sets CP and W′ on a copy."""
+        index = PowerCurveIndex()
+        index.add(5, "a", TODAY, _model_curve(270, 19000))
+        suggestion = refit_athletes(index, today=TODAY, model="2p")[5]
+        athlete = Athlete(id=5, name="Rider", sport="cycling", ftp=260)
+        updated = apply_threshold_suggestion(athlete, suggestion)
+        assert updated.cp == suggestion.cp
+        assert updated.w_prime == suggestion.w_prime
+        assert athlete.cp is None
@@ -5,6 +5,7 @@ import pytest
 
 from app.services.file_parser import parse_fit_file, FileParseError
 from app.schemas.training import WorkoutExecuted, Sample
+from app.services.sample_frame import SampleFrame
 
 
 class TestFitFileParser:
@@ -37,12 +38,12 @@ class TestFitFileParser:
         assert 'distance_m' in workout.summary_json
         
         # Verify samples were extracted
-        assert isinstance(samples, list)
+        assert isinstance(samples, SampleFrame)
         assert len(samples) > 0
-        assert all(isinstance(s, Sample) for s in samples)
         
-        # Verify first sample
-        first_sample = samples[0]
+        # Verify first sample (materialized lazily as a Sample model)
+        first_sample = samples.to_samples()[0]
+        assert isinstance(first_sample, Sample)
         assert first_sample.workout_id == 1
         assert first_sample.t_s == 0
         
@@ -109,7 +110,8 @@ class TestFitFileParser:
         if not fit_file_path.exists():
             pytest.skip("Test FIT file not found")
         
-        _, samples = parse_fit_file(str(fit_file_path), athlete_id=1)
+        _, frame = parse_fit_file(str(fit_file_path), athlete_id=1)
+        samples = frame.to_samples()
         
         # Check that samples have reasonable data
         sample_with_data = None
@@ -138,8 +140,7 @@ class TestFitFileParser:
         _, samples = parse_fit_file(str(fit_file_path), athlete_id=1)
         
         # Verify samples are time-ordered
-        for i in range(1, min(len(samples), 100)):
-            assert samples[i].t_s >= samples[i-1].t_s, "Samples should be in time order"
+        assert (samples.t_s[1:] >= samples.t_s[:-1]).all(), "Samples should be in time order"
     
     def test_workout_duration_matches_last_sample(self):
         """Test that workout duration matches the last sample timestamp."""
@@ -153,7 +154,7 @@ class TestFitFileParser:
         if samples:
             # Duration should approximately match last sample time
             # Allow some tolerance for rounding
-            assert abs(workout.duration_s - samples[-1].t_s) <= 1
+            assert abs(workout.duration_s - samples.t_s[-1]) <= 1
 
 
 class TestFitFileParserEdgeCases:
@@ -185,3 +186,408 @@ class TestFitFileParserEdgeCases:
         finally:
             Path(temp_path).unlink()
 
+
+
+class TestSinglePassDecode:
+    """Tests for the single-pass FIT message dispatcher."""
+    
+    def test_decode_collects_session_lap_event_and_records_in_one_pass(self):
+        """Test that one decode pass fills sessions, laps, events and samples."""
+        import gzip
+        import io
+        from fitparse import FitFile
+        from app.services.file_parser import decode_fit_messages
+        
+        fit_file_path = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+        if not fit_file_path.exists():
+            pytest.skip("Test FIT file not found")
+        
+        fitfile = FitFile(io.BytesIO(gzip.decompress(fit_file_path.read_bytes())))
+        decoded = decode_fit_messages(fitfile)
+        
+        assert len(decoded.sessions) == 1
+        assert decoded.session_data['sport'] == 'cycling'
+        assert len(decoded.laps) > 1
+        assert all('start_time' in lap and 'total_elapsed_time' in lap for lap in decoded.laps)
+        assert [e['event_type'] for e in decoded.events if e['event'] == 'timer'] == ['start', 'stop']
+        assert len(decoded.device_info) == 1
+        assert len(decoded.samples) > 0
+        assert decoded.start_time is not None
+
+
+class TestInMemoryDecompression:
+    """Tests for decoding compressed FIT payloads without temp files."""
+    
+    FIT_GZ = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    
+    def test_parse_fit_bytes_and_stream_match_path(self):
+        """Test that bytes, zstd stream and path sources produce the same workout."""
+        import gzip
+        import io
+        zstandard = pytest.importorskip("zstandard")
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        
+        raw = gzip.decompress(self.FIT_GZ.read_bytes())
+        from_path, frame_path = parse_fit_file(str(self.FIT_GZ), athlete_id=1, ftp=250)
+        from_bytes, frame_bytes = parse_fit_file(raw, athlete_id=1, ftp=250, filename="ride.fit")
+        zst_stream = io.BytesIO(zstandard.ZstdCompressor().compress(raw))
+        from_zst, _ = parse_fit_file(zst_stream, athlete_id=1, ftp=250, filename="ride.fit.zst")
+        
+        assert from_bytes.summary_json == from_path.summary_json
+        assert from_zst.summary_json == from_path.summary_json
+        assert len(frame_bytes) == len(frame_path)
+        assert from_zst.file_ref == "ride.fit.zst"
+    
+    def test_parse_gz_does_not_create_temp_files(self, monkeypatch):
+        """Test that .fit.gz parsing never goes through tempfile."""
+        import tempfile
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        
+        def fail(*args, **kwargs):
+            raise AssertionError("temp file created")
+        
+        monkeypatch.setattr(tempfile, "NamedTemporaryFile", fail)
+        workout, samples = parse_fit_file(self.FIT_GZ, athlete_id=1)
+        assert len(samples) > 0
+    
+    def test_decompression_bomb_is_rejected(self):
+        """Test that payloads above the decompression cap raise FileParseError."""
+        import gzip
+        from app.services.file_parser import open_fit_source
+        
+        bomb = gzip.compress(b"\x00" * (4 * 1024 * 1024))
+        with pytest.raises(FileParseError, match="exceeds"):
+            open_fit_source(bomb, max_decompressed_bytes=1024 * 1024)
+    
+    def test_corrupt_gzip_raises_parse_error(self):
+        """Test that a truncated gzip payload raises FileParseError."""
+        import gzip
+        truncated = gzip.compress(b"not really a fit file" * 100)[:30]
+        with pytest.raises(FileParseError):
+            parse_fit_file(truncated, athlete_id=1)
+    
+    def test_get_file_type_sees_through_compression_suffix(self):
+        """Test that compressed uploads are typed by their inner extension."""
+        from app.services.file_parser import get_file_type
+        assert get_file_type("ride.fit.gz") == 'fit'
+        assert get_file_type("ride.FIT.zst") == 'fit'
+        assert get_file_type("ride.gz") == 'unknown'
+
+
+def _build_fit(body: bytes) -> bytes:
+    """Wrap message bytes in a FIT header and CRC."""
+    import struct
+    from fitparse.records import Crc
+    data = struct.pack('<2BHI4sH', 14, 0x10, 2093, len(body), b'.FIT', 0) + body
+    return data + struct.pack('<H', Crc.calculate(data))
+
+
+def _record_definition(local: int, fields, big_endian: bool = False) -> bytes:
+    """Definition message for a record (global 20) with (num, size, base type) fields."""
+    import struct
+    endian = '>' if big_endian else '<'
+    header = struct.pack(endian + 'BBBHB', 0x40 | local, 0, int(big_endian), 20, len(fields))
+    return header + b''.join(bytes(field) for field in fields)
+
+
+class TestFastDecoder:
+    """Tests for the bulk NumPy FIT record decoder."""
+    
+    FIT_GZ = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    FIELDS = [(253, 4, 0x86), (7, 2, 0x84), (3, 1, 0x02), (6, 2, 0x84)]
+    
+    @staticmethod
+    def _assert_same_decode(fast, slow):
+        import numpy as np
+        from app.services.sample_frame import CHANNELS
+        assert fast.sessions == slow.sessions
+        assert fast.laps == slow.laps
+        assert fast.events == slow.events
+        assert fast.device_info == slow.device_info
+        assert fast.start_time == slow.start_time
+        np.testing.assert_array_equal(fast.samples.t_s, slow.samples.t_s)
+        for name in CHANNELS:
+            np.testing.assert_array_equal(getattr(fast.samples, name), getattr(slow.samples, name))
+            np.testing.assert_array_equal(fast.samples.valid[name], slow.samples.valid[name])
+    
+    def _records(self, big_endian: bool = False) -> bytes:
+        import struct
+        endian = '>' if big_endian else '<'
+        body = _record_definition(0, self.FIELDS, big_endian)
+        for i, (power, hr) in enumerate([(200, 120), (0xFFFF, 121), (250, 0xFF)]):
+            body += b'\x00' + struct.pack(endian + 'IHBH', 1_000_000_000 + i, power, hr, 8000 + i)
+        return body
+    
+    def test_fast_decoder_matches_fitparse_on_sample_file(self, monkeypatch):
+        """Test that the fast path reproduces fitparse output without per-record decoding."""
+        import gzip
+        from app.services import file_parser
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        
+        data = gzip.decompress(self.FIT_GZ.read_bytes())
+        slow = file_parser.decode_fit_messages(file_parser.open_fit_source(data))
+        
+        def fail(state, message):
+            raise AssertionError("record decoded through fitparse")
+        
+        monkeypatch.setitem(file_parser._MESSAGE_HANDLERS, 'record', fail)
+        fast = file_parser.decode_fit_fast(data)
+        self._assert_same_decode(fast, slow)
+        assert len(fast.samples) == 3601
+    
+    def test_parse_fit_file_fast_flag_and_env(self, monkeypatch):
+        """Test that fast=True and the environment flag give identical workouts."""
+        from app.services.file_parser import FAST_DECODE_ENV
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        
+        slow, _ = parse_fit_file(self.FIT_GZ, athlete_id=1, ftp=250, fast=False)
+        fast, _ = parse_fit_file(self.FIT_GZ, athlete_id=1, ftp=250, fast=True)
+        monkeypatch.setenv(FAST_DECODE_ENV, "1")
+        from_env, _ = parse_fit_file(self.FIT_GZ, athlete_id=1, ftp=250)
+        assert fast.summary_json == slow.summary_json
+        assert from_env.summary_json == slow.summary_json
+    
+    @pytest.mark.parametrize("big_endian", [False, True])
+    def test_fast_decoder_handles_invalid_values_and_endianness(self, big_endian):
+        """Test invalid sentinels and big-endian definitions against fitparse."""
+        from app.services.file_parser import decode_fit_fast, decode_fit_messages, open_fit_source
+        data = _build_fit(self._records(big_endian))
+        fast = decode_fit_fast(data)
+        self._assert_same_decode(fast, decode_fit_messages(open_fit_source(data)))
+        assert fast.samples.values('power_w').tolist() == [200, 250]
+        assert fast.samples.values('pace_mps').tolist() == [8.0, 8.001, 8.002]
+    
+    def test_fast_decoder_falls_back_on_compressed_timestamps(self):
+        """Test that compressed timestamp headers are decoded by fitparse."""
+        import struct
+        from app.services.file_parser import decode_fit_fast, decode_fit_messages, open_fit_source
+        body = self._records()
+        body += _record_definition(1, [(7, 2, 0x84), (3, 1, 0x02)])
+        # Compressed timestamp header: local type 1, time offset 5 seconds
+        body += bytes([0x80 | (1 << 5) | ((1_000_000_002 + 5) & 0x1F)]) + struct.pack('<HB', 300, 130)
+        data = _build_fit(body)
+        
+        fast = decode_fit_fast(data)
+        self._assert_same_decode(fast, decode_fit_messages(open_fit_source(data)))
+        assert len(fast.samples) == 4
+    
+    def test_fast_decoder_corrupt_file_raises_parse_error(self):
+        """Test that a CRC mismatch surfaces fitparse's error."""
+        from app.services.file_parser import decode_fit_fast
+        data = bytearray(_build_fit(self._records()))
+        data[20] ^= 0xFF
+        with pytest.raises(FileParseError):
+            decode_fit_fast(bytes(data))
+
+
+class TestChannelProjection:
+    """Tests for decode-time channel projection (``channels=``)."""
+    
+    FIT_GZ = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_load_profile_decodes_only_power_and_hr(self, fast):
+        """Test that the load profile keeps TSS inputs and skips other channels."""
+        import numpy as np
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        
+        full, full_samples = parse_fit_file(self.FIT_GZ, athlete_id=1, ftp=250, fast=fast)
+        load, load_samples = parse_fit_file(self.FIT_GZ, athlete_id=1, ftp=250, fast=fast, channels="load")
+        
+        np.testing.assert_array_equal(load_samples.power_w, full_samples.power_w)
+        np.testing.assert_array_equal(load_samples.hr_bpm, full_samples.hr_bpm)
+        for name in ("cadence", "pace_mps", "distance_m", "lat", "lon"):
+            assert not load_samples.has_channel(name)
+        assert full_samples.has_channel("pace_mps")
+        for key in ("np", "tss", "if", "avg_hr", "distance_m"):
+            assert load.summary_json[key] == full.summary_json[key]
+    
+    def test_explicit_channel_list(self):
+        """Test that an explicit channel list is honoured by both decoders."""
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        
+        _, slow = parse_fit_file(self.FIT_GZ, athlete_id=1, fast=False, channels=["cadence"])
+        _, fast = parse_fit_file(self.FIT_GZ, athlete_id=1, fast=True, channels=["cadence"])
+        assert slow.has_channel("cadence") and fast.has_channel("cadence")
+        assert not slow.has_channel("power_w") and not fast.has_channel("power_w")
+        assert slow.values("cadence").tolist() == fast.values("cadence").tolist()
+    
+    def test_unknown_channel_profile_raises_error(self):
+        """Test that a typo in the profile name fails loudly."""
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        with pytest.raises(ValueError, match="Unknown channel profile"):
+            parse_fit_file(self.FIT_GZ, athlete_id=1, channels="lod")
+
+
+class TestChunkedStreaming:
+    """Tests for chunked FIT decoding and the constant-memory summary."""
+    
+    FIT_GZ = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+    
+    def test_stream_summary_matches_batch_parse(self):
+        """Test that summarize_fit_stream reproduces parse_fit_file's summary."""
+        from app.services.file_parser import summarize_fit_stream
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        
+        workout, samples = parse_fit_file(self.FIT_GZ, athlete_id=1, ftp=250)
+        chunk_sizes = []
+        streamed = summarize_fit_stream(
+            self.FIT_GZ, athlete_id=1, ftp=250, chunk_size=500,
+            on_chunk=lambda chunk: chunk_sizes.append(len(chunk)),
+        )
+        
+        assert max(chunk_sizes) == 500
+        assert sum(chunk_sizes) == len(samples)
+        assert streamed.duration_s == workout.duration_s
+        assert streamed.start_time == workout.start_time
+        assert streamed.sport == workout.sport
+        assert streamed.summary_json.keys() == workout.summary_json.keys()
+        for key, value in workout.summary_json.items():
+            assert streamed.summary_json[key] == pytest.approx(value, rel=1e-9)
+    
+    def test_chunk_reader_yields_continuous_chunks_and_frees_messages(self):
+        """Test that chunks keep file-relative time and fitparse's cache is dropped."""
+        import numpy as np
+        from app.services.file_parser import FitChunkReader
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        
+        _, samples = parse_fit_file(self.FIT_GZ, athlete_id=1)
+        reader = FitChunkReader(self.FIT_GZ, chunk_size=1000)
+        chunks = []
+        for chunk in reader:
+            assert len(getattr(reader._fitfile, "_messages", [])) == 0
+            chunks.append(chunk)
+        
+        assert [len(chunk) for chunk in chunks] == [1000, 1000, 1000, len(samples) - 3000]
+        np.testing.assert_array_equal(np.concatenate([c.t_s for c in chunks]), samples.t_s)
+        np.testing.assert_array_equal(
+            np.concatenate([c.power_w for c in chunks]), samples.power_w
+        )
+        assert len(reader.result.sessions) == 1
+        assert len(reader.result.laps) > 0
+        assert len(reader.result.samples) == 0
+    
+    def test_installed_fitparse_message_cache_is_released(self):
+        """Test that the installed fitparse either streams uncached or exposes the cache we clear."""
+        from app.services import file_parser
+        from app.services.file_parser import open_fit_source, release_parsed_messages
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        if file_parser.UncachedFitFile is not None:
+            pytest.skip("fitparse provides UncachedFitFile")
+        
+        fitfile = open_fit_source(self.FIT_GZ)
+        parsed = sum(1 for _ in zip(range(100), fitfile.get_messages()))
+        # A fitparse upgrade that moves the cache must be noticed here
+        assert isinstance(fitfile._messages, list)
+        assert release_parsed_messages(fitfile) >= parsed
+        assert fitfile._messages == []
+        assert next(fitfile.get_messages()) is not None
+    
+    @pytest.mark.parametrize("codec", ["gzip", "zstd"])
+    def test_compressed_input_is_streamed_not_buffered(self, codec, monkeypatch):
+        """Test that chunked decoding never buffers the whole decompressed payload."""
+        import gzip
+        import io
+        import numpy as np
+        from app.services import file_parser
+        from app.services.file_parser import FitChunkReader
+        if not self.FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        raw = gzip.decompress(self.FIT_GZ.read_bytes())
+        if codec == "zstd":
+            payload = pytest.importorskip("zstandard").ZstdCompressor().compress(raw)
+        else:
+            payload = self.FIT_GZ.read_bytes()
+        
+        def fail(*args, **kwargs):
+            raise AssertionError("payload decompressed into memory")
+        
+        monkeypatch.setattr(file_parser, "_read_capped", fail)
+        _, samples = parse_fit_file(raw, athlete_id=1)
+        chunks = list(FitChunkReader(io.BytesIO(payload), chunk_size=1000))
+        np.testing.assert_array_equal(np.concatenate([c.power_w for c in chunks]), samples.power_w)
+    
+    def test_streamed_decompression_is_capped(self):
+        """Test that the decompressed-size limit also applies when streaming."""
+        import gzip
+        from app.services.file_parser import open_fit_source
+        bomb = gzip.compress(b"\x00" * (4 * 1024 * 1024))
+        with pytest.raises(FileParseError, match="exceeds"):
+            open_fit_source(bomb, max_decompressed_bytes=1024 * 1024, streaming=True)
+    
+    def test_chunk_size_must_be_positive(self):
+        """Test that a zero chunk size is rejected."""
+        from app.services.file_parser import FitChunkReader
+        with pytest.raises(ValueError, match="chunk_size must be positive"):
+            FitChunkReader(b"", chunk_size=0)
+
+
+class TestMultisportSessions:
+    """Tests for splitting multisport/brick files into one workout per session."""
+    
+    T0 = 1_000_000_000
+    
+    def _brick_fit(self) -> bytes:
+        """A 60 s run followed by a 120 s ride, with one session message per leg."""
+        import struct
+        fields = [(253, 4, 0x86), (7, 2, 0x84), (3, 1, 0x02)]
+        body = _record_definition(0, fields)
+        for t in range(180):
+            power = 0xFFFF if t < 60 else 200 + (t % 2) * 100
+            body += b'\x00' + struct.pack('<IHB', self.T0 + t, power, 150 if t < 60 else 140)
+        session_fields = [(253, 4, 0x86), (2, 4, 0x86), (7, 4, 0x86), (5, 1, 0x00)]
+        body += struct.pack('<BBBHB', 0x41, 0, 0, 18, len(session_fields))
+        body += b''.join(bytes(field) for field in session_fields)
+        for start, elapsed, sport in ((0, 60, 1), (60, 120, 2)):
+            body += b'\x01' + struct.pack('<IIIB', self.T0 + start + elapsed, self.T0 + start, elapsed * 1000, sport)
+        return _build_fit(body)
+    
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_brick_file_yields_one_workout_per_leg(self, fast):
+        """Test that each leg gets its own sport, duration and power metrics."""
+        from datetime import timedelta
+        from app.services.file_parser import parse_fit_sessions
+        legs = parse_fit_sessions(self._brick_fit(), athlete_id=1, ftp=250, fast=fast)
+        
+        assert [leg.sport for leg, _ in legs] == ["running", "cycling"]
+        assert [len(samples) for _, samples in legs] == [60, 120]
+        run, run_samples = legs[0]
+        bike, bike_samples = legs[1]
+        assert "avg_power" not in run.summary_json
+        assert run.summary_json["avg_hr"] == 150
+        assert bike.summary_json["avg_power"] == 250
+        assert bike.summary_json["avg_hr"] == 140
+        assert bike.duration_s == 119
+        assert bike.start_time - run.start_time == timedelta(seconds=60)
+        # Legs are views into one shared decode; t_s restarts at each leg
+        assert bike_samples.power_w.base is not None
+        assert run_samples.power_w.base is bike_samples.power_w.base
+        assert run_samples.t_s[0] == 0 and bike_samples.t_s[0] == 0
+    
+    def test_parse_fit_file_rejects_multisport_file(self):
+        """Test that a brick file is not collapsed into one workout."""
+        with pytest.raises(FileParseError, match="parse_fit_sessions"):
+            parse_fit_file(self._brick_fit(), athlete_id=1, ftp=250)
+    
+    def test_single_session_file_matches_parse_fit_file(self):
+        """Test that ordinary files still give exactly one workout."""
+        from app.services.file_parser import parse_fit_sessions
+        fit_gz = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+        if not fit_gz.exists():
+            pytest.skip("Test FIT file not found")
+        
+        workout, samples = parse_fit_file(fit_gz, athlete_id=1, ftp=250)
+        legs = parse_fit_sessions(fit_gz, athlete_id=1, ftp=250)
+        assert len(legs) == 1
+        assert legs[0][0] == workout
+        assert len(legs[0][1]) == len(samples)
@@ -0,0 +1,121 @@
+"""Unit tests for streaming GPX parsing and track geometry."""
+import gzip
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.file_parser import FileParseError
+from app.services.geo import haversine_m, track_distance_and_speed
+from app.services.gpx_parser import decode_gpx_bytes, parse_gpx_file
+
+
+GPX_NS = "http://www.topografix.com/GPX/1/1"
+TPX_NS = "http://www.garmin.com/xmlschemas/TrackPointExtension/v1"
+
+
+def make_gpx(points: int = 600, start=datetime(2024, 5, 1, 8, 0, 0), step_deg: float = 1e-4) -> bytes:
+    """Build a GPX ride heading north at a constant step per second."""
+    trkpts = []
+    for i in range(points):
+        t = start + timedelta(seconds=i)
+        trkpts.append(
+            f'<trkpt lat="{45 + i * step_deg:.7f}" lon="7.0"><ele>{200 + i * 0.5}</ele>'
+            f"<time>{t.isoformat()}Z</time><extensions><power>{180 + i % 40}</power>"
+            f"<gpxtpx:TrackPointExtension><gpxtpx:atemp>21</gpxtpx:atemp>"
+            f"<gpxtpx:hr>{130 + i % 5}</gpxtpx:hr><gpxtpx:cad>88</gpxtpx:cad>"
+            f"</gpxtpx:TrackPointExtension></extensions></trkpt>"
+        )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<gpx version="1.1" creator="StravaGPX" xmlns="{GPX_NS}" xmlns:gpxtpx="{TPX_NS}">'
+        f"<metadata><time>{start.isoformat()}Z</time></metadata>"
+        f"<trk><name>Morning Ride</name><type>1</type><trkseg>{''.join(trkpts)}</trkseg></trk></gpx>"
+    ).encode()
+
+
+class TestGeo:
+    """Tests for vectorized haversine helpers."""
+
+    def test_haversine_one_degree_of_latitude(self):
+        """Test that one degree of latitude is about 111.2 km."""
+        assert haversine_m(0.0, 0.0, 1.0, 0.0) == pytest.approx(111_195, rel=1e-4)
+
+    def test_track_distance_and_speed(self):
+        """Test cumulative distance and per-segment speed, including a zero-time step."""
+        t_s = np.array([0, 10, 10, 20])
+        lat = np.array([0.0, 0.001, 0.002, 0.003])
+        lon = np.zeros(4)
+        distance, speed = track_distance_and_speed(t_s, lat, lon)
+        step = haversine_m(0.0, 0.0, 0.001, 0.0)
+        np.testing.assert_allclose(distance, [0, step, 2 * step, 3 * step])
+        assert np.isnan(speed[0]) and np.isnan(speed[2])
+        assert speed[1] == pytest.approx(step / 10)
+
+
+class TestGpxParser:
+    """Tests for GPX parsing."""
+
+    def test_parse_gpx_reads_extensions_and_derives_distance(self):
+        """Test that TrackPointExtension and power fields fill the sample channels."""
+        workout, samples = parse_gpx_file(make_gpx(), athlete_id=1, ftp=250, filename="ride.gpx")
+
+        step = haversine_m(45.0, 7.0, 45.0001, 7.0)
+        assert len(samples) == 600
+        assert samples.values("hr_bpm")[:3].tolist() == [130, 131, 132]
+        assert samples.values("cadence")[0] == 88
+        assert samples.values("power_w")[0] == 180
+        assert samples.values("temperature_c")[0] == 21
+        assert samples.values("altitude_m")[1] == pytest.approx(200.5)
+        assert samples.values("distance_m")[-1] == pytest.approx(599 * step, rel=1e-6)
+        assert samples.values("pace_mps")[0] == pytest.approx(step, rel=1e-6)
+
+        assert workout.sport == "cycling"
+        assert workout.start_time == datetime(2024, 5, 1, 8, 0, 0)
+        assert workout.summary_json["distance_m"] == pytest.approx(599 * step, rel=1e-6)
+        assert "tss" in workout.summary_json
+
+    def test_parse_gzipped_gpx(self):
+        """Test that .gpx.gz payloads are decompressed in memory."""
+        _, samples = parse_gpx_file(gzip.compress(make_gpx(60)), athlete_id=1)
+        assert len(samples) == 60
+
+    def test_distance_is_derived_from_cleaned_track(self):
+        """Test that distance skips rejected positions and follows restored time order."""
+        points = [(0, 45.0), (2, 45.0002), (1, 45.0001), (3, 95.0), (4, 45.0003)]
+        trkpts = "".join(
+            f'<trkpt lat="{lat}" lon="7.0"><time>2024-05-01T08:00:0{t}Z</time></trkpt>'
+            for t, lat in points
+        )
+        data = f'<gpx xmlns="{GPX_NS}"><trk><trkseg>{trkpts}</trkseg></trk></gpx>'.encode()
+
+        workout, samples = parse_gpx_file(data, athlete_id=1)
+
+        step = haversine_m(45.0, 7.0, 45.0001, 7.0)
+        assert samples.t_s.tolist() == [0, 1, 2, 3, 4]
+        assert not samples.valid["distance_m"][3]
+        np.testing.assert_allclose(samples.values("distance_m"), [0, step, 2 * step, 3 * step], rtol=1e-6)
+        assert workout.summary_json["distance_m"] == pytest.approx(3 * step, rel=1e-6)
+
+    def test_gpx_without_positions_has_no_distance(self):
+        """Test that point-less position data doesn't invent a distance."""
+        data = (
+            f'<gpx xmlns="{GPX_NS}"><trk><trkseg>'
+            "<trkpt><time>2024-05-01T08:00:00Z</time></trkpt>"
+            "<trkpt><time>2024-05-01T08:00:01Z</time></trkpt>"
+            "</trkseg></trk></gpx>"
+        ).encode()
+        decoded = decode_gpx_bytes(data)
+        assert len(decoded.samples) == 2
+        assert "total_distance_m" not in decoded.session_data
+        assert not decoded.samples.has_channel("distance_m")
+
+    def test_non_gpx_document_raises_parse_error(self):
+        """Test that other XML documents are rejected."""
+        with pytest.raises(FileParseError, match="Not a GPX document"):
+            decode_gpx_bytes(b"<TrainingCenterDatabase/>")
+
+    def test_malformed_gpx_raises_parse_error(self):
+        """Test that truncated XML raises FileParseError."""
+        with pytest.raises(FileParseError, match="Failed to parse GPX"):
+            decode_gpx_bytes(make_gpx()[:400])
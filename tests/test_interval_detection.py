@@ -0,0 +1,104 @@
+"""Unit tests for change-point interval detection."""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.services.file_parser import FitDecodeResult, clean_samples, decode_fit_bytes
+from app.services.interval_detection import (
+    SegmentationParams,
+    change_point_intervals,
+    detect_intervals,
+    pelt,
+    segment_series,
+)
+from app.services.sample_frame import SampleFrame
+
+FIT_GZ = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+
+# Warmup, 5 x (3 min @ 320 W / 2 min @ 140 W), cooldown
+LEVELS = [(600, 150)] + [(180, 320), (120, 140)] * 5 + [(600, 100)]
+
+
+def noisy_power(levels=LEVELS, noise_w: float = 20.0, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.concatenate(
+        [np.full(n, watts) + rng.normal(0, noise_w, n) for n, watts in levels]
+    ).clip(0)
+
+
+class TestPelt:
+    """Tests for the PELT search itself."""
+
+    def test_pelt_finds_mean_shifts(self):
+        """Test exact recovery of clean step changes."""
+        values = np.concatenate([np.full(50, 1.0), np.full(50, 5.0), np.full(50, 2.0)])
+        values = values + np.random.default_rng(1).normal(0, 0.1, 150)
+        assert pelt(values, penalty=20.0, min_size=5, min_variance=1e-6).tolist() == [50, 100, 150]
+
+    def test_pelt_respects_min_size(self):
+        """Test that no segment is shorter than min_size."""
+        values = np.random.default_rng(2).normal(0, 1, 500)
+        ends = pelt(values, penalty=0.0, min_size=20, min_variance=1e-6)
+        assert np.diff(np.concatenate([[0], ends])).min() >= 20
+
+    def test_pelt_rejects_tiny_min_size(self):
+        """Test that min_size below 2 is refused (variance needs two points)."""
+        with pytest.raises(ValueError, match="min_size"):
+            pelt(np.zeros(10), penalty=1.0, min_size=1)
+
+
+class TestSegmentSeries:
+    """Tests for smoothing, refinement and merging."""
+
+    def test_structured_workout_boundaries_within_a_few_seconds(self):
+        """Test that detected boundaries land on the true step changes."""
+        bounds = segment_series(noisy_power())
+        truth = np.cumsum([0] + [n for n, _ in LEVELS])
+        assert len(bounds) == len(truth)
+        assert np.abs(bounds - truth).max() <= 3
+
+    def test_similar_neighbours_are_merged(self):
+        """Test that steps within merge_ratio collapse into one segment."""
+        power = noisy_power([(300, 200), (300, 210), (300, 400)], noise_w=5)
+        bounds = segment_series(power, SegmentationParams(merge_ratio=0.1))
+        assert bounds.tolist()[0] == 0 and len(bounds) == 3
+        assert abs(bounds[1] - 600) <= 3
+
+
+class TestChangePointIntervals:
+    """Tests for IntervalDetected output and the lap fast path."""
+
+    def _decoded(self, power) -> FitDecodeResult:
+        from datetime import datetime
+        samples = SampleFrame.from_columns(np.arange(len(power)), {"power_w": power})
+        return FitDecodeResult(samples=samples, start_time=datetime(2024, 5, 1, 8))
+
+    def test_intervals_are_labelled_against_ftp(self):
+        """Test warmup/work/rest/cooldown labels and contiguous coverage."""
+        decoded = self._decoded(noisy_power())
+        intervals = detect_intervals(decoded, ftp=300)
+        kinds = [interval.kind for interval in intervals]
+        assert kinds[0] == "warmup" and kinds[-1] == "cooldown"
+        assert kinds[1:-1] == ["work", "rest"] * 5
+        assert intervals[1].metrics_json["avg_power"] == pytest.approx(320, abs=5)
+        assert all(a.t_end == b.t_start for a, b in zip(intervals, intervals[1:]))
+        assert intervals[-1].t_end == len(decoded.samples)
+
+    def test_no_power_or_pace_gives_no_intervals(self):
+        """Test that HR-only files are left unsegmented."""
+        samples = SampleFrame.from_columns(np.arange(100), {"hr_bpm": np.full(100, 120.0)})
+        assert change_point_intervals(samples) == []
+
+    def test_sample_file_uses_device_laps(self):
+        """Test that laps take precedence and change points roughly agree with them."""
+        if not FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        decoded = clean_samples(decode_fit_bytes(FIT_GZ.read_bytes()))
+        laps = detect_intervals(decoded, ftp=250)
+        assert len(laps) == len(decoded.laps)
+        
+        detected = change_point_intervals(decoded.samples, ftp=250)
+        lap_starts = np.array([lap.t_start for lap in laps])
+        distance = [np.abs(lap_starts - interval.t_start).min() for interval in detected]
+        assert np.median(distance) <= 10
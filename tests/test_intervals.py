@@ -0,0 +1,144 @@
+"""Unit tests for device-lap interval segmentation."""
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.services.file_parser import FitDecodeResult, clean_samples, decode_fit_bytes, split_sessions
+from app.services.intervals import device_intervals, segment_metrics
+from app.services.metrics import calculate_normalized_power
+from app.services.sample_frame import SampleFrame
+
+FIT_GZ = Path(__file__).parent.parent / "UploadFiles" / "Purple Patch- Nancy & Frank Duet.fit.gz"
+START = datetime(2024, 5, 1, 8, 0, 0)
+
+
+def make_decoded(power, laps=(), events=()) -> FitDecodeResult:
+    """1 Hz decode result with the given power trace and lap/event dicts."""
+    power = np.asarray(power, dtype=float)
+    samples = SampleFrame.from_columns(
+        np.arange(len(power)), {"power_w": power, "hr_bpm": np.full(len(power), 140.0)}
+    )
+    return FitDecodeResult(
+        laps=list(laps), events=list(events), samples=samples, start_time=START
+    )
+
+
+def lap(start_s: int, end_s: int, intensity=None, step=None) -> dict:
+    return {
+        "start_time": START + timedelta(seconds=start_s),
+        "end_time": START + timedelta(seconds=end_s),
+        "intensity": intensity,
+        "wkt_step_index": step,
+    }
+
+
+class TestSegmentMetrics:
+    """Tests for prefix-sum segment metrics."""
+
+    def test_whole_ride_segment_matches_normalized_power(self):
+        """Test that one segment over the ride reproduces calculate_normalized_power."""
+        rng = np.random.default_rng(7)
+        power = rng.uniform(50, 450, 1200).round()
+        decoded = make_decoded(power)
+        metrics = segment_metrics(decoded.samples, [0], [1200])[0]
+        assert metrics["np"] == pytest.approx(calculate_normalized_power(power), rel=1e-12)
+        assert metrics["avg_power"] == pytest.approx(power.mean())
+
+    def test_whole_ride_segment_matches_normalized_power_below_1hz(self):
+        """Test that lap NP uses the same sample-rate window as calculate_normalized_power."""
+        rng = np.random.default_rng(8)
+        power = rng.uniform(50, 450, 600).round()
+        samples = SampleFrame.from_columns(np.arange(0, 1200, 2), {"power_w": power})
+        metrics = segment_metrics(samples, [0], [1200], sample_rate_hz=0.5)[0]
+        assert metrics["np"] == pytest.approx(
+            calculate_normalized_power(power, sample_rate_hz=0.5), rel=1e-12
+        )
+        assert metrics["np"] != pytest.approx(calculate_normalized_power(power), rel=1e-6)
+
+    def test_short_segment_np_is_average_and_zones_follow_ftp(self):
+        """Test the <30 s NP rule and Coggan time-in-zone at FTP 200."""
+        power = [100] * 10 + [300] * 10
+        decoded = make_decoded(power)
+        metrics = segment_metrics(decoded.samples, [0, 10], [10, 20], ftp=200)
+        assert metrics[0]["np"] == 100
+        assert metrics[1]["avg_power"] == 300
+        assert metrics[0]["time_in_zone"]["Z1"] == 10
+        assert metrics[1]["time_in_zone"]["Z6"] == 10
+        assert sum(metrics[1]["time_in_zone"].values()) == 10
+
+    def test_segment_without_power_omits_power_metrics(self):
+        """Test that HR-only segments carry no power keys."""
+        samples = SampleFrame.from_columns(np.arange(60), {"hr_bpm": np.full(60, 120.0)})
+        metrics = segment_metrics(samples, [0], [60], ftp=250)[0]
+        assert "avg_power" not in metrics and "time_in_zone" not in metrics
+        assert metrics["avg_hr"] == 120
+
+
+class TestDeviceIntervals:
+    """Tests for building IntervalDetected from laps and timer events."""
+
+    def test_laps_become_intervals_with_kind_and_step(self):
+        """Test lap intensity/step mapping and per-lap averages."""
+        power = [120] * 300 + [320] * 120 + [100] * 180
+        decoded = make_decoded(power, laps=[
+            lap(0, 300, "warmup", 0), lap(300, 420, "active", 1), lap(420, 600, "rest", 2),
+        ])
+        intervals = device_intervals(decoded, ftp=300)
+        assert [(i.t_start, i.t_end, i.kind) for i in intervals] == [
+            (0, 300, "warmup"), (300, 420, "work"), (420, 600, "rest"),
+        ]
+        assert [i.planned_step_index for i in intervals] == [0, 1, 2]
+        assert intervals[1].metrics_json["avg_power"] == 320
+        assert intervals[2].metrics_json["avg_hr"] == 140
+
+    def test_timer_pauses_used_when_laps_missing(self):
+        """Test that timer start/stop pairs segment a lap-less file."""
+        events = [
+            {"event": "timer", "event_type": "start", "timestamp": START},
+            {"event": "timer", "event_type": "stop_all", "timestamp": START + timedelta(seconds=200)},
+            {"event": "timer", "event_type": "start", "timestamp": START + timedelta(seconds=260)},
+            {"event": "timer", "event_type": "stop_all", "timestamp": START + timedelta(seconds=400)},
+        ]
+        intervals = device_intervals(make_decoded([200] * 400, events=events))
+        assert [(i.t_start, i.t_end) for i in intervals] == [(0, 200), (260, 400)]
+
+    def test_single_lap_means_no_device_segmentation(self):
+        """Test that one whole-ride lap defers to change-point detection."""
+        decoded = make_decoded([200] * 100, laps=[lap(0, 100)])
+        assert device_intervals(decoded) == []
+
+    def test_laps_on_second_multisport_leg_align_with_samples(self):
+        """Test that a later leg's laps line up with that leg's samples."""
+        power = [0] * 600 + [150] * 300 + [350] * 120 + [120] * 180
+        decoded = make_decoded(power, laps=[
+            lap(0, 600), lap(600, 900, "warmup"), lap(900, 1020, "active"), lap(1020, 1200, "rest"),
+        ])
+        decoded.sessions = [
+            {"start_time": START, "sport": "running"},
+            {"start_time": START + timedelta(seconds=600), "sport": "cycling"},
+        ]
+        bike = split_sessions(decoded)[1]
+
+        assert bike.samples.t_s[0] == 0
+        intervals = device_intervals(bike, ftp=300)
+        assert [(i.t_start, i.t_end, i.kind) for i in intervals] == [
+            (0, 300, "warmup"), (300, 420, "work"), (420, 600, "rest"),
+        ]
+        assert [i.metrics_json["avg_power"] for i in intervals] == [150, 350, 120]
+
+    def test_sample_file_laps_match_device_lap_averages(self):
+        """Test that computed lap averages agree with the device's lap summaries."""
+        if not FIT_GZ.exists():
+            pytest.skip("Test FIT file not found")
+        decoded = clean_samples(decode_fit_bytes(FIT_GZ.read_bytes()))
+        intervals = device_intervals(decoded, ftp=250)
+        assert len(intervals) == len(decoded.laps)
+        # Head units round and sample lap boundaries their own way; agree on average
+        errors = [
+            abs(interval.metrics_json["avg_power"] - device_lap["avg_power"])
+            for interval, device_lap in zip(intervals, decoded.laps)
+        ]
+        assert np.mean(errors) < 1.5
+        assert max(errors) < 10
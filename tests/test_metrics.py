@@ -2,15 +2,29 @@ from datetime import date, timedelta
 
 import pytest
 
-from app.schemas.training import Activity
+from app.schemas.training import Activity, Athlete
 from app.services.metrics import (
+    activities_to_arrays,
     activities_to_dataframe,
+    banister_loads,
+    banister_loads_batch,
     compute_chronic_and_acute_loads,
     compute_metrics_daily,
+    daily_loads,
     calculate_normalized_power,
+    calculate_normalized_power_batch,
     calculate_intensity_factor,
     calculate_variability_index,
     calculate_tss_from_power,
+    calculate_tss_from_power_batch,
+    calculate_w_prime_balance,
+    calculate_w_prime_balance_for_athlete,
+    interpolate_power_curve,
+    LoadConstants,
+    mean_max_power,
+    MMP_DURATIONS_S,
+    RunningStats,
+    StreamingNormalizedPower,
 )
 
 
@@ -45,6 +59,153 @@ def test_empty_activities_returns_empty_metrics():
     assert results == []
 
 
+def _random_activities(count: int, seed: int = 0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    start = date(2020, 1, 1)
+    return [
+        Activity(
+            activity_date=start + timedelta(days=int(day)),
+            sport="ride",
+            duration_min=float(rng.uniform(20, 240)),
+            tss=None if rng.random() < 0.3 else float(rng.uniform(0, 250)),
+            intensity_factor=None if rng.random() < 0.5 else float(rng.uniform(0.5, 1.1)),
+        )
+        for day in rng.integers(0, 900, count)
+    ]
+
+
+class TestColumnarDailyMetrics:
+    """Tests for the array-based activities -> daily metrics path."""
+
+    def test_missing_tss_is_estimated(self):
+        """Test the duration x IF estimate (IF 0.7 when missing)."""
+        activities = [
+            Activity(activity_date=date(2024, 1, 1), sport="ride", duration_min=60.0, tss=42.0),
+            Activity(activity_date=date(2024, 1, 2), sport="ride", duration_min=90.0, intensity_factor=0.8),
+            Activity(activity_date=date(2024, 1, 2), sport="run", duration_min=30.0),
+        ]
+        days, tss = activities_to_arrays(activities)
+        assert (days - days[0]).tolist() == [0, 1, 1]
+        assert tss.tolist() == pytest.approx([42.0, 120.0, 35.0])
+
+    def test_matches_pandas_pipeline(self):
+        """Test that daily loads equal the DataFrame + EWM path, gaps included."""
+        import numpy as np
+
+        activities = _random_activities(600)
+        loads = daily_loads(activities)
+        expected = compute_chronic_and_acute_loads(activities_to_dataframe(activities))
+
+        assert len(loads.dates) == len(expected)
+        np.testing.assert_array_equal(loads.dates, expected["date"].to_numpy().astype("datetime64[D]"))
+        np.testing.assert_allclose(loads.tss, expected["tss"], rtol=1e-12)
+        np.testing.assert_allclose(loads.atl, expected["atl"], rtol=1e-9)
+        np.testing.assert_allclose(loads.ctl, expected["ctl"], rtol=1e-9)
+
+    def test_json_matches_validated_models(self):
+        """Test that array serialization equals serializing validated MetricsDaily rows."""
+        import json
+        from typing import List
+
+        from pydantic import TypeAdapter
+
+        from app.schemas.training import MetricsDaily
+
+        loads = daily_loads(_random_activities(50, seed=1))
+        validated = [MetricsDaily(**row.model_dump()) for row in loads.to_metrics()]
+        expected = TypeAdapter(List[MetricsDaily]).dump_python(validated, mode="json")
+        assert json.loads(loads.to_json()) == expected
+        assert json.loads(daily_loads([]).to_json()) == []
+
+
+class TestBanisterLoads:
+    """Tests for the closed-form Banister ATL/CTL recurrence."""
+
+    @pytest.mark.parametrize("constants", [LoadConstants(), LoadConstants(1.5, 28), LoadConstants(1, 42)])
+    def test_matches_pandas_ewm(self, constants):
+        """Test that loads equal the pandas EWM path over years of days."""
+        import numpy as np
+        import pandas as pd
+
+        tss = np.random.default_rng(0).gamma(2.0, 40.0, 3000) * (np.arange(3000) % 7 != 0)
+        atl, ctl = banister_loads(tss, constants)
+        daily = pd.DataFrame({"date": pd.date_range("2015-01-01", periods=3000), "tss": tss})
+        expected = compute_chronic_and_acute_loads(daily, constants)
+        np.testing.assert_allclose(atl, expected["atl"], rtol=1e-9)
+        np.testing.assert_allclose(ctl, expected["ctl"], rtol=1e-9)
+
+    def test_continuing_from_previous_loads_equals_one_pass(self):
+        """Test that appending days from the last loads equals recomputing all."""
+        import numpy as np
+
+        tss = np.random.default_rng(1).uniform(0, 150, 400)
+        atl, ctl = banister_loads(tss)
+        head_atl, head_ctl = banister_loads(tss[:300])
+        tail_atl, tail_ctl = banister_loads(tss[300:], atl0=head_atl[-1], ctl0=head_ctl[-1])
+        np.testing.assert_allclose(tail_atl, atl[300:], rtol=1e-12)
+        np.testing.assert_allclose(tail_ctl, ctl[300:], rtol=1e-12)
+        # A few days continue through the short-series loop
+        short_atl, short_ctl = banister_loads(tss[395:], atl0=atl[394], ctl0=ctl[394])
+        np.testing.assert_allclose(short_atl, atl[395:], rtol=1e-12)
+        np.testing.assert_allclose(short_ctl, ctl[395:], rtol=1e-12)
+
+    def test_empty_and_invalid_constants(self):
+        """Test empty input and rejection of sub-day time constants."""
+        atl, ctl = banister_loads([])
+        assert len(atl) == len(ctl) == 0
+        with pytest.raises(ValueError, match="at least 1 day"):
+            banister_loads([100.0], LoadConstants(atl_tau_days=0.5))
+
+
+class TestBanisterLoadsBatch:
+    """Tests for the multi-athlete Banister recurrence."""
+
+    @pytest.mark.parametrize("block_cells", [1 << 18, 1000])
+    def test_rows_match_single_athlete_loads(self, block_cells, monkeypatch):
+        """Test that each row equals banister_loads from its first training day."""
+        import numpy as np
+
+        monkeypatch.setattr("app.services.metrics._LOAD_BLOCK_CELLS", block_cells)
+
+        rng = np.random.default_rng(2)
+        tss = rng.uniform(0, 180, (6, 900)) * (rng.random((6, 900)) < 0.7)
+        tss[1, :200] = 0          # joins the team later
+        tss[2] = 0                # no training at all
+        constants = [LoadConstants(7, 42), LoadConstants(5, 35), LoadConstants(), LoadConstants(1, 42),
+                     LoadConstants(10, 60), LoadConstants(1.2, 21)]
+        atl, ctl = banister_loads_batch(tss, constants)
+
+        for row in range(6):
+            trained = np.flatnonzero(tss[row] > 0)
+            if not len(trained):
+                assert not atl[row].any() and not ctl[row].any()
+                continue
+            first = trained[0]
+            expected_atl, expected_ctl = banister_loads(tss[row, first:], constants[row])
+            assert not atl[row, :first].any()
+            np.testing.assert_allclose(atl[row, first:], expected_atl, rtol=1e-9)
+            np.testing.assert_allclose(ctl[row, first:], expected_ctl, rtol=1e-9)
+
+    def test_continues_from_given_loads(self):
+        """Test that per-athlete starting loads continue existing series."""
+        import numpy as np
+
+        tss = np.random.default_rng(3).uniform(0, 150, (3, 500))
+        atl, ctl = banister_loads_batch(tss)
+        tail_atl, tail_ctl = banister_loads_batch(tss[:, 300:], atl0=atl[:, 299], ctl0=ctl[:, 299])
+        np.testing.assert_allclose(tail_atl, atl[:, 300:], rtol=1e-12)
+        np.testing.assert_allclose(tail_ctl, ctl[:, 300:], rtol=1e-12)
+
+    def test_rejects_mismatched_constants(self):
+        """Test that per-athlete constants must match the matrix rows."""
+        import numpy as np
+
+        with pytest.raises(ValueError, match="2 load constants for 3 athletes"):
+            banister_loads_batch(np.ones((3, 10)), [LoadConstants(), LoadConstants()])
+
+
 # ============================================================================
 # Power Metrics Tests (NP, IF, VI, TSS)
 # ============================================================================
@@ -94,6 +255,45 @@ class TestNormalizedPower:
         with pytest.raises(ValueError, match="sample_rate_hz must be positive"):
             calculate_normalized_power([250.0] * 100, sample_rate_hz=0)
 
+    def test_normalized_power_matches_pandas_rolling_reference(self):
+        """Test the cumulative-sum kernel against the pandas rolling formula."""
+        import numpy as np
+        import pandas as pd
+        power = np.random.default_rng(1).uniform(0, 800, 5000)
+        for rate in (1, 2, 4):
+            rolling = pd.Series(power).rolling(window=30 * rate, min_periods=1).mean()
+            expected = float((rolling ** 4).mean() ** 0.25)
+            assert calculate_normalized_power(power, sample_rate_hz=rate) == pytest.approx(expected, rel=1e-9)
+
+    def test_normalized_power_sub_1hz_recording(self):
+        """Test that a 0.5 Hz recording gives the NP of the same ride at 1 Hz."""
+        intervals = ([350.0] * 180 + [150.0] * 180) * 10
+        at_half_hz = calculate_normalized_power(intervals[::2], sample_rate_hz=0.5)
+        assert at_half_hz == pytest.approx(calculate_normalized_power(intervals), rel=0.01)
+
+    @pytest.mark.parametrize("block_samples", [1000, 1 << 17])
+    def test_normalized_power_batch_matches_per_workout(self, monkeypatch, block_samples):
+        """Test ragged batch NP equals one call per workout, with NaN for empty workouts."""
+        import numpy as np
+        from app.services import metrics
+        monkeypatch.setattr(metrics, "_NP_BLOCK_SAMPLES", block_samples)
+        rng = np.random.default_rng(2)
+        rides = [rng.uniform(0, 600, n) for n in (3600, 0, 20, 30, 31, 7200)]
+        offsets = np.cumsum([0] + [len(ride) for ride in rides])
+        batch = calculate_normalized_power_batch(np.concatenate(rides), offsets)
+        assert np.isnan(batch[1])
+        for ride, value in zip(rides, batch):
+            if len(ride):
+                assert value == pytest.approx(calculate_normalized_power(ride), rel=1e-9)
+
+    def test_normalized_power_batch_rejects_bad_offsets(self):
+        """Test that offsets must partition the concatenated values."""
+        import numpy as np
+        with pytest.raises(ValueError, match="offsets"):
+            calculate_normalized_power_batch(np.ones(10), np.array([0, 6, 4, 10]))
+        with pytest.raises(ValueError, match="offsets"):
+            calculate_normalized_power_batch(np.ones(10), np.array([0, 9]))
+
 
 class TestIntensityFactor:
     """Tests for Intensity Factor (IF) calculation."""
@@ -171,6 +371,179 @@ class TestTSSFromPower:
         tss = calculate_tss_from_power(duration_s=0, np=250.0, ftp=300)
         assert tss == 0.0
 
+    def test_tss_batch_matches_scalar_and_propagates_nan(self):
+        """Test that the vectorized IF/TSS equals the scalar formula."""
+        import numpy as np
+        durations = np.array([3600, 1800, 5400])
+        nps = np.array([300.0, 255.0, np.nan])
+        if_values, tss = calculate_tss_from_power_batch(durations, nps, ftp=300)
+        assert if_values[0] == pytest.approx(1.0)
+        assert tss[0] == pytest.approx(calculate_tss_from_power(3600, 300.0, 300))
+        assert tss[1] == pytest.approx(calculate_tss_from_power(1800, 255.0, 300))
+        assert np.isnan(tss[2])
+
+
+class TestStreamingAccumulators:
+    """Tests for the chunked running stats and Normalized Power."""
+
+    @pytest.mark.parametrize("n", [10, 29, 30, 31, 5000])
+    def test_streaming_np_matches_batch_for_any_chunking(self, n):
+        """Test that streaming NP equals the pandas rolling NP for random chunk splits."""
+        import numpy as np
+        rng = np.random.default_rng(n)
+        power = rng.uniform(0, 600, n)
+        cuts = np.sort(rng.choice(np.arange(1, n), size=min(n - 1, 40), replace=False))
+        stream_np = StreamingNormalizedPower()
+        for chunk in np.split(power, cuts):
+            stream_np.update(chunk)
+        assert stream_np.count == n
+        assert stream_np.value == pytest.approx(calculate_normalized_power(power), rel=1e-9)
+
+    def test_streaming_np_matches_batch_at_fractional_sample_rates(self):
+        """Test that the streaming window is sized like calculate_normalized_power's."""
+        import numpy as np
+        power = np.random.default_rng(11).uniform(80, 420, 900).round()
+        for sample_rate_hz in (0.5, 0.3, 1.7):
+            stream_np = StreamingNormalizedPower(sample_rate_hz)
+            for chunk in np.array_split(power, 6):
+                stream_np.update(chunk)
+            assert isinstance(stream_np.window, int)
+            assert stream_np.value == pytest.approx(
+                calculate_normalized_power(power, sample_rate_hz=sample_rate_hz), rel=1e-9
+            )
+        with pytest.raises(ValueError, match="positive"):
+            StreamingNormalizedPower(0)
+
+    def test_streaming_np_empty_returns_none(self):
+        """Test that NP is undefined until power arrives."""
+        import numpy as np
+        stream_np = StreamingNormalizedPower()
+        stream_np.update(np.zeros(0))
+        assert stream_np.value is None
+
+    def test_running_stats_mean_and_max(self):
+        """Test running mean/max across chunks, including empty ones."""
+        import numpy as np
+        stats = RunningStats()
+        assert stats.mean is None
+        for chunk in ([100.0, 200.0], [], [300.0]):
+            stats.update(np.array(chunk))
+        assert stats.count == 3
+        assert stats.mean == 200.0
+        assert stats.maximum == 300.0
+
+
+class TestMeanMaxPower:
+    """Tests for the mean-maximal power curve."""
+
+    def test_mean_max_power_matches_brute_force(self):
+        """Test every grid duration against a brute-force best rolling mean."""
+        import numpy as np
+        import pandas as pd
+        power = np.random.default_rng(3).gamma(4.0, 55.0, 2000)
+        curve = mean_max_power(power)
+        for i, duration in enumerate(MMP_DURATIONS_S.tolist()):
+            if duration > len(power):
+                assert np.isnan(curve[i])
+            else:
+                expected = pd.Series(power).rolling(duration).mean().max()
+                assert curve[i] == pytest.approx(expected, rel=1e-5)
+
+    def test_mean_max_power_of_multiple_duration_is_not_higher(self):
+        """Test that the best 2d-second power never exceeds the best d-second power."""
+        import numpy as np
+        durations = np.array([15, 30, 60, 120, 300, 600, 1200, 2400])
+        curve = mean_max_power(np.random.default_rng(4).uniform(0, 900, 7200), durations)
+        assert (curve[1:] <= curve[:-1] + 1e-3).all()
+
+    def test_mean_max_power_sample_rate(self):
+        """Test that durations are converted to samples at the sample rate."""
+        import numpy as np
+        power = np.concatenate([np.full(120, 200.0), np.full(60, 500.0)])  # 30 s at 500 W, 2 Hz
+        curve = mean_max_power(power, np.array([30, 60]), sample_rate_hz=2)
+        assert curve.tolist() == pytest.approx([500.0, 350.0])
+
+    def test_interpolate_power_curve_between_grid_points(self):
+        """Test work-linear interpolation and NaN past the ride's end."""
+        import numpy as np
+        ride = np.concatenate([np.full(600, 200.0), np.full(300, 400.0)])
+        curve = mean_max_power(ride)
+        assert interpolate_power_curve(curve, 301) == pytest.approx((300 * 400 + 200) / 301, rel=1e-3)
+        assert np.isnan(interpolate_power_curve(curve, 901))
+        assert interpolate_power_curve(curve, np.array([60, 900])).tolist() == pytest.approx([400, 800 / 3])
+
+
+class TestWPrimeBalance:
+    """Tests for W′bal (Skiba) traces."""
+
+    @staticmethod
+    def _intervals():
+        import numpy as np
+        rest, work = np.full(240, 140.0), np.full(180, 380.0)
+        return np.concatenate([np.full(600, 180.0)] + [work, rest] * 5 + [np.full(600, 150.0)])
+
+    def test_integral_model_matches_quadratic_integral(self):
+        """Test the O(n) recurrence against the textbook O(n^2) Skiba integral."""
+        import numpy as np
+        power = self._intervals()
+        balance = calculate_w_prime_balance(power, cp=300, w_prime=18000, model="integral")
+        below = power[power < 300]
+        tau = 546 * np.exp(-0.01 * (300 - below.mean())) + 316
+        expended = np.maximum(power - 300, 0)
+        t = np.arange(len(power))
+        naive = np.array([
+            18000 - np.sum(expended[:i + 1] * np.exp(-(i - t[:i + 1]) / tau)) for i in range(len(power))
+        ])
+        assert balance.tau_s == pytest.approx(tau)
+        np.testing.assert_allclose(balance.trace_j, naive, atol=1e-6)
+        assert balance.min_j == pytest.approx(naive.min())
+        assert balance.min_at_s == float(np.argmin(naive))
+
+    def test_differential_model_matches_sample_loop(self):
+        """Test the default (differential) model against a per-sample loop."""
+        import numpy as np
+        power = np.random.default_rng(5).gamma(4.0, 70.0, 5000)
+        w_bal, expected = 20000.0, []
+        for p in power:
+            w_bal = w_bal - (p - 250) if p >= 250 else w_bal + (20000 - w_bal) * (250 - p) / 20000
+            expected.append(w_bal)
+        balance = calculate_w_prime_balance(power, cp=250, w_prime=20000)
+        np.testing.assert_allclose(balance.trace_j, expected, atol=1e-6)
+        assert balance.tau_s is None
+
+    def test_time_below_and_sample_rate(self):
+        """Test time-below summaries in seconds and dt scaling at 2 Hz."""
+        import numpy as np
+        power = np.concatenate([np.full(60, 200.0), np.full(120, 400.0)])
+        one_hz = calculate_w_prime_balance(power, cp=300, w_prime=12520, model="differential")
+        two_hz = calculate_w_prime_balance(np.repeat(power, 2), cp=300, w_prime=12520,
+                                           sample_rate_hz=2, model="differential")
+        assert one_hz.min_j == pytest.approx(520.0)
+        assert two_hz.min_j == pytest.approx(520.0)
+        assert one_hz.time_below_s[0.5] == 58.0
+        assert two_hz.time_below_s[0.5] == 57.5
+        assert one_hz.time_below_s[0.25] == 27.0
+
+    def test_thresholds_from_athlete(self):
+        """Test CP/W′ come from the athlete, with FTP standing in for a missing CP."""
+        import numpy as np
+        power = self._intervals()
+        athlete = Athlete(name="Test", sport="cycling", ftp=290, w_prime=18000)
+        assert calculate_w_prime_balance_for_athlete(power, athlete).cp_w == 290
+        athlete.cp = 300
+        assert calculate_w_prime_balance_for_athlete(power, athlete).cp_w == 300
+        with pytest.raises(ValueError, match="W′"):
+            calculate_w_prime_balance_for_athlete(power, Athlete(name="Test", sport="cycling", ftp=290))
+
+    def test_invalid_inputs_raise_error(self):
+        """Test empty power, non-positive thresholds and unknown models."""
+        with pytest.raises(ValueError, match="empty"):
+            calculate_w_prime_balance([], cp=300, w_prime=20000)
+        with pytest.raises(ValueError, match="positive"):
+            calculate_w_prime_balance([300.0], cp=0, w_prime=20000)
+        with pytest.raises(ValueError, match="model"):
+            calculate_w_prime_balance([300.0], cp=300, w_prime=20000, model="bartram")
+
 
 class TestIntegratedPowerMetrics:
     """Integration tests for combined power metrics."""
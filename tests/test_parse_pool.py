@@ -0,0 +1,60 @@
+"""Unit tests for the bounded parse worker pool."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.parse_pool import ParsePool, ParsePoolSaturatedError
+
+
+def _thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+class TestParsePool:
+    """Tests for ParsePool concurrency limits."""
+
+    def test_run_returns_worker_result(self):
+        """Test that a job's return value is passed back to the caller."""
+        pool = ParsePool(max_workers=1, queue_depth=0, executor_factory=_thread_pool)
+        try:
+            assert asyncio.run(pool.run(pow, 2, 10)) == 1024
+            assert pool.in_flight == 0
+        finally:
+            pool.shutdown()
+
+    def test_run_beyond_capacity_raises_saturated(self):
+        """Test that jobs beyond workers + queue depth are rejected immediately."""
+        pool = ParsePool(max_workers=1, queue_depth=1, executor_factory=_thread_pool)
+        release = threading.Event()
+
+        async def scenario():
+            blocked = [asyncio.ensure_future(pool.run(release.wait, 5)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            assert pool.in_flight == 2
+            with pytest.raises(ParsePoolSaturatedError):
+                await pool.run(release.wait, 5)
+            release.set()
+            await asyncio.gather(*blocked)
+            assert pool.in_flight == 0
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            release.set()
+            pool.shutdown()
+
+    def test_invalid_sizes_raise_error(self):
+        """Test that non-positive worker counts are rejected."""
+        with pytest.raises(ValueError, match="max_workers"):
+            ParsePool(max_workers=0)
+        with pytest.raises(ValueError, match="queue_depth"):
+            ParsePool(max_workers=1, queue_depth=-1)
+
+    def test_from_env_reads_sizes(self, monkeypatch):
+        """Test that pool sizes come from environment variables."""
+        monkeypatch.setenv("AUTOCOACH_PARSE_WORKERS", "3")
+        monkeypatch.setenv("AUTOCOACH_PARSE_QUEUE_DEPTH", "5")
+        pool = ParsePool.from_env()
+        assert pool.capacity == 8
@@ -0,0 +1,232 @@
+"""Unit tests for the incrementally maintained per-athlete PMC."""
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.schemas.training import WorkoutExecuted
+from app.services.metrics import LoadConstants, compute_chronic_and_acute_loads
+from app.services.pmc import PmcCache, team_loads
+from app.services.workout_store import WorkoutStore
+
+START = date(2016, 1, 1)
+
+
+def _workout(day: date, tss: float, np_w=None, athlete_id: int = 1) -> WorkoutExecuted:
+    summary = {"tss": tss}
+    if np_w is not None:
+        summary.update({"np": np_w, "avg_power": np_w * 0.95})
+    return WorkoutExecuted(
+        athlete_id=athlete_id,
+        source="file",
+        start_time=datetime.combine(day, datetime.min.time()),
+        duration_s=3600,
+        sport="cycling",
+        summary_json=summary,
+    )
+
+
+def _full_recompute(store: WorkoutStore, athlete_id: int = 1) -> pd.DataFrame:
+    dates, tss = store.daily_tss(athlete_id)
+    daily = pd.DataFrame({"date": pd.to_datetime(dates), "tss": tss})
+    return compute_chronic_and_acute_loads(daily[daily["tss"] > 0])
+
+
+def _history(store: WorkoutStore, days: int, seed: int = 0, athlete_id: int = 1, offset: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    for i in np.flatnonzero(rng.random(days) < 0.7):
+        day = START + timedelta(days=int(i) + offset)
+        store.add(f"w{i}", _workout(day, float(rng.uniform(20, 200)), athlete_id=athlete_id))
+
+
+class TestPmcCache:
+    """Tests for PmcCache."""
+
+    def test_matches_full_recompute(self):
+        """Test that cached loads equal a full pandas recompute."""
+        store = WorkoutStore()
+        cache = PmcCache(store)
+        _history(store, 400)
+
+        dates, tss, atl, ctl = cache.series(1)
+        expected = _full_recompute(store)
+        assert dates[0] == np.datetime64(expected["date"].iloc[0].date())
+        np.testing.assert_allclose(atl, expected["atl"], rtol=1e-9)
+        np.testing.assert_allclose(ctl, expected["ctl"], rtol=1e-9)
+
+    def test_adding_todays_ride_recomputes_one_day(self):
+        """Test that a ride after years of history only recomputes its day."""
+        store = WorkoutStore()
+        cache = PmcCache(store)
+        _history(store, 3650)
+        store.add("last", _workout(START + timedelta(days=3649), 80.0))
+        cache.state(1)
+        before = cache.days_recomputed
+
+        store.add("today", _workout(START + timedelta(days=3650), 120.0))
+        state = cache.state(1)
+
+        assert cache.days_recomputed - before == 1
+        expected = _full_recompute(store).iloc[-1]
+        assert state.last_date == START + timedelta(days=3650)
+        assert state.atl == pytest.approx(expected["atl"], rel=1e-9)
+        assert state.ctl == pytest.approx(expected["ctl"], rel=1e-9)
+        assert state.tsb == pytest.approx(expected["tsb"], rel=1e-9)
+
+    def test_edits_recompute_forward_from_earliest_change(self):
+        """Test that edits coalesce and only later days are recomputed."""
+        store = WorkoutStore()
+        cache = PmcCache(store)
+        _history(store, 1000)
+        store.add("edited", _workout(START + timedelta(days=10), 0.0))
+        cache.series(1)
+        before = cache.days_recomputed
+
+        store.add("edited", _workout(START + timedelta(days=900), 300.0))   # moved later
+        store.add("late", _workout(START + timedelta(days=950), 90.0))
+        _, _, atl, ctl = cache.series(1)
+
+        assert cache.days_recomputed - before == 1000 - 10
+        expected = _full_recompute(store)
+        np.testing.assert_allclose(atl, expected["atl"], rtol=1e-9)
+        np.testing.assert_allclose(ctl, expected["ctl"], rtol=1e-9)
+
+    def test_rethreshold_and_earlier_history_invalidate(self):
+        """Test that FTP changes and workouts before the first day update loads."""
+        store = WorkoutStore()
+        cache = PmcCache(store)
+        store.add("a", _workout(START + timedelta(days=5), 60.0, np_w=250))
+        store.add("b", _workout(START + timedelta(days=8), 70.0, np_w=200))
+        cache.series(1)
+
+        store.rethreshold(1, ftp=220)
+        store.add("early", _workout(START, 40.0))
+        dates, _, atl, ctl = cache.series(1)
+
+        expected = _full_recompute(store)
+        assert dates[0] == np.datetime64(START)
+        np.testing.assert_allclose(atl, expected["atl"], rtol=1e-9)
+        np.testing.assert_allclose(ctl, expected["ctl"], rtol=1e-9)
+
+    def test_series_range_and_decay_after_last_workout(self):
+        """Test range slicing and zero-TSS days up to a later end date."""
+        store = WorkoutStore()
+        cache = PmcCache(store)
+        store.add("a", _workout(START, 100.0))
+        store.add("b", _workout(START + timedelta(days=2), 50.0))
+
+        dates, tss, atl, ctl = cache.series(1, start=START + timedelta(days=1), end=START + timedelta(days=5))
+        assert len(dates) == 5
+        assert tss.tolist() == [0, 50, 0, 0, 0]
+        assert atl[-1] == pytest.approx(atl[1] * (6 / 7) ** 3)
+        assert cache.state(1).last_date == START + timedelta(days=2)
+
+        rows = cache.metrics_daily(1)
+        assert [row.metric_date for row in rows] == [START + timedelta(days=i) for i in range(3)]
+        assert rows[-1].tsb == pytest.approx(rows[-1].ctl - rows[-1].atl)
+
+    def test_persisted_series_resume_after_restart(self, tmp_path):
+        """Test that a restarted cache reuses stored loads and stays exact."""
+        store = WorkoutStore(tmp_path / "workouts")
+        cache = PmcCache(store, root=tmp_path / "pmc")
+        _history(store, 1000)
+        cache.series(1)
+        store.add("edited", _workout(START + timedelta(days=900), 300.0))   # truncates the file
+
+        restarted_store = WorkoutStore(tmp_path / "workouts")
+        restarted = PmcCache(restarted_store, root=tmp_path / "pmc")
+        restarted_store.add("today", _workout(START + timedelta(days=1000), 120.0))
+        _, _, atl, ctl = restarted.series(1)
+
+        assert restarted.days_recomputed == 1000 - 900 + 1
+        expected = _full_recompute(restarted_store)
+        np.testing.assert_allclose(atl, expected["atl"], rtol=1e-9)
+        np.testing.assert_allclose(ctl, expected["ctl"], rtol=1e-9)
+
+    def test_persisted_series_with_other_constants_are_rebuilt(self, tmp_path):
+        """Test that stored loads are not reused under different time constants."""
+        store = WorkoutStore()
+        _history(store, 100)
+        PmcCache(store, root=tmp_path).series(1)
+
+        cache = PmcCache(store, LoadConstants(5, 30), root=tmp_path)
+        cache.series(1)
+        assert cache.days_recomputed == len(store.daily_tss(1)[1])
+
+    def test_cache_created_after_store_keeps_earlier_history(self):
+        """Test that the first change seen by a late cache doesn't drop older days."""
+        store = WorkoutStore()
+        for i in range(20):
+            store.add(f"w{i}", _workout(START + timedelta(days=i), 100.0))
+        cache = PmcCache(store)
+        store.add("late", _workout(START + timedelta(days=25), 50.0))
+
+        dates, _, atl, ctl = cache.series(1)
+
+        expected = _full_recompute(store)
+        assert dates[0] == np.datetime64(START)
+        assert len(dates) == 26
+        assert atl[-1] == pytest.approx(expected["atl"].iloc[-1], rel=1e-9)
+        assert ctl[-1] == pytest.approx(expected["ctl"].iloc[-1], rel=1e-9)
+
+    def test_missing_series_file_is_rebuilt_from_store_history(self, tmp_path):
+        """Test that a data dir without .pmc files resumes from the full history."""
+        store = WorkoutStore(tmp_path / "workouts")
+        _history(store, 200)
+
+        restarted_store = WorkoutStore(tmp_path / "workouts")
+        cache = PmcCache(restarted_store, root=tmp_path / "pmc")
+        restarted_store.add("today", _workout(START + timedelta(days=200), 120.0))
+        _, _, atl, ctl = cache.series(1)
+
+        expected = _full_recompute(restarted_store)
+        np.testing.assert_allclose(atl, expected["atl"], rtol=1e-9)
+        np.testing.assert_allclose(ctl, expected["ctl"], rtol=1e-9)
+
+    def test_unknown_athlete(self):
+        """Test that athletes without workouts have no state or rows."""
+        cache = PmcCache(WorkoutStore())
+        assert cache.state(42) is None
+        assert cache.metrics_daily(42) == []
+
+
+class TestTeamLoads:
+    """Tests for the vectorized team PMC."""
+
+    def test_rows_match_per_athlete_cache(self):
+        """Test that team rows equal each athlete's own series on shared dates."""
+        store = WorkoutStore()
+        for athlete_id, offset in ((1, 0), (2, 120), (3, 45)):
+            _history(store, 300, seed=athlete_id, athlete_id=athlete_id, offset=offset)
+        constants = {2: LoadConstants(5, 30)}
+        caches = {athlete_id: PmcCache(store, constants.get(athlete_id)) for athlete_id in (1, 2, 3)}
+
+        loads = team_loads(store, [3, 1, 2, 4], constants, end=START + timedelta(days=450))
+
+        assert loads.athlete_ids == [3, 1, 2, 4]
+        assert loads.dates[0] == np.datetime64(START)
+        assert loads.dates[-1] == np.datetime64(START + timedelta(days=450))
+        assert not loads.atl[3].any()
+        for row, athlete_id in enumerate(loads.athlete_ids[:3]):
+            dates, tss, atl, ctl = caches[athlete_id].series(athlete_id, end=START + timedelta(days=450))
+            columns = slice(int((dates[0] - loads.dates[0]).astype(int)), None)
+            np.testing.assert_allclose(loads.tss[row, columns], tss)
+            np.testing.assert_allclose(loads.atl[row, columns], atl, rtol=1e-9)
+            np.testing.assert_allclose(loads.ctl[row, columns], ctl, rtol=1e-9)
+        np.testing.assert_allclose(loads.tsb, loads.ctl - loads.atl)
+
+    def test_start_trims_columns(self):
+        """Test that start only trims the output, not the load history."""
+        store = WorkoutStore()
+        _history(store, 200)
+        full = team_loads(store, [1])
+        trimmed = team_loads(store, [1], start=START + timedelta(days=150))
+        assert trimmed.dates[0] == np.datetime64(START + timedelta(days=150))
+        np.testing.assert_array_equal(trimmed.ctl, full.ctl[:, 150:])
+
+    def test_team_without_workouts(self):
+        """Test that athletes without workouts give an empty calendar."""
+        loads = team_loads(WorkoutStore(), [1, 2])
+        assert len(loads.dates) == 0
+        assert loads.atl.shape == (2, 0)
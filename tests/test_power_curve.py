@@ -0,0 +1,127 @@
+"""Unit tests for workout power curves and the per-athlete best-curve index."""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.metrics import MMP_DURATIONS_S, mean_max_power
+from app.services.power_curve import (
+    BLOCK_DAYS,
+    PowerCurveIndex,
+    power_on_grid,
+    workout_power_curve,
+)
+from app.services.sample_frame import SampleFrame
+
+START = date(2024, 1, 1)
+
+
+def _curve(seed: int, seconds: int = 3600) -> np.ndarray:
+    return mean_max_power(np.random.default_rng(seed).gamma(4.0, 55.0, seconds))
+
+
+def _brute_force_best(workouts, first: date, last: date) -> np.ndarray:
+    rows = [curve for day, curve in workouts if first <= day <= last]
+    return np.fmax.reduce(np.stack(rows), axis=0)
+
+
+class TestPowerOnGrid:
+    """Tests for resampling recorded power onto 1 s."""
+
+    def test_short_gaps_hold_and_long_gaps_are_zero(self):
+        """Test that smart-recording gaps hold power and stops count as 0 W."""
+        t_s = np.array([10, 11, 14, 30, 31])
+        samples = SampleFrame.from_columns(t_s, {"power_w": np.array([100, 200, 300, 400, 500.0])})
+        grid = power_on_grid(samples)
+        assert len(grid) == 22
+        assert grid[:5].tolist() == [100, 200, 200, 200, 300]
+        assert grid[5:10].tolist() == [300] * 5
+        assert grid[10:20].tolist() == [0] * 10
+        assert grid[-2:].tolist() == [400, 500]
+
+    def test_workout_without_power_has_no_curve(self):
+        """Test that HR-only workouts are not indexed."""
+        samples = SampleFrame.from_columns(np.arange(60), {"hr_bpm": np.full(60, 130.0)})
+        assert workout_power_curve(samples) is None
+
+
+class TestPowerCurveIndex:
+    """Tests for the incrementally maintained best-curve index."""
+
+    def test_range_queries_match_brute_force(self):
+        """Test block + edge-day queries against scanning every workout."""
+        index = PowerCurveIndex()
+        rng = np.random.default_rng(0)
+        workouts = []
+        for i, offset in enumerate(np.sort(rng.integers(0, 400, 60)).tolist()):
+            day = START + timedelta(days=offset)
+            curve = _curve(i, seconds=int(rng.integers(600, 7200)))
+            index.add(1, f"w{i}", day, curve)
+            workouts.append((day, curve))
+
+        for first_offset, last_offset in ((0, 399), (5, 40), (31, 32), (100, 190), (200, 200)):
+            first, last = START + timedelta(days=first_offset), START + timedelta(days=last_offset)
+            if not any(first <= day <= last for day, _ in workouts):
+                assert index.best_curve(1, first, last) is None
+                continue
+            expected = _brute_force_best(workouts, first, last)
+            np.testing.assert_array_equal(index.best_curve(1, first, last), expected)
+        np.testing.assert_array_equal(
+            index.best_curve(1), _brute_force_best(workouts, date.min, date.max)
+        )
+
+    def test_best_power_for_duration_and_missing_data(self):
+        """Test single-duration queries, other athletes and durations nobody rode."""
+        index = PowerCurveIndex()
+        curve = _curve(1)
+        index.add(1, "a", START, curve)
+        twenty_min = int(np.searchsorted(MMP_DURATIONS_S, 1200))
+        assert index.best_power(1, 1200) == pytest.approx(curve[twenty_min])
+        assert index.best_power(1, 4 * 3600) is None
+        assert index.best_power(2, 1200) is None
+        assert index.best_curve(1, start=START + timedelta(days=1)) is None
+
+    def test_replacing_or_removing_a_workout_lowers_the_bests(self):
+        """Test that a re-added key replaces its curve instead of keeping the old max."""
+        index = PowerCurveIndex()
+        day = START + timedelta(days=BLOCK_DAYS + 3)
+        index.add(1, "a", day, _curve(1) + 100)
+        index.add(1, "b", day + timedelta(days=1), _curve(2))
+        index.add(1, "a", day, _curve(3))
+        assert len(index) == 2
+        np.testing.assert_array_equal(index.best_curve(1), np.fmax(_curve(2), _curve(3)))
+        assert index.remove(1, "a") and not index.remove(1, "a")
+        assert index.best_curve(1, START, day) is None
+        np.testing.assert_array_equal(index.best_curve(1), _curve(2))
+
+    def test_curve_must_match_grid(self):
+        """Test that curves on another duration grid are rejected."""
+        with pytest.raises(ValueError, match="points"):
+            PowerCurveIndex().add(1, "a", START, np.zeros(10))
+
+    def test_persisted_curves_survive_reopen(self, tmp_path):
+        """Test that a reopened index replays adds, replacements and removals."""
+        index = PowerCurveIndex(root=tmp_path)
+        index.add(1, "a", START, _curve(1) + 100)
+        index.add(1, "b", START + timedelta(days=40), _curve(2))
+        index.add(1, "a", START, _curve(3))
+        index.add(2, "c", START, _curve(4))
+        index.remove(2, "c")
+        index.add(2, "d:1", START + timedelta(days=2), _curve(5))
+        with (tmp_path / "1.mmp").open("ab") as f:
+            f.write(b"\x05\x00torn")
+
+        reopened = PowerCurveIndex(root=tmp_path)
+
+        assert len(reopened) == 3 and (2, "c") not in reopened
+        for athlete_id in (1, 2):
+            np.testing.assert_array_equal(reopened.best_curve(athlete_id), index.best_curve(athlete_id))
+        np.testing.assert_array_equal(
+            reopened.best_curve(1, START, START + timedelta(days=39)), _curve(3).astype(np.float32)
+        )
+
+    def test_persisted_curves_on_another_grid_are_skipped(self, tmp_path):
+        """Test that files written for a different duration grid are not loaded."""
+        PowerCurveIndex(root=tmp_path).add(1, "a", START, _curve(1))
+        reopened = PowerCurveIndex(MMP_DURATIONS_S[:-1], root=tmp_path)
+        assert len(reopened) == 0
@@ -0,0 +1,91 @@
+"""Unit tests for the columnar SampleFrame."""
+import numpy as np
+import pytest
+
+from app.schemas.training import Sample
+from app.services.sample_frame import CHANNELS, SampleFrame, SampleFrameBuilder, resolve_channels
+
+
+class TestSampleFrame:
+    """Tests for SampleFrame construction and validation."""
+
+    def test_from_columns_marks_nan_as_invalid(self):
+        """Test that NaN values become invalid entries in the mask."""
+        frame = SampleFrame.from_columns(
+            np.arange(3),
+            {"power_w": np.array([200.0, np.nan, 210.0])},
+        )
+        assert frame.power_w.dtype == np.int32
+        assert frame.valid["power_w"].tolist() == [True, False, True]
+        assert frame.values("power_w").tolist() == [200, 210]
+        assert not frame.has_channel("hr_bpm")
+
+    def test_validate_rejects_out_of_range_values(self):
+        """Test that out-of-range values are masked rather than raising."""
+        frame = SampleFrame.from_columns(
+            np.arange(4),
+            {
+                "power_w": np.array([250.0, 65535.0, 260.0, -5.0]),
+                "lat": np.array([45.0, 91.0, np.nan, -45.0]),
+            },
+            validate=False,
+        )
+        rejected = frame.validate()
+        assert rejected == {"power_w": 2, "lat": 1}
+        assert frame.values("power_w").tolist() == [250, 260]
+        assert frame.values("lat").tolist() == [45.0, -45.0]
+
+    def test_from_columns_unknown_channel_raises_error(self):
+        """Test that unknown channel names are rejected."""
+        with pytest.raises(ValueError, match="Unknown sample channels"):
+            SampleFrame.from_columns(np.arange(2), {"watts": np.zeros(2)})
+
+    def test_to_samples_builds_sample_models(self):
+        """Test that to_samples materializes Sample objects with missing fields as None."""
+        frame = SampleFrame.from_columns(
+            np.array([0, 1]),
+            {"power_w": np.array([200.0, np.nan]), "hr_bpm": np.array([120.0, 121.0])},
+        )
+        samples = frame.to_samples(workout_id=7)
+        assert all(isinstance(s, Sample) for s in samples)
+        assert samples[0].power_w == 200 and samples[0].hr_bpm == 120
+        assert samples[1].power_w is None
+        assert samples[1].workout_id == 7
+
+    def test_duration_of_empty_frame_is_zero(self):
+        """Test that an empty frame has zero duration."""
+        frame = SampleFrame.empty()
+        assert len(frame) == 0
+        assert frame.duration_s == 0
+
+
+class TestSampleFrameBuilder:
+    """Tests for incremental frame building."""
+
+    def test_builder_fills_missing_channels(self):
+        """Test that channels missing from a row are stored as invalid."""
+        builder = SampleFrameBuilder()
+        builder.append(0, {"power_w": 180, "cadence": 85})
+        builder.append(1, {"hr_bpm": 130})
+        frame = builder.build()
+        assert len(builder) == 2
+        assert frame.t_s.tolist() == [0, 1]
+        assert frame.valid["power_w"].tolist() == [True, False]
+        assert frame.valid["hr_bpm"].tolist() == [False, True]
+        assert frame.duration_s == 1
+
+
+class TestResolveChannels:
+    """Tests for channel selection used by decode-time projection."""
+
+    def test_profiles_and_defaults(self):
+        """Test None, named profiles and explicit lists."""
+        assert resolve_channels() == frozenset(CHANNELS)
+        assert resolve_channels("full") == frozenset(CHANNELS)
+        assert resolve_channels("load") == {"power_w", "hr_bpm"}
+        assert resolve_channels(["cadence"]) == {"cadence"}
+
+    def test_unknown_channel_raises_error(self):
+        """Test that unknown channel names are rejected."""
+        with pytest.raises(ValueError, match="Unknown sample channels: watts"):
+            resolve_channels(["watts"])
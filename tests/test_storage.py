@@ -0,0 +1,153 @@
+"""Unit tests for content-addressed upload storage and the parse-result cache."""
+from datetime import datetime
+
+import numpy as np
+
+from app.schemas.training import IntervalDetected
+from app.services.file_parser import FitDecodeResult, apply_ftp, summarize_workout
+from app.services.interval_detection import SegmentationParams
+from app.services.sample_frame import CHANNELS, SampleFrame
+from app.services.storage import (
+    IntervalCache,
+    ParseResultCache,
+    RawUploadStore,
+    content_hash,
+    threshold_version,
+)
+
+
+class TestRawUploadStore:
+    """Tests for content-addressed raw storage."""
+
+    def test_put_stores_by_hash_and_deduplicates(self, tmp_path):
+        """Test that identical bytes map to one stored file."""
+        store = RawUploadStore(tmp_path)
+        digest = store.put(b"ride-bytes")
+        assert digest == content_hash(b"ride-bytes")
+        assert store.put(b"ride-bytes") == digest
+        assert store.get(digest) == b"ride-bytes"
+        assert store.path(digest).parent.name == digest[:2]
+        assert len(list(tmp_path.rglob("*"))) == 2
+
+    def test_different_content_never_collides(self, tmp_path):
+        """Test that two uploads with the same name but different bytes both survive."""
+        store = RawUploadStore(tmp_path)
+        a = store.put(b"athlete one ride.fit")
+        b = store.put(b"athlete two ride.fit")
+        assert a != b
+        assert store.get(a) != store.get(b)
+
+
+class TestParseResultCache:
+    """Tests for the persistent parse-result cache."""
+
+    def test_round_trip_preserves_samples_and_metadata(self, tmp_path):
+        """Test that a cached result loads back identical to what was stored."""
+        frame = SampleFrame.from_columns(
+            np.arange(3),
+            {"power_w": np.array([200.0, np.nan, 220.0]), "lat": np.array([45.1, 45.2, 45.3])},
+        )
+        start = datetime(2024, 2, 29, 18, 22, 51)
+        decoded = FitDecodeResult(
+            sessions=[{"sport": "cycling", "start_time": start, "total_ascent_m": None}],
+            laps=[{"start_time": start, "total_elapsed_time": 60.0}],
+            samples=frame,
+            start_time=start,
+        )
+        cache = ParseResultCache(tmp_path)
+        cache.put("ab" * 32, decoded)
+
+        loaded = cache.get("ab" * 32)
+        assert "ab" * 32 in cache
+        assert loaded.session_data == decoded.session_data
+        assert loaded.laps == decoded.laps
+        assert loaded.start_time == start
+        for name in CHANNELS:
+            assert np.array_equal(getattr(loaded.samples, name), getattr(frame, name))
+            assert np.array_equal(loaded.samples.valid[name], frame.valid[name])
+        assert loaded.samples.power_w.dtype == np.int32
+
+    def test_missing_entry_returns_none(self, tmp_path):
+        """Test that a cache miss returns None."""
+        assert ParseResultCache(tmp_path).get("cd" * 32) is None
+
+    def test_stored_summaries_give_the_same_workout_for_any_ftp(self, tmp_path):
+        """Test that an FTP-free summary plus apply_ftp equals summarizing with the FTP."""
+        power = np.random.default_rng(3).uniform(100, 350, 1800).round()
+        decoded = FitDecodeResult(
+            sessions=[{"sport": "cycling", "start_time": datetime(2024, 3, 1, 7, 0), "tss": 12.0}],
+            samples=SampleFrame.from_columns(np.arange(1800), {"power_w": power}),
+        )
+        cache = ParseResultCache(tmp_path)
+        cache.put_summaries("ef" * 32, [summarize_workout(decoded, athlete_id=1)], 1800)
+
+        summaries, sample_count = cache.get_summaries("ef" * 32)
+        assert sample_count == 1800
+        assert summaries[0].summary_json["tss"] == 12.0   # device TSS without an FTP
+        for ftp in (None, 250, 300):
+            expected = summarize_workout(decoded, athlete_id=1, ftp=ftp)
+            assert apply_ftp(summaries[0], ftp).summary_json == expected.summary_json
+        assert cache.get_summaries("cd" * 32) is None
+
+
+def _intervals(avg_power: float):
+    return [
+        IntervalDetected(workout_id=1, t_start=0, t_end=60, kind="work", metrics_json={"avg_power": avg_power}),
+        IntervalDetected(workout_id=1, t_start=60, t_end=120, kind="rest", metrics_json={}),
+    ]
+
+
+class TestIntervalCache:
+    """Tests for the two-tier detected-interval cache."""
+
+    DIGEST = "ab" * 32
+
+    def test_disk_tier_survives_a_new_cache_instance(self, tmp_path):
+        """Test that a restart (fresh instance) is served from disk."""
+        params = SegmentationParams()
+        version = threshold_version(250)
+        IntervalCache(tmp_path).put(self.DIGEST, params, version, _intervals(300.0))
+        loaded = IntervalCache(tmp_path).get(self.DIGEST, params, version)
+        assert loaded == _intervals(300.0)
+
+    def test_threshold_change_invalidates_entry(self, tmp_path):
+        """Test that a new FTP or new zones miss and the next put replaces the entry."""
+        cache = IntervalCache(tmp_path)
+        params = SegmentationParams()
+        cache.put(self.DIGEST, params, threshold_version(250), _intervals(300.0))
+        assert cache.get(self.DIGEST, params, threshold_version(260)) is None
+        assert cache.get(
+            self.DIGEST, params, threshold_version(250, {"Z2": (140, 190)})
+        ) is None
+        cache.put(self.DIGEST, params, threshold_version(260), _intervals(310.0))
+        assert len(list(tmp_path.rglob("*.json"))) == 1
+        assert cache.get(self.DIGEST, params, threshold_version(250)) is None
+
+    def test_parameters_are_part_of_the_key(self, tmp_path):
+        """Test that different smoothing/min-duration/penalty settings don't collide."""
+        cache = IntervalCache(tmp_path)
+        version = threshold_version(None)
+        cache.put(self.DIGEST, SegmentationParams(), version, _intervals(300.0))
+        cache.put(self.DIGEST, SegmentationParams(min_duration_s=60), version, _intervals(280.0))
+        assert cache.get(self.DIGEST, SegmentationParams(), version)[0].metrics_json["avg_power"] == 300.0
+        assert cache.get(self.DIGEST, SegmentationParams(penalty=50.0), version) is None
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        """Test LRU eviction in a memory-only cache."""
+        cache = IntervalCache(max_entries=2)
+        params = SegmentationParams()
+        version = threshold_version(250)
+        for digest in ("a", "b"):
+            cache.put(digest, params, version, _intervals(200.0))
+        cache.get("a", params, version)
+        cache.put("c", params, version, _intervals(200.0))
+        assert cache.get("b", params, version) is None
+        assert cache.get("a", params, version) is not None
+
+    def test_invalidate_drops_memory_and_disk(self, tmp_path):
+        """Test explicit invalidation of one workout."""
+        cache = IntervalCache(tmp_path)
+        version = threshold_version(250)
+        cache.put(self.DIGEST, SegmentationParams(), version, _intervals(300.0))
+        cache.invalidate(self.DIGEST)
+        assert cache.get(self.DIGEST, SegmentationParams(), version) is None
@@ -0,0 +1,115 @@
+"""Unit tests for streaming TCX parsing."""
+import gzip
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.services.file_parser import FileParseError
+from app.services.tcx_parser import decode_tcx_bytes, parse_tcx_file
+
+
+TCX_NS = "http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2"
+EXT_NS = "http://www.garmin.com/xmlschemas/ActivityExtension/v2"
+
+
+def _trackpoint(time: datetime, i: int, power: int = 200) -> str:
+    return f"""
+        <Trackpoint>
+          <Time>{time.isoformat()}Z</Time>
+          <Position><LatitudeDegrees>{45 + i * 1e-5}</LatitudeDegrees><LongitudeDegrees>-122.5</LongitudeDegrees></Position>
+          <AltitudeMeters>{100 + i * 0.1}</AltitudeMeters>
+          <DistanceMeters>{i * 8.0}</DistanceMeters>
+          <HeartRateBpm><Value>{120 + i % 10}</Value></HeartRateBpm>
+          <Cadence>90</Cadence>
+          <Extensions><ns3:TPX><ns3:Speed>8.0</ns3:Speed><ns3:Watts>{power}</ns3:Watts></ns3:TPX></Extensions>
+        </Trackpoint>"""
+
+
+def make_tcx(laps=((600, 200), (300, 100)), start=datetime(2024, 5, 1, 8, 0, 0)) -> bytes:
+    """Build a TCX ride with one lap per (seconds, watts) pair."""
+    lap_xml = []
+    t, i = start, 0
+    for seconds, watts in laps:
+        points = []
+        lap_start = t
+        for _ in range(seconds):
+            points.append(_trackpoint(t, i, watts))
+            t += timedelta(seconds=1)
+            i += 1
+        lap_xml.append(f"""
+      <Lap StartTime="{lap_start.isoformat()}Z">
+        <TotalTimeSeconds>{seconds}</TotalTimeSeconds>
+        <DistanceMeters>{seconds * 8.0}</DistanceMeters>
+        <AverageHeartRateBpm><Value>125</Value></AverageHeartRateBpm>
+        <MaximumHeartRateBpm><Value>129</Value></MaximumHeartRateBpm>
+        <Intensity>Active</Intensity>
+        <Cadence>90</Cadence>
+        <TriggerMethod>Manual</TriggerMethod>
+        <Track>{''.join(points)}
+        </Track>
+        <Extensions><ns3:LX><ns3:AvgWatts>{watts}</ns3:AvgWatts><ns3:MaxWatts>{watts}</ns3:MaxWatts></ns3:LX></Extensions>
+      </Lap>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<TrainingCenterDatabase xmlns="{TCX_NS}" xmlns:ns3="{EXT_NS}">
+  <Activities>
+    <Activity Sport="Biking">
+      <Id>{start.isoformat()}Z</Id>{''.join(lap_xml)}
+      <Creator><Name>Edge 530</Name></Creator>
+    </Activity>
+  </Activities>
+</TrainingCenterDatabase>""".encode()
+
+
+class TestTcxParser:
+    """Tests for TCX parsing."""
+
+    def test_parse_tcx_fills_samples_laps_and_summary(self):
+        """Test that trackpoints, extensions and laps map onto the FIT structures."""
+        workout, samples = parse_tcx_file(make_tcx(), athlete_id=1, ftp=250, filename="ride.tcx")
+
+        assert len(samples) == 900
+        assert samples.t_s[0] == 0 and samples.t_s[-1] == 899
+        assert samples.values("power_w")[:600].tolist() == [200] * 600
+        assert samples.values("pace_mps")[0] == pytest.approx(8.0)
+        assert samples.values("hr_bpm")[:3].tolist() == [120, 121, 122]
+        assert samples.values("lat")[1] == pytest.approx(45.00001)
+
+        assert workout.sport == "cycling"
+        assert workout.start_time == datetime(2024, 5, 1, 8, 0, 0)
+        assert workout.duration_s == 899
+        assert workout.file_ref == "ride.tcx"
+        assert workout.summary_json["distance_m"] == pytest.approx(7200.0)
+        assert workout.summary_json["avg_power"] == pytest.approx(500 / 3)
+        assert "tss" in workout.summary_json
+
+    def test_decode_tcx_laps_use_fit_lap_keys(self):
+        """Test that lap summaries use the same keys as FIT laps."""
+        decoded = decode_tcx_bytes(make_tcx())
+        first = decoded.laps[0]
+        assert len(decoded.laps) == 2
+        assert first["start_time"] == datetime(2024, 5, 1, 8, 0, 0)
+        assert first["end_time"] == datetime(2024, 5, 1, 8, 10, 0)
+        assert first["total_timer_time"] == 600.0
+        assert first["avg_power"] == 200.0
+        assert first["avg_hr"] == 125 and first["max_hr"] == 129
+        assert first["intensity"] == "active"
+        assert first["lap_trigger"] == "manual"
+        assert decoded.device_info == [{"product": "Edge 530"}]
+
+    def test_parse_gzipped_tcx(self):
+        """Test that .tcx.gz payloads are decompressed in memory."""
+        _, plain = parse_tcx_file(make_tcx(), athlete_id=1)
+        _, compressed = parse_tcx_file(gzip.compress(make_tcx()), athlete_id=1)
+        np.testing.assert_array_equal(plain.power_w, compressed.power_w)
+
+    def test_malformed_tcx_raises_parse_error(self):
+        """Test that truncated XML raises FileParseError."""
+        with pytest.raises(FileParseError, match="Failed to parse TCX"):
+            decode_tcx_bytes(make_tcx()[:500])
+
+    def test_tcx_without_activity_raises_parse_error(self):
+        """Test that a document without an Activity is rejected."""
+        data = f'<TrainingCenterDatabase xmlns="{TCX_NS}"><Activities/></TrainingCenterDatabase>'
+        with pytest.raises(FileParseError, match="No Activity"):
+            decode_tcx_bytes(data.encode())
@@ -0,0 +1,168 @@
+"""Unit tests for the WorkoutSpec compiler."""
+import numpy as np
+import pytest
+
+from app.schemas.training import Athlete, WorkoutSpec, WorkoutStep
+from app.services import workout_compiler
+from app.services.metrics import calculate_normalized_power, calculate_tss_from_power
+from app.services.workout_compiler import compile_spec, spec_hash, with_planned_load
+
+FTP = 300
+
+
+def vo2_spec() -> WorkoutSpec:
+    """10 min warmup, 5 x (3 min @ 115% / 3 min rest), 10 min cooldown."""
+    return WorkoutSpec(sport="cycling", steps=[
+        WorkoutStep(kind="warmup", duration_s=600, target_power_pct=55, tolerance_pct=10),
+        WorkoutStep(kind="interval_block", repeats=5, steps=[
+            WorkoutStep(kind="work", duration_s=180, target_power_pct=115, tolerance_pct=5),
+            WorkoutStep(kind="rest", duration_s=180, target_power_pct=50),
+        ]),
+        WorkoutStep(kind="cooldown", duration_s=600, target_power_pct=50, tolerance_pct=10),
+    ])
+
+
+def athlete(**thresholds) -> Athlete:
+    return Athlete(name="Test", sport="cycling", **thresholds)
+
+
+class TestCompileSpec:
+    """Tests for flattening specs into per-step arrays."""
+
+    def test_interval_blocks_are_unrolled(self):
+        """Test repeats expansion, offsets, per-second step index and absolute targets."""
+        compiled = compile_spec(vo2_spec(), athlete(ftp=FTP))
+        assert len(compiled.steps) == 12
+        assert compiled.duration_s == 600 + 5 * 360 + 600
+        assert compiled.start_s[:3].tolist() == [0, 600, 780]
+        assert compiled.end_s[-1] == compiled.duration_s
+        assert compiled.step_index[600] == 1 and compiled.step_index[780] == 2
+        assert compiled.target[1] == pytest.approx(345)
+        assert (compiled.low[1], compiled.high[1]) == pytest.approx((327.75, 362.25))
+        assert compiled.intensity[1] == pytest.approx(1.15)
+
+    def test_nested_blocks_and_hr_pace_targets(self):
+        """Test blocks inside blocks and resolution of HR and pace targets."""
+        spec = WorkoutSpec(sport="running", steps=[
+            WorkoutStep(kind="interval_block", repeats=2, steps=[
+                WorkoutStep(kind="interval_block", repeats=3, steps=[
+                    WorkoutStep(kind="work", duration_s=60, target_pace_min_per_km=4.0),
+                ]),
+                WorkoutStep(kind="rest", duration_s=120, target_hr_pct=70),
+            ]),
+        ])
+        compiled = compile_spec(spec, athlete(lthr=170))
+        assert [step.kind for step in compiled.steps] == (["work"] * 3 + ["rest"]) * 2
+        assert compiled.channel.tolist() == [2, 2, 2, 1] * 2
+        assert compiled.target[0] == pytest.approx(1000 / 240)
+        assert compiled.target[3] == pytest.approx(119)
+        assert compiled.planned_tss is None
+
+    def test_repeats_on_leaf_steps_are_unrolled(self):
+        """Test that repeats on a step without nested steps repeats the step."""
+        spec = WorkoutSpec(sport="cycling", steps=[
+            WorkoutStep(kind="work", duration_s=60, target_power_pct=150, repeats=8),
+            WorkoutStep(kind="cooldown", duration_s=300, target_power_pct=50),
+        ])
+        compiled = compile_spec(spec, ftp=FTP)
+        assert [step.kind for step in compiled.steps] == ["work"] * 8 + ["cooldown"]
+        assert compiled.duration_s == 8 * 60 + 300
+        assert compiled.start_s[-1] == 480
+
+    def test_explicit_thresholds_override_athlete(self):
+        """Test that keyword thresholds win over the athlete's."""
+        compiled = compile_spec(vo2_spec(), athlete(ftp=FTP), ftp=200)
+        assert compiled.ftp == 200
+        assert compiled.target[1] == pytest.approx(230)
+
+    def test_distance_steps_are_rejected(self):
+        """Test that steps without a duration can't be placed on the time grid."""
+        spec = WorkoutSpec(sport="running", steps=[WorkoutStep(kind="work", duration_distance_m=1000)])
+        with pytest.raises(ValueError, match="distance-based"):
+            compile_spec(spec)
+
+
+class TestPlannedLoad:
+    """Tests for analytic planned NP/IF/TSS."""
+
+    def test_planned_load_matches_executing_the_plan(self):
+        """Test that planned TSS is close to the TSS of riding the targets exactly."""
+        compiled = compile_spec(vo2_spec(), ftp=FTP)
+        power = compiled.target[compiled.step_index]
+        executed_np = calculate_normalized_power(power.tolist())
+        assert compiled.planned_np == pytest.approx(executed_np, rel=0.02)
+        assert compiled.planned_if == pytest.approx(compiled.planned_np / FTP)
+        assert compiled.planned_tss == pytest.approx(
+            calculate_tss_from_power(compiled.duration_s, executed_np, FTP), rel=0.04
+        )
+
+    def test_mixed_step_types_count_toward_planned_load(self):
+        """Test that untargeted and HR steps are part of planned NP and TSS duration."""
+        spec = WorkoutSpec(sport="cycling", steps=[
+            WorkoutStep(kind="warmup", duration_s=900),
+            WorkoutStep(kind="interval_block", repeats=4, steps=[
+                WorkoutStep(kind="work", duration_s=240, target_power_pct=110),
+                WorkoutStep(kind="rest", duration_s=120, target_hr_bpm=120),
+            ]),
+            WorkoutStep(kind="cooldown", duration_s=600),
+        ])
+        compiled = compile_spec(spec, ftp=FTP)
+        easy = workout_compiler.UNTARGETED_POWER_FTP_FRACTION * FTP
+        power = np.where(compiled.channel == 0, compiled.target, easy)[compiled.step_index]
+        executed_np = calculate_normalized_power(power.tolist())
+
+        assert compiled.duration_s == 900 + 4 * 360 + 600
+        assert compiled.planned_np == pytest.approx(executed_np, rel=0.02)
+        assert compiled.planned_tss == pytest.approx(
+            calculate_tss_from_power(compiled.duration_s, executed_np, FTP), rel=0.04
+        )
+        # Work steps alone (the previous result) would overstate NP
+        assert compiled.planned_np < 0.95 * 1.10 * FTP
+
+    def test_steady_ride_is_exact(self):
+        """Test one hour at FTP plans IF 1.0 and 100 TSS."""
+        spec = WorkoutSpec(sport="cycling", steps=[
+            WorkoutStep(kind="work", duration_s=3600, target_power_w=FTP),
+        ])
+        compiled = compile_spec(spec, ftp=FTP)
+        assert compiled.planned_if == pytest.approx(1.0)
+        assert compiled.planned_tss == pytest.approx(100.0)
+
+    def test_with_planned_load_fills_spec_totals(self):
+        """Test that total_duration_s and total_tss are filled on a copy."""
+        spec = vo2_spec()
+        planned = with_planned_load(spec, athlete(ftp=FTP))
+        assert planned.total_duration_s == 3000
+        assert planned.total_tss == pytest.approx(compile_spec(spec, ftp=FTP).planned_tss)
+        assert spec.total_tss is None
+        assert with_planned_load(spec).total_tss is None
+
+
+class TestCompileCache:
+    """Tests for memoization by spec hash and thresholds."""
+
+    def setup_method(self):
+        workout_compiler._cache.clear()
+
+    def test_equal_specs_share_one_compilation(self):
+        """Test that an equal spec at the same thresholds is a cache hit."""
+        first = compile_spec(vo2_spec(), ftp=FTP)
+        second = compile_spec(vo2_spec(), athlete(ftp=FTP))
+        assert second is first
+        assert workout_compiler._cache.hits == 1 and workout_compiler._cache.misses == 1
+
+    def test_threshold_or_spec_change_recompiles(self):
+        """Test that a new FTP or an edited spec compiles again."""
+        spec = vo2_spec()
+        base = compile_spec(spec, ftp=FTP)
+        assert compile_spec(spec, ftp=FTP + 10) is not base
+        edited = spec.model_copy(update={"name": "VO2 5x3"})
+        assert spec_hash(edited) != spec_hash(spec)
+        assert compile_spec(edited, ftp=FTP) is not base
+
+    def test_compiled_arrays_are_read_only(self):
+        """Test that a shared compilation can't be modified in place."""
+        compiled = compile_spec(vo2_spec(), ftp=FTP)
+        with pytest.raises(ValueError):
+            compiled.target[0] = 0
+        assert not np.shares_memory(compiled.start_s, compiled.end_s)
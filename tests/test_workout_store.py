@@ -0,0 +1,129 @@
+"""Unit tests for the FTP-independent workout store and rethresholding."""
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from app.schemas.training import WorkoutExecuted
+from app.services.metrics import calculate_tss_from_power
+from app.services.workout_store import WorkoutStore
+
+
+def _workout(day: date, np_w=None, duration_s=3600, tss=None, athlete_id=1, sport="cycling") -> WorkoutExecuted:
+    summary = {}
+    if np_w is not None:
+        summary.update({"np": np_w, "avg_power": np_w * 0.95})
+    if tss is not None:
+        summary["tss"] = tss
+    return WorkoutExecuted(
+        athlete_id=athlete_id,
+        source="file",
+        start_time=datetime.combine(day, datetime.min.time()),
+        duration_s=duration_s,
+        sport=sport,
+        summary_json=summary,
+    )
+
+
+class TestWorkoutStore:
+    """Tests for WorkoutStore."""
+
+    def test_rethreshold_matches_scalar_tss(self):
+        """Test that vectorized rethresholding equals calculate_tss_from_power."""
+        store = WorkoutStore()
+        store.add("a", _workout(date(2024, 1, 1), np_w=250, duration_s=3600, tss=100))
+        store.add("b", _workout(date(2024, 1, 3), np_w=200, duration_s=5400, tss=80))
+
+        result = store.rethreshold(1, ftp=280)
+
+        _, daily = store.daily_tss(1)
+        assert result.workouts_updated == 2
+        assert result.earliest_affected_date == date(2024, 1, 1)
+        assert daily[0] == pytest.approx(calculate_tss_from_power(3600, 250, 280))
+        assert daily[1] == 0.0
+        assert daily[2] == pytest.approx(calculate_tss_from_power(5400, 200, 280))
+
+    def test_rethreshold_since_only_touches_later_workouts(self):
+        """Test that `since` limits the recompute and the invalidation date."""
+        store = WorkoutStore()
+        changes = []
+        store.subscribe(lambda athlete_id, changed_from: changes.append(changed_from))
+        store.add("a", _workout(date(2024, 1, 1), np_w=250, tss=79.7))
+        store.add("b", _workout(date(2024, 3, 1), np_w=250, tss=79.7))
+        changes.clear()
+
+        result = store.rethreshold(1, ftp=300, since=date(2024, 2, 1))
+
+        assert result.workouts_updated == 1
+        assert result.earliest_affected_date == date(2024, 3, 1)
+        assert changes == [date(2024, 3, 1)]
+        _, daily = store.daily_tss(1)
+        assert daily[0] == pytest.approx(79.7)
+
+    def test_workouts_without_power_keep_their_tss(self):
+        """Test that HR-only workouts are not rethresholded."""
+        store = WorkoutStore()
+        store.add("run", _workout(date(2024, 1, 1), tss=60))
+        result = store.rethreshold(1, ftp=300)
+        assert result.workouts_updated == 0
+        assert result.earliest_affected_date is None
+        assert store.daily_tss(1)[1].tolist() == [60.0]
+
+    def test_other_sports_with_power_keep_their_tss(self):
+        """Test that running power is not rethresholded with the cycling FTP."""
+        store = WorkoutStore()
+        store.add("run", _workout(date(2024, 1, 1), np_w=280, tss=70, sport="running"))
+        store.add("ride", _workout(date(2024, 1, 2), np_w=250, tss=100))
+        result = store.rethreshold(1, ftp=300)
+        assert result.workouts_updated == 1
+        assert result.earliest_affected_date == date(2024, 1, 2)
+        assert store.daily_tss(1)[1][0] == 70.0
+
+    def test_re_adding_same_key_replaces_entry(self):
+        """Test that a duplicate upload doesn't double-count TSS."""
+        store = WorkoutStore()
+        store.add("a", _workout(date(2024, 1, 1), np_w=250, tss=70))
+        store.add("a", _workout(date(2024, 1, 1), np_w=250, tss=70))
+        assert len(store) == 1
+        dates, daily = store.daily_tss(1)
+        assert dates.tolist() == [date(2024, 1, 1)]
+        assert daily.tolist() == [70.0]
+
+    def test_rethreshold_invalid_ftp_raises_error(self):
+        """Test that a non-positive FTP is rejected."""
+        with pytest.raises(ValueError, match="FTP must be positive"):
+            WorkoutStore().rethreshold(1, ftp=0)
+
+    def test_daily_tss_matrix_shares_one_calendar(self):
+        """Test that team rows align by date and match per-athlete daily TSS."""
+        store = WorkoutStore()
+        store.add("a", _workout(date(2024, 1, 3), tss=50, athlete_id=1))
+        store.add("b", _workout(date(2024, 1, 3), tss=30, athlete_id=1))
+        store.add("c", _workout(date(2024, 1, 1), tss=80, athlete_id=2))
+        store.add("d", _workout(date(2024, 1, 5), tss=40, athlete_id=2))
+
+        dates, tss, first_day = store.daily_tss_matrix([1, 9, 2], end=date(2024, 1, 6))
+
+        assert dates[0] == np.datetime64("2024-01-01") and len(dates) == 6
+        assert tss.tolist() == [[0, 0, 80, 0, 0, 0], [0] * 6, [80, 0, 0, 0, 40, 0]]
+        assert first_day.tolist() == [2, 6, 0]
+        np.testing.assert_array_equal(tss[2, :5], store.daily_tss(2)[1])
+
+    def test_persisted_tables_survive_restart(self, tmp_path):
+        """Test that adds, replacements and rethresholds are reloaded from disk."""
+        store = WorkoutStore(tmp_path)
+        store.add("a", _workout(date(2024, 1, 1), np_w=250, tss=100))
+        store.add("b", _workout(date(2024, 1, 3), tss=40))
+        store.add("b", _workout(date(2024, 1, 2), tss=60))
+        store.add("c", _workout(date(2024, 1, 5), np_w=200, athlete_id=2))
+        store.rethreshold(1, ftp=300)
+        with (tmp_path / "1.jsonl").open("a") as f:
+            f.write('{"key": "torn", "day"')
+
+        reloaded = WorkoutStore(tmp_path)
+        assert len(reloaded) == 3
+        for athlete_id in (1, 2):
+            dates, daily = reloaded.daily_tss(athlete_id)
+            expected_dates, expected = store.daily_tss(athlete_id)
+            np.testing.assert_array_equal(dates, expected_dates)
+            np.testing.assert_allclose(daily, expected)